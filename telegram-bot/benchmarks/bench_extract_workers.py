@@ -0,0 +1,58 @@
+"""Event loop responsiveness during concurrent extractions
+
+Usage: python -m benchmarks.bench_extract_workers [--workers N] URL [URL ...]
+
+Runs extract_metadata for all URLs concurrently and samples how late a
+10ms asyncio timer fires meanwhile. With --workers 0 extraction runs in
+the bot process thread pool; with N > 0 it runs in N worker processes.
+"""
+import os
+import time
+import asyncio
+import argparse
+import statistics
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+
+from bot import downloader  # noqa: E402
+from bot.ydl_workers import YDLProcessPool  # noqa: E402
+
+TICK = 0.01
+
+async def sample_lag(stop: asyncio.Event, samples: list) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        samples.append(time.perf_counter() - start - TICK)
+
+async def main(args):
+    downloader.ydl_workers = YDLProcessPool(workers=args.workers)
+    await downloader.ydl_workers.start()
+
+    stop = asyncio.Event()
+    samples = []
+    sampler = asyncio.create_task(sample_lag(stop, samples))
+
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(downloader.extract_metadata(url) for url in args.urls),
+        return_exceptions=True
+    )
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await sampler
+    downloader.ydl_workers.close()
+    downloader.ydl_pool.clear()
+
+    failed = sum(isinstance(result, Exception) for result in results)
+    samples.sort()
+    mode = f"{args.workers} processes" if args.workers else "threads"
+    print(f"mode={mode} urls={len(args.urls)} failed={failed} elapsed={elapsed:.2f}s")
+    print(f"loop lag: median={statistics.median(samples)*1000:.1f}ms "
+          f"p99={samples[int(len(samples) * 0.99)]*1000:.1f}ms max={samples[-1]*1000:.1f}ms")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Event loop lag during extraction")
+    parser.add_argument('--workers', type=int, default=0)
+    parser.add_argument('urls', nargs='+')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,82 @@
+"""Pure-Python moov relocation vs ffmpeg -c copy -movflags +faststart
+
+Usage: python -m benchmarks.bench_faststart [--duration 600] [--bitrate 8M] [--runs 3]
+
+A 1080p test pattern (lavfi testsrc2 + sine) is encoded with moov at the
+end of the file. Each run relocates moov with both methods on a fresh copy
+and reports the best wall time and the output size. Requires ffmpeg.
+"""
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+
+from bot.utils import run_command  # noqa: E402
+from bot.faststart import relocate_moov  # noqa: E402
+from bot.transcode_planner import moov_before_mdat  # noqa: E402
+
+async def make_source(path: str, duration: int, bitrate: str) -> None:
+    cmd = [
+        'ffmpeg', '-hide_banner', '-y',
+        '-f', 'lavfi', '-i', f'testsrc2=size=1920x1080:rate=30:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', bitrate,
+        '-c:a', 'aac', path
+    ]
+    returncode, _, stderr = await run_command(cmd)
+    if returncode != 0:
+        sys.exit(stderr.decode()[-1000:])
+
+async def with_ffmpeg(source: str, output: str) -> str:
+    cmd = [
+        'ffmpeg', '-hide_banner', '-y', '-i', source,
+        '-map', '0', '-c', 'copy', '-movflags', '+faststart', output
+    ]
+    returncode, _, _ = await run_command(cmd)
+    return output if returncode == 0 else None
+
+async def with_python(source: str, output: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, relocate_moov, source, output)
+
+async def measure(name: str, work_dir: str, source: str, method, runs: int) -> None:
+    best = None
+    output = None
+    for _ in range(runs):
+        output = os.path.join(work_dir, f'{name}.mp4')
+        start = time.perf_counter()
+        result = await method(source, output)
+        elapsed = time.perf_counter() - start
+        if not result or not moov_before_mdat(result):
+            print(f"{name:7s} failed")
+            return
+        best = elapsed if best is None else min(best, elapsed)
+    size = os.path.getsize(output) / (1024 * 1024)
+    print(f"{name:7s} best={best:6.2f}s output={size:.1f}MB")
+    os.remove(output)
+
+async def main(args):
+    work_dir = tempfile.mkdtemp(prefix="bench_faststart_")
+    try:
+        source = os.path.join(work_dir, 'source.mp4')
+        await make_source(source, args.duration, args.bitrate)
+        if moov_before_mdat(source):
+            sys.exit("source already has moov first")
+        print(f"source: {os.path.getsize(source)/(1024*1024):.1f}MB, runs: {args.runs}")
+
+        await measure("ffmpeg", work_dir, source, with_ffmpeg, args.runs)
+        await measure("python", work_dir, source, with_python, args.runs)
+    finally:
+        shutil.rmtree(work_dir)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Faststart relocation benchmark")
+    parser.add_argument('--duration', type=int, default=600)
+    parser.add_argument('--bitrate', default='8M')
+    parser.add_argument('--runs', type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,115 @@
+"""Sequential vs parallel downloads against a local throttled HTTP stand-in
+
+Usage: python -m benchmarks.bench_parallel_download [--size-mb 64] [--conn-mbps 40] [--runs 6]
+
+The stand-in limits every connection to --conn-mbps, like CDNs that
+throttle per connection. It serves a large progressive file (with Range
+support) and an HLS playlist of 4-second segments. The progressive file is
+fetched repeatedly with the host tuner choosing the connection count; the
+playlist is fetched by yt-dlp with 1 and with N concurrent fragments.
+"""
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+import shutil
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+
+import yt_dlp  # noqa: E402
+from aiohttp import web  # noqa: E402
+from bot.range_downloader import download_ranges  # noqa: E402
+from bot.services.host_tuner import HostThroughputTuner  # noqa: E402
+
+SEGMENT_SIZE = 2 * 1024 * 1024
+SEND_SIZE = 64 * 1024
+
+def make_app(payload: bytes, segments: int, conn_rate: float) -> web.Application:
+    async def send_throttled(request, body: bytes, status=200, headers=None):
+        response = web.StreamResponse(status=status, headers=headers or {})
+        response.content_length = len(body)
+        await response.prepare(request)
+        for offset in range(0, len(body), SEND_SIZE):
+            await response.write(body[offset:offset + SEND_SIZE])
+            await asyncio.sleep(SEND_SIZE / conn_rate)
+        return response
+
+    async def video(request):
+        header = request.headers.get('Range')
+        if not header:
+            return await send_throttled(request, payload)
+        start, end = header.replace('bytes=', '').split('-')
+        start, end = int(start), min(int(end or len(payload) - 1), len(payload) - 1)
+        return await send_throttled(request, payload[start:end + 1], 206, {
+            'Content-Range': f'bytes {start}-{end}/{len(payload)}', 'Accept-Ranges': 'bytes'
+        })
+
+    async def playlist(request):
+        lines = ['#EXTM3U', '#EXT-X-VERSION:3', '#EXT-X-TARGETDURATION:4', '#EXT-X-MEDIA-SEQUENCE:0']
+        for index in range(segments):
+            lines += ['#EXTINF:4.0,', f'seg{index}.ts']
+        lines.append('#EXT-X-ENDLIST')
+        return web.Response(text='\n'.join(lines), content_type='application/vnd.apple.mpegurl')
+
+    async def segment(request):
+        return await send_throttled(request, payload[:SEGMENT_SIZE])
+
+    app = web.Application()
+    app.router.add_get('/video.mp4', video)
+    app.router.add_get('/hls/index.m3u8', playlist)
+    app.router.add_get('/hls/{name}.ts', segment)
+    return app
+
+def hls_download(url: str, output_dir: str, fragments: int) -> float:
+    opts = {
+        'outtmpl': os.path.join(output_dir, f'hls_{fragments}.%(ext)s'),
+        'quiet': True, 'no_warnings': True, 'noprogress': True,
+        'concurrent_fragment_downloads': fragments, 'fixup': 'never',
+    }
+    start = time.perf_counter()
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        ydl.download([url])
+    return time.perf_counter() - start
+
+async def main(args):
+    payload = os.urandom(args.size_mb * 1024 * 1024)
+    conn_rate = args.conn_mbps * 1000 * 1000 / 8
+    runner = web.AppRunner(make_app(payload, args.size_mb * 1024 * 1024 // SEGMENT_SIZE, conn_rate))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base = f"http://127.0.0.1:{port}"
+    work_dir = tempfile.mkdtemp(prefix="bench_parallel_")
+
+    try:
+        print(f"file={args.size_mb}MB per-connection limit={args.conn_mbps}Mbit/s")
+        tuner = HostThroughputTuner(max_concurrency=args.max_connections)
+        output_path = os.path.join(work_dir, 'video.mp4')
+        for run in range(args.runs):
+            connections, chunk_size = tuner.settings('127.0.0.1')
+            nbytes, seconds = await download_ranges(
+                f"{base}/video.mp4", output_path, connections=connections, chunk_size=chunk_size
+            )
+            tuner.record('127.0.0.1', nbytes, seconds, connections)
+            print(f"range run {run + 1}: connections={connections} chunk={chunk_size // (1024 * 1024)}MB "
+                  f"time={seconds:.2f}s rate={nbytes / seconds / (1024 * 1024):.1f}MB/s")
+
+        loop = asyncio.get_event_loop()
+        for fragments in (1, args.max_connections):
+            seconds = await loop.run_in_executor(
+                None, hls_download, f"{base}/hls/index.m3u8", work_dir, fragments
+            )
+            print(f"hls fragments={fragments}: time={seconds:.2f}s")
+    finally:
+        await runner.cleanup()
+        shutil.rmtree(work_dir)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Parallel download benchmark")
+    parser.add_argument('--size-mb', type=int, default=64)
+    parser.add_argument('--conn-mbps', type=int, default=40)
+    parser.add_argument('--runs', type=int, default=6)
+    parser.add_argument('--max-connections', type=int, default=8)
+    asyncio.run(main(parser.parse_args()))
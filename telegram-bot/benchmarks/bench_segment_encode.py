@@ -0,0 +1,72 @@
+"""Single-process vs segment-parallel encoding on a synthetic input
+
+Usage: python -m benchmarks.bench_segment_encode [--duration 300] [--workers 0]
+
+A 1080p test pattern (lavfi testsrc2 + sine) is encoded at a high bitrate,
+then compressed to TARGET_VIDEO_SIZE_MB at 720p once with the current
+single ffmpeg process and once split into keyframe-aligned segments
+encoded on --workers cores (0 = CPU count). Wall time, output size and
+the speedup are reported. Requires ffmpeg.
+"""
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+
+from bot.config.config import config  # noqa: E402
+from bot.utils import run_command  # noqa: E402
+from bot.video_compress import encode_to_size  # noqa: E402
+from bot import segment_encoder  # noqa: E402
+
+async def make_source(path: str, duration: int) -> None:
+    cmd = [
+        'ffmpeg', '-hide_banner', '-y',
+        '-f', 'lavfi', '-i', f'testsrc2=size=1920x1080:rate=30:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', '8M', '-g', '60',
+        '-c:a', 'aac', '-movflags', '+faststart', path
+    ]
+    returncode, _, stderr = await run_command(cmd)
+    if returncode != 0:
+        sys.exit(stderr.decode()[-1000:])
+
+async def measure(name: str, coro) -> float:
+    start = time.perf_counter()
+    output = await coro
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(output) / (1024 * 1024) if output else 0
+    print(f"{name:9s} time={elapsed:6.1f}s output={size:.1f}MB")
+    return elapsed
+
+async def main(args):
+    root = tempfile.mkdtemp(prefix="bench_segment_")
+    config.downloads_dir = root
+    if args.workers:
+        config.segment_workers = args.workers
+    try:
+        source = os.path.join(root, 'source.mp4')
+        await make_source(source, args.duration)
+        target_bytes = config.target_video_size_mb * 1024 * 1024
+        print(f"source: {os.path.getsize(source)/(1024*1024):.1f}MB, {args.duration}s, "
+              f"target: {config.target_video_size_mb}MB, workers: {segment_encoder.segment_workers()}")
+
+        single = await measure("single", encode_to_size(
+            source, os.path.join(root, 'single.mp4'), args.duration, 1280, 720, target_bytes
+        ))
+        segmented = await measure("segmented", segment_encoder.encode_segmented(
+            source, os.path.join(root, 'segmented.mp4'), args.duration, 1280, 720, target_bytes
+        ))
+        print(f"speedup: {single / segmented:.2f}x")
+    finally:
+        shutil.rmtree(root)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Segment-parallel encoding benchmark")
+    parser.add_argument('--duration', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
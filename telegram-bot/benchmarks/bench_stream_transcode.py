@@ -0,0 +1,135 @@
+"""Download-then-compress vs streaming transcode on a synthetic input
+
+Usage: python -m benchmarks.bench_stream_transcode [--duration 120] [--rate-mbps 40]
+
+A 1080p test pattern (lavfi testsrc2 + sine) is encoded at a high bitrate
+and served from a local HTTP server throttled to --rate-mbps. Both modes
+compress it to TARGET_VIDEO_SIZE_MB; wall time and peak disk usage of the
+work directory are reported. Requires ffmpeg.
+"""
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import threading
+import urllib.request
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+
+from bot.config.config import config  # noqa: E402
+from bot.utils import run_command  # noqa: E402
+from bot.video_compress import compress_video  # noqa: E402
+from bot.stream_transcode import stream_compress  # noqa: E402
+
+CHUNK = 64 * 1024
+
+class ThrottledHandler(SimpleHTTPRequestHandler):
+    rate_bytes = 5 * 1024 * 1024
+
+    def copyfile(self, source, outputfile):
+        while True:
+            start = time.perf_counter()
+            chunk = source.read(CHUNK)
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            delay = len(chunk) / self.rate_bytes - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+    def log_message(self, *args):
+        pass
+
+class DiskSampler(threading.Thread):
+    """Polls the size of a directory and keeps the peak"""
+
+    def __init__(self, path: str):
+        super().__init__(daemon=True)
+        self.path = path
+        self.peak = 0
+        self.running = True
+
+    def run(self):
+        while self.running:
+            total = 0
+            for entry in os.scandir(self.path):
+                try:
+                    total += entry.stat().st_size
+                except FileNotFoundError:
+                    pass
+            self.peak = max(self.peak, total)
+            time.sleep(0.05)
+
+async def make_source(path: str, duration: int) -> None:
+    cmd = [
+        'ffmpeg', '-hide_banner', '-y',
+        '-f', 'lavfi', '-i', f'testsrc2=size=1920x1080:rate=30:duration={duration}',
+        '-f', 'lavfi', '-i', f'sine=frequency=440:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-b:v', '8M',
+        '-c:a', 'aac', '-movflags', '+faststart', path
+    ]
+    returncode, _, stderr = await run_command(cmd)
+    if returncode != 0:
+        sys.exit(stderr.decode()[-1000:])
+
+async def classic(url: str, work_dir: str) -> str:
+    original = os.path.join(work_dir, 'original.mp4')
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, urllib.request.urlretrieve, url, original)
+    return await compress_video(original, os.path.join(work_dir, 'classic.mp4'))
+
+async def streamed(info: dict, work_dir: str) -> str:
+    return await stream_compress(info, os.path.join(work_dir, 'streamed.mp4'))
+
+async def measure(name: str, work_dir: str, coro) -> None:
+    sampler = DiskSampler(work_dir)
+    sampler.start()
+    start = time.perf_counter()
+    output = await coro
+    elapsed = time.perf_counter() - start
+    sampler.running = False
+    sampler.join()
+    size = os.path.getsize(output) / (1024 * 1024) if output else 0
+    print(f"{name:9s} time={elapsed:6.1f}s peak_disk={sampler.peak/(1024*1024):7.1f}MB output={size:.1f}MB")
+    shutil.rmtree(work_dir)
+    os.makedirs(work_dir)
+
+async def main(args):
+    root = tempfile.mkdtemp(prefix="bench_stream_")
+    serve_dir = os.path.join(root, 'serve')
+    work_dir = os.path.join(root, 'work')
+    os.makedirs(serve_dir)
+    os.makedirs(work_dir)
+
+    source = os.path.join(serve_dir, 'source.mp4')
+    await make_source(source, args.duration)
+    source_size = os.path.getsize(source)
+    print(f"source: {source_size/(1024*1024):.1f}MB, target: {config.target_video_size_mb}MB, "
+          f"link: {args.rate_mbps}Mbit/s")
+
+    ThrottledHandler.rate_bytes = args.rate_mbps * 1000 * 1000 / 8
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(ThrottledHandler, directory=serve_dir))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/source.mp4"
+
+    info = {
+        'id': 'bench', 'url': url, 'protocol': 'http', 'ext': 'mp4',
+        'duration': args.duration, 'width': 1920, 'height': 1080, 'filesize': source_size
+    }
+    try:
+        await measure("classic", work_dir, classic(url, work_dir))
+        await measure("streamed", work_dir, streamed(info, work_dir))
+    finally:
+        server.shutdown()
+        shutil.rmtree(root)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Streaming transcode benchmark")
+    parser.add_argument('--duration', type=int, default=120)
+    parser.add_argument('--rate-mbps', type=int, default=40)
+    asyncio.run(main(parser.parse_args()))
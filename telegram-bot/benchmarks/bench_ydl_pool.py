@@ -0,0 +1,54 @@
+"""Cold vs warm yt-dlp metadata extraction latency
+
+Usage: python -m benchmarks.bench_ydl_pool URL [URL ...]
+
+"cold" builds a fresh YoutubeDL per URL (old behaviour), "warm" reuses
+instances from YDLPool with a persistent cachedir.
+"""
+import os
+import sys
+import time
+import asyncio
+import statistics
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+
+import yt_dlp  # noqa: E402
+from bot.downloader import create_ydl_opts, ydl_pool  # noqa: E402
+from bot.ydl_pool import PROFILE_METADATA  # noqa: E402
+
+def cold_extract(url: str) -> None:
+    with yt_dlp.YoutubeDL(create_ydl_opts("bench.%(ext)s")) as ydl:
+        ydl.extract_info(url, download=False)
+
+async def warm_extract(url: str) -> None:
+    async with ydl_pool.checkout(PROFILE_METADATA) as ydl:
+        await asyncio.get_event_loop().run_in_executor(
+            None, lambda: ydl.extract_info(url, download=False)
+        )
+
+async def main(urls):
+    loop = asyncio.get_event_loop()
+    cold, warm = [], []
+    for url in urls:
+        start = time.perf_counter()
+        await loop.run_in_executor(None, cold_extract, url)
+        cold.append(time.perf_counter() - start)
+
+    # Birinchi chaqiruv nusxani yaratadi
+    await warm_extract(urls[0])
+    for url in urls:
+        start = time.perf_counter()
+        await warm_extract(url)
+        warm.append(time.perf_counter() - start)
+
+    ydl_pool.clear()
+    for name, samples in (("cold", cold), ("warm", warm)):
+        print(f"{name}: median={statistics.median(samples):.3f}s "
+              f"min={min(samples):.3f}s max={max(samples):.3f}s n={len(samples)}")
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    asyncio.run(main(sys.argv[1:]))
@@ -13,34 +13,67 @@ from .utils import run_command
 from .path_utils import generate_temp_filename
 from .services.monitoring import metrics
 from .config.config import config
+from .media_probe import media_probe
+from .transcode_planner import plan_audio, AUDIO_PLAN_COPY, AUDIO_PLAN_ENCODE
 
 logger = logging.getLogger(__name__)
 
-async def extract_audio_from_video(video_path: str, output_path: Optional[str] = None) -> Optional[str]:
-    """Extract audio from video file"""
+# Encoder settings for each audio container a caller can ask for
+AUDIO_ENCODE_ARGS = {
+    '.mp3': ['-acodec', 'libmp3lame', '-ab', '192k', '-ar', '44100'],
+    '.m4a': ['-acodec', 'aac', '-ab', '192k', '-ar', '44100'],
+}
+
+async def extract_audio_from_video(
+    video_path: str,
+    output_path: Optional[str] = None,
+    prefix: str = "audio_"
+) -> Optional[str]:
+    """Extract audio from video file
+
+    Without output_path, AAC and MP3 tracks are copied as they are into a
+    temporary m4a/mp3 file and anything else is encoded to mp3. An explicit
+    output_path is kept: its suffix (.mp3 or .m4a) picks the container and
+    the track is copied only when it already matches it.
+    """
     try:
         if not os.path.exists(video_path):
             logger.error(f"Video file not found: {video_path}")
             return None
 
+        media = await media_probe.probe(video_path)
+        plan, extension = plan_audio(media.to_probe() if media else None)
         if output_path is None:
-            output_path = str(Path(video_path).with_suffix('.mp3'))
-
+            output_path = generate_temp_filename(prefix=prefix, suffix=extension)
+        else:
+            extension_wanted = Path(output_path).suffix.lower()
+            if extension_wanted not in AUDIO_ENCODE_ARGS:
+                logger.error(f"Unsupported audio output format: {output_path}")
+                return None
+            if extension_wanted != extension:
+                plan, extension = AUDIO_PLAN_ENCODE, extension_wanted
+
+        if plan == AUDIO_PLAN_COPY:
+            codec_args = ['-acodec', 'copy']
+        else:
+            codec_args = AUDIO_ENCODE_ARGS[extension]
         cmd = [
             'ffmpeg',
             '-i', video_path,
             '-vn',  # Disable video
-            '-acodec', 'libmp3lame',
-            '-ab', '192k',
-            '-ar', '44100',
+        ] + codec_args + [
             '-y',  # Overwrite output file
             output_path
         ]
 
+        start_time = time.monotonic()
         returncode, stdout, stderr = await run_command(cmd)
+        metrics.track_stage_time(f"audio_{plan}", time.monotonic() - start_time)
 
         if returncode != 0:
             logger.error(f"FFmpeg error: {stderr.decode()}")
+            if os.path.exists(output_path):
+                os.remove(output_path)
             return None
 
         if not os.path.exists(output_path):
@@ -150,7 +183,7 @@ async def get_music_info_from_video(video_path: str) -> Optional[Dict[str, Any]]
     """Extract audio from video and recognize music"""
     try:
         # Extract audio to temporary file
-        audio_path = await extract_audio_from_video(video_path)
+        audio_path = await extract_audio_from_video(video_path, prefix="music_")
         if not audio_path:
             return None
 
@@ -11,6 +11,7 @@ class BotConfig:
     max_file_age: int
     port: int
     downloads_dir: Path
+    data_dir: Path
 
     # Railway settings
     max_disk_percent: int = 80
@@ -21,6 +22,78 @@ class BotConfig:
     max_video_size_mb: int = 450  # Railway limit
     target_video_size_mb: int = 45  # Telegram limit
     max_video_height: int = 720  # Default max height for compression
+    encode_crf: int = 23  # Quality of capped-CRF encodes when the predicted size fits
+    segment_encoding: bool = True  # Encode long videos as parallel keyframe-aligned segments
+    segment_min_duration: int = 300  # Seconds; shorter videos use a single encoder
+    segment_workers: int = 0  # Concurrent segment encoders, 0 = transcode_max_encoders
+    transcode_cpus: float = 0  # CPU budget of all encoders, 0 = cgroup quota / affinity
+    transcode_max_encoders: int = 0  # Concurrent ffmpeg encoders, 0 = half the CPU budget
+    transcode_max_preset: str = "medium"  # Slowest x264 preset used when idle
+    transcode_latency_budget: float = 300  # Seconds an encode may take before faster presets are used
+    transcode_abort_ratio: float = 1.1  # Stop an encode projected above target x this, 0 = never
+    fit_format_selection: bool = True  # Pick a rendition under target size before downloading
+    stream_transcode: bool = True  # Let ffmpeg read the stream instead of downloading first
+
+    # Media cache settings
+    media_cache_max_mb: int = 1024
+    media_cache_high_watermark: int = 90  # % of budget that triggers eviction
+    media_cache_low_watermark: int = 70  # % of budget eviction stops at
+    media_cache_policy: str = "lru"  # lru or lfu
+
+    # Metadata cache settings
+    metadata_cache_max_entries: int = 2000
+    metadata_cache_ttl: int = 1800  # 30 minutes
+    metadata_cache_negative_ttl: int = 300  # 5 minutes for private/removed videos
+    metadata_cache_persist: bool = False
+
+    # Pipeline stage concurrency
+    pipeline_metadata_workers: int = 4
+    pipeline_download_workers: int = 3
+    pipeline_probe_workers: int = 4
+    pipeline_upload_workers: int = 3
+
+    # Parallel fragment/range downloads, tuned per host
+    parallel_downloads: bool = True
+    download_max_connections: int = 8
+
+    # Resumable downloads
+    download_max_attempts: int = 3  # Per job, across retries and restarts
+    partial_max_age_hours: float = 6
+
+    # Fair scheduling of download/transcode jobs across users
+    scheduler_slots: int = 4
+    scheduler_quantum: float = 60  # Seconds of estimated work per user per round
+    scheduler_global_sjf: bool = False
+
+    # Per-domain circuit breakers and adaptive concurrency
+    breaker_window: int = 20  # Last N calls per domain
+    breaker_min_calls: int = 5
+    breaker_failure_ratio: float = 0.5
+    breaker_throttle_limit: int = 3  # 429/403 answers in the window
+    breaker_open_seconds: float = 30
+    breaker_max_wait: float = 15  # Shorter open periods are waited out
+    domain_max_concurrency: int = 4
+
+    # Telegram flood limits for status edits and sends
+    telegram_global_rate: float = 25  # Messages per second across all chats
+    telegram_chat_rate: float = 1  # Messages per second in one chat
+    telegram_chat_burst: int = 3
+
+    # Messages and .txt files with several links
+    batch_max_urls: int = 20
+    batch_parallelism: int = 3
+
+    # yt-dlp worker processes (0 = run in the bot process thread pool)
+    ydl_process_workers: int = 0
+
+    # ffmpeg/ffprobe subprocess limits (0 = no limit)
+    process_timeout: int = 3600  # Wall-clock seconds for one ffmpeg run
+    probe_timeout: int = 60  # Wall-clock seconds for one ffprobe run
+    process_cpu_limit: int = 0  # CPU seconds (RLIMIT_CPU)
+    process_memory_limit_mb: int = 0  # Address space (RLIMIT_AS)
+    process_nice: int = 0  # Added niceness, keeps the bot responsive under load
+    process_ionice_idle: bool = False  # Disk I/O only when nothing else needs it
+    process_output_limit_kb: int = 256  # stderr kept per process (last N KB)
     
     # Audio settings
     max_audio_size_mb: int = 50  # Telegram limit for audio files
@@ -46,18 +119,73 @@ class BotConfig:
         downloads_dir = Path(os.getenv("DOWNLOAD_DIR", "downloads"))
         downloads_dir.mkdir(exist_ok=True)
 
+        # Persistent state (file_id registry, indexes) lives outside downloads
+        data_dir = Path(os.getenv("DATA_DIR", "data"))
+        data_dir.mkdir(exist_ok=True)
+
         return cls(
             token=token,
             admin_ids=admin_ids,
             max_file_age=int(os.getenv("MAX_FILE_AGE_HOURS", "1")),
             port=int(os.getenv("PORT", "8080")),
             downloads_dir=downloads_dir,
+            data_dir=data_dir,
             max_disk_percent=int(os.getenv("MAX_DISK_PERCENT", "80")),
             max_memory_percent=int(os.getenv("MAX_MEMORY_PERCENT", "85")),
             cleanup_interval=int(os.getenv("CLEANUP_INTERVAL_SECONDS", "300")),
             max_video_size_mb=int(os.getenv("MAX_VIDEO_SIZE_MB", "450")),
             target_video_size_mb=int(os.getenv("TARGET_VIDEO_SIZE_MB", "45")),
             max_video_height=int(os.getenv("MAX_VIDEO_HEIGHT", "720")),
+            encode_crf=int(os.getenv("ENCODE_CRF", "23")),
+            segment_encoding=os.getenv("SEGMENT_ENCODING", "true").lower() in ("1", "true", "yes"),
+            segment_min_duration=int(os.getenv("SEGMENT_MIN_DURATION_SECONDS", "300")),
+            segment_workers=int(os.getenv("SEGMENT_WORKERS", "0")),
+            transcode_cpus=float(os.getenv("TRANSCODE_CPUS", "0")),
+            transcode_max_encoders=int(os.getenv("TRANSCODE_MAX_ENCODERS", "0")),
+            transcode_max_preset=os.getenv("TRANSCODE_MAX_PRESET", "medium").lower(),
+            transcode_latency_budget=float(os.getenv("TRANSCODE_LATENCY_BUDGET_SECONDS", "300")),
+            transcode_abort_ratio=float(os.getenv("TRANSCODE_ABORT_RATIO", "1.1")),
+            media_cache_max_mb=int(os.getenv("MEDIA_CACHE_MAX_MB", "1024")),
+            media_cache_high_watermark=int(os.getenv("MEDIA_CACHE_HIGH_WATERMARK", "90")),
+            media_cache_low_watermark=int(os.getenv("MEDIA_CACHE_LOW_WATERMARK", "70")),
+            media_cache_policy=os.getenv("MEDIA_CACHE_POLICY", "lru").lower(),
+            metadata_cache_max_entries=int(os.getenv("METADATA_CACHE_MAX_ENTRIES", "2000")),
+            metadata_cache_ttl=int(os.getenv("METADATA_CACHE_TTL_SECONDS", "1800")),
+            metadata_cache_negative_ttl=int(os.getenv("METADATA_CACHE_NEGATIVE_TTL_SECONDS", "300")),
+            metadata_cache_persist=os.getenv("METADATA_CACHE_PERSIST", "false").lower() in ("1", "true", "yes"),
+            pipeline_metadata_workers=int(os.getenv("PIPELINE_METADATA_WORKERS", "4")),
+            pipeline_download_workers=int(os.getenv("PIPELINE_DOWNLOAD_WORKERS", "3")),
+            pipeline_probe_workers=int(os.getenv("PIPELINE_PROBE_WORKERS", "4")),
+            pipeline_upload_workers=int(os.getenv("PIPELINE_UPLOAD_WORKERS", "3")),
+            fit_format_selection=os.getenv("FIT_FORMAT_SELECTION", "true").lower() in ("1", "true", "yes"),
+            stream_transcode=os.getenv("STREAM_TRANSCODE", "true").lower() in ("1", "true", "yes"),
+            parallel_downloads=os.getenv("PARALLEL_DOWNLOADS", "true").lower() in ("1", "true", "yes"),
+            download_max_connections=int(os.getenv("DOWNLOAD_MAX_CONNECTIONS", "8")),
+            download_max_attempts=int(os.getenv("DOWNLOAD_MAX_ATTEMPTS", "3")),
+            partial_max_age_hours=float(os.getenv("PARTIAL_MAX_AGE_HOURS", "6")),
+            scheduler_slots=int(os.getenv("SCHEDULER_SLOTS", "4")),
+            scheduler_quantum=float(os.getenv("SCHEDULER_QUANTUM_SECONDS", "60")),
+            scheduler_global_sjf=os.getenv("SCHEDULER_GLOBAL_SJF", "false").lower() in ("1", "true", "yes"),
+            breaker_window=int(os.getenv("BREAKER_WINDOW", "20")),
+            breaker_min_calls=int(os.getenv("BREAKER_MIN_CALLS", "5")),
+            breaker_failure_ratio=float(os.getenv("BREAKER_FAILURE_RATIO", "0.5")),
+            breaker_throttle_limit=int(os.getenv("BREAKER_THROTTLE_LIMIT", "3")),
+            breaker_open_seconds=float(os.getenv("BREAKER_OPEN_SECONDS", "30")),
+            breaker_max_wait=float(os.getenv("BREAKER_MAX_WAIT_SECONDS", "15")),
+            domain_max_concurrency=int(os.getenv("DOMAIN_MAX_CONCURRENCY", "4")),
+            telegram_global_rate=float(os.getenv("TELEGRAM_GLOBAL_RATE", "25")),
+            telegram_chat_rate=float(os.getenv("TELEGRAM_CHAT_RATE", "1")),
+            telegram_chat_burst=int(os.getenv("TELEGRAM_CHAT_BURST", "3")),
+            batch_max_urls=int(os.getenv("BATCH_MAX_URLS", "20")),
+            batch_parallelism=int(os.getenv("BATCH_PARALLELISM", "3")),
+            ydl_process_workers=int(os.getenv("YDL_PROCESS_WORKERS", "0")),
+            process_timeout=int(os.getenv("PROCESS_TIMEOUT_SECONDS", "3600")),
+            probe_timeout=int(os.getenv("PROBE_TIMEOUT_SECONDS", "60")),
+            process_cpu_limit=int(os.getenv("PROCESS_CPU_LIMIT_SECONDS", "0")),
+            process_memory_limit_mb=int(os.getenv("PROCESS_MEMORY_LIMIT_MB", "0")),
+            process_nice=int(os.getenv("PROCESS_NICE", "0")),
+            process_ionice_idle=os.getenv("PROCESS_IONICE_IDLE", "false").lower() in ("1", "true", "yes"),
+            process_output_limit_kb=int(os.getenv("PROCESS_OUTPUT_LIMIT_KB", "256")),
             max_audio_size_mb=int(os.getenv("MAX_AUDIO_SIZE_MB", "50")),
             audio_bitrate=int(os.getenv("AUDIO_BITRATE", "192")),
             max_requests_per_minute=int(os.getenv("MAX_REQUESTS_PER_MINUTE", "30")),
@@ -1,23 +1,72 @@
 import os
+import re
+import time
 import logging
 import asyncio
 from typing import Optional, Tuple, Dict, Any
 from pathlib import Path
+import aiohttp
 import yt_dlp
 from .services.monitoring import metrics
+from .services.metadata_cache import metadata_cache, ENTRY_ERROR
 from .path_utils import generate_temp_filename
+from .ydl_pool import YDLPool, PROFILE_METADATA, PROFILE_DOWNLOAD
+from .ydl_workers import ydl_workers
+from .format_selector import select_format
+from .range_downloader import download_ranges, RangeDownloadError
+from .services.host_tuner import host_tuner, host_key
+from .services.circuit_breaker import (
+    circuit_breakers, CircuitOpenError, RESULT_OK, RESULT_FAILURE, RESULT_THROTTLED
+)
 from .config.config import config
 
 logger = logging.getLogger(__name__)
 
+# Failure categories that won't change on retry
+ERROR_PRIVATE = "private"
+ERROR_AGE_RESTRICTED = "age_restricted"
+ERROR_UNAVAILABLE = "unavailable"
+ERROR_TOO_LARGE = "too_large"
+# Site is failing/throttling us right now; not cached, not retried
+ERROR_CIRCUIT_OPEN = "circuit_open"
+
+# Categories cached negatively; "private" only when the extractor said so
+NEGATIVE_CACHE_CATEGORIES = (ERROR_PRIVATE, ERROR_AGE_RESTRICTED, ERROR_UNAVAILABLE)
+
+# Seconds before the first retry of an interrupted download (doubles each time)
+RETRY_BACKOFF = 2
+
+# Protocols whose fragments yt-dlp can fetch concurrently
+FRAGMENT_PROTOCOLS = ('m3u8_native', 'http_dash_segments', 'http_dash_segments_generator', 'ism', 'f4m')
+
+# HTTP answers a site uses to tell us to slow down
+THROTTLE_STATUSES = (403, 429)
+
+# Used when no rendition is known to fit the upload target
+DEFAULT_FORMAT = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
+
 class DownloadError(Exception):
-    """Custom exception for download errors"""
-    pass
+    """Custom exception for download errors
+
+    http_status is the HTTP answer behind a mapped yt-dlp error, so the
+    circuit breaker still sees a 403/429 after the user-facing rewording.
+    """
+    def __init__(self, message: str, category: Optional[str] = None, http_status: Optional[int] = None):
+        super().__init__(message)
+        self.category = category
+        self.http_status = http_status
+
+def http_status(e: BaseException) -> Optional[int]:
+    """HTTP status of a (yt-dlp) error, if it came from one"""
+    if isinstance(e, DownloadError) and e.http_status:
+        return e.http_status
+    match = re.search(r"HTTP Error (\d{3})", str(e))
+    return int(match.group(1)) if match else None
 
 def create_ydl_opts(output_path: str) -> dict:
     """Create yt-dlp options"""
     return {
-        'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
+        'format': DEFAULT_FORMAT,
         'outtmpl': output_path,
         'quiet': True,
         'no_warnings': True,
@@ -26,77 +75,377 @@ def create_ydl_opts(output_path: str) -> dict:
         'noplaylist': True,
         'max_filesize': config.max_video_size_mb * 1024 * 1024,
         'merge_output_format': 'mp4',
-        'postprocessors': [{
-            'key': 'FFmpegVideoRemuxer',
-            'preferedformat': 'mp4',
-        }],
+        # Konteyner compress_video rejasida kerak bo'lsagina almashtiriladi
     }
 
-async def download_video_with_info(url: str, output_dir: str = "downloads") -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
-    """Download video and return path with video info"""
+def choose_format(info: Optional[Dict[str, Any]]) -> str:
+    """Format spec for this video: a Telegram-fit rendition if one is known"""
+    if not info or not config.fit_format_selection:
+        return DEFAULT_FORMAT
+
+    selected = select_format(info)
+    metrics.track_format_selection(fitted=selected is not None)
+    if not selected:
+        return DEFAULT_FORMAT
+
+    spec, size = selected
+    logger.info(f"Selected format {spec} (~{size/(1024*1024):.1f}MB) for {info.get('id')}")
+    # Tanlangan format yo'qolsa, odatiy tanlovga qaytamiz
+    return f"{spec}/{DEFAULT_FORMAT}"
+
+def prepare_job(
+    ydl: yt_dlp.YoutubeDL,
+    output_path: str,
+    info: Optional[Dict[str, Any]] = None,
+    tuning: Optional[Dict[str, Tuple[int, int]]] = None
+) -> None:
+    """Point a pooled YoutubeDL at this job's output file, format and host tuning
+
+    tuning maps hosts to (concurrency, chunk_size) when the job runs in a
+    worker process, whose own host tuner never sees any downloads.
+    """
+    ydl.params['outtmpl']['default'] = output_path
+    spec = choose_format(info)
+    if spec != ydl.params.get('format'):
+        ydl.params['format'] = spec
+        ydl.format_selector = ydl.build_format_selector(spec)
+
+    host = stream_host(info) if config.parallel_downloads else None
+    if host:
+        concurrency, chunk_size = (tuning or {}).get(host) or host_tuner.settings(host)
+        ydl.params['concurrent_fragment_downloads'] = concurrency
+        ydl.params['http_chunk_size'] = chunk_size
+    else:
+        ydl.params['concurrent_fragment_downloads'] = 1
+        ydl.params.pop('http_chunk_size', None)
+
+def stream_host(info: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Tuning key of the CDN serving the selected stream(s)"""
+    if not info:
+        return None
+    formats = info.get('requested_formats') or [info]
+    url = formats[0].get('url')
+    return host_key(url) if url else None
+
+def is_cacheable_error(e: DownloadError) -> bool:
+    """Whether every later request for the URL would fail the same way
+
+    A bare HTTP 403 is mapped to "private" but is just as often throttling,
+    a geo block or an expired signature, so it is never cached.
+    """
+    if e.category == ERROR_CIRCUIT_OPEN or e.category not in NEGATIVE_CACHE_CATEGORIES:
+        return False
+    return not (e.category == ERROR_PRIVATE and e.http_status)
+
+def is_throttle_error(e: BaseException) -> bool:
+    return http_status(e) in THROTTLE_STATUSES
+
+def classify_result(e: Optional[BaseException]) -> str:
+    """Circuit breaker outcome: private/removed videos don't count against the site"""
+    if e is None:
+        return RESULT_OK
+    if is_throttle_error(e):
+        return RESULT_THROTTLED
+    if isinstance(e, DownloadError) and e.category:
+        return RESULT_OK
+    return RESULT_FAILURE
+
+def throughput_sample(
+    host: Optional[str],
+    result: Dict[str, Any],
+    seconds: float,
+    concurrency: int
+) -> Optional[Dict[str, Any]]:
+    """host_tuner.record() arguments for a fragment download, None otherwise"""
+    formats = result.get('requested_formats') or [result]
+    if not host or not any(fmt.get('protocol') in FRAGMENT_PROTOCOLS for fmt in formats):
+        return None
+    return {'host': host, 'nbytes': downloaded_bytes(result), 'seconds': seconds, 'concurrency': concurrency}
+
+def record_throughput(sample: Optional[Dict[str, Any]]) -> None:
+    if sample:
+        host_tuner.record(**sample)
+        metrics.track_download_mode("fragments")
+    else:
+        metrics.track_download_mode("sequential")
+
+def downloaded_bytes(result: Dict[str, Any]) -> int:
+    total = 0
+    for download in result.get('requested_downloads') or []:
+        filepath = download.get('filepath')
+        if filepath and os.path.exists(filepath):
+            total += os.path.getsize(filepath)
+    return total
+
+async def range_download(
+    ydl: yt_dlp.YoutubeDL,
+    selected: Dict[str, Any],
+    host: str
+) -> Optional[Dict[str, Any]]:
+    """Fetch a progressive mp4 over parallel byte ranges
+
+    Returns the result in process_ie_result shape, or None when the format
+    isn't a single HTTP file, the host is tuned down to one connection, or
+    the server doesn't cooperate - yt-dlp then downloads it sequentially.
+    """
+    if selected.get('requested_formats') or selected.get('protocol') not in ('http', 'https'):
+        return None
+    if selected.get('ext') != 'mp4' or not selected.get('url'):
+        return None
+    connections, chunk_size = host_tuner.settings(host)
+    if connections < 2:
+        return None
+
+    path = ydl.prepare_filename(selected)
     try:
-        output_dir = Path(output_dir)
-        output_dir.mkdir(exist_ok=True)
-        
-        output_path = generate_temp_filename(suffix=".%(ext)s")
-        ydl_opts = create_ydl_opts(output_path)
-
-        loop = asyncio.get_event_loop()
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # Extract info first to validate URL and check size
+        nbytes, seconds = await download_ranges(
+            selected['url'], path, selected.get('http_headers'), connections, chunk_size
+        )
+    except RangeDownloadError as e:
+        if e.throttled:
+            host_tuner.record_throttle(host)
+        logger.info(f"Range download from {host} not possible ({e}), using yt-dlp")
+        return None
+    except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+        logger.warning(f"Range download from {host} failed ({e}), using yt-dlp")
+        return None
+
+    host_tuner.record(host, nbytes, seconds, connections)
+    metrics.track_download_mode("range")
+    return {**selected, 'requested_downloads': [{'filepath': path}]}
+
+async def run_download(ydl: yt_dlp.YoutubeDL, info: Dict[str, Any]) -> Dict[str, Any]:
+    """Download resolved info with a prepared YoutubeDL, in parallel where possible"""
+    loop = asyncio.get_event_loop()
+    host = stream_host(info) if config.parallel_downloads else None
+
+    if host:
+        # Format tanlash tarmoqqa murojaat qilmaydi - qaysi fayl yuklanishini oldindan bilamiz
+        selected = await loop.run_in_executor(
+            None,
+            lambda: ydl.process_ie_result(dict(info), download=False)
+        )
+        result = await range_download(ydl, selected, host)
+        if result:
+            return result
+
+    start_time = time.monotonic()
+    try:
+        result = await loop.run_in_executor(
+            None,
+            lambda: ydl.process_ie_result(info, download=True)
+        )
+    except yt_dlp.utils.DownloadError as e:
+        if host and is_throttle_error(e):
+            host_tuner.record_throttle(host)
+        raise
+
+    record_throughput(throughput_sample(
+        host,
+        result,
+        time.monotonic() - start_time,
+        ydl.params.get('concurrent_fragment_downloads', 1)
+    ))
+    return result
+
+# Warm YoutubeDL instances shared by all jobs
+ydl_pool = YDLPool(lambda profile: create_ydl_opts(generate_temp_filename(suffix=".%(ext)s")))
+
+def map_download_error(e: Exception) -> DownloadError:
+    """Translate yt-dlp errors into user-facing DownloadError"""
+    error_msg = str(e)
+    status = http_status(e)
+    if status == 403:
+        return DownloadError("Video is private or requires authentication", ERROR_PRIVATE, status)
+    elif "Private video" in error_msg or "This video is private" in error_msg:
+        return DownloadError("Video is private or requires authentication", ERROR_PRIVATE)
+    elif "This video is not available" in error_msg:
+        return DownloadError("Video is not available", ERROR_UNAVAILABLE, status)
+    elif "Sign in to confirm your age" in error_msg:
+        return DownloadError("Age-restricted content", ERROR_AGE_RESTRICTED, status)
+    else:
+        return DownloadError(f"Download error: {error_msg}", http_status=status)
+
+def estimate_filesize(info: Dict[str, Any]) -> Optional[int]:
+    """Best known size of the selected format(s) in bytes"""
+    filesize = info.get('filesize') or info.get('filesize_approx')
+    if filesize:
+        return int(filesize)
+
+    # Merged video+audio: sum the parts
+    requested = info.get('requested_formats') or []
+    sizes = [fmt.get('filesize') or fmt.get('filesize_approx') for fmt in requested]
+    if sizes and all(sizes):
+        return int(sum(sizes))
+    return None
+
+def check_size_limit(info: Dict[str, Any]) -> None:
+    """Reject videos larger than the configured download limit"""
+    if config.fit_format_selection and select_format(info):
+        # A rendition under the upload target will be downloaded instead
+        return
+    filesize = estimate_filesize(info)
+    if filesize and filesize > config.max_video_size_mb * 1024 * 1024:
+        raise DownloadError(
+            f"Video size ({filesize/(1024*1024):.1f}MB) exceeds limit "
+            f"({config.max_video_size_mb}MB)",
+            ERROR_TOO_LARGE
+        )
+
+async def extract_metadata(url: str) -> Dict[str, Any]:
+    """Resolve video info (formats, sizes, ids) without downloading
+
+    The returned dict can be passed to download_video_with_info so the
+    webpage and extractor APIs are only hit once per job.
+    """
+    try:
+        if ydl_workers.enabled:
+            # Worker process returns slim info with a reference to the full one
+            info = await ydl_workers.extract(url)
+        else:
+            loop = asyncio.get_event_loop()
+            async with ydl_pool.checkout(PROFILE_METADATA) as ydl:
                 info = await loop.run_in_executor(
                     None,
                     lambda: ydl.extract_info(url, download=False)
                 )
-                
-                if not info:
-                    raise DownloadError("Could not extract video info")
-                
-                # Check file size if available
-                filesize = info.get('filesize') or info.get('filesize_approx')
-                if filesize and filesize > config.max_video_size_mb * 1024 * 1024:
-                    raise DownloadError(
-                        f"Video size ({filesize/(1024*1024):.1f}MB) exceeds limit "
-                        f"({config.max_video_size_mb}MB)"
-                    )
-                
-                # Download video
-                info = await loop.run_in_executor(
-                    None,
-                    lambda: ydl.extract_info(url, download=True)
+    except DownloadError:
+        raise
+    except yt_dlp.utils.DownloadError as e:
+        raise map_download_error(e) from e
+    except Exception as e:
+        logger.error(f"Metadata error for {url}: {str(e)}")
+        metrics.track_error(type(e).__name__)
+        raise DownloadError(str(e))
+
+    if not info:
+        raise DownloadError("Could not extract video info")
+    return info
+
+async def get_metadata(url: str) -> Dict[str, Any]:
+    """Metadata through the TTL cache
+
+    A fresh extraction returns the full info dict (usable for download);
+    a cache hit returns a slimmed dict marked with '_slim'. Permanent
+    failures (see is_cacheable_error) are cached and raised again without
+    touching the network. Extractions run under
+    the site's circuit breaker, so a throttling site fails fast.
+    """
+    cached = metadata_cache.get(url)
+    if cached:
+        kind, payload = cached
+        if kind == ENTRY_ERROR:
+            raise DownloadError(payload['message'], payload['category'])
+        return payload
+
+    try:
+        async with circuit_breakers.guard(url, classify_result):
+            info = await extract_metadata(url)
+    except CircuitOpenError as e:
+        minutes = max(1, round(e.retry_after / 60))
+        raise DownloadError(
+            f"⏳ {e.domain} hozircha so'rovlarni cheklamoqda. "
+            f"Taxminan {minutes} daqiqadan keyin qayta urinib ko'ring.",
+            ERROR_CIRCUIT_OPEN
+        )
+    except DownloadError as e:
+        if is_cacheable_error(e):
+            metadata_cache.put_error(url, e.category, str(e))
+        raise
+
+    metadata_cache.put_info(url, info)
+    return info
+
+async def _download_once(
+    url: str,
+    output_path: str,
+    info: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """One download attempt; returns the processed info dict"""
+    if ydl_workers.enabled:
+        # The worker reuses the full info it extracted earlier when it
+        # still has it, otherwise it extracts again before downloading
+        if info is not None:
+            check_size_limit(info)
+        tuning = {host: host_tuner.settings(host) for host in list(host_tuner.hosts)}
+        result = await ydl_workers.download(url, output_path, info, tuning)
+        # Worker measured the transfer; the tuner lives in this process
+        record_throughput(result.pop('_throughput', None))
+        return result
+
+    # Extract info first to validate URL and check size.
+    # Slim (cached) info has no stream URLs, so it can't drive a download.
+    if info is None or info.get('_slim'):
+        info = await extract_metadata(url)
+    check_size_limit(info)
+
+    try:
+        async with ydl_pool.checkout(PROFILE_DOWNLOAD) as ydl:
+            prepare_job(ydl, output_path, info)
+            # Download from the already resolved info (no second extraction)
+            return await run_download(ydl, info)
+    except yt_dlp.utils.DownloadError as e:
+        raise map_download_error(e) from e
+
+async def download_video_with_info(
+    url: str,
+    output_dir: str = "downloads",
+    info: Optional[Dict[str, Any]] = None,
+    output_template: Optional[str] = None
+) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """Download video and return path with video info
+
+    If info from extract_metadata is given, the download is driven from it
+    and the URL is not extracted again. With a job-scoped output_template
+    (see DownloadJournal) interrupted downloads continue from their partial
+    files, both in the retries made here and in later calls.
+    """
+    try:
+        output_dir = Path(output_dir)
+        output_dir.mkdir(exist_ok=True)
+
+        output_path = output_template or generate_temp_filename(suffix=".%(ext)s")
+
+        for attempt in range(1, config.download_max_attempts + 1):
+            try:
+                info = await _download_once(url, output_path, info)
+                circuit_breakers.record(host_key(url) or "unknown", RESULT_OK)
+                break
+            except DownloadError as e:
+                circuit_breakers.record(host_key(url) or "unknown", classify_result(e))
+                # Xususiy, o'chirilgan yoki juda katta videolarni qayta urinish befoyda
+                if e.category or attempt == config.download_max_attempts:
+                    raise
+                delay = RETRY_BACKOFF * 2 ** (attempt - 1)
+                logger.warning(
+                    f"Download attempt {attempt} for {url} failed ({e}), "
+                    f"resuming in {delay}s"
                 )
-                
-            # Find downloaded file
-            for file in output_dir.iterdir():
-                if file.name.startswith(Path(output_path).stem):
-                    video_path = str(file)
-                    if os.path.exists(video_path):
-                        metrics.track_successful_download(url)
-                        return video_path, info
-                        
-            raise DownloadError("Downloaded file not found")
-            
-        except yt_dlp.utils.DownloadError as e:
-            # Handle specific yt-dlp errors
-            error_msg = str(e)
-            if "HTTP Error 403" in error_msg:
-                raise DownloadError("Video is private or requires authentication")
-            elif "This video is not available" in error_msg:
-                raise DownloadError("Video is not available")
-            elif "Sign in to confirm your age" in error_msg:
-                raise DownloadError("Age-restricted content")
-            else:
-                raise DownloadError(f"Download error: {error_msg}")
-            
+                await asyncio.sleep(delay)
+
+        # Find downloaded file
+        for download in info.get('requested_downloads') or []:
+            video_path = download.get('filepath')
+            if video_path and os.path.exists(video_path):
+                metrics.track_successful_download(url)
+                return video_path, info
+
+        output_stem = Path(output_path).stem
+        for file in Path(output_path).parent.iterdir():
+            if file.name.startswith(output_stem) and not file.name.endswith(('.part', '.ytdl', '.json')):
+                video_path = str(file)
+                if os.path.exists(video_path):
+                    metrics.track_successful_download(url)
+                    return video_path, info
+
+        raise DownloadError("Downloaded file not found")
+
     except DownloadError:
         raise
     except Exception as e:
         logger.error(f"Download error for {url}: {str(e)}")
         metrics.track_error(type(e).__name__)
         raise DownloadError(str(e))
-    
-    return None, None
 
 async def download_video(url: str) -> Optional[str]:
     """Simple video download function"""
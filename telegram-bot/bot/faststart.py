@@ -0,0 +1,168 @@
+import os
+import mmap
+import struct
+import logging
+from bisect import bisect_right
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Boxes on the way from moov to the chunk offset tables
+CONTAINER_BOXES = (b'trak', b'mdia', b'minf', b'stbl')
+# Offsets in these are not absolute file positions we can patch
+UNSUPPORTED_BOXES = (b'moof', b'cmov')
+COPY_CHUNK = 4 * 1024 * 1024
+MAX_32BIT = 0xFFFFFFFF
+
+Box = Tuple[bytes, int, int, int]  # type, start, header size, end
+
+class FaststartError(Exception):
+    """File layout the relocator does not handle; use ffmpeg instead"""
+
+def _top_level(buf, size: int) -> List[Box]:
+    boxes = []
+    offset = 0
+    while offset + 8 <= size:
+        box_size, box_type = struct.unpack_from('>I4s', buf, offset)
+        header = 8
+        if box_size == 1:
+            box_size = struct.unpack_from('>Q', buf, offset + 8)[0]
+            header = 16
+        elif box_size == 0:
+            box_size = size - offset
+        if box_size < header or offset + box_size > size:
+            raise FaststartError(f"truncated {box_type!r} box at {offset}")
+        boxes.append((box_type, offset, header, offset + box_size))
+        offset += box_size
+    if offset != size:
+        raise FaststartError("trailing bytes after the last box")
+    return boxes
+
+def _header(box_type: bytes, payload_size: int) -> bytes:
+    if payload_size + 8 <= MAX_32BIT:
+        return struct.pack('>I4s', payload_size + 8, box_type)
+    return struct.pack('>I4sQ', 1, box_type, payload_size + 16)
+
+class _OffsetMap:
+    """Moves absolute file offsets along with the top-level box they fall in"""
+
+    def __init__(self, boxes: List[Box], new_starts: List[int]):
+        self.starts = [box[1] for box in boxes]
+        self.ends = [box[3] for box in boxes]
+        self.shifts = [new - box[1] for box, new in zip(boxes, new_starts)]
+
+    def shift(self, offset: int) -> int:
+        index = bisect_right(self.starts, offset) - 1
+        if index < 0 or offset >= self.ends[index]:
+            raise FaststartError(f"chunk offset {offset} outside the file")
+        return offset + self.shifts[index]
+
+def _patch_table(buf, box_type: bytes, start: int, end: int, offsets: _OffsetMap) -> bytes:
+    """Rebuilt stco/co64 with shifted offsets; stco becomes co64 if it must"""
+    version_flags = bytes(buf[start:start + 4])
+    count = struct.unpack_from('>I', buf, start + 4)[0]
+    code = 'Q' if box_type == b'co64' else 'I'
+    if start + 8 + count * struct.calcsize(code) > end:
+        raise FaststartError(f"{box_type!r} table overflows its box")
+
+    table = struct.unpack_from(f'>{count}{code}', buf, start + 8)
+    shifted = [offsets.shift(value) for value in table]
+    if code == 'I' and shifted and max(shifted) > MAX_32BIT:
+        code = 'Q'
+    payload = version_flags + struct.pack(f'>I{count}{code}', count, *shifted)
+    return _header(b'co64' if code == 'Q' else b'stco', len(payload)) + payload
+
+def _rebuild(buf, start: int, end: int, offsets: _OffsetMap) -> bytes:
+    """Children of a container box with every chunk offset table patched"""
+    parts = []
+    offset = start
+    while offset + 8 <= end:
+        box_size, box_type = struct.unpack_from('>I4s', buf, offset)
+        header = 8
+        if box_size == 1:
+            box_size = struct.unpack_from('>Q', buf, offset + 8)[0]
+            header = 16
+        elif box_size == 0:
+            box_size = end - offset
+        if box_size < header or offset + box_size > end:
+            raise FaststartError(f"truncated {box_type!r} box inside moov")
+        payload_start, box_end = offset + header, offset + box_size
+        if box_type in UNSUPPORTED_BOXES:
+            raise FaststartError(f"{box_type!r} box is not supported")
+        if box_type in CONTAINER_BOXES:
+            payload = _rebuild(buf, payload_start, box_end, offsets)
+            parts.append(_header(box_type, len(payload)) + payload)
+        elif box_type in (b'stco', b'co64'):
+            parts.append(_patch_table(buf, box_type, payload_start, box_end, offsets))
+        else:
+            parts.append(bytes(buf[offset:box_end]))
+        offset = box_end
+    return b''.join(parts)
+
+def _layout(boxes: List[Box], moov_index: int, moov_size: int) -> Tuple[List[Box], List[int]]:
+    """New box order (moov before the first mdat) and each box's new start"""
+    first_mdat = next(index for index, box in enumerate(boxes) if box[0] == b'mdat')
+    order = [box for index, box in enumerate(boxes[:first_mdat]) if index != moov_index]
+    order.append(boxes[moov_index])
+    order += [box for index, box in enumerate(boxes) if index >= first_mdat and index != moov_index]
+
+    new_starts = {}
+    position = 0
+    for box in order:
+        new_starts[box[1]] = position
+        position += moov_size if box is boxes[moov_index] else box[3] - box[1]
+    return order, [new_starts[box[1]] for box in boxes]
+
+def relocate_moov(input_path: str, output_path: Optional[str] = None) -> Optional[str]:
+    """Move the moov box in front of the media data, without ffmpeg
+
+    The file is memory-mapped; the rebuilt moov (chunk offsets in
+    stco/co64 shifted, stco widened to co64 if offsets pass 4GB) is written
+    first and everything else is copied in one sequential pass. Writes to
+    output_path, or replaces input_path when it is None. Returns the path
+    of the faststart file (input_path if it already was one), or None if
+    the layout is not supported.
+    """
+    target_path = output_path or input_path
+    tmp_path = f"{target_path}.faststart.tmp"
+    try:
+        size = os.path.getsize(input_path)
+        with open(input_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            boxes = _top_level(buf, size)
+            types = [box[0] for box in boxes]
+            if b'moov' not in types or b'mdat' not in types:
+                raise FaststartError("no moov or mdat box")
+            if any(box_type in UNSUPPORTED_BOXES for box_type in types):
+                raise FaststartError("fragmented or compressed movie")
+            moov_index = types.index(b'moov')
+            if moov_index < types.index(b'mdat'):
+                return input_path
+
+            _, moov_start, moov_header, moov_end = boxes[moov_index]
+            moov_size = moov_end - moov_start
+            # moov kattalashsa (stco -> co64), siljishlar qayta hisoblanadi
+            for _ in range(3):
+                order, new_starts = _layout(boxes, moov_index, moov_size)
+                payload = _rebuild(buf, moov_start + moov_header, moov_end, _OffsetMap(boxes, new_starts))
+                moov = _header(b'moov', len(payload)) + payload
+                if len(moov) == moov_size:
+                    break
+                moov_size = len(moov)
+            else:
+                raise FaststartError("moov size did not settle")
+
+            with open(tmp_path, 'wb') as out:
+                for box in order:
+                    if box[0] == b'moov':
+                        out.write(moov)
+                        continue
+                    for offset in range(box[1], box[3], COPY_CHUNK):
+                        out.write(buf[offset:min(offset + COPY_CHUNK, box[3])])
+        os.replace(tmp_path, target_path)
+        return target_path
+
+    except (FaststartError, OSError, ValueError, struct.error) as e:
+        logger.warning(f"Faststart relocation failed for {input_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
@@ -0,0 +1,121 @@
+import os
+import logging
+from typing import Optional, Tuple
+
+from .services.monitoring import metrics
+from .services.transcode_scheduler import DEFAULT_PRESET
+from .services.transcode_jobs import transcode_jobs, TranscodeJob
+from .ffmpeg_progress import with_progress
+from .utils import run_command
+
+logger = logging.getLogger(__name__)
+
+AUDIO_BITRATE = 128000
+MIN_VIDEO_BITRATE = 100000
+# Aim this far below the target so normal variance stays under it
+SIZE_SAFETY = 0.97
+
+def calculate_target_bitrate(
+    duration: float,
+    target_size_mb: float,
+    audio_bitrate: int = AUDIO_BITRATE
+) -> int:
+    """Calculate target video bitrate based on desired file size"""
+    target_size_bits = target_size_mb * 8 * 1024 * 1024
+    # Audio takes its share of the budget in bits, same unit as the target
+    audio_size_bits = audio_bitrate * duration
+    video_size_bits = target_size_bits - audio_size_bits
+    video_bitrate = int(video_size_bits / duration)
+    return max(video_bitrate, MIN_VIDEO_BITRATE)  # Minimum 100Kbps
+
+def scaled_dimensions(width: int, height: int, max_height: int) -> Tuple[int, int]:
+    """Scale down to max_height keeping aspect ratio, with even dimensions"""
+    if height > max_height:
+        scale_factor = max_height / height
+        width = int(width * scale_factor)
+        height = max_height
+
+    # Ensure even dimensions
+    return width - (width % 2), height - (height % 2)
+
+def build_encode_args(
+    target_bitrate: int,
+    width: int,
+    height: int,
+    output_path: str,
+    crf: Optional[int] = None,
+    pass_number: Optional[int] = None,
+    passlogfile: Optional[str] = None,
+    audio_copy: bool = False,
+    preset: str = DEFAULT_PRESET,
+    threads: Optional[int] = None
+) -> list:
+    """ffmpeg output options for a Telegram-sized H.264/AAC mp4
+
+    Default is single-pass ABR at target_bitrate. With crf the rate is
+    quality-driven and target_bitrate only caps it (capped CRF); with
+    pass_number 1/2 it is one pass of a two-pass ABR encode. audio_copy
+    passes an already AAC audio track through untouched. preset and
+    threads come from the transcode scheduler's slot.
+    """
+    if crf is not None:
+        rate_args = [
+            '-crf', f'{crf}',
+            '-maxrate', f'{target_bitrate}',
+            '-bufsize', f'{int(target_bitrate * 2)}',
+        ]
+    else:
+        rate_args = [
+            '-b:v', f'{target_bitrate}',
+            '-maxrate', f'{int(target_bitrate * 1.5)}',
+            '-bufsize', f'{int(target_bitrate * 2)}',
+        ]
+    if pass_number:
+        rate_args += ['-pass', f'{pass_number}', '-passlogfile', passlogfile]
+
+    args = ['-c:v', 'libx264', '-preset', preset]
+    if threads:
+        args += ['-threads', f'{threads}']
+    args += rate_args + [
+        '-vf', f'scale={width}:{height}',
+    ]
+    if pass_number == 1:
+        # Birinchi o'tish faqat statistika yig'adi
+        return args + ['-an', '-f', 'mp4', '-y', os.devnull]
+    if audio_copy:
+        audio_args = ['-c:a', 'copy']
+    else:
+        audio_args = ['-c:a', 'aac', '-b:a', f'{AUDIO_BITRATE // 1000}k', '-ar', '44100']
+    return args + audio_args + [
+        '-movflags', '+faststart',
+        '-y',
+        output_path
+    ]
+
+class EncodeOvershoot(Exception):
+    """ffmpeg was stopped early: its progress showed the output would not fit"""
+
+    def __init__(self, projected_size: int):
+        super().__init__(f"projected output {projected_size} bytes is over target")
+        self.projected_size = projected_size
+
+async def run_ffmpeg(cmd: list, job: Optional[TranscodeJob] = None) -> bool:
+    """Run ffmpeg; with a job its -progress output feeds the job table
+
+    Raises EncodeOvershoot when the job stopped the encode because the
+    projected size went over its target.
+    """
+    if job is None:
+        returncode, stdout, stderr = await run_command(cmd)
+    else:
+        try:
+            returncode, stdout, stderr = await run_command(with_progress(cmd), on_progress=job.update)
+        finally:
+            transcode_jobs.finish(job)
+        if job.aborted:
+            raise EncodeOvershoot(job.projected_size)
+    if returncode != 0:
+        logger.error(f"FFmpeg error: {stderr.decode(errors='ignore')[-2000:]}")
+        metrics.track_error("FFmpegError")
+        return False
+    return True
@@ -0,0 +1,77 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Machine-readable progress on stdout instead of the human stats line on stderr
+PROGRESS_ARGS = ['-progress', 'pipe:1', '-nostats']
+
+@dataclass
+class FFmpegProgress:
+    """One block of ffmpeg -progress output"""
+    frame: int = 0
+    fps: float = 0.0
+    out_time: float = 0.0  # Seconds of output written
+    speed: float = 0.0  # x realtime
+    bitrate: float = 0.0  # bits/s
+    total_size: int = 0  # Bytes written so far
+    done: bool = False
+
+def with_progress(cmd: List[str]) -> List[str]:
+    """cmd with -progress output enabled (options go right after the program name)"""
+    return cmd[:1] + PROGRESS_ARGS + cmd[1:]
+
+def _number(value: str, suffix: str = '') -> Optional[float]:
+    value = value.strip()
+    if suffix and value.endswith(suffix):
+        value = value[:-len(suffix)]
+    try:
+        return float(value)
+    except ValueError:
+        return None  # N/A
+
+def _clock(value: str) -> Optional[float]:
+    """HH:MM:SS.micro -> seconds"""
+    try:
+        hours, minutes, seconds = value.strip().split(':')
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except ValueError:
+        return None
+
+def parse_block(fields: Dict[str, str]) -> FFmpegProgress:
+    progress = FFmpegProgress(done=fields.get('progress') == 'end')
+    progress.frame = int(_number(fields.get('frame', '')) or 0)
+    progress.fps = _number(fields.get('fps', '')) or 0.0
+    # out_time_ms is microseconds too (long-standing ffmpeg quirk)
+    micros = _number(fields.get('out_time_us', '')) or _number(fields.get('out_time_ms', ''))
+    if micros is not None:
+        progress.out_time = max(0.0, micros / 1_000_000)
+    elif 'out_time' in fields:
+        progress.out_time = max(0.0, _clock(fields['out_time']) or 0.0)
+    progress.speed = _number(fields.get('speed', ''), 'x') or 0.0
+    progress.bitrate = (_number(fields.get('bitrate', ''), 'kbits/s') or 0.0) * 1000
+    progress.total_size = int(_number(fields.get('total_size', '')) or 0)
+    return progress
+
+class ProgressParser:
+    """Incremental parser for ffmpeg -progress key=value output
+
+    feed() takes raw pipe chunks (split anywhere) and returns the blocks
+    completed by them; a block ends with progress=continue or progress=end.
+    """
+
+    def __init__(self):
+        self._partial = b''
+        self._fields: Dict[str, str] = {}
+
+    def feed(self, data: bytes) -> List[FFmpegProgress]:
+        blocks = []
+        lines = (self._partial + data).split(b'\n')
+        self._partial = lines.pop()
+        for line in lines:
+            key, sep, value = line.decode(errors='ignore').strip().partition('=')
+            if not sep:
+                continue
+            self._fields[key] = value
+            if key == 'progress':
+                blocks.append(parse_block(self._fields))
+                self._fields = {}
+        return blocks
@@ -0,0 +1,132 @@
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from .config.config import config
+
+logger = logging.getLogger(__name__)
+
+# Approximate sizes (filesize_approx, tbr x duration) get a safety margin
+APPROX_SIZE_MARGIN = 1.1
+
+# Characters that would break a yt-dlp format spec
+_SPEC_SPECIAL = set('/+,[]()')
+
+# Video codecs Telegram plays inline and that mux into mp4 without remux
+_H264_CODECS = ('avc1', 'avc3', 'h264')
+_AAC_CODECS = ('mp4a', 'aac')
+
+def _codec(fmt: Dict[str, Any], key: str) -> Optional[str]:
+    codec = fmt.get(key)
+    return codec.lower() if codec else None
+
+def has_video(fmt: Dict[str, Any]) -> bool:
+    """Video only on a positive signal: a picture size, and vcodec not 'none'"""
+    if _codec(fmt, 'vcodec') == 'none':
+        return False
+    return bool(fmt.get('width') or fmt.get('height'))
+
+def has_audio(fmt: Dict[str, Any]) -> bool:
+    return _codec(fmt, 'acodec') != 'none'
+
+def is_audio_only(fmt: Dict[str, Any]) -> bool:
+    """Audio track to pair with video: vcodec says 'none' or acodec is known"""
+    if has_video(fmt) or not has_audio(fmt):
+        return False
+    return _codec(fmt, 'vcodec') == 'none' or _codec(fmt, 'acodec') is not None
+
+def estimate_format_size(fmt: Dict[str, Any], duration: Optional[float]) -> Optional[float]:
+    """Size of one format in bytes: exact, approximate or from bitrate"""
+    if fmt.get('filesize'):
+        return float(fmt['filesize'])
+    if fmt.get('filesize_approx'):
+        return fmt['filesize_approx'] * APPROX_SIZE_MARGIN
+    bitrate = fmt.get('tbr') or ((fmt.get('vbr') or 0) + (fmt.get('abr') or 0))
+    if bitrate and duration:
+        # tbr is in kbit/s
+        return bitrate * 1000 / 8 * duration * APPROX_SIZE_MARGIN
+    return None
+
+def is_video_compatible(fmt: Dict[str, Any]) -> bool:
+    """h264 in mp4; unknown codec in an mp4 container is assumed h264"""
+    vcodec = _codec(fmt, 'vcodec')
+    if vcodec:
+        return vcodec.startswith(_H264_CODECS) and fmt.get('ext') in ('mp4', None)
+    return fmt.get('ext') == 'mp4'
+
+def is_audio_compatible(fmt: Dict[str, Any]) -> bool:
+    """aac in mp4/m4a"""
+    acodec = _codec(fmt, 'acodec')
+    if acodec:
+        return acodec.startswith(_AAC_CODECS)
+    return fmt.get('ext') in ('m4a', 'mp4')
+
+def _usable(fmt: Dict[str, Any]) -> bool:
+    format_id = str(fmt.get('format_id') or '')
+    if not format_id or _SPEC_SPECIAL & set(format_id):
+        return False
+    if fmt.get('ext') == 'mhtml' or fmt.get('protocol') == 'mhtml':
+        # Storyboard rasmlari
+        return False
+    if fmt.get('has_drm'):
+        return False
+    return has_video(fmt) or has_audio(fmt)
+
+def _candidates(formats: List[Dict[str, Any]], duration: Optional[float]):
+    """Yield (spec, size, compatible, height) for progressive formats and video+audio pairs"""
+    sized = []
+    for fmt in formats:
+        if not _usable(fmt):
+            continue
+        size = estimate_format_size(fmt, duration)
+        if size:
+            sized.append((fmt, size))
+
+    audios = [(fmt, size) for fmt, size in sized if is_audio_only(fmt)]
+    for fmt, size in sized:
+        if not has_video(fmt):
+            continue
+        height = fmt.get('height') or 0
+        if has_audio(fmt):
+            # Progressive, or acodec unknown - how most non-YouTube sites report them
+            compatible = is_video_compatible(fmt) and (
+                _codec(fmt, 'acodec') is None or is_audio_compatible(fmt)
+            )
+            yield str(fmt['format_id']), size, compatible, height
+            continue
+        for audio, audio_size in audios:
+            compatible = is_video_compatible(fmt) and is_audio_compatible(audio)
+            yield (
+                f"{fmt['format_id']}+{audio['format_id']}",
+                size + audio_size,
+                compatible,
+                height
+            )
+
+def select_format(
+    info: Dict[str, Any],
+    target_bytes: Optional[int] = None
+) -> Optional[Tuple[str, float]]:
+    """Best format spec whose estimated size fits target_bytes
+
+    h264/aac combinations win over better-looking vp9/av1/opus ones, since
+    they merge into mp4 without a remux and play inline in Telegram; only
+    when none of them fits is another codec chosen. Among equals the
+    higher resolution, then the larger (higher bitrate) rendition wins.
+    Returns (spec, estimated_size) or None when nothing fits or sizes are
+    unknown; the caller then falls back to the default format and transcoding.
+    """
+    if target_bytes is None:
+        target_bytes = config.target_video_size_mb * 1024 * 1024
+    if info.get('is_live') or not info.get('formats'):
+        return None
+
+    best = None
+    for spec, size, compatible, height in _candidates(info['formats'], info.get('duration')):
+        if size > target_bytes:
+            continue
+        key = (compatible, height, size)
+        if best is None or key > best[0]:
+            best = (key, spec, size)
+
+    if best is None:
+        return None
+    return best[1], best[2]
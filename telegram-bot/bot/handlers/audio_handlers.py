@@ -1,26 +1,79 @@
 import os
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from ..acrcloud_recognizer import extract_audio_from_video, get_music_info
 from ..utils import cleanup_file, format_duration
-from ..path_utils import generate_temp_filename
 from ..services.rate_limiters import audio_rate_limiter
 from ..services.monitoring import metrics
+from ..services.file_id_registry import (
+    file_id_registry, file_id_from_message, VARIANT_VIDEO, VARIANT_AUDIO
+)
+from ..services.media_cache import media_cache
 from ..config.config import config
 
 logger = logging.getLogger(__name__)
 
+def resolve_video_ref(ref: str):
+    """Callback ma'lumotidan (media kalit yoki eski fayl yo'li) video faylni topish
+
+    Returns:
+        (media_key, video_path, lease) - topilmaganlari None; keshdagi fayl
+        ishlatib bo'lingach lease media_cache.release() ga qaytariladi
+    """
+    if os.path.exists(ref):
+        return None, ref, None
+
+    entry = media_cache.lookup(ref, lease=True)
+    if entry:
+        return ref, entry['path'], entry['lease']
+
+    record = file_id_registry.get(ref, VARIANT_VIDEO, touch=False)
+    video_path = record['local_path'] if record else None
+    if video_path and not os.path.exists(video_path):
+        video_path = None
+    return ref, video_path, None
+
+async def send_cached_audio(query, media_key: str) -> bool:
+    """Avval ajratilgan audioni file_id orqali qayta yuborish"""
+    record = file_id_registry.get(media_key, VARIANT_AUDIO)
+    if not record:
+        return False
+    try:
+        await query.message.reply_audio(
+            audio=record['file_id'],
+            caption="🎵 Musiqa formatida yuklab olindi"
+        )
+    except Exception as e:
+        logger.warning(f"Cached audio file_id rejected for {media_key}: {e}")
+        file_id_registry.forget(media_key, VARIANT_AUDIO)
+        return False
+
+    metrics.track_file_id_hit()
+    metrics.track_successful_audio_extraction()
+    return True
+
 async def extract_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Video fayldan audio ajratib olish"""
     if not update.callback_query:
         return
     
     query = update.callback_query
-    video_path = query.data.replace("get_audio:", "")
+    media_key, video_path, lease = resolve_video_ref(query.data.replace("get_audio:", ""))
+    try:
+        await _extract_audio(update, query, media_key, video_path)
+    finally:
+        media_cache.release(lease)
+
+async def _extract_audio(update: Update, query, media_key: Optional[str], video_path: Optional[str]):
+    """Audio ajratish (video fayl chaqiruvchi tomonidan ijaraga olingan)"""
+    # Audio avval yuborilgan bo'lsa, qayta ajratmasdan yuborish
+    if media_key and await send_cached_audio(query, media_key):
+        await query.answer()
+        return
     
-    if not os.path.exists(video_path):
+    if not video_path:
         await query.message.reply_text(
             "❌ Video fayli topilmadi. Iltimos, qayta yuklang."
         )
@@ -43,9 +96,8 @@ async def extract_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.edit_message_reply_markup(reply_markup=None)
         status = await query.message.reply_text("⏳ Audio ajratilmoqda...")
         
-        # Generate unique output path
-        audio_path = generate_temp_filename(prefix="audio_", suffix=".mp3")
-        audio_path = await extract_audio_from_video(video_path, audio_path)
+        # Kengaytmani kodek tanlaydi (m4a/mp3), vaqtinchalik yo'l qaytariladi
+        audio_path = await extract_audio_from_video(video_path, prefix="audio_")
         
         if not audio_path or not os.path.exists(audio_path):
             await status.edit_text(
@@ -67,14 +119,20 @@ async def extract_audio(update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             with open(audio_path, 'rb') as audio_file:
                 original_filename = os.path.basename(video_path)
-                audio_filename = f"{os.path.splitext(original_filename)[0]}.mp3"
+                audio_filename = (
+                    os.path.splitext(original_filename)[0] + os.path.splitext(audio_path)[1]
+                )
                 
-                await query.message.reply_audio(
+                message = await query.message.reply_audio(
                     audio=audio_file,
                     caption="🎵 Musiqa formatida yuklab olindi",
                     filename=audio_filename,
                     duration=None  # FFprobe orqali aniqlanadi
                 )
+
+            uploaded = file_id_from_message(message)
+            if media_key and uploaded:
+                file_id_registry.put(media_key, VARIANT_AUDIO, **uploaded)
             
             await status.delete()
             metrics.track_successful_audio_extraction()
@@ -105,9 +163,15 @@ async def find_original(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     query = update.callback_query
-    video_path = query.data.replace("find_original:", "")
-    
-    if not os.path.exists(video_path):
+    _, video_path, lease = resolve_video_ref(query.data.replace("find_original:", ""))
+    try:
+        await _find_original(update, query, video_path)
+    finally:
+        media_cache.release(lease)
+
+async def _find_original(update: Update, query, video_path: Optional[str]):
+    """Qo'shiqni aniqlash (video fayl chaqiruvchi tomonidan ijaraga olingan)"""
+    if not video_path:
         await query.message.reply_text(
             "❌ Video fayli topilmadi. Iltimos, qayta yuklang."
         )
@@ -132,8 +196,7 @@ async def find_original(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         
         # Vaqtinchalik audio fayl
-        audio_path = generate_temp_filename(prefix="music_", suffix=".mp3")
-        audio_path = await extract_audio_from_video(video_path, audio_path)
+        audio_path = await extract_audio_from_video(video_path, prefix="music_")
         
         if not audio_path:
             await status.edit_text(
@@ -3,6 +3,11 @@ from telegram.ext import ContextTypes
 from ..services.monitoring import metrics
 from ..config.config import config
 from ..services.rate_limiters import rate_limiter, audio_rate_limiter
+from ..services.host_tuner import host_tuner
+from ..services.fair_scheduler import fair_scheduler
+from ..services.circuit_breaker import circuit_breakers, STATE_OPEN, STATE_HALF_OPEN
+from ..services.transcode_jobs import transcode_jobs
+from ..utils import format_duration
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,6 +31,7 @@ HELP_MESSAGE = """🤖 *Video Yuklovchi Bot*
 1. Video havolasini yuboring
 2. Bot videoni yuklab beradi
 3. "🎵 Audio yuklab olish" tugmasini bosib, faqat ovozini olishingiz mumkin
+4. Bir nechta havolani bitta xabarda yoki .txt faylda yuborsangiz, videolar albom qilib yuboriladi
 
 *Muhim eslatmalar:*
 • Video hajmi 450MB dan oshmasligi kerak
@@ -109,7 +115,11 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "/admin block <user_id> [duration] - Foydalanuvchini bloklash\n"
             "/admin unblock <user_id> - Blokdan chiqarish\n"
             "/admin reset <user_id> - Cheklovlarni qayta o'rnatish\n"
-            "/admin stats [user_id] - Statistikani ko'rish"
+            "/admin stats [user_id] - Statistikani ko'rish\n"
+            "/admin hosts - Hostlar bo'yicha yuklab olish tezligi\n"
+            "/admin weight <user_id> [weight] - Navbatdagi ulushni o'rnatish\n"
+            "/admin breakers [reset <domain>] - Saytlar holati (circuit breaker)\n"
+            "/admin jobs - Siqilayotgan videolar holati"
         )
         return
 
@@ -205,6 +215,100 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         except ValueError:
             await update.effective_message.reply_text("❌ Noto'g'ri ID")
     
+    elif command == "hosts":
+        host_stats = host_tuner.get_statistics()
+        if not host_stats:
+            await update.effective_message.reply_text("📭 Hali yuklab olish statistikasi yo'q")
+            return
+
+        lines = ["🌐 Hostlar bo'yicha yuklab olish:\n"]
+        for host, stats in sorted(host_stats.items(), key=lambda item: -item[1]['downloads']):
+            lines.append(
+                f"{host}: {stats['avg_rate'] / (1024 * 1024):.1f}MB/s, "
+                f"ulanishlar: {stats['concurrency']}, "
+                f"bo'lak: {stats['chunk_size'] // (1024 * 1024)}MB, "
+                f"yuklashlar: {stats['downloads']}, "
+                f"cheklovlar: {stats['throttled']}"
+            )
+        await update.effective_message.reply_text("\n".join(lines))
+    
+    elif command == "breakers":
+        if len(context.args) > 2 and context.args[1].lower() == "reset":
+            domain = context.args[2].lower()
+            if circuit_breakers.reset(domain):
+                await update.effective_message.reply_text(f"✅ {domain} qayta yoqildi")
+            else:
+                await update.effective_message.reply_text(f"❓ {domain} topilmadi")
+            return
+
+        breaker_stats = circuit_breakers.get_statistics()
+        if not breaker_stats:
+            await update.effective_message.reply_text("📭 Hali saytlar statistikasi yo'q")
+            return
+
+        icons = {STATE_OPEN: "🔴", STATE_HALF_OPEN: "🟡"}
+        lines = ["🛡 Saytlar holati:\n"]
+        for domain, stats in sorted(breaker_stats.items()):
+            line = (
+                f"{icons.get(stats['state'], '🟢')} {domain}: {stats['state']}, "
+                f"ulanishlar: {stats['active']}/{stats['limit']}, "
+                f"kechikish: {stats['latency']:.1f}s, "
+                f"xato: {stats['failures']}, cheklov: {stats['throttled']}, "
+                f"rad etildi: {stats['rejected']}"
+            )
+            if stats['retry_after']:
+                line += f", {stats['retry_after']:.0f}s dan keyin sinaladi"
+            lines.append(line)
+        await update.effective_message.reply_text("\n".join(lines))
+
+    elif command == "jobs":
+        jobs = transcode_jobs.get_statistics()['jobs']
+        if not jobs:
+            await update.effective_message.reply_text("📭 Hozir siqilayotgan video yo'q")
+            return
+
+        lines = [f"⚙️ Siqilayotgan videolar: {len(jobs)}\n"]
+        for job in jobs:
+            line = (
+                f"#{job['id']} {job['label']} ({job['step']}): {job['percent']:.0f}%, "
+                f"tezlik: {job['speed']:.2f}x, "
+                f"bitreyt: {job['bitrate'] / 1000:.0f}kbps"
+            )
+            if job['eta'] is not None:
+                line += f", qoldi: {format_duration(job['eta'])}"
+            if job['projected_size']:
+                line += f", taxminiy hajm: {job['projected_size'] / (1024 * 1024):.1f}MB"
+                if job['target_bytes']:
+                    line += f" / {job['target_bytes'] / (1024 * 1024):.1f}MB"
+            lines.append(line)
+        await update.effective_message.reply_text("\n".join(lines))
+
+    elif command == "weight":
+        if len(context.args) < 2:
+            stats = fair_scheduler.get_statistics()
+            weights = "\n".join(
+                f"{user_id}: {weight:g}" for user_id, weight in sorted(stats['weights'].items())
+            ) or "Hammasi 1.0"
+            await update.effective_message.reply_text(
+                f"⚖️ Navbat: {stats['active']}/{stats['limit']} band, "
+                f"{stats['waiting']} ta kutmoqda ({stats['users_waiting']} foydalanuvchi)\n\n"
+                f"Ulushlar:\n{weights}"
+            )
+            return
+
+        try:
+            target_id = int(context.args[1])
+            weight = float(context.args[2]) if len(context.args) > 2 else 1.0
+            fair_scheduler.set_weight(target_id, weight)
+            await update.effective_message.reply_text(
+                f"✅ Foydalanuvchi {target_id} ulushi: {weight:g}"
+            )
+        except ValueError:
+            await update.effective_message.reply_text(
+                "❌ Noto'g'ri ID yoki ulush (musbat son bo'lishi kerak)\n"
+                "Foydalanish: /admin weight <user_id> <ulush>"
+            )
+    
     else:
         await update.effective_message.reply_text(
             "❌ Noto'g'ri buyruq. /admin buyrug'i orqali mavjud buyruqlarni ko'ring"
@@ -1,35 +1,182 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaVideo
 from telegram.ext import ContextTypes
 from telegram.constants import ParseMode
-from telegram.error import TelegramError
-from ..utils import extract_url, format_duration, format_size
+from telegram.error import TelegramError, BadRequest
+from ..utils import extract_urls, format_duration, format_size
 from ..downloader import download_video_with_info, DownloadError
 from ..services.monitoring import metrics
 from ..services.video_service import VideoService
+from ..services.single_flight import SingleFlight
+from ..services.pipeline import pipeline, STAGE_UPLOAD
+from ..services.download_journal import download_journal
+from ..services.media_cache import media_cache
+from ..services.edit_scheduler import edit_scheduler
+from ..services.transcode_jobs import transcode_jobs
+from ..services.file_id_registry import (
+    file_id_registry, file_id_from_message, VARIANT_VIDEO
+)
 from ..config.config import config
 import logging
 import asyncio
 import time
+from contextlib import ExitStack
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 video_service = VideoService()
+upload_flight = SingleFlight("upload")
 
-async def update_progress_message(message, text: str, every_n_seconds: int = 3):
-    """Update progress message not more often than every N seconds"""
-    current_time = time.time()
-    if not hasattr(message, "_last_edit_time") or current_time - message._last_edit_time >= every_n_seconds:
-        try:
-            await message.edit_text(text)
-            message._last_edit_time = current_time
-        except TelegramError:
-            pass
+# Telegram albomida eng ko'pi bilan 10 ta media bo'ladi
+ALBUM_SIZE = 10
+MAX_URL_LIST_BYTES = 256 * 1024
+
+async def update_progress_message(message, text: str):
+    """Queue a progress edit; the edit scheduler coalesces it within flood limits"""
+    edit_scheduler.edit(message, text)
+
+def build_transcode_status(job) -> str:
+    """Siqish jarayoni holati: bosqich, foiz va taxminiy qolgan vaqt"""
+    text = f"⚙️ Video siqilmoqda ({job.step}): {job.percent:.0f}%"
+    if job.eta is not None:
+        text += f"\n⏳ Taxminan {format_duration(job.eta)} qoldi"
+    return text
+
+def show_transcode_progress(message):
+    """Encodes started inside this block report their progress to message"""
+    return transcode_jobs.listen(lambda job: edit_scheduler.edit(message, build_transcode_status(job)))
+
+def build_video_caption(title: str, duration: float, file_size: int, extra: str = None) -> str:
+    """Video izohini (caption) tayyorlash"""
+    duration_text = format_duration(duration) if duration else "Noma'lum"
+    caption = (
+        f"📹 *{title}*\n\n"
+        f"⏱ Davomiyligi: {duration_text}\n"
+        f"💾 Hajmi: {format_size(file_size or 0)}"
+    )
+    if extra:
+        caption += f"\n{extra}"
+    return caption
+
+def build_video_keyboard(media_key: str, duration: float, has_audio: bool = True) -> Optional[InlineKeyboardMarkup]:
+    """Audio va musiqa aniqlash tugmalari (ovozsiz videoda tugma yo'q)"""
+    if not has_audio:
+        return None
+
+    keyboard = [
+        [
+            InlineKeyboardButton(
+                "🎵 Audio formatda yuklash",
+                callback_data=f"get_audio:{media_key}"
+            )
+        ]
+    ]
+
+    # Add music recognition button if duration is reasonable
+    if duration and duration <= 300:  # 5 minutes max for music recognition
+        keyboard.append([
+            InlineKeyboardButton(
+                "🎼 Musiqani topish",
+                callback_data=f"find_original:{media_key}"
+            )
+        ])
+
+    return InlineKeyboardMarkup(keyboard)
+
+async def send_registered_video(update: Update, context: ContextTypes.DEFAULT_TYPE, media_key: str) -> bool:
+    """Saqlangan file_id orqali videoni joriy chatga yuborish"""
+    return await send_registered_video_to(context.bot, update.effective_chat.id, media_key)
+
+async def send_registered_video_to(bot, chat_id: int, media_key: str) -> bool:
+    """Saqlangan file_id orqali videoni berilgan chatga yuborish"""
+    record = file_id_registry.get(media_key, VARIANT_VIDEO)
+    if not record:
+        return False
+
+    meta = record['meta']
+    duration = meta.get('duration') or 0
+    try:
+        await edit_scheduler.reserve(chat_id)
+        await bot.send_video(
+            chat_id=chat_id,
+            video=record['file_id'],
+            caption=build_video_caption(
+                meta.get('title', 'Video'), duration, record['file_size']
+            ),
+            reply_markup=build_video_keyboard(media_key, duration, meta.get('has_audio', True)),
+            supports_streaming=True,
+            parse_mode=ParseMode.MARKDOWN
+        )
+    except BadRequest as e:
+        # file_id eskirgan - oddiy yo'l bilan qayta yuklaymiz
+        logger.warning(f"Cached file_id rejected for {media_key}: {e}")
+        file_id_registry.forget(media_key, VARIANT_VIDEO)
+        return False
+
+    metrics.track_file_id_hit()
+    return True
+
+async def send_cached_video(update: Update, context: ContextTypes.DEFAULT_TYPE, url: str) -> bool:
+    """Avval yuborilgan videoni saqlangan file_id orqali qayta yuborish"""
+    media_key = file_id_registry.resolve_alias(url)
+    if not media_key or not await send_registered_video(update, context, media_key):
+        return False
+
+    metrics.track_successful_download(url)
+    return True
+
+async def upload_video_file(bot, chat_id: int, result: dict, caption: str, reply_markup) -> None:
+    """Video faylni Telegramga yuklash va file_id ni saqlash"""
+    duration = result.get('duration', 0)
+    async with pipeline.stage(STAGE_UPLOAD):
+        await edit_scheduler.reserve(chat_id)
+        with open(result['video_path'], 'rb') as video_file:
+            message = await bot.send_video(
+                chat_id=chat_id,
+                video=video_file,
+                caption=caption,
+                reply_markup=reply_markup,
+                supports_streaming=True,
+                width=result.get('width'),
+                height=result.get('height'),
+                duration=int(duration) if duration else None,
+                parse_mode=ParseMode.MARKDOWN
+            )
+    remember_upload(result, message)
+
+def remember_upload(result: dict, message) -> None:
+    """Telegram qaytargan file_id ni keyingi so'rovlar uchun saqlash"""
+    uploaded = file_id_from_message(message)
+    if not uploaded:
+        return
+    file_id_registry.put(
+        result['media_key'],
+        VARIANT_VIDEO,
+        local_path=result['video_path'],
+        meta=video_meta(result),
+        **uploaded
+    )
+
+def video_meta(result: dict) -> dict:
+    """file_id bilan saqlanadigan video ma'lumotlari"""
+    return {
+        'title': result.get('title'),
+        'duration': result.get('duration'),
+        'width': result.get('width'),
+        'height': result.get('height'),
+        'has_audio': result.get('has_audio', True)
+    }
 
 async def handle_media_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle messages containing media URLs"""
     if not update.effective_message or not update.effective_message.text:
         return
     
-    url = extract_url(update.effective_message.text)
+    urls = extract_urls(update.effective_message.text, limit=config.batch_max_urls)
+    if len(urls) > 1:
+        await handle_url_batch(update, context, urls)
+        return
+
+    url = urls[0] if urls else None
     if not url:
         platforms = (
             "▫️ YouTube\n"
@@ -46,9 +193,19 @@ async def handle_media_message(update: Update, context: ContextTypes.DEFAULT_TYP
         )
         return
 
+    # Metadata javob yuborish bilan parallel olinadi
+    video_service.prefetch(url)
+
+    result = None
+    # Keshdagi file_id yuborilayotganda holat xabari hali yo'q
+    status_message = None
     try:
         # Track download attempt
         metrics.track_download_attempt(url)
+
+        # Bu video avval yuborilgan bo'lsa, yuklab olmasdan qayta yuborish
+        if await send_cached_video(update, context, url):
+            return
         
         status_message = await update.effective_message.reply_text(
             "🔍 Video tekshirilmoqda..."
@@ -56,7 +213,12 @@ async def handle_media_message(update: Update, context: ContextTypes.DEFAULT_TYP
 
         # Start video processing
         process_start_time = time.time()
-        result = await video_service.download_and_process_video(url)
+        with show_transcode_progress(status_message):
+            result = await video_service.download_and_process_video(
+                url,
+                chat_id=update.effective_chat.id,
+                user_id=update.effective_user.id if update.effective_user else None
+            )
         process_duration = time.time() - process_start_time
         
         if not result['success']:
@@ -68,93 +230,75 @@ async def handle_media_message(update: Update, context: ContextTypes.DEFAULT_TYP
                 "▫️ Video xususiy emasligini\n"
                 "▫️ Platforma qo'llab-quvvatlanishini"
             )
-            await status_message.edit_text(
+            await edit_scheduler.edit_now(
+                status_message,
                 f"❌ {error_msg}\n\n{error_help}",
                 parse_mode=ParseMode.HTML
             )
             return
 
         # Format video info
-        title = result['title']
         duration = result.get('duration', 0)
-        file_size = result['file_size']
-        duration_text = format_duration(duration) if duration else "Noma'lum"
-        size_text = format_size(file_size)
-        process_text = f"⚡️ Qayta ishlash vaqti: {process_duration:.1f}s"
-
-        info_text = (
-            f"📹 *{title}*\n\n"
-            f"⏱ Davomiyligi: {duration_text}\n"
-            f"💾 Hajmi: {size_text}\n"
-            f"{process_text}"
+        info_text = build_video_caption(
+            result['title'],
+            duration,
+            result['file_size'],
+            f"⚡️ Qayta ishlash vaqti: {process_duration:.1f}s"
         )
 
         await update_progress_message(status_message, "📤 Video yuklanmoqda...")
 
         # Create inline keyboard
-        keyboard = [
-            [
-                InlineKeyboardButton(
-                    "🎵 Audio formatda yuklash",
-                    callback_data=f"get_audio:{result['video_path']}"
-                )
-            ]
-        ]
-
-        # Add music recognition button if duration is reasonable
-        if duration and duration <= 300:  # 5 minutes max for music recognition
-            keyboard.append([
-                InlineKeyboardButton(
-                    "🎼 Musiqani topish",
-                    callback_data=f"find_original:{result['video_path']}"
-                )
-            ])
-
-        reply_markup = InlineKeyboardMarkup(keyboard)
+        reply_markup = build_video_keyboard(result['media_key'], duration, result.get('has_audio', True))
 
         # Send the video
         try:
-            with open(result['video_path'], 'rb') as video_file:
-                await context.bot.send_video(
-                    chat_id=update.effective_chat.id,
-                    video=video_file,
-                    caption=info_text,
-                    reply_markup=reply_markup,
-                    supports_streaming=True,
-                    width=result.get('width'),
-                    height=result.get('height'),
-                    duration=int(duration) if duration else None,
-                    parse_mode=ParseMode.MARKDOWN
+            # Boshqa havola orqali avval yuborilgan bo'lsa, file_id yetarli
+            chat_id = update.effective_chat.id
+            if not await send_registered_video(update, context, result['media_key']):
+                # Bir vaqtda tayyor bo'lgan so'rovlar faylni faqat bir marta yuklaydi
+                _, shared = await upload_flight.do(
+                    result['media_key'],
+                    lambda: upload_video_file(context.bot, chat_id, result, info_text, reply_markup)
                 )
+                if shared and not await send_registered_video(update, context, result['media_key']):
+                    await upload_video_file(context.bot, chat_id, result, info_text, reply_markup)
             
             # Track successful download
             metrics.track_successful_download(url)
             
         except TelegramError as e:
             if "File too large" in str(e):
-                await status_message.edit_text(
+                await edit_scheduler.edit_now(
+                    status_message,
                     "❌ Video hajmi juda katta (50MB dan oshmasligi kerak).\n"
                     "Videoni siqib ko'raman..."
                 )
                 
                 # Try compressing the video
-                compressed_result = await video_service.compress_and_send_video(
-                    result['video_path'],
-                    update.effective_chat.id,
-                    context.bot,
-                    info_text,
-                    reply_markup
-                )
+                with show_transcode_progress(status_message):
+                    compressed_result = await video_service.compress_and_send_video(
+                        result['video_path'],
+                        update.effective_chat.id,
+                        context.bot,
+                        info_text,
+                        reply_markup,
+                        media_key=result['media_key'],
+                        parse_mode=ParseMode.MARKDOWN,
+                        meta=video_meta(result)
+                    )
                 
                 if not compressed_result:
-                    await status_message.edit_text(
+                    await edit_scheduler.edit_now(
+                        status_message,
                         "❌ Video hajmi juda katta va uni siqib bo'lmadi.\n"
                         "Iltimos, kichikroq video tanlang."
                     )
                     return
             else:
                 logger.error(f"Error sending video: {e}")
-                await status_message.edit_text(
+                await edit_scheduler.edit_now(
+                    status_message,
                     "❌ Video yuborishda xatolik yuz berdi.\n"
                     "Iltimos, keyinroq qayta urinib ko'ring."
                 )
@@ -163,12 +307,14 @@ async def handle_media_message(update: Update, context: ContextTypes.DEFAULT_TYP
         finally:
             # Clean up status message
             try:
+                edit_scheduler.forget(status_message)
                 await status_message.delete()
             except:
                 pass
 
     except asyncio.CancelledError:
-        await status_message.edit_text("❌ Video yuklab olish bekor qilindi")
+        if status_message:
+            await edit_scheduler.edit_now(status_message, "❌ Video yuklab olish bekor qilindi")
         
     except Exception as e:
         # Track error
@@ -185,8 +331,282 @@ async def handle_media_message(update: Update, context: ContextTypes.DEFAULT_TYP
             else:
                 error_message = str(e)
         
-        await status_message.edit_text(
+        logger.error(f"Error handling {url}: {e}")
+        text = (
             f"❌ Xatolik yuz berdi: {error_message}\n\n"
-            "Iltimos, havolani tekshiring va qayta urinib ko'ring.",
-            parse_mode=ParseMode.HTML
-        )
\ No newline at end of file
+            "Iltimos, havolani tekshiring va qayta urinib ko'ring."
+        )
+        try:
+            if status_message:
+                await edit_scheduler.edit_now(status_message, text, parse_mode=ParseMode.HTML)
+            else:
+                await update.effective_message.reply_text(text, parse_mode=ParseMode.HTML)
+        except TelegramError as report_error:
+            logger.warning(f"Could not report error for {url}: {report_error}")
+
+    finally:
+        # Yuborilgan (yoki yuborilmagan) fayl endi keshdan chiqarilishi mumkin
+        if result:
+            media_cache.release(result.get('lease'))
+async def handle_url_list_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle .txt documents with a list of video URLs"""
+    document = update.effective_message.document if update.effective_message else None
+    if not document:
+        return
+
+    if document.file_size and document.file_size > MAX_URL_LIST_BYTES:
+        await update.effective_message.reply_text(
+            f"❌ Fayl juda katta ({MAX_URL_LIST_BYTES // 1024}KB dan oshmasligi kerak)"
+        )
+        return
+
+    telegram_file = await document.get_file()
+    content = await telegram_file.download_as_bytearray()
+    urls = extract_urls(bytes(content).decode('utf-8', errors='ignore'), limit=config.batch_max_urls)
+    if not urls:
+        await update.effective_message.reply_text("❌ Faylda video havolasi topilmadi.")
+        return
+
+    await handle_url_batch(update, context, urls)
+
+class BatchProgress:
+    """Bir nechta havola uchun bitta umumiy holat xabari"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+
+    def text(self) -> str:
+        text = f"📦 Havolalar: {self.done + self.failed}/{self.total} tayyor"
+        if self.failed:
+            text += f", ❌ {self.failed} ta xato"
+        return text
+
+async def handle_url_batch(update: Update, context: ContextTypes.DEFAULT_TYPE, urls: list):
+    """Bir nechta havolani parallel yuklab olish va albom qilib yuborish
+
+    Havolalar cheklangan parallellik bilan pipeline orqali qayta ishlanadi,
+    tayyor videolar 10 tadan albom (send_media_group) bo'lib yuboriladi va
+    jarayon bitta holat xabarida ko'rsatiladi.
+    """
+    chat_id = update.effective_chat.id
+    user_id = update.effective_user.id if update.effective_user else None
+    progress = BatchProgress(len(urls))
+    # Metadata navbatni kutmasdan hamma havolalar uchun boshlanadi
+    for url in urls:
+        video_service.prefetch(url)
+    status_message = await update.effective_message.reply_text(
+        f"🔍 {len(urls)} ta havola qabul qilindi..."
+    )
+    semaphore = asyncio.Semaphore(max(1, config.batch_parallelism))
+
+    async def process(url: str) -> dict:
+        metrics.track_download_attempt(url)
+        result = None
+        handed_over = False
+        try:
+            async with semaphore:
+                result = registered_result(url)
+                if not result:
+                    try:
+                        result = await video_service.download_and_process_video(
+                            url, chat_id=chat_id, user_id=user_id
+                        )
+                    except Exception as e:
+                        logger.error(f"Batch item {url} failed: {e}")
+                        result = {'success': False, 'error': str(e)}
+
+            if result['success']:
+                progress.done += 1
+            else:
+                progress.failed += 1
+            await update_progress_message(status_message, progress.text())
+            handed_over = True
+            return result
+        finally:
+            # Natija albomga yetib bormasa (bekor qilinsa), kesh ijarasi shu yerda qaytariladi
+            if result and not handed_over:
+                media_cache.release(result.get('lease'))
+
+    tasks = [asyncio.create_task(process(url)) for url in urls]
+    failures = []
+    delivered = 0
+    try:
+        # Albomlar tartib bo'yicha, har biri o'z videolari tayyor bo'lishi bilan yuboriladi
+        for start in range(0, len(tasks), ALBUM_SIZE):
+            results = await asyncio.gather(*tasks[start:start + ALBUM_SIZE])
+            delivered = start + len(results)
+            try:
+                items = []
+                for url, result in zip(urls[start:start + ALBUM_SIZE], results):
+                    if result['success']:
+                        items.append((url, result))
+                    else:
+                        failures.append((url, result.get('error', "Noma'lum xatolik")))
+                if items:
+                    failures.extend(await send_video_album(context.bot, chat_id, items))
+            finally:
+                for result in results:
+                    media_cache.release(result.get('lease'))
+    finally:
+        for task in tasks:
+            task.cancel()
+        # Yuborilmay qolgan tayyor natijalarning kesh ijarasini qaytarish
+        for task in tasks[delivered:]:
+            if task.done() and not task.cancelled() and task.exception() is None:
+                media_cache.release(task.result().get('lease'))
+
+    if failures:
+        lines = [f"{progress.total - len(failures)}/{progress.total} ta video yuborildi.\n", "❌ Yuklab bo'lmadi:"]
+        lines.extend(f"▫️ {url}\n   {error}" for url, error in failures)
+        try:
+            await edit_scheduler.edit_now(status_message, "\n".join(lines), disable_web_page_preview=True)
+        except TelegramError:
+            pass
+    else:
+        try:
+            edit_scheduler.forget(status_message)
+            await status_message.delete()
+        except TelegramError:
+            pass
+
+def registered_result(url: str) -> Optional[dict]:
+    """Avval yuborilgan video uchun yuklab olish natijasi (faqat file_id bilan)"""
+    media_key = file_id_registry.resolve_alias(url)
+    record = file_id_registry.get(media_key, VARIANT_VIDEO) if media_key else None
+    if not record:
+        return None
+    meta = record['meta']
+    return {
+        'success': True,
+        'media_key': media_key,
+        'file_size': record['file_size'],
+        'title': meta.get('title', 'Video'),
+        'duration': meta.get('duration') or 0,
+        'width': meta.get('width'),
+        'height': meta.get('height'),
+        'has_audio': meta.get('has_audio', True),
+        'file_id': record['file_id'],
+        'cached': True
+    }
+
+async def send_video_album(bot, chat_id: int, items: list) -> list:
+    """Tayyor videolarni albom qilib yuborish; yuborilmaganlar ro'yxatini qaytaradi
+
+    items: (url, result) juftliklari. Avval yuborilgan videolar file_id
+    orqali, qolganlari fayl sifatida yuklanadi. Albom rad etilsa, har bir
+    video alohida yuboriladi.
+    """
+    if len(items) > 1:
+        try:
+            with ExitStack() as stack:
+                media = []
+                uploaded = []
+                for url, result in items:
+                    # Yozuv shu orada o'chirilgan bo'lsa, natijadagi file_id ishlatiladi
+                    record = file_id_registry.get(result['media_key'], VARIANT_VIDEO)
+                    file_id = record['file_id'] if record else result.get('file_id')
+                    if file_id:
+                        source = file_id
+                    elif result.get('video_path'):
+                        source = stack.enter_context(open(result['video_path'], 'rb'))
+                    else:
+                        raise OSError(f"video file of {url} is not available")
+                    uploaded.append(file_id is None)
+                    duration = result.get('duration') or 0
+                    media.append(InputMediaVideo(
+                        source,
+                        caption=build_video_caption(result['title'], duration, result['file_size']),
+                        width=result.get('width'),
+                        height=result.get('height'),
+                        duration=int(duration) if duration else None,
+                        supports_streaming=True,
+                        parse_mode=ParseMode.MARKDOWN
+                    ))
+                async with pipeline.stage(STAGE_UPLOAD):
+                    await edit_scheduler.reserve(chat_id)
+                    messages = await bot.send_media_group(chat_id=chat_id, media=media)
+
+            for (url, result), message, is_upload in zip(items, messages, uploaded):
+                if is_upload:
+                    remember_upload(result, message)
+                else:
+                    metrics.track_file_id_hit()
+                metrics.track_successful_download(url)
+            return []
+        except (TelegramError, OSError) as e:
+            logger.warning(f"Album delivery failed, sending videos one by one: {e}")
+
+    failures = []
+    for url, result in items:
+        duration = result.get('duration') or 0
+        try:
+            if not await send_registered_video_to(bot, chat_id, result['media_key']):
+                if not result.get('video_path'):
+                    raise OSError("video file is not available")
+                await upload_video_file(
+                    bot,
+                    chat_id,
+                    result,
+                    build_video_caption(result['title'], duration, result['file_size']),
+                    build_video_keyboard(result['media_key'], duration, result.get('has_audio', True))
+                )
+            metrics.track_successful_download(url)
+        except (TelegramError, OSError) as e:
+            logger.error(f"Error sending video {url}: {e}")
+            failures.append((url, "Video yuborishda xatolik yuz berdi"))
+    return failures
+
+async def resume_interrupted_downloads(bot) -> None:
+    """Qayta ishga tushishdan oldin tugallanmagan yuklashlarni davom ettirish
+
+    Jurnalda qolgan har bir ish qisman fayllardan davom ettiriladi va
+    tayyor video kutayotgan chatlarga yuboriladi.
+    """
+    entries = download_journal.pending()
+    if not entries:
+        return
+    logger.info(f"Resuming {len(entries)} interrupted downloads")
+    await asyncio.gather(
+        *(resume_download(bot, entry) for entry in entries),
+        return_exceptions=True
+    )
+
+async def resume_download(bot, entry: dict) -> None:
+    """Bitta tugallanmagan yuklashni davom ettirish va natijani yuborish"""
+    chat_ids = entry.get('chat_ids') or []
+    try:
+        result = await video_service.download_and_process_video(entry['url'])
+    except Exception as e:
+        logger.error(f"Resuming {entry['media_key']} failed: {e}")
+        result = {'success': False, 'error': str(e)}
+
+    if not result['success']:
+        for chat_id in chat_ids:
+            try:
+                await edit_scheduler.reserve(chat_id)
+                await bot.send_message(
+                    chat_id=chat_id,
+                    text=f"❌ Bot qayta ishga tushgani sababli to'xtagan yuklash yakunlanmadi:\n"
+                         f"{entry['url']}\n\n{result.get('error', '')}"
+                )
+            except TelegramError as e:
+                logger.warning(f"Could not notify chat {chat_id}: {e}")
+        return
+
+    media_key = result['media_key']
+    duration = result.get('duration', 0)
+    caption = build_video_caption(result['title'], duration, result['file_size'])
+    reply_markup = build_video_keyboard(media_key, duration, result.get('has_audio', True))
+    try:
+        for chat_id in chat_ids:
+            try:
+                # Birinchi yuklash file_id beradi, qolgan chatlar uni ishlatadi
+                if not await send_registered_video_to(bot, chat_id, media_key):
+                    await upload_video_file(bot, chat_id, result, caption, reply_markup)
+                metrics.track_successful_download(entry['url'])
+            except TelegramError as e:
+                logger.error(f"Error sending resumed video to {chat_id}: {e}")
+    finally:
+        media_cache.release(result.get('lease'))
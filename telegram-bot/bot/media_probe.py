@@ -0,0 +1,417 @@
+import os
+import json
+import mmap
+import struct
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .services.monitoring import metrics
+from .services.pipeline import pipeline, STAGE_PROBE
+from .utils import run_command
+from .transcode_planner import moov_before_mdat
+
+logger = logging.getLogger(__name__)
+
+SOURCE_YTDLP = "ytdlp"
+SOURCE_MP4 = "mp4"
+SOURCE_FFPROBE = "ffprobe"
+
+MP4_FORMAT_NAME = "mov,mp4,m4a,3gp,3g2,mj2"
+MATROSKA_FORMAT_NAME = "matroska,webm"
+FORMAT_NAMES = {
+    'mp4': MP4_FORMAT_NAME, 'm4a': MP4_FORMAT_NAME, 'mov': MP4_FORMAT_NAME,
+    'webm': MATROSKA_FORMAT_NAME, 'mkv': MATROSKA_FORMAT_NAME,
+}
+
+# Sample entry fourcc -> ffprobe codec_name
+SAMPLE_ENTRY_CODECS = {
+    b'avc1': 'h264', b'avc3': 'h264', b'hvc1': 'hevc', b'hev1': 'hevc',
+    b'av01': 'av1', b'vp09': 'vp9', b'mp4v': 'mpeg4',
+    b'mp4a': 'aac', b'Opus': 'opus', b'.mp3': 'mp3', b'ac-3': 'ac3', b'ec-3': 'eac3',
+}
+# esds objectTypeIndication values that are MP3 rather than AAC
+MP3_OBJECT_TYPES = (0x69, 0x6B)
+HANDLER_TYPES = {b'vide': 'video', b'soun': 'audio'}
+
+# yt-dlp vcodec/acodec prefix -> ffprobe codec_name
+YTDLP_CODECS = (
+    ('avc', 'h264'), ('h264', 'h264'), ('hvc1', 'hevc'), ('hev1', 'hevc'), ('h265', 'hevc'),
+    ('av01', 'av1'), ('vp09', 'vp9'), ('vp9', 'vp9'), ('vp8', 'vp8'),
+    ('mp4a', 'aac'), ('aac', 'aac'), ('opus', 'opus'), ('mp3', 'mp3'), ('vorbis', 'vorbis'),
+)
+
+MAX_CACHED_PROBES = 512
+
+@dataclass
+class MediaInfo:
+    """Stream metadata of one media file, whichever way it was obtained
+
+    streams and format use ffprobe's field names, so to_probe() can be
+    fed to code written against ffprobe output.
+    """
+    path: str
+    size: int
+    duration: float
+    format_name: str
+    source: str
+    faststart: bool = False
+    streams: List[Dict[str, Any]] = field(default_factory=list)
+
+    def _stream(self, codec_type: str) -> Optional[Dict[str, Any]]:
+        return next((stream for stream in self.streams if stream.get('codec_type') == codec_type), None)
+
+    @property
+    def video(self) -> Optional[Dict[str, Any]]:
+        return self._stream('video')
+
+    @property
+    def audio(self) -> Optional[Dict[str, Any]]:
+        return self._stream('audio')
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio is not None
+
+    @property
+    def width(self) -> Optional[int]:
+        return (self.video or {}).get('width')
+
+    @property
+    def height(self) -> Optional[int]:
+        return (self.video or {}).get('height')
+
+    def to_probe(self) -> Dict[str, Any]:
+        return {
+            'streams': self.streams,
+            'format': {
+                'format_name': self.format_name,
+                'duration': str(self.duration),
+                'size': str(self.size)
+            }
+        }
+
+def _codec_from_ytdlp(codec: Optional[str]) -> Optional[str]:
+    if not codec or codec == 'none':
+        return None
+    codec = codec.lower()
+    for prefix, name in YTDLP_CODECS:
+        if codec.startswith(prefix):
+            return name
+    return codec.split('.')[0]
+
+def from_ytdlp(path: str, size: int, info: Dict[str, Any]) -> Optional[MediaInfo]:
+    """Streams described by the yt-dlp info of the downloaded file
+
+    Only used when the info clearly matches the file (same extension, known
+    codecs, dimensions and duration); anything else falls through.
+    """
+    ext = Path(path).suffix.lstrip('.').lower()
+    if not info.get('duration') or info.get('ext') != ext or ext not in FORMAT_NAMES:
+        return None
+
+    streams = []
+    for fmt in info.get('requested_formats') or [info]:
+        # None = noma'lum ('none' esa oqim yo'qligini bildiradi): fayl o'zi tekshiriladi
+        if not fmt.get('vcodec') or not fmt.get('acodec'):
+            return None
+        vcodec = _codec_from_ytdlp(fmt.get('vcodec'))
+        acodec = _codec_from_ytdlp(fmt.get('acodec'))
+        if vcodec:
+            width = fmt.get('width') or info.get('width')
+            height = fmt.get('height') or info.get('height')
+            if not width or not height:
+                return None
+            streams.append({
+                'codec_type': 'video', 'codec_name': vcodec,
+                'width': int(width), 'height': int(height),
+                'bit_rate': str(int(fmt['vbr'] * 1000)) if fmt.get('vbr') else None
+            })
+        if acodec:
+            streams.append({
+                'codec_type': 'audio', 'codec_name': acodec,
+                'bit_rate': str(int(fmt['abr'] * 1000)) if fmt.get('abr') else None
+            })
+    if not any(stream['codec_type'] == 'video' for stream in streams):
+        return None
+
+    format_name = FORMAT_NAMES[ext]
+    return MediaInfo(
+        path=path,
+        size=size,
+        duration=float(info['duration']),
+        format_name=format_name,
+        source=SOURCE_YTDLP,
+        faststart=format_name == MP4_FORMAT_NAME and moov_before_mdat(path),
+        streams=streams
+    )
+
+def _boxes(buf, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """(type, payload start, box end) of the boxes in buf[start:end]"""
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from('>I4s', buf, offset)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', buf, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            return
+        yield box_type, offset + header, min(offset + size, end)
+        offset += size
+
+def _child(buf, start: int, end: int, path: Tuple[bytes, ...]) -> Optional[Tuple[int, int]]:
+    for box_type, payload, box_end in _boxes(buf, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return payload, box_end
+            return _child(buf, payload, box_end, path[1:])
+    return None
+
+def _timescale_duration(buf, start: int) -> Tuple[int, int]:
+    """timescale and duration of an mvhd/mdhd full box"""
+    if buf[start] == 1:
+        return struct.unpack_from('>IQ', buf, start + 20)
+    return struct.unpack_from('>II', buf, start + 12)
+
+def _descriptor_length(buf, offset: int) -> Tuple[int, int]:
+    length = 0
+    for _ in range(4):
+        byte = buf[offset]
+        offset += 1
+        length = (length << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            break
+    return length, offset
+
+def _esds(buf, start: int, end: int) -> Tuple[Optional[int], Optional[int]]:
+    """objectTypeIndication and average bitrate from an esds box"""
+    offset = start + 4
+    if offset >= end or buf[offset] != 0x03:
+        return None, None
+    _, offset = _descriptor_length(buf, offset + 1)
+    flags = buf[offset + 2]
+    offset += 3
+    if flags & 0x80:
+        offset += 2
+    if flags & 0x40:
+        offset += 1 + buf[offset]
+    if flags & 0x20:
+        offset += 2
+    if offset >= end or buf[offset] != 0x04:
+        return None, None
+    _, offset = _descriptor_length(buf, offset + 1)
+    object_type = buf[offset]
+    avg_bitrate = struct.unpack_from('>I', buf, offset + 9)[0]
+    return object_type, avg_bitrate or None
+
+def _sample_bytes(buf, stbl: Tuple[int, int]) -> Optional[int]:
+    stsz = _child(buf, stbl[0], stbl[1], (b'stsz',))
+    if not stsz:
+        return None
+    sample_size, count = struct.unpack_from('>II', buf, stsz[0] + 4)
+    if sample_size:
+        return sample_size * count
+    if stsz[0] + 12 + count * 4 > stsz[1]:
+        return None
+    return sum(struct.unpack_from(f'>{count}I', buf, stsz[0] + 12))
+
+def _track(buf, start: int, end: int) -> Optional[Dict[str, Any]]:
+    hdlr = _child(buf, start, end, (b'mdia', b'hdlr'))
+    mdhd = _child(buf, start, end, (b'mdia', b'mdhd'))
+    stbl = _child(buf, start, end, (b'mdia', b'minf', b'stbl'))
+    if not hdlr or not mdhd or not stbl:
+        return None
+    codec_type = HANDLER_TYPES.get(bytes(buf[hdlr[0] + 8:hdlr[0] + 12]))
+    stsd = _child(buf, stbl[0], stbl[1], (b'stsd',))
+    if not codec_type or not stsd:
+        return None
+
+    entry = stsd[0] + 8
+    entry_size, fourcc = struct.unpack_from('>I4s', buf, entry)
+    stream = {'codec_type': codec_type, 'codec_name': SAMPLE_ENTRY_CODECS.get(fourcc, fourcc.decode('latin-1').strip())}
+
+    timescale, duration = _timescale_duration(buf, mdhd[0])
+    seconds = duration / timescale if timescale else 0
+    if seconds:
+        stream['duration'] = str(seconds)
+
+    bit_rate = None
+    if codec_type == 'video':
+        tkhd = _child(buf, start, end, (b'tkhd',))
+        width = height = 0
+        if tkhd:
+            offset = tkhd[0] + (88 if buf[tkhd[0]] == 1 else 76)
+            width, height = (value >> 16 for value in struct.unpack_from('>II', buf, offset))
+        if not width or not height:
+            # Kodlangan o'lcham (VisualSampleEntry)
+            width, height = struct.unpack_from('>HH', buf, entry + 32)
+        stream['width'] = width
+        stream['height'] = height
+    else:
+        stream['sample_rate'] = str(struct.unpack_from('>I', buf, entry + 32)[0] >> 16)
+        if fourcc == b'mp4a':
+            esds = _child(buf, entry + 36, entry + entry_size, (b'esds',))
+            if esds:
+                object_type, bit_rate = _esds(buf, esds[0], esds[1])
+                if object_type in MP3_OBJECT_TYPES:
+                    stream['codec_name'] = 'mp3'
+
+    if not bit_rate and seconds:
+        total = _sample_bytes(buf, stbl)
+        bit_rate = int(total * 8 / seconds) if total else None
+    stream['bit_rate'] = str(bit_rate) if bit_rate else None
+    return stream
+
+def parse_mp4(path: str) -> Optional[MediaInfo]:
+    """Read stream metadata straight from the moov box (no subprocess)
+
+    Returns None for non-MP4 files, fragmented MP4s without a duration and
+    anything the parser does not understand.
+    """
+    try:
+        size = os.path.getsize(path)
+        if size < 8:
+            return None
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            moov = None
+            moov_offset = mdat_offset = None
+            first = True
+            for box_type, payload, box_end in _boxes(buf, 0, size):
+                if first and box_type != b'ftyp':
+                    return None
+                first = False
+                if box_type == b'moov':
+                    moov, moov_offset = (payload, box_end), payload
+                elif box_type == b'mdat' and mdat_offset is None:
+                    mdat_offset = payload
+            if not moov:
+                return None
+
+            mvhd = _child(buf, moov[0], moov[1], (b'mvhd',))
+            if not mvhd:
+                return None
+            timescale, duration = _timescale_duration(buf, mvhd[0])
+            if not timescale or not duration:
+                return None
+
+            streams = []
+            for box_type, payload, box_end in _boxes(buf, moov[0], moov[1]):
+                if box_type == b'trak':
+                    stream = _track(buf, payload, box_end)
+                    if stream:
+                        streams.append(stream)
+    except (OSError, ValueError, struct.error, IndexError) as e:
+        logger.debug(f"MP4 header parse failed for {path}: {e}")
+        return None
+
+    if not streams:
+        return None
+    return MediaInfo(
+        path=path,
+        size=size,
+        duration=duration / timescale,
+        format_name=MP4_FORMAT_NAME,
+        source=SOURCE_MP4,
+        faststart=mdat_offset is None or moov_offset < mdat_offset,
+        streams=streams
+    )
+
+async def ffprobe(path: str) -> Optional[Dict[str, Any]]:
+    """Raw ffprobe JSON of a file"""
+    try:
+        cmd = [
+            'ffprobe',
+            '-v', 'quiet',
+            '-print_format', 'json',
+            '-show_format',
+            '-show_streams',
+            path
+        ]
+
+        async with pipeline.stage(STAGE_PROBE):
+            returncode, stdout, stderr = await run_command(cmd)
+
+        if returncode != 0:
+            logger.error(f"FFprobe error: {stderr.decode()}")
+            return None
+
+        return json.loads(stdout.decode())
+
+    except Exception as e:
+        logger.error(f"Error getting video info: {e}")
+        metrics.track_error(type(e).__name__)
+        return None
+
+def from_ffprobe(path: str, size: int, probe: Dict[str, Any]) -> Optional[MediaInfo]:
+    format_info = probe.get('format') or {}
+    try:
+        duration = float(format_info.get('duration') or 0)
+    except ValueError:
+        duration = 0.0
+    format_name = format_info.get('format_name') or ''
+    return MediaInfo(
+        path=path,
+        size=size,
+        duration=duration,
+        format_name=format_name,
+        source=SOURCE_FFPROBE,
+        faststart=MP4_FORMAT_NAME.split(',')[0] in format_name.split(',') and moov_before_mdat(path),
+        streams=probe.get('streams') or []
+    )
+
+class MediaProbe:
+    """One MediaInfo per file, from the cheapest source that knows it
+
+    Order: the yt-dlp info the file was downloaded with, the MP4 header
+    parser, then ffprobe. Results are cached by (path, size, mtime), so
+    compression, audio extraction and the upload share one probe.
+    """
+
+    def __init__(self, max_entries: int = MAX_CACHED_PROBES):
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[str, int, int], MediaInfo]" = OrderedDict()
+
+    @staticmethod
+    def _key(path: str) -> Optional[Tuple[str, int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+    async def probe(self, path: str, info: Optional[Dict[str, Any]] = None) -> Optional[MediaInfo]:
+        key = self._key(path)
+        if not key:
+            return None
+        cached = self._cache.get(key)
+        if cached:
+            self._cache.move_to_end(key)
+            metrics.track_media_probe("cache")
+            return cached
+
+        size = key[1]
+        media = from_ytdlp(path, size, info) if info else None
+        if not media:
+            media = parse_mp4(path)
+        if not media:
+            probe = await ffprobe(path)
+            media = from_ffprobe(path, size, probe) if probe else None
+        if not media:
+            return None
+
+        metrics.track_media_probe(media.source)
+        self._cache[key] = media
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return media
+
+    def get_statistics(self) -> Dict[str, int]:
+        return {'entries': len(self._cache)}
+
+# Global media probe instance
+media_probe = MediaProbe()
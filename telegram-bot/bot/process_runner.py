@@ -0,0 +1,262 @@
+import os
+import time
+import signal
+import asyncio
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+import psutil
+
+from .config.config import config
+from .ffmpeg_progress import FFmpegProgress, ProgressParser
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK = 64 * 1024
+# ffprobe JSON / packet lists are read whole; this only stops a runaway writer
+STDOUT_LIMIT = 64 * 1024 * 1024
+SAMPLE_INTERVAL = 0.5
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_TIMEOUT = "timeout"
+STATUS_CANCELLED = "cancelled"
+STATUS_ABORTED = "aborted"
+
+# Returns False to stop the process (e.g. its output will not fit anyway)
+ProgressCallback = Callable[[FFmpegProgress], bool]
+
+class _Aborted(Exception):
+    """The progress callback asked to stop the process"""
+
+class RingBuffer:
+    """Keeps only the last `limit` bytes written to it"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.chunks = deque()
+        self.size = 0
+        self.dropped = 0
+
+    def write(self, data: bytes) -> None:
+        self.chunks.append(data)
+        self.size += len(data)
+        while self.size > self.limit:
+            extra = self.size - self.limit
+            head = self.chunks[0]
+            if len(head) <= extra:
+                self.chunks.popleft()
+                self.size -= len(head)
+                self.dropped += len(head)
+            else:
+                self.chunks[0] = head[extra:]
+                self.size -= extra
+                self.dropped += extra
+
+    def getvalue(self) -> bytes:
+        return b''.join(self.chunks)
+
+@dataclass
+class ProcessResult:
+    """Outcome of one subprocess run"""
+    returncode: int
+    stdout: bytes
+    stderr: bytes
+    status: str
+    duration: float
+    cpu_seconds: float = 0.0
+    peak_rss: int = 0
+    stderr_dropped: int = 0
+
+def _peak_rss(process: psutil.Process) -> int:
+    """High-water RSS from /proc (exact between samples), current RSS elsewhere"""
+    try:
+        with open(f"/proc/{process.pid}/status") as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return process.memory_info().rss
+
+class ProcessRunner:
+    """Runs ffmpeg/ffprobe with bounded output, deadlines and resource limits
+
+    Each child gets its own process group, so a timeout or a cancelled
+    caller kills everything it started. stdout/stderr are read as they
+    arrive into ring buffers instead of communicate()'s unbounded ones.
+    """
+
+    def __init__(
+        self,
+        timeout: Optional[float] = None,
+        probe_timeout: Optional[float] = None,
+        cpu_limit: Optional[int] = None,
+        memory_limit_mb: Optional[int] = None,
+        nice: Optional[int] = None,
+        ionice_idle: Optional[bool] = None,
+        output_limit_kb: Optional[int] = None
+    ):
+        self.timeout = config.process_timeout if timeout is None else timeout
+        self.probe_timeout = config.probe_timeout if probe_timeout is None else probe_timeout
+        self.cpu_limit = config.process_cpu_limit if cpu_limit is None else cpu_limit
+        self.memory_limit_mb = config.process_memory_limit_mb if memory_limit_mb is None else memory_limit_mb
+        self.nice = config.process_nice if nice is None else nice
+        self.ionice_idle = config.process_ionice_idle if ionice_idle is None else ionice_idle
+        self.output_limit = (
+            config.process_output_limit_kb if output_limit_kb is None else output_limit_kb
+        ) * 1024
+
+    def default_timeout(self, program: str) -> float:
+        return self.probe_timeout if program == 'ffprobe' else self.timeout
+
+    def _apply_limits(self, process: psutil.Process) -> None:
+        # preexec_fn bilan fork qilish thread'lar bor jarayonda xavfli,
+        # shuning uchun cheklovlar ishga tushgandan keyin prlimit orqali qo'yiladi
+        try:
+            if self.nice:
+                process.nice(process.nice() + self.nice)
+            if self.ionice_idle:
+                process.ionice(psutil.IOPRIO_CLASS_IDLE)
+            if self.cpu_limit:
+                process.rlimit(psutil.RLIMIT_CPU, (self.cpu_limit, self.cpu_limit))
+            if self.memory_limit_mb:
+                limit = self.memory_limit_mb * 1024 * 1024
+                process.rlimit(psutil.RLIMIT_AS, (limit, limit))
+        except (psutil.Error, AttributeError, OSError, ValueError) as e:
+            logger.warning(f"Could not apply limits to pid {process.pid}: {e}")
+
+    @staticmethod
+    async def _pump(stream: asyncio.StreamReader, buffer: RingBuffer) -> None:
+        while True:
+            chunk = await stream.read(READ_CHUNK)
+            if not chunk:
+                return
+            buffer.write(chunk)
+
+    @staticmethod
+    async def _pump_progress(
+        stream: asyncio.StreamReader,
+        buffer: RingBuffer,
+        on_progress: ProgressCallback
+    ) -> None:
+        parser = ProgressParser()
+        while True:
+            chunk = await stream.read(READ_CHUNK)
+            if not chunk:
+                return
+            buffer.write(chunk)
+            for progress in parser.feed(chunk):
+                if on_progress(progress) is False:
+                    raise _Aborted()
+
+    @staticmethod
+    async def _sample(process: psutil.Process, usage: dict) -> None:
+        while True:
+            try:
+                with process.oneshot():
+                    times = process.cpu_times()
+                    usage['peak_rss'] = max(usage['peak_rss'], _peak_rss(process))
+                usage['cpu_seconds'] = times.user + times.system
+            except psutil.Error:
+                return
+            await asyncio.sleep(SAMPLE_INTERVAL)
+
+    @staticmethod
+    def _kill(process: asyncio.subprocess.Process) -> None:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    async def run(
+        self,
+        cmd: List[str],
+        timeout: Optional[float] = None,
+        on_progress: Optional[ProgressCallback] = None
+    ) -> ProcessResult:
+        """Run cmd to completion, its deadline or the caller's cancellation
+
+        timeout=None uses the configured deadline for the program (ffprobe
+        gets the short one); 0 disables it. Cancellation kills the process
+        group and re-raises. With on_progress, stdout is parsed as ffmpeg
+        -progress output as it arrives; the callback returning False kills
+        the process (status "aborted").
+        """
+        program = os.path.basename(cmd[0])
+        if timeout is None:
+            timeout = self.default_timeout(program)
+        start = time.monotonic()
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True
+        )
+        stdout = RingBuffer(STDOUT_LIMIT)
+        stderr = RingBuffer(self.output_limit)
+        usage = {'cpu_seconds': 0.0, 'peak_rss': 0}
+        if on_progress:
+            stdout_pump = self._pump_progress(process.stdout, stdout, on_progress)
+        else:
+            stdout_pump = self._pump(process.stdout, stdout)
+        io_tasks = [
+            asyncio.create_task(stdout_pump),
+            asyncio.create_task(self._pump(process.stderr, stderr)),
+            asyncio.create_task(process.wait()),
+        ]
+        tasks = list(io_tasks)
+        try:
+            child = psutil.Process(process.pid)
+            self._apply_limits(child)
+            tasks.append(asyncio.create_task(self._sample(child, usage)))
+        except psutil.Error:
+            pass
+
+        status = None
+        try:
+            await asyncio.wait_for(asyncio.gather(*io_tasks), timeout or None)
+        except _Aborted:
+            status = STATUS_ABORTED
+            self._kill(process)
+            await process.wait()
+            stderr.write(b"\n[stopped by progress callback]\n")
+        except asyncio.TimeoutError:
+            status = STATUS_TIMEOUT
+            self._kill(process)
+            await process.wait()
+            stderr.write(f"\n[killed after {timeout}s timeout]\n".encode())
+            logger.warning(f"{program} timed out after {timeout}s and was killed")
+        except asyncio.CancelledError:
+            self._kill(process)
+            await process.wait()
+            self._report(program, STATUS_CANCELLED, usage)
+            raise
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if status is None:
+            status = STATUS_OK if process.returncode == 0 else STATUS_FAILED
+        self._report(program, status, usage)
+        return ProcessResult(
+            returncode=process.returncode,
+            stdout=stdout.getvalue(),
+            stderr=stderr.getvalue(),
+            status=status,
+            duration=time.monotonic() - start,
+            cpu_seconds=usage['cpu_seconds'],
+            peak_rss=usage['peak_rss'],
+            stderr_dropped=stderr.dropped
+        )
+
+    @staticmethod
+    def _report(program: str, status: str, usage: dict) -> None:
+        from .services.monitoring import metrics
+        metrics.track_process(program, status, usage['cpu_seconds'], usage['peak_rss'])
+
+# Global process runner instance
+process_runner = ProcessRunner()
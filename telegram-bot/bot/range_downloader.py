@@ -0,0 +1,155 @@
+import os
+import json
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Statuses that mean the host is limiting us
+THROTTLE_STATUSES = (403, 429)
+RANGE_RETRIES = 3
+READ_SIZE = 256 * 1024
+
+class RangeDownloadError(Exception):
+    """Byte-range download failed; the caller falls back to yt-dlp"""
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+    @property
+    def throttled(self) -> bool:
+        return self.status in THROTTLE_STATUSES
+
+def _check_status(response: aiohttp.ClientResponse) -> None:
+    if response.status in THROTTLE_STATUSES:
+        raise RangeDownloadError(f"HTTP Error {response.status}", response.status)
+    if response.status != 206:
+        raise RangeDownloadError(f"Range request answered with HTTP {response.status}", response.status)
+
+async def probe_size(session: aiohttp.ClientSession, url: str, headers: Dict[str, str]) -> int:
+    """Total size from a one-byte range request; fails if ranges aren't supported"""
+    async with session.get(url, headers={**headers, 'Range': 'bytes=0-0'}) as response:
+        _check_status(response)
+        content_range = response.headers.get('Content-Range', '')
+    total = content_range.rpartition('/')[2]
+    if not total.isdigit():
+        raise RangeDownloadError(f"Unknown size in Content-Range: {content_range!r}")
+    return int(total)
+
+async def _fetch_range(
+    session: aiohttp.ClientSession,
+    url: str,
+    headers: Dict[str, str],
+    fd: int,
+    start: int,
+    end: int
+) -> None:
+    """Write bytes start..end (inclusive) at their offset, resuming on errors"""
+    offset = start
+    for attempt in range(RANGE_RETRIES):
+        try:
+            async with session.get(url, headers={**headers, 'Range': f'bytes={offset}-{end}'}) as response:
+                _check_status(response)
+                async for chunk in response.content.iter_chunked(READ_SIZE):
+                    os.pwrite(fd, chunk, offset)
+                    offset += len(chunk)
+            if offset > end:
+                return
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Range {offset}-{end} failed (attempt {attempt + 1}): {e}")
+    raise RangeDownloadError(f"Range {start}-{end} incomplete after {RANGE_RETRIES} attempts")
+
+def _load_journal(path: str, total_size: int) -> Optional[dict]:
+    """Progress of an earlier attempt at the same file, if it matches"""
+    try:
+        with open(path) as f:
+            journal = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if journal.get('total') != total_size:
+        return None
+    return journal
+
+def _save_journal(path: str, journal: dict) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(journal, f)
+    os.replace(tmp_path, path)
+
+async def download_ranges(
+    url: str,
+    output_path: str,
+    headers: Optional[Dict[str, str]] = None,
+    connections: int = 4,
+    chunk_size: int = 4 * 1024 * 1024,
+    total_size: Optional[int] = None
+) -> Tuple[int, float]:
+    """Download a progressive file over several connections
+
+    The file is split into chunk_size ranges handed out to `connections`
+    workers; each range is written at its own offset into
+    output_path.ranges.part. Finished ranges are recorded in
+    output_path.ranges.json, so a failed or interrupted download continues
+    where it stopped on the next call. Returns (bytes fetched by this call,
+    seconds); raises RangeDownloadError on failure.
+    """
+    headers = dict(headers or {})
+    part_path = f"{output_path}.ranges.part"
+    journal_path = f"{output_path}.ranges.json"
+    loop = asyncio.get_running_loop()
+    start_time = loop.time()
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60)
+    connector = aiohttp.TCPConnector(limit=connections)
+    fetched = 0
+
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        if not total_size:
+            total_size = await probe_size(session, url, headers)
+
+        journal = _load_journal(journal_path, total_size) if os.path.exists(part_path) else None
+        if journal:
+            chunk_size = journal['chunk']
+            logger.info(f"Resuming {output_path}: {len(journal['done'])} ranges already downloaded")
+        else:
+            # Every connection gets at least one range even for small files
+            chunk_size = max(1, min(chunk_size, -(-total_size // max(1, connections))))
+            journal = {'total': total_size, 'chunk': chunk_size, 'done': []}
+
+        done = set(journal['done'])
+        ranges = asyncio.Queue()
+        for start in range(0, total_size, chunk_size):
+            if start not in done:
+                ranges.put_nowait((start, min(start + chunk_size, total_size) - 1))
+
+        async def worker():
+            nonlocal fetched
+            while True:
+                try:
+                    start, end = ranges.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await _fetch_range(session, url, headers, fd, start, end)
+                fetched += end - start + 1
+                journal['done'].append(start)
+                _save_journal(journal_path, journal)
+
+        fd = os.open(part_path, os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, total_size)
+            workers = [asyncio.create_task(worker()) for _ in range(max(1, connections))]
+            try:
+                await asyncio.gather(*workers)
+            except BaseException:
+                for task in workers:
+                    task.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+                raise
+        finally:
+            os.close(fd)
+
+    os.replace(part_path, output_path)
+    if os.path.exists(journal_path):
+        os.remove(journal_path)
+    return fetched, loop.time() - start_time
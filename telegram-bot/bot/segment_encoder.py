@@ -0,0 +1,355 @@
+import os
+import json
+import time
+import shutil
+import asyncio
+import hashlib
+import logging
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import List, Optional
+
+from .services.monitoring import metrics
+from .services.pipeline import pipeline, STAGE_PROBE
+from .services.transcode_scheduler import transcode_scheduler, DEFAULT_PRESET
+from .services.transcode_jobs import transcode_jobs
+from .config.config import config
+from .utils import run_command
+from .ffmpeg_encode import (
+    calculate_target_bitrate, run_ffmpeg, EncodeOvershoot,
+    AUDIO_BITRATE, MIN_VIDEO_BITRATE, SIZE_SAFETY
+)
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+AUDIO_NAME = "audio.m4a"
+# Shorter segments waste bits on keyframes and encoder warm-up
+MIN_SEGMENT_SECONDS = 20
+# More segments than workers so uneven segments still keep all cores busy
+SEGMENTS_PER_WORKER = 2
+# Segment is re-encoded in the correction round if it overshot its budget by more
+SEGMENT_OVERSHOOT = 1.05
+
+@dataclass
+class Segment:
+    """One keyframe-aligned piece of the source and its encode state"""
+    index: int
+    start: float
+    end: float
+    bitrate: int
+    done: bool = False
+    size: int = 0
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    @property
+    def filename(self) -> str:
+        return f"seg_{self.index:03d}.mp4"
+
+    @property
+    def budget_bytes(self) -> float:
+        return self.bitrate / 8 * self.duration
+
+def segment_workers() -> int:
+    return config.segment_workers or transcode_scheduler.max_encoders
+
+def segments_dir() -> Path:
+    return Path(config.downloads_dir) / "segments"
+
+def job_name(input_path: str, target_bytes: int, width: int, height: int) -> str:
+    """Same source and settings give the same job, so a restart finds its segments"""
+    stat = os.stat(input_path)
+    key = f"{os.path.abspath(input_path)}:{stat.st_size}:{int(stat.st_mtime)}:{target_bytes}:{width}x{height}"
+    return "seg_" + hashlib.sha1(key.encode()).hexdigest()[:16]
+
+async def keyframe_times(input_path: str) -> List[float]:
+    """Keyframe timestamps of the first video stream (packet flags only, no decoding)"""
+    cmd = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        input_path
+    ]
+    async with pipeline.stage(STAGE_PROBE):
+        returncode, stdout, stderr = await run_command(cmd)
+    if returncode != 0:
+        logger.error(f"FFprobe keyframe error: {stderr.decode(errors='ignore')[-500:]}")
+        return []
+
+    times = []
+    for line in stdout.decode(errors='ignore').splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags:
+            try:
+                times.append(float(pts_time))
+            except ValueError:
+                continue
+    return sorted(times)
+
+def split_points(keyframes: List[float], duration: float, count: int) -> List[float]:
+    """Segment boundaries at the keyframes nearest to equal splits"""
+    points = [0.0]
+    for index in range(1, count):
+        ideal = duration * index / count
+        nearest = min(keyframes, key=lambda t: abs(t - ideal)) if keyframes else ideal
+        if nearest - points[-1] >= MIN_SEGMENT_SECONDS and duration - nearest >= MIN_SEGMENT_SECONDS:
+            points.append(nearest)
+    points.append(duration)
+    return points
+
+def plan_segments(keyframes: List[float], duration: float, video_bitrate: int, workers: int) -> List[Segment]:
+    """Keyframe-aligned segments; each gets the bitrate share of its duration
+
+    With one bitrate for all, segment budgets add up to the total video
+    budget (bitrate * duration) whatever the boundaries are.
+    """
+    count = max(1, min(workers * SEGMENTS_PER_WORKER, int(duration // MIN_SEGMENT_SECONDS)))
+    points = split_points(keyframes, duration, count)
+    return [
+        Segment(index=index, start=start, end=end, bitrate=video_bitrate)
+        for index, (start, end) in enumerate(zip(points, points[1:]))
+    ]
+
+class SegmentJob:
+    """Segment files plus a manifest in downloads/segments/<job>
+
+    The manifest is rewritten after every finished segment, so a crashed
+    or restarted encode only redoes the segments that were in progress.
+    """
+
+    def __init__(self, name: str):
+        self.dir = segments_dir() / name
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.manifest_path = self.dir / MANIFEST_NAME
+        self.segments: List[Segment] = []
+        self.audio_done = False
+        # Bitta ishning barcha segmentlari bir xil preset bilan kodlanadi (concat uchun)
+        self.preset = DEFAULT_PRESET
+
+    def load(self) -> bool:
+        """Restore segments of an earlier attempt whose files are still intact"""
+        try:
+            data = json.loads(self.manifest_path.read_text())
+        except (OSError, ValueError):
+            return False
+        self.segments = [Segment(**segment) for segment in data.get('segments', [])]
+        for segment in self.segments:
+            path = self.dir / segment.filename
+            if segment.done and (not path.exists() or path.stat().st_size != segment.size):
+                segment.done = False
+        self.audio_done = data.get('audio_done', False) and (self.dir / AUDIO_NAME).exists()
+        self.preset = data.get('preset', DEFAULT_PRESET)
+        return bool(self.segments)
+
+    def save(self) -> None:
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+        try:
+            tmp_path.write_text(json.dumps({
+                'segments': [asdict(segment) for segment in self.segments],
+                'audio_done': self.audio_done,
+                'preset': self.preset,
+                'updated': time.time()
+            }))
+            tmp_path.replace(self.manifest_path)
+        except OSError as e:
+            logger.error(f"Error writing segment manifest {self.manifest_path}: {e}")
+
+    def remove(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+async def encode_segment(
+    input_path: str,
+    job: SegmentJob,
+    segment: Segment,
+    width: int,
+    height: int,
+    threads: int,
+    stop_early: bool = False
+) -> bool:
+    """Encode one segment (video only) to its bitrate budget with the job's preset
+
+    With stop_early the encode is stopped once it is projected above the
+    same SEGMENT_OVERSHOOT the correction round uses; the segment keeps its
+    projected size and stays pending, so that round re-encodes it without
+    paying for the rest of this run.
+    """
+    part_path = job.dir / f"{segment.filename}.part.mp4"
+    cmd = [
+        'ffmpeg', '-hide_banner', '-nostdin',
+        '-ss', f'{segment.start:.3f}', '-i', input_path, '-t', f'{segment.duration:.3f}',
+        '-map', '0:v:0',
+        '-c:v', 'libx264', '-preset', job.preset, '-threads', f'{threads}',
+        '-b:v', f'{segment.bitrate}',
+        '-maxrate', f'{int(segment.bitrate * 1.5)}',
+        '-bufsize', f'{int(segment.bitrate * 2)}',
+        '-vf', f'scale={width}:{height}',
+        '-an', '-y', str(part_path)
+    ]
+    progress_job = transcode_jobs.create(
+        'segment', os.path.basename(input_path), segment.duration,
+        target_bytes=int(segment.budget_bytes) if stop_early else None,
+        step=f'segment {segment.index + 1}/{len(job.segments)}',
+        abort_ratio=SEGMENT_OVERSHOOT
+    )
+    try:
+        if not await run_ffmpeg(cmd, progress_job) or not part_path.exists():
+            return False
+    except EncodeOvershoot as e:
+        segment.size = e.projected_size
+        part_path.unlink(missing_ok=True)
+        return True
+    final_path = job.dir / segment.filename
+    part_path.replace(final_path)
+    segment.size = final_path.stat().st_size
+    segment.done = True
+    job.save()
+    return True
+
+async def encode_audio(input_path: str, job: SegmentJob, audio_copy: bool) -> bool:
+    if job.audio_done:
+        return True
+    if audio_copy:
+        codec_args = ['-c:a', 'copy']
+    else:
+        codec_args = ['-c:a', 'aac', '-b:a', f'{AUDIO_BITRATE // 1000}k', '-ar', '44100']
+    part_path = job.dir / f"{AUDIO_NAME}.part.m4a"
+    cmd = ['ffmpeg', '-hide_banner', '-nostdin', '-i', input_path, '-map', '0:a:0', '-vn'] + codec_args + [
+        '-y', str(part_path)
+    ]
+    if not await run_ffmpeg(cmd) or not part_path.exists():
+        return False
+    part_path.replace(job.dir / AUDIO_NAME)
+    job.audio_done = True
+    job.save()
+    return True
+
+async def concat_segments(job: SegmentJob, output_path: str, has_audio: bool) -> bool:
+    """Join the segments and the audio track without re-encoding"""
+    list_path = job.dir / "concat.txt"
+    list_path.write_text("".join(f"file '{segment.filename}'\n" for segment in job.segments))
+    cmd = ['ffmpeg', '-hide_banner', '-nostdin', '-f', 'concat', '-safe', '0', '-i', str(list_path)]
+    if has_audio:
+        cmd += ['-i', str(job.dir / AUDIO_NAME), '-map', '0:v:0', '-map', '1:a:0']
+    cmd += ['-c', 'copy', '-movflags', '+faststart', '-y', output_path]
+    return await run_ffmpeg(cmd) and os.path.exists(output_path)
+
+async def _encode_pending(
+    input_path: str,
+    job: SegmentJob,
+    width: int,
+    height: int,
+    workers: int,
+    stop_early: bool = False
+) -> bool:
+    semaphore = asyncio.Semaphore(workers)
+
+    async def run(segment: Segment) -> bool:
+        async with semaphore:
+            # Iplar soni umumiy CPU byudjetidan olinadi
+            async with transcode_scheduler.encoder(segment.duration, preset=job.preset) as slot:
+                encoded = await encode_segment(
+                    input_path, job, segment, width, height, slot.threads, stop_early
+                )
+                if encoded and segment.done:
+                    slot.media_seconds += segment.duration
+                return encoded
+
+    results = await asyncio.gather(*(run(segment) for segment in job.segments if not segment.done))
+    return all(results)
+
+async def encode_segmented(
+    input_path: str,
+    output_path: str,
+    duration: float,
+    width: int,
+    height: int,
+    target_bytes: int,
+    has_audio: bool = True,
+    audio_bitrate: int = None,
+    audio_copy: bool = False
+) -> Optional[str]:
+    """Encode a long video as keyframe-aligned segments on all cores
+
+    Segments are encoded concurrently at a shared bitrate whose budgets add
+    up to the target size, then joined with the concat demuxer (stream
+    copy). Segments that overshot their budget get one corrective
+    re-encode; in the first round a segment whose progress already shows
+    the overshoot is stopped early and goes straight to that re-encode.
+    Finished segments are checkpointed and reused after a crash.
+    """
+    workers = segment_workers()
+    audio_bitrate = (audio_bitrate or AUDIO_BITRATE) if has_audio else 0
+    video_bitrate = calculate_target_bitrate(
+        duration=duration,
+        target_size_mb=target_bytes * SIZE_SAFETY / (1024 * 1024),
+        audio_bitrate=audio_bitrate
+    )
+
+    job = SegmentJob(job_name(input_path, target_bytes, width, height))
+    if job.load():
+        done = sum(1 for segment in job.segments if segment.done)
+        logger.info(f"Resuming segmented encode: {done}/{len(job.segments)} segments done")
+        metrics.track_segment_resume(done)
+    else:
+        job.segments = plan_segments(await keyframe_times(input_path), duration, video_bitrate, workers)
+        job.preset = transcode_scheduler.choose_preset(duration, transcode_scheduler.budget)
+        job.save()
+    logger.info(f"Encoding {input_path} in {len(job.segments)} segments with {workers} workers, "
+                f"preset {job.preset}")
+
+    # Birinchi aylanishda budjetdan oshayotgan segment erta to'xtatiladi
+    encodes = [_encode_pending(input_path, job, width, height, workers, stop_early=True)]
+    if has_audio:
+        encodes.append(encode_audio(input_path, job, audio_copy))
+    if not all(await asyncio.gather(*encodes)):
+        # Tayyor segmentlar keyingi urinish uchun saqlanib qoladi
+        return None
+
+    # Byudjetdan oshgan segmentlar bir marta pastroq bitreyt bilan qayta kodlanadi
+    corrected = False
+    for segment in job.segments:
+        # Erta to'xtatilgan segment (done=False) ham albatta qayta kodlanadi
+        if not segment.done or segment.size > segment.budget_bytes * SEGMENT_OVERSHOOT:
+            if segment.size > segment.budget_bytes:
+                segment.bitrate = max(
+                    MIN_VIDEO_BITRATE, int(segment.bitrate * segment.budget_bytes / segment.size)
+                )
+            segment.done = False
+            corrected = True
+    if corrected:
+        job.save()
+        if not await _encode_pending(input_path, job, width, height, workers):
+            return None
+
+    if not await concat_segments(job, output_path, has_audio):
+        return None
+    actual = os.path.getsize(output_path)
+    metrics.track_size_encode("segmented", corrected, actual <= target_bytes)
+    if actual > target_bytes:
+        logger.warning(f"Segmented encode above target: {actual / (1024 * 1024):.1f}MB")
+    job.remove()
+    return output_path
+
+def cleanup_stale(max_age_hours: float = None) -> int:
+    """Remove segment jobs nobody touched for max_age_hours; returns bytes freed"""
+    root = segments_dir()
+    if not root.exists():
+        return 0
+    max_age = (max_age_hours or config.partial_max_age_hours) * 3600
+    now = time.time()
+    freed = 0
+    for job_dir in root.iterdir():
+        try:
+            files = list(job_dir.iterdir()) if job_dir.is_dir() else []
+            newest = max([job_dir.stat().st_mtime] + [path.stat().st_mtime for path in files])
+            if now - newest <= max_age:
+                continue
+            freed += sum(path.stat().st_size for path in files)
+            shutil.rmtree(job_dir, ignore_errors=True)
+        except OSError as e:
+            logger.error(f"Error removing segment job {job_dir}: {e}")
+    return freed
@@ -5,6 +5,17 @@ from .health_service import HealthService
 from .railway_service import RailwayService
 from .rate_limiter import RateLimiter
 from .video_service import VideoService
+from .file_id_registry import FileIdRegistry, file_id_registry
+from .media_cache import MediaCache, media_cache
+from .pipeline import Pipeline, pipeline
+from .metadata_cache import MetadataCache, metadata_cache
+from .host_tuner import HostThroughputTuner, host_tuner
+from .download_journal import DownloadJournal, download_journal
+from .fair_scheduler import FairScheduler, fair_scheduler
+from .circuit_breaker import CircuitBreakers, circuit_breakers
+from .edit_scheduler import EditScheduler, edit_scheduler
+from .transcode_scheduler import TranscodeScheduler, transcode_scheduler
+from .transcode_jobs import TranscodeJobTable, transcode_jobs
 
 __all__ = [
     'metrics',
@@ -12,5 +23,27 @@ __all__ = [
     'HealthService',
     'RailwayService',
     'RateLimiter',
-    'VideoService'
+    'VideoService',
+    'FileIdRegistry',
+    'file_id_registry',
+    'MediaCache',
+    'media_cache',
+    'Pipeline',
+    'pipeline',
+    'MetadataCache',
+    'metadata_cache',
+    'HostThroughputTuner',
+    'host_tuner',
+    'DownloadJournal',
+    'download_journal',
+    'FairScheduler',
+    'fair_scheduler',
+    'CircuitBreakers',
+    'circuit_breakers',
+    'EditScheduler',
+    'edit_scheduler',
+    'TranscodeScheduler',
+    'transcode_scheduler',
+    'TranscodeJobTable',
+    'transcode_jobs'
 ]
\ No newline at end of file
@@ -0,0 +1,242 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Optional
+from ..config.config import config
+from ..services.host_tuner import host_key
+from ..services.monitoring import metrics
+from ..services.pipeline import StagePool
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# Outcome of one call, decided by the caller's classifier
+RESULT_OK = "ok"
+RESULT_FAILURE = "failure"
+RESULT_THROTTLED = "throttled"
+
+MAX_OPEN_SECONDS = 600
+# Weight of the newest sample in the latency moving average
+LATENCY_EWMA_WEIGHT = 0.2
+
+class CircuitOpenError(Exception):
+    """Domain is failing; retry_after says when it will be probed again"""
+    def __init__(self, domain: str, retry_after: float):
+        super().__init__(f"Circuit for {domain} is open, retry in {retry_after:.0f}s")
+        self.domain = domain
+        self.retry_after = retry_after
+
+@dataclass
+class DomainHealth:
+    """Recent results, breaker state and concurrency limit of one domain"""
+    pool: StagePool
+    state: str = STATE_CLOSED
+    results: Deque[str] = field(default_factory=deque)
+    opened_at: float = 0.0
+    open_seconds: float = 0.0
+    probing: bool = False
+    latency: float = 0.0
+    successes: int = 0
+    failures: int = 0
+    throttled: int = 0
+    rejected: int = 0
+    trips: int = 0
+    streak: int = 0
+
+    def retry_after(self, now: float) -> float:
+        return max(0.0, self.opened_at + self.open_seconds - now)
+
+class CircuitBreakers:
+    """Per-domain circuit breakers with AIMD concurrency limits
+
+    Each domain (instagram.com, tiktok.com, ...) keeps its last N call
+    results. When the error rate or the number of 429/403 answers crosses
+    the threshold, the circuit opens: calls fail fast with an ETA, or wait
+    for it when it is short, instead of tying up a worker until a timeout.
+    After the open period one probe call is let through (half-open); its
+    result closes the circuit or opens it again for twice as long.
+
+    Concurrency per domain grows by one after a full limit's worth of
+    successes and is halved on throttling (AIMD).
+    """
+
+    def __init__(
+        self,
+        window: int = None,
+        min_calls: int = None,
+        failure_ratio: float = None,
+        throttle_limit: int = None,
+        open_seconds: float = None,
+        max_wait: float = None,
+        max_concurrency: int = None
+    ):
+        self.window = window or config.breaker_window
+        self.min_calls = min_calls or config.breaker_min_calls
+        self.failure_ratio = failure_ratio or config.breaker_failure_ratio
+        self.throttle_limit = throttle_limit or config.breaker_throttle_limit
+        self.open_seconds = open_seconds or config.breaker_open_seconds
+        self.max_wait = config.breaker_max_wait if max_wait is None else max_wait
+        self.max_concurrency = max_concurrency or config.domain_max_concurrency
+        self.domains: Dict[str, DomainHealth] = {}
+
+    def _health(self, domain: str) -> DomainHealth:
+        if domain not in self.domains:
+            self.domains[domain] = DomainHealth(
+                pool=StagePool(f"domain:{domain}", max(1, self.max_concurrency // 2)),
+                results=deque(maxlen=self.window)
+            )
+        return self.domains[domain]
+
+    def check(self, domain: str) -> bool:
+        """Raise CircuitOpenError if calls to domain must not run now
+
+        Returns True when the caller is the half-open probe.
+        """
+        health = self._health(domain)
+        now = time.monotonic()
+        if health.state == STATE_OPEN:
+            if health.retry_after(now) > 0:
+                health.rejected += 1
+                raise CircuitOpenError(domain, health.retry_after(now))
+            health.state = STATE_HALF_OPEN
+            health.probing = False
+            logger.info(f"Circuit for {domain} half-open, probing")
+
+        if health.state == STATE_HALF_OPEN:
+            if health.probing:
+                health.rejected += 1
+                raise CircuitOpenError(domain, max(1.0, health.latency))
+            health.probing = True
+            return True
+        return False
+
+    def record(self, domain: str, result: str, latency: Optional[float] = None, probe: bool = False) -> None:
+        """Feed one call result into the domain's health"""
+        health = self._health(domain)
+        if latency is not None:
+            health.latency = (
+                latency if not health.latency
+                else health.latency + LATENCY_EWMA_WEIGHT * (latency - health.latency)
+            )
+        health.results.append(result)
+
+        if result == RESULT_OK:
+            health.successes += 1
+            health.streak += 1
+            if probe or health.state == STATE_HALF_OPEN:
+                self._close(domain, health)
+            elif health.streak >= health.pool.limit and health.pool.limit < self.max_concurrency:
+                # Additive increase
+                health.pool.set_limit(health.pool.limit + 1)
+                health.streak = 0
+            return
+
+        health.streak = 0
+        if result == RESULT_THROTTLED:
+            health.throttled += 1
+            # Multiplicative decrease
+            health.pool.set_limit(max(1, health.pool.limit // 2))
+        else:
+            health.failures += 1
+
+        if probe or health.state == STATE_HALF_OPEN:
+            self._open(domain, health, health.open_seconds * 2)
+        elif health.state == STATE_CLOSED and self._should_trip(health):
+            self._open(domain, health, self.open_seconds)
+
+    def _should_trip(self, health: DomainHealth) -> bool:
+        results = list(health.results)
+        if results.count(RESULT_THROTTLED) >= self.throttle_limit:
+            return True
+        if len(results) < self.min_calls:
+            return False
+        failed = len(results) - results.count(RESULT_OK)
+        return failed / len(results) >= self.failure_ratio
+
+    def _open(self, domain: str, health: DomainHealth, seconds: float) -> None:
+        health.state = STATE_OPEN
+        health.opened_at = time.monotonic()
+        health.open_seconds = min(max(seconds, self.open_seconds), MAX_OPEN_SECONDS)
+        health.probing = False
+        health.trips += 1
+        health.pool.set_limit(1)
+        metrics.track_breaker_trip(domain)
+        logger.warning(f"Circuit for {domain} opened for {health.open_seconds:.0f}s")
+
+    def _close(self, domain: str, health: DomainHealth) -> None:
+        health.state = STATE_CLOSED
+        health.probing = False
+        health.open_seconds = 0.0
+        health.results.clear()
+        logger.info(f"Circuit for {domain} closed")
+
+    def reset(self, domain: str) -> bool:
+        health = self.domains.get(domain)
+        if not health:
+            return False
+        self._close(domain, health)
+        health.pool.set_limit(max(1, self.max_concurrency // 2))
+        return True
+
+    @asynccontextmanager
+    async def guard(self, url: str, classify: Callable[[Optional[BaseException]], str]):
+        """Run the block under the domain's breaker and concurrency limit
+
+        classify(exception or None) tells whether the call counts as ok,
+        failure or throttled; e.g. a private video is the user's problem,
+        not the site's. Short open periods are waited out (up to max_wait).
+        """
+        domain = host_key(url) or "unknown"
+        while True:
+            try:
+                probe = self.check(domain)
+                break
+            except CircuitOpenError as e:
+                if e.retry_after > self.max_wait:
+                    raise
+                await asyncio.sleep(e.retry_after)
+
+        health = self._health(domain)
+        try:
+            async with health.pool.slot():
+                start_time = time.monotonic()
+                try:
+                    yield domain
+                except BaseException as e:
+                    if isinstance(e, asyncio.CancelledError):
+                        raise
+                    self.record(domain, classify(e), time.monotonic() - start_time, probe=probe)
+                    raise
+                self.record(domain, classify(None), time.monotonic() - start_time, probe=probe)
+        finally:
+            if probe and health.state == STATE_HALF_OPEN:
+                # Probe was cancelled before giving an answer
+                health.probing = False
+
+    def get_statistics(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        return {
+            domain: {
+                'state': health.state,
+                'retry_after': health.retry_after(now) if health.state == STATE_OPEN else 0.0,
+                'limit': health.pool.limit,
+                'active': health.pool.active,
+                'waiting': health.pool.waiting,
+                'latency': health.latency,
+                'successes': health.successes,
+                'failures': health.failures,
+                'throttled': health.throttled,
+                'rejected': health.rejected,
+                'trips': health.trips
+            }
+            for domain, health in self.domains.items()
+        }
+
+# Global breaker registry
+circuit_breakers = CircuitBreakers()
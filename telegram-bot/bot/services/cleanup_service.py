@@ -7,6 +7,9 @@ from typing import Optional
 from ..utils import cleanup_file
 from ..config.config import config
 from ..services.monitoring import metrics
+from ..services.media_cache import media_cache
+from ..services.download_journal import download_journal
+from .. import segment_encoder
 
 logger = logging.getLogger(__name__)
 
@@ -54,6 +57,9 @@ class CleanupService:
         while self._running:
             try:
                 await self._cleanup_old_files()
+                download_journal.cleanup_stale()
+                segment_encoder.cleanup_stale()
+                media_cache.enforce_budget()
                 await self._check_disk_usage()
                 await asyncio.sleep(self.cleanup_interval)
             except asyncio.CancelledError:
@@ -64,7 +70,11 @@ class CleanupService:
                 await asyncio.sleep(60)  # Wait a minute before retrying
 
     async def _cleanup_old_files(self):
-        """Clean up files older than max_age_hours"""
+        """Clean up temporary files older than max_age_hours
+
+        Cached media lives in a subdirectory and is governed by the cache
+        byte budget instead of file age.
+        """
         try:
             current_time = time.time()
             max_age_seconds = self.max_age_hours * 3600
@@ -109,11 +119,18 @@ class CleanupService:
                     f"Disk usage at {disk_usage.percent}%, "
                     "performing emergency cleanup"
                 )
+
+                # Evict cold cache entries before touching in-flight files
+                media_cache.evict()
+                disk_usage = psutil.disk_usage(str(self.downloads_dir))
+                if disk_usage.percent < config.max_disk_percent:
+                    return
                 
                 # Get list of files sorted by modification time
                 files = []
                 for file in self.downloads_dir.iterdir():
-                    if file.is_file():
+                    # Hozir ishlanayotgan yuklash fayllari o'chirilmaydi
+                    if file.is_file() and not download_journal.is_active(file):
                         try:
                             files.append((
                                 file,
@@ -156,4 +173,7 @@ class CleanupService:
     async def force_cleanup(self):
         """Force immediate cleanup"""
         await self._cleanup_old_files()
+        download_journal.cleanup_stale()
+        segment_encoder.cleanup_stale()
+        media_cache.enforce_budget()
         await self._check_disk_usage()
\ No newline at end of file
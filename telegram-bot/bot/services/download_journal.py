@@ -0,0 +1,185 @@
+import json
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+from ..config.config import config
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SUFFIX = ".job.json"
+
+class DownloadJournal:
+    """Job-scoped partial downloads that survive failures and restarts
+
+    Every video gets a deterministic output name in downloads/partial, so
+    yt-dlp's .part files and fragment state (continuedl) and the range
+    downloader's journal are picked up by the next attempt, even from a
+    new process. A small JSON file per job records the URL and the chats
+    waiting for it; unfinished jobs are resumed at startup. Partials older
+    than partial_max_age are deleted. Working files an active job keeps
+    elsewhere (e.g. its compressed output) are registered with track() so
+    disk cleanup can skip them through is_active().
+    """
+
+    def __init__(self, partial_dir: str = None, max_age_hours: float = None, max_attempts: int = None):
+        self.partial_dir = Path(partial_dir or Path(config.downloads_dir) / "partial")
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        self.max_age = (max_age_hours or config.partial_max_age_hours) * 3600
+        self.max_attempts = max_attempts or config.download_max_attempts
+        self._active: Set[str] = set()
+        self._tracked: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def job_name(media_key: str) -> str:
+        return "job_" + hashlib.sha1(media_key.encode()).hexdigest()[:16]
+
+    def output_template(self, media_key: str) -> str:
+        """yt-dlp outtmpl for this job's files"""
+        return str(self.partial_dir / f"{self.job_name(media_key)}.%(ext)s")
+
+    def _journal_path(self, media_key: str) -> Path:
+        return self.partial_dir / f"{self.job_name(media_key)}{JOURNAL_SUFFIX}"
+
+    def _read(self, path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, entry: Dict[str, Any]) -> None:
+        path = self._journal_path(entry['media_key'])
+        tmp_path = path.with_suffix('.tmp')
+        try:
+            tmp_path.write_text(json.dumps(entry))
+            tmp_path.replace(path)
+        except OSError as e:
+            logger.error(f"Error writing download journal {path.name}: {e}")
+
+    def track(self, media_key: str, path: str) -> str:
+        """Register a working file of an active job; returns path"""
+        with self._lock:
+            if media_key in self._active:
+                self._tracked.setdefault(media_key, set()).add(str(Path(path).resolve()))
+        return path
+
+    def is_active(self, path) -> bool:
+        """File belongs to a job that is being worked on right now"""
+        path = Path(path)
+        with self._lock:
+            if path.resolve().parent == self.partial_dir.resolve():
+                job = path.name.split('.', 1)[0]
+                return any(self.job_name(key) == job for key in self._active)
+            resolved = str(path.resolve())
+            return any(resolved in paths for paths in self._tracked.values())
+
+    def get(self, media_key: str) -> Optional[Dict[str, Any]]:
+        return self._read(self._journal_path(media_key))
+
+    def begin(self, media_key: str, url: str, chat_id: Optional[int] = None) -> Dict[str, Any]:
+        """Record a (re)started attempt; returns the journal entry"""
+        with self._lock:
+            entry = self.get(media_key) or {
+                'media_key': media_key,
+                'url': url,
+                'chat_ids': [],
+                'created': time.time(),
+                'attempts': 0
+            }
+            if chat_id and chat_id not in entry['chat_ids']:
+                entry['chat_ids'].append(chat_id)
+            entry['attempts'] += 1
+            entry['updated'] = time.time()
+            self._active.add(media_key)
+            self._write(entry)
+        return entry
+
+    def fail(self, media_key: str) -> None:
+        """Attempt failed; partials stay for the next one unless attempts ran out"""
+        with self._lock:
+            self._active.discard(media_key)
+            self._tracked.pop(media_key, None)
+            entry = self.get(media_key)
+        if entry and entry['attempts'] >= self.max_attempts:
+            logger.warning(f"Giving up on {media_key} after {entry['attempts']} attempts")
+            self.discard(media_key)
+
+    def finish(self, media_key: str, keep: Optional[str] = None) -> None:
+        """Job completed: drop the journal and leftover partials (except `keep`)"""
+        with self._lock:
+            self._active.discard(media_key)
+            self._tracked.pop(media_key, None)
+            self._remove_files(self.job_name(media_key), keep=keep)
+
+    def discard(self, media_key: str) -> None:
+        with self._lock:
+            self._active.discard(media_key)
+            self._tracked.pop(media_key, None)
+            self._remove_files(self.job_name(media_key))
+
+    def _remove_files(self, job: str, keep: Optional[str] = None) -> int:
+        removed = 0
+        keep_path = Path(keep).resolve() if keep else None
+        for path in self.partial_dir.glob(f"{job}*"):
+            try:
+                if path.is_file() and path.resolve() != keep_path:
+                    removed += path.stat().st_size
+                    path.unlink()
+            except OSError as e:
+                logger.error(f"Error removing partial file {path}: {e}")
+        return removed
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """Unfinished jobs that nobody is working on (e.g. after a restart)"""
+        entries = []
+        now = time.time()
+        for path in self.partial_dir.glob(f"*{JOURNAL_SUFFIX}"):
+            entry = self._read(path)
+            if not entry or entry['media_key'] in self._active:
+                continue
+            if now - entry.get('updated', 0) > self.max_age:
+                continue
+            entries.append(entry)
+        return sorted(entries, key=lambda entry: entry['created'])
+
+    def cleanup_stale(self) -> int:
+        """Remove partials of inactive jobs older than the age limit; returns bytes freed"""
+        now = time.time()
+        active_jobs = {self.job_name(key) for key in self._active}
+        last_modified: Dict[str, float] = {}
+        for path in self.partial_dir.iterdir():
+            job = path.name.split('.', 1)[0]
+            if job in active_jobs:
+                continue
+            try:
+                last_modified[job] = max(last_modified.get(job, 0), path.stat().st_mtime)
+            except OSError:
+                continue
+        stale_jobs = [job for job, mtime in last_modified.items() if now - mtime > self.max_age]
+
+        freed = 0
+        with self._lock:
+            for job in stale_jobs:
+                freed += self._remove_files(job)
+        if stale_jobs:
+            logger.info(f"Removed {len(stale_jobs)} stale partial downloads ({freed/(1024*1024):.1f}MB)")
+        return freed
+
+    def get_statistics(self) -> Dict[str, int]:
+        total = 0
+        for path in self.partial_dir.iterdir():
+            try:
+                total += path.stat().st_size
+            except OSError:
+                pass
+        return {
+            'active': len(self._active),
+            'pending': len(self.pending()),
+            'bytes': total
+        }
+
+# Global download journal instance
+download_journal = DownloadJournal()
@@ -0,0 +1,219 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from telegram.error import BadRequest, RetryAfter, TelegramError
+from ..config.config import config
+from ..services.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+# Telegram allows about 20 messages per minute in a group
+GROUP_RATE = 20 / 60
+# How long the flusher steps aside while user-facing sends wait for tokens
+PRIORITY_YIELD = 0.05
+# Tokens per chat that progress edits leave for user-facing sends
+SEND_RESERVE = 1
+# Last sent texts remembered to skip no-op edits
+MAX_REMEMBERED_TEXTS = 5000
+
+MessageKey = Tuple[int, int]
+
+class TokenBucket:
+    """Classic token bucket; tokens refill at `rate` per second up to `burst`"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float, reserve: float = 0) -> float:
+        """Seconds until one token (plus `reserve` spare ones) is available"""
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        needed = min(1 + reserve, self.burst)
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, seconds: float) -> None:
+        """Telegram answered RetryAfter: nothing goes out until it expires"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst and now >= self.blocked_until
+
+class EditScheduler:
+    """Central, flood-limit aware scheduler for status message edits
+
+    Progress edits are not sent right away: each message keeps only its
+    latest pending text, texts equal to what the user already sees are
+    dropped, and a single background flusher sends them within a per-chat
+    and a global token bucket. User-facing sends (videos, final answers)
+    take tokens first via reserve()/edit_now(), so cosmetic progress
+    updates never delay them or cause 429s for them.
+    """
+
+    def __init__(self, global_rate: float = None, chat_rate: float = None):
+        self.global_bucket = TokenBucket(
+            global_rate or config.telegram_global_rate,
+            global_rate or config.telegram_global_rate
+        )
+        self.chat_rate = chat_rate or config.telegram_chat_rate
+        self._chats: Dict[int, TokenBucket] = {}
+        self._pending: "OrderedDict[MessageKey, Tuple[Any, str, Dict[str, Any]]]" = OrderedDict()
+        self._shown: "OrderedDict[MessageKey, str]" = OrderedDict()
+        self._sends_waiting = 0
+        self._flusher: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _key(message) -> MessageKey:
+        return (message.chat_id, message.message_id)
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        if chat_id not in self._chats:
+            rate = GROUP_RATE if chat_id < 0 else self.chat_rate
+            self._chats[chat_id] = TokenBucket(min(rate, self.chat_rate), config.telegram_chat_burst)
+        return self._chats[chat_id]
+
+    def _remember(self, key: MessageKey, text: str) -> None:
+        self._shown[key] = text
+        self._shown.move_to_end(key)
+        while len(self._shown) > MAX_REMEMBERED_TEXTS:
+            self._shown.popitem(last=False)
+
+    def edit(self, message, text: str, **kwargs) -> None:
+        """Queue a cosmetic edit; replaces any edit still pending for the message"""
+        key = self._key(message)
+        if key in self._pending:
+            metrics.track_status_edit("coalesced")
+        elif self._shown.get(key) == text:
+            metrics.track_status_edit("skipped")
+            return
+        self._pending[key] = (message, text, kwargs)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush())
+
+    def forget(self, message) -> None:
+        """Drop pending edits of a message that is about to be deleted"""
+        key = self._key(message)
+        self._pending.pop(key, None)
+        self._shown.pop(key, None)
+
+    async def reserve(self, chat_id: int) -> None:
+        """Wait for a send slot in chat_id, ahead of any queued progress edits"""
+        self._sends_waiting += 1
+        try:
+            chat = self._chat_bucket(chat_id)
+            while True:
+                now = time.monotonic()
+                delay = max(chat.wait_time(now), self.global_bucket.wait_time(now))
+                if delay <= 0:
+                    chat.take(now)
+                    self.global_bucket.take(now)
+                    return
+                await asyncio.sleep(delay)
+        finally:
+            self._sends_waiting -= 1
+
+    async def edit_now(self, message, text: str, **kwargs) -> None:
+        """User-facing edit (results, errors): sent with priority, never coalesced away"""
+        key = self._key(message)
+        self._pending.pop(key, None)
+        if self._shown.get(key) == text:
+            metrics.track_status_edit("skipped")
+            return
+        for attempt in range(2):
+            await self.reserve(message.chat_id)
+            try:
+                await message.edit_text(text, **kwargs)
+            except RetryAfter as e:
+                self.penalize(message.chat_id, e.retry_after)
+                if attempt:
+                    raise
+                continue
+            except BadRequest as e:
+                if "not modified" not in str(e).lower():
+                    raise
+            self._remember(key, text)
+            metrics.track_status_edit("sent")
+            return
+
+    def penalize(self, chat_id: int, seconds: float) -> None:
+        """Respect a RetryAfter answer for this chat"""
+        metrics.track_status_edit("retry_after")
+        logger.warning(f"Telegram flood limit in chat {chat_id}, waiting {seconds}s")
+        self._chat_bucket(chat_id).block(float(seconds))
+
+    def _next_ready(self, now: float) -> Tuple[Optional[MessageKey], float]:
+        """Oldest pending edit whose chat has a token, or how long to wait"""
+        wait = None
+        for key in self._pending:
+            delay = self._chat_bucket(key[0]).wait_time(now, reserve=SEND_RESERVE)
+            if delay <= 0:
+                return key, 0.0
+            wait = delay if wait is None else min(wait, delay)
+        return None, wait or 0.0
+
+    async def _flush(self) -> None:
+        while self._pending:
+            if self._sends_waiting:
+                await asyncio.sleep(PRIORITY_YIELD)
+                continue
+
+            now = time.monotonic()
+            global_wait = self.global_bucket.wait_time(now)
+            if global_wait > 0:
+                await asyncio.sleep(global_wait)
+                continue
+            key, wait = self._next_ready(now)
+            if key is None:
+                # Short naps so edits for other chats aren't held up
+                await asyncio.sleep(min(wait, 0.5))
+                continue
+
+            message, text, kwargs = self._pending.pop(key)
+            self._chat_bucket(key[0]).take(now)
+            self.global_bucket.take(now)
+            try:
+                await message.edit_text(text, **kwargs)
+                self._remember(key, text)
+                metrics.track_status_edit("sent")
+            except RetryAfter as e:
+                self.penalize(key[0], e.retry_after)
+                # Retry later unless a newer text arrived meanwhile
+                self._pending.setdefault(key, (message, text, kwargs))
+            except TelegramError as e:
+                # Deleted message, not modified, ... - progress is best effort
+                logger.debug(f"Progress edit dropped: {e}")
+            except Exception as e:
+                logger.error(f"Progress edit failed: {e}")
+
+        # Idle chats don't need their buckets
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.idle(now)]:
+            del self._chats[chat_id]
+
+    def get_statistics(self) -> Dict[str, int]:
+        return {
+            'pending': len(self._pending),
+            'chats': len(self._chats),
+            'sends_waiting': self._sends_waiting
+        }
+
+# Global edit scheduler instance
+edit_scheduler = EditScheduler()
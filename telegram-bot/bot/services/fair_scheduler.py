@@ -0,0 +1,219 @@
+import json
+import math
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from pathlib import Path
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, List, Optional
+from ..config.config import config
+from ..format_selector import select_format
+from ..services.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Cost model: estimated seconds of work for one job
+ASSUMED_DOWNLOAD_RATE = 2 * MB  # bytes/s
+ASSUMED_BITRATE = 2_000_000 / 8  # bytes/s of media when the size is unknown
+TRANSCODE_SECONDS_PER_SECOND = 0.5
+UNKNOWN_DURATION = 120
+BASE_COST = 1.0
+
+def estimate_job_cost(info: Dict[str, Any]) -> float:
+    """Estimated seconds of download (and transcode) work from metadata only"""
+    duration = info.get('duration') or UNKNOWN_DURATION
+    selected = select_format(info)
+    if selected:
+        size = selected[1]
+        needs_transcode = False
+    else:
+        size = info.get('filesize') or info.get('filesize_approx') or duration * ASSUMED_BITRATE
+        needs_transcode = size > config.target_video_size_mb * MB
+
+    cost = BASE_COST + size / ASSUMED_DOWNLOAD_RATE
+    if needs_transcode:
+        cost += duration * TRANSCODE_SECONDS_PER_SECOND
+    return cost
+
+class FairScheduler:
+    """Weighted fair admission of video jobs across users
+
+    Each user has their own queue ordered by estimated cost (shortest job
+    first). Users are served with deficit round-robin: every round a user
+    earns quantum x weight credit and may start jobs whose cost fits the
+    credit, so one user's ten long videos cannot hold up everybody else's
+    short clips. With global_sjf the cheapest job overall goes first
+    instead, aged by waiting time so long jobs still run eventually.
+    """
+
+    def __init__(
+        self,
+        limit: int = None,
+        quantum: float = None,
+        global_sjf: bool = None,
+        persist_path: Optional[str] = None
+    ):
+        self.limit = max(1, limit or config.scheduler_slots)
+        self.quantum = quantum or config.scheduler_quantum
+        self.global_sjf = config.scheduler_global_sjf if global_sjf is None else global_sjf
+        self.persist_path = Path(persist_path) if persist_path else None
+        self.active = 0
+        self.weights: Dict[int, float] = {}
+        self._queues: Dict[int, List[tuple]] = {}
+        self._deficits: Dict[int, float] = {}
+        self._round: Deque[int] = deque()
+        self._fresh = True  # Head of the round hasn't received its quantum yet
+        self._seq = itertools.count()
+        self.started = 0
+        if self.persist_path:
+            self.load()
+
+    @property
+    def waiting(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def weight(self, user_id: int) -> float:
+        return self.weights.get(user_id, 1.0)
+
+    def set_weight(self, user_id: int, weight: float) -> None:
+        """Share of the slots relative to other users (default 1.0)"""
+        # NaN/inf kamomadni buzadi va navbat tanlovi hech qachon tugamaydi
+        if not math.isfinite(weight) or weight <= 0:
+            raise ValueError("weight must be a positive finite number")
+        if weight == 1.0:
+            self.weights.pop(user_id, None)
+        else:
+            self.weights[user_id] = weight
+        self.save()
+
+    async def acquire(self, user_id: int, cost: float) -> None:
+        if self.active < self.limit and not self._queues:
+            self.active += 1
+            self.started += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        if user_id not in self._queues:
+            self._queues[user_id] = []
+            self._deficits.setdefault(user_id, 0.0)
+            self._round.append(user_id)
+        heapq.heappush(self._queues[user_id], (cost, next(self._seq), time.monotonic(), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was handed over right as we got cancelled
+                self.release()
+            else:
+                self._remove(user_id, future)
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        self._dispatch()
+
+    def set_limit(self, limit: int) -> None:
+        self.limit = max(1, limit)
+        self._dispatch()
+
+    def _remove(self, user_id: int, future: asyncio.Future) -> None:
+        queue = self._queues.get(user_id)
+        if queue is None:
+            return
+        queue[:] = [item for item in queue if item[3] is not future]
+        heapq.heapify(queue)
+        if not queue:
+            self._drop_user(user_id)
+
+    def _drop_user(self, user_id: int) -> None:
+        # Idle users don't bank credit
+        del self._queues[user_id]
+        self._deficits.pop(user_id, None)
+        if self._round and self._round[0] == user_id:
+            self._fresh = True
+        self._round.remove(user_id)
+
+    def _dispatch(self) -> None:
+        while self.active < self.limit and self._queues:
+            user_id = self._next_global() if self.global_sjf else self._next_drr()
+            cost, _, queued_at, future = heapq.heappop(self._queues[user_id])
+            if not self._queues[user_id]:
+                self._drop_user(user_id)
+            if future.done():
+                continue
+            self.active += 1
+            self.started += 1
+            metrics.track_stage_time("schedule", time.monotonic() - queued_at)
+            future.set_result(True)
+
+    def _next_drr(self) -> int:
+        """User whose cheapest job fits their deficit, in round-robin order"""
+        while True:
+            user_id = self._round[0]
+            if self._fresh:
+                self._deficits[user_id] += self.quantum * self.weight(user_id)
+                self._fresh = False
+            cost = self._queues[user_id][0][0]
+            if cost <= self._deficits[user_id]:
+                self._deficits[user_id] -= cost
+                return user_id
+            self._round.rotate(-1)
+            self._fresh = True
+
+    def _next_global(self) -> int:
+        """User holding the cheapest job overall; waiting time lowers the cost"""
+        now = time.monotonic()
+
+        def priority(user_id: int) -> float:
+            cost, _, queued_at, _ = self._queues[user_id][0]
+            return cost / self.weight(user_id) - (now - queued_at)
+
+        return min(self._queues, key=priority)
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, cost: float):
+        """Hold one job slot for the duration of the block"""
+        await self.acquire(user_id, cost)
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            'limit': self.limit,
+            'active': self.active,
+            'waiting': self.waiting,
+            'users_waiting': len(self._queues),
+            'started': self.started,
+            'weights': dict(self.weights)
+        }
+
+    def save(self) -> None:
+        if not self.persist_path:
+            return
+        try:
+            self.persist_path.write_text(json.dumps({str(user_id): w for user_id, w in self.weights.items()}))
+        except OSError as e:
+            logger.error(f"Error saving scheduler weights: {e}")
+
+    def load(self) -> None:
+        if not self.persist_path or not self.persist_path.exists():
+            return
+        try:
+            data = json.loads(self.persist_path.read_text())
+            weights = {int(user_id): float(w) for user_id, w in data.items()}
+            self.weights = {
+                user_id: weight for user_id, weight in weights.items()
+                if math.isfinite(weight) and weight > 0
+            }
+        except (OSError, ValueError, TypeError) as e:
+            logger.error(f"Error loading scheduler weights: {e}")
+
+# Global scheduler instance
+fair_scheduler = FairScheduler(persist_path=str(Path(config.data_dir) / "scheduler_weights.json"))
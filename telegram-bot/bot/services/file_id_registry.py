@@ -0,0 +1,185 @@
+import json
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+from ..config.config import config
+from ..utils import canonicalize_url
+
+logger = logging.getLogger(__name__)
+
+# Delivered variants
+VARIANT_VIDEO = "video"
+VARIANT_AUDIO = "audio"
+
+class FileIdRegistry:
+    """Persistent map of media key + variant -> Telegram file_id
+
+    Telegram keeps every uploaded file on its servers, so a video that was
+    delivered once can be re-sent to any chat by its file_id without
+    downloading, compressing or uploading it again.
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = Path(db_path or Path(config.data_dir) / "file_ids.sqlite3")
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._init_schema()
+
+    def _init_schema(self):
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS file_ids (
+                    media_key TEXT NOT NULL,
+                    variant TEXT NOT NULL,
+                    file_id TEXT NOT NULL,
+                    file_unique_id TEXT,
+                    file_size INTEGER,
+                    local_path TEXT,
+                    meta TEXT,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (media_key, variant)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS aliases (
+                    url TEXT PRIMARY KEY,
+                    media_key TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+
+    def get(
+        self,
+        media_key: str,
+        variant: str = VARIANT_VIDEO,
+        touch: bool = True
+    ) -> Optional[Dict[str, Any]]:
+        """Return stored upload record (and count the hit unless touch=False)"""
+        if not media_key:
+            return None
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT file_id, file_unique_id, file_size, local_path, meta "
+                "FROM file_ids WHERE media_key = ? AND variant = ?",
+                (media_key, variant)
+            ).fetchone()
+            if not row:
+                return None
+            if touch:
+                self._conn.execute(
+                    "UPDATE file_ids SET hits = hits + 1, last_used_at = ? "
+                    "WHERE media_key = ? AND variant = ?",
+                    (time.time(), media_key, variant)
+                )
+
+        return {
+            'media_key': media_key,
+            'variant': variant,
+            'file_id': row[0],
+            'file_unique_id': row[1],
+            'file_size': row[2],
+            'local_path': row[3],
+            'meta': json.loads(row[4]) if row[4] else {}
+        }
+
+    def put(
+        self,
+        media_key: str,
+        variant: str,
+        file_id: str,
+        file_unique_id: Optional[str] = None,
+        file_size: Optional[int] = None,
+        local_path: Optional[str] = None,
+        meta: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Remember file_id returned by Telegram for an upload"""
+        if not media_key or not file_id:
+            return
+        now = time.time()
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT INTO file_ids (media_key, variant, file_id, file_unique_id, "
+                    "file_size, local_path, meta, created_at, last_used_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(media_key, variant) DO UPDATE SET "
+                    "file_id = excluded.file_id, file_unique_id = excluded.file_unique_id, "
+                    "file_size = excluded.file_size, local_path = excluded.local_path, "
+                    "meta = excluded.meta, last_used_at = excluded.last_used_at",
+                    (media_key, variant, file_id, file_unique_id, file_size,
+                     local_path, json.dumps(meta or {}), now, now)
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Error saving file_id for {media_key}: {e}")
+
+    def forget(self, media_key: str, variant: str = VARIANT_VIDEO) -> None:
+        """Drop a file_id Telegram no longer accepts"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM file_ids WHERE media_key = ? AND variant = ?",
+                (media_key, variant)
+            )
+
+    def add_alias(self, url: str, media_key: str) -> None:
+        """Map a (canonical) URL to the media key it resolved to"""
+        if not url or not media_key:
+            return
+        try:
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO aliases (url, media_key, created_at) "
+                    "VALUES (?, ?, ?)",
+                    (canonicalize_url(url), media_key, time.time())
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Error saving alias for {url}: {e}")
+
+    def resolve_alias(self, url: str) -> Optional[str]:
+        """Return media key previously resolved for this URL"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT media_key FROM aliases WHERE url = ?",
+                (canonicalize_url(url),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def lookup_url(self, url: str, variant: str = VARIANT_VIDEO) -> Optional[Dict[str, Any]]:
+        """Find upload record for a URL without any network access"""
+        media_key = self.resolve_alias(url)
+        return self.get(media_key, variant) if media_key else None
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Registry size and reuse counters"""
+        with self._lock:
+            entries, hits = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM file_ids"
+            ).fetchone()
+            aliases = self._conn.execute("SELECT COUNT(*) FROM aliases").fetchone()[0]
+        return {'entries': entries, 'hits': hits, 'aliases': aliases}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def file_id_from_message(message) -> Optional[Dict[str, Any]]:
+    """Pick uploaded media object (video/animation/audio/document) from a sent message"""
+    if message is None:
+        return None
+    for attr in ('video', 'animation', 'audio', 'document'):
+        media = getattr(message, attr, None)
+        if media is not None:
+            return {
+                'file_id': media.file_id,
+                'file_unique_id': media.file_unique_id,
+                'file_size': media.file_size
+            }
+    return None
+
+# Global registry instance
+file_id_registry = FileIdRegistry()
@@ -6,6 +6,18 @@ from aiohttp import web
 from typing import Optional
 from datetime import datetime
 from ..services.monitoring import metrics
+from ..services.media_cache import media_cache
+from ..services.pipeline import pipeline
+from ..services.metadata_cache import metadata_cache
+from ..downloader import ydl_pool
+from ..ydl_workers import ydl_workers
+from ..services.host_tuner import host_tuner
+from ..services.download_journal import download_journal
+from ..services.fair_scheduler import fair_scheduler
+from ..services.transcode_scheduler import transcode_scheduler
+from ..services.transcode_jobs import transcode_jobs
+from ..services.edit_scheduler import edit_scheduler
+from ..services.circuit_breaker import circuit_breakers, STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN
 from ..config.config import config
 
 logger = logging.getLogger(__name__)
@@ -129,6 +141,262 @@ class HealthService:
                 '# TYPE bot_music_recognitions counter',
                 f'bot_music_recognitions {bot_stats["music_recognitions"]}'
             ])
+
+            # Add file_id reuse metrics
+            prometheus_metrics.extend([
+                '# TYPE bot_file_id_hits counter',
+                f'bot_file_id_hits {bot_stats["file_id_hits"]}'
+            ])
+
+            # Add media cache metrics
+            cache_stats = bot_stats["cache"]
+            cache_size = media_cache.get_statistics()
+            prometheus_metrics.extend([
+                '# TYPE bot_media_cache_hits counter',
+                f'bot_media_cache_hits {cache_stats["hits"]}',
+                '# TYPE bot_media_cache_misses counter',
+                f'bot_media_cache_misses {cache_stats["misses"]}',
+                '# TYPE bot_media_cache_bytes_saved counter',
+                f'bot_media_cache_bytes_saved {cache_stats["bytes_saved"]}',
+                '# TYPE bot_media_cache_evictions counter',
+                f'bot_media_cache_evictions {cache_stats["evictions"]}',
+                '# TYPE bot_media_cache_bytes gauge',
+                f'bot_media_cache_bytes {cache_size["size_bytes"]}',
+                '# TYPE bot_media_cache_entries gauge',
+                f'bot_media_cache_entries {cache_size["entries"]}'
+            ])
+            
+            # Add metadata cache metrics
+            meta_stats = bot_stats["metadata_cache"]
+            meta_lookups = meta_stats["hits"] + meta_stats["negative_hits"] + meta_stats["misses"]
+            meta_hit_rate = (
+                (meta_stats["hits"] + meta_stats["negative_hits"]) / meta_lookups
+                if meta_lookups else 0
+            )
+            prometheus_metrics.extend([
+                '# TYPE bot_metadata_cache_hits counter',
+                f'bot_metadata_cache_hits{{kind="positive"}} {meta_stats["hits"]}',
+                f'bot_metadata_cache_hits{{kind="negative"}} {meta_stats["negative_hits"]}',
+                '# TYPE bot_metadata_cache_misses counter',
+                f'bot_metadata_cache_misses {meta_stats["misses"]}',
+                '# TYPE bot_metadata_cache_hit_rate gauge',
+                f'bot_metadata_cache_hit_rate {meta_hit_rate:.4f}',
+                '# TYPE bot_metadata_cache_entries gauge',
+                f'bot_metadata_cache_entries {len(metadata_cache)}'
+            ])
+
+            # Add format selection metrics (fallback means transcoding is likely)
+            prometheus_metrics.extend([
+                '# TYPE bot_format_selections counter',
+                f'bot_format_selections{{result="fit"}} {bot_stats["format_selection"]["fit"]}',
+                f'bot_format_selections{{result="fallback"}} {bot_stats["format_selection"]["fallback"]}'
+            ])
+
+            # Add transcode mode metrics
+            prometheus_metrics.append('# TYPE bot_transcodes counter')
+            for mode, count in bot_stats['transcode_modes'].items():
+                prometheus_metrics.append(f'bot_transcodes{{mode="{mode}"}} {count}')
+
+            # Add size-targeted encoding metrics
+            size_encoding = bot_stats['size_encoding']
+            prometheus_metrics.append('# TYPE bot_size_encodes counter')
+            for mode, count in size_encoding['modes'].items():
+                prometheus_metrics.append(f'bot_size_encodes{{mode="{mode}"}} {count}')
+            prometheus_metrics.extend([
+                '# TYPE bot_size_corrective_passes counter',
+                f'bot_size_corrective_passes {size_encoding["corrective_passes"]}',
+                '# TYPE bot_size_target_misses counter',
+                f'bot_size_target_misses {size_encoding["target_misses"]}',
+                '# TYPE bot_segment_resumes counter',
+                f'bot_segment_resumes {size_encoding["segment_resumes"]}',
+                '# TYPE bot_segments_reused counter',
+                f'bot_segments_reused {size_encoding["segments_reused"]}',
+                '# TYPE bot_size_prediction_error gauge',
+                f'bot_size_prediction_error{{stat="avg"}} {size_encoding["prediction_error_avg"]:.4f}',
+                f'bot_size_prediction_error{{stat="max"}} {size_encoding["prediction_error_max"]:.4f}'
+            ])
+
+            # Add download mode and per-host tuning metrics
+            prometheus_metrics.append('# TYPE bot_downloads_by_mode counter')
+            for mode, count in bot_stats['download_modes'].items():
+                prometheus_metrics.append(f'bot_downloads_by_mode{{mode="{mode}"}} {count}')
+            host_stats = host_tuner.get_statistics()
+            if host_stats:
+                prometheus_metrics.extend([
+                    '# TYPE bot_host_connections gauge',
+                    '# TYPE bot_host_chunk_bytes gauge',
+                    '# TYPE bot_host_throughput_bytes gauge',
+                    '# TYPE bot_host_throttled counter'
+                ])
+                for host, stats in host_stats.items():
+                    prometheus_metrics.extend([
+                        f'bot_host_connections{{host="{host}"}} {stats["concurrency"]}',
+                        f'bot_host_chunk_bytes{{host="{host}"}} {stats["chunk_size"]}',
+                        f'bot_host_throughput_bytes{{host="{host}"}} {stats["avg_rate"]:.0f}',
+                        f'bot_host_throttled{{host="{host}"}} {stats["throttled"]}'
+                    ])
+
+            # Add per-domain circuit breaker metrics
+            breaker_stats = circuit_breakers.get_statistics()
+            if breaker_stats:
+                state_values = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+                prometheus_metrics.extend([
+                    '# TYPE bot_breaker_state gauge',
+                    '# TYPE bot_breaker_limit gauge',
+                    '# TYPE bot_breaker_latency_seconds gauge',
+                    '# TYPE bot_breaker_calls counter',
+                    '# TYPE bot_breaker_trips counter'
+                ])
+                for domain, stats in breaker_stats.items():
+                    prometheus_metrics.extend([
+                        f'bot_breaker_state{{domain="{domain}"}} {state_values[stats["state"]]}',
+                        f'bot_breaker_limit{{domain="{domain}"}} {stats["limit"]}',
+                        f'bot_breaker_latency_seconds{{domain="{domain}"}} {stats["latency"]:.3f}',
+                        f'bot_breaker_calls{{domain="{domain}",result="ok"}} {stats["successes"]}',
+                        f'bot_breaker_calls{{domain="{domain}",result="failure"}} {stats["failures"]}',
+                        f'bot_breaker_calls{{domain="{domain}",result="throttled"}} {stats["throttled"]}',
+                        f'bot_breaker_calls{{domain="{domain}",result="rejected"}} {stats["rejected"]}',
+                        f'bot_breaker_trips{{domain="{domain}"}} {stats["trips"]}'
+                    ])
+
+            # Add speculative metadata prefetch metrics
+            prometheus_metrics.append('# TYPE bot_metadata_prefetches counter')
+            for result, count in bot_stats['metadata_prefetches'].items():
+                prometheus_metrics.append(f'bot_metadata_prefetches{{result="{result}"}} {count}')
+
+            # Add media probe source metrics (ffprobe = subprocess spawned)
+            prometheus_metrics.append('# TYPE bot_media_probes counter')
+            for source, count in bot_stats['media_probes'].items():
+                prometheus_metrics.append(f'bot_media_probes{{source="{source}"}} {count}')
+
+            # Add ffmpeg/ffprobe subprocess metrics
+            processes = bot_stats['processes']
+            prometheus_metrics.append('# TYPE bot_process_runs counter')
+            for program, stats in processes.items():
+                for status, count in stats['runs'].items():
+                    prometheus_metrics.append(f'bot_process_runs{{program="{program}",status="{status}"}} {count}')
+            prometheus_metrics.append('# TYPE bot_process_cpu_seconds counter')
+            for program, stats in processes.items():
+                prometheus_metrics.append(f'bot_process_cpu_seconds{{program="{program}"}} {stats["cpu_seconds"]:.2f}')
+            prometheus_metrics.append('# TYPE bot_process_peak_rss_bytes gauge')
+            for program, stats in processes.items():
+                prometheus_metrics.append(f'bot_process_peak_rss_bytes{{program="{program}"}} {stats["peak_rss_bytes"]}')
+
+            # Add status edit scheduler metrics
+            prometheus_metrics.append('# TYPE bot_status_edits counter')
+            for result, count in bot_stats['status_edits'].items():
+                prometheus_metrics.append(f'bot_status_edits{{result="{result}"}} {count}')
+            prometheus_metrics.extend([
+                '# TYPE bot_status_edits_pending gauge',
+                f'bot_status_edits_pending {edit_scheduler.get_statistics()["pending"]}'
+            ])
+
+            # Add fair scheduler metrics
+            scheduler_stats = fair_scheduler.get_statistics()
+            prometheus_metrics.extend([
+                '# TYPE bot_scheduler_slots gauge',
+                f'bot_scheduler_slots{{state="limit"}} {scheduler_stats["limit"]}',
+                f'bot_scheduler_slots{{state="active"}} {scheduler_stats["active"]}',
+                '# TYPE bot_scheduler_waiting gauge',
+                f'bot_scheduler_waiting{{kind="jobs"}} {scheduler_stats["waiting"]}',
+                f'bot_scheduler_waiting{{kind="users"}} {scheduler_stats["users_waiting"]}'
+            ])
+
+            # Add transcode CPU budget and per-preset metrics
+            transcode_stats = transcode_scheduler.get_statistics()
+            prometheus_metrics.extend([
+                '# TYPE bot_transcode_threads gauge',
+                f'bot_transcode_threads{{state="budget"}} {transcode_stats["budget"]}',
+                f'bot_transcode_threads{{state="in_use"}} {transcode_stats["threads_in_use"]}',
+                '# TYPE bot_transcode_encoders gauge',
+                f'bot_transcode_encoders{{state="limit"}} {transcode_stats["max_encoders"]}',
+                f'bot_transcode_encoders{{state="active"}} {transcode_stats["active"]}',
+                f'bot_transcode_encoders{{state="waiting"}} {transcode_stats["waiting"]}'
+            ])
+            prometheus_metrics.extend([
+                '# TYPE bot_transcode_jobs gauge',
+                f'bot_transcode_jobs {transcode_jobs.get_statistics()["active"]}',
+                '# TYPE bot_transcode_aborts counter'
+            ])
+            for kind, count in bot_stats['transcode_aborts'].items():
+                prometheus_metrics.append(f'bot_transcode_aborts{{kind="{kind}"}} {count}')
+            presets = bot_stats['transcode_presets']
+            for name, kind, key in (
+                ('bot_transcode_preset_encodes', 'counter', 'encodes'),
+                ('bot_transcode_preset_media_seconds', 'counter', 'media_seconds'),
+                ('bot_transcode_preset_wall_seconds', 'counter', 'wall_seconds'),
+                ('bot_transcode_preset_wait_seconds', 'counter', 'wait_seconds'),
+                ('bot_transcode_preset_speed', 'gauge', 'speed')
+            ):
+                prometheus_metrics.append(f'# TYPE {name} {kind}')
+                for preset, stats in presets.items():
+                    prometheus_metrics.append(f'{name}{{preset="{preset}"}} {stats[key]:.2f}')
+
+            # Add resumable download metrics
+            partial_stats = download_journal.get_statistics()
+            prometheus_metrics.extend([
+                '# TYPE bot_partial_downloads gauge',
+                f'bot_partial_downloads{{state="active"}} {partial_stats["active"]}',
+                f'bot_partial_downloads{{state="pending"}} {partial_stats["pending"]}',
+                '# TYPE bot_partial_bytes gauge',
+                f'bot_partial_bytes {partial_stats["bytes"]}'
+            ])
+
+            # Add YoutubeDL pool metrics
+            prometheus_metrics.extend([
+                '# TYPE bot_ydl_checkouts counter',
+                f'bot_ydl_checkouts{{kind="warm"}} {bot_stats["ydl_checkouts"]["warm"]}',
+                f'bot_ydl_checkouts{{kind="cold"}} {bot_stats["ydl_checkouts"]["cold"]}',
+                '# TYPE bot_ydl_pool_instances gauge'
+            ])
+            for profile, pool_stats in ydl_pool.get_statistics().items():
+                prometheus_metrics.extend([
+                    f'bot_ydl_pool_instances{{profile="{profile}",state="created"}} {pool_stats["created"]}',
+                    f'bot_ydl_pool_instances{{profile="{profile}",state="idle"}} {pool_stats["idle"]}'
+                ])
+
+            # Add yt-dlp worker process metrics
+            if ydl_workers.enabled:
+                worker_stats = ydl_workers.get_statistics()
+                prometheus_metrics.extend([
+                    '# TYPE bot_ydl_workers gauge',
+                    f'bot_ydl_workers{{state="busy"}} {worker_stats["busy"]}',
+                    f'bot_ydl_workers{{state="idle"}} {worker_stats["idle"]}',
+                    '# TYPE bot_ydl_worker_crashes counter',
+                    f'bot_ydl_worker_crashes {worker_stats["crashes"]}',
+                    '# TYPE bot_ydl_worker_cancelled counter',
+                    f'bot_ydl_worker_cancelled {worker_stats["cancelled"]}'
+                ])
+
+            # Add request coalescing metrics
+            prometheus_metrics.append('# TYPE bot_coalesced_requests counter')
+            for flight, count in bot_stats["coalesced_requests"].items():
+                prometheus_metrics.append(f'bot_coalesced_requests{{flight="{flight}"}} {count}')
+            
+            # Add pipeline stage metrics
+            prometheus_metrics.extend([
+                '# TYPE bot_stage_runs_total counter',
+                '# TYPE bot_stage_seconds_total counter',
+                '# TYPE bot_stage_seconds_max gauge'
+            ])
+            for stage, timing in bot_stats["stage_timings"].items():
+                prometheus_metrics.extend([
+                    f'bot_stage_runs_total{{stage="{stage}"}} {timing["count"]}',
+                    f'bot_stage_seconds_total{{stage="{stage}"}} {timing["total_seconds"]:.3f}',
+                    f'bot_stage_seconds_max{{stage="{stage}"}} {timing["max_seconds"]:.3f}'
+                ])
+
+            prometheus_metrics.extend([
+                '# TYPE bot_pipeline_limit gauge',
+                '# TYPE bot_pipeline_active gauge',
+                '# TYPE bot_pipeline_waiting gauge'
+            ])
+            for stage, pool in pipeline.get_statistics().items():
+                prometheus_metrics.extend([
+                    f'bot_pipeline_limit{{stage="{stage}"}} {pool["limit"]}',
+                    f'bot_pipeline_active{{stage="{stage}"}} {pool["active"]}',
+                    f'bot_pipeline_waiting{{stage="{stage}"}} {pool["waiting"]}'
+                ])
             
             # Add system metrics
             system_stats = bot_stats.get("system", {})
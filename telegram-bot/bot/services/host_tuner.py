@@ -0,0 +1,163 @@
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+from urllib.parse import urlparse
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, Optional, Tuple
+from ..config.config import config
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Tuning bounds
+MIN_CHUNK_SIZE = 1 * MB
+MAX_CHUNK_SIZE = 32 * MB
+INITIAL_CHUNK_SIZE = 4 * MB
+INITIAL_CONCURRENCY = 2
+
+# Samples smaller than this say more about latency than throughput
+MIN_SAMPLE_BYTES = 2 * MB
+# Throughput must grow at least this much to keep adding connections
+GAIN_THRESHOLD = 0.1
+# No increases for this long after a 429/403
+THROTTLE_COOLDOWN = 600
+# Weight of the newest sample in the per-level moving average
+EWMA_WEIGHT = 0.5
+
+def host_key(url: str) -> Optional[str]:
+    """Group CDN nodes of one site: rr3---sn-x.googlevideo.com -> googlevideo.com"""
+    hostname = urlparse(url).hostname
+    if not hostname:
+        return None
+    labels = hostname.split('.')
+    if len(labels) > 2 and not hostname.replace('.', '').isdigit():
+        return '.'.join(labels[-2:])
+    return hostname
+
+@dataclass
+class HostStats:
+    """Throughput history and current settings of one host"""
+    concurrency: int = INITIAL_CONCURRENCY
+    chunk_size: int = INITIAL_CHUNK_SIZE
+    downloads: int = 0
+    total_bytes: int = 0
+    total_seconds: float = 0.0
+    throttled: int = 0
+    cooldown_until: float = 0.0
+    # Moving average of bytes/s per concurrency level (keys are str for JSON)
+    rates: Dict[str, float] = field(default_factory=dict)
+
+    def rate(self, level: int) -> Optional[float]:
+        return self.rates.get(str(level))
+
+class HostThroughputTuner:
+    """Per-host download concurrency and chunk size from measured throughput
+
+    Connections are added one at a time while throughput keeps growing;
+    when it stops growing the best measured level is kept. A 429/403 halves
+    both settings and blocks increases for a while (AIMD).
+    """
+
+    def __init__(self, max_concurrency: int = None, persist_path: Optional[str] = None):
+        self.max_concurrency = max_concurrency or config.download_max_connections
+        self.persist_path = Path(persist_path) if persist_path else None
+        self.hosts: Dict[str, HostStats] = {}
+        self._lock = threading.Lock()
+        if self.persist_path:
+            self.load()
+
+    def _stats(self, host: str) -> HostStats:
+        if host not in self.hosts:
+            self.hosts[host] = HostStats(concurrency=min(INITIAL_CONCURRENCY, self.max_concurrency))
+        return self.hosts[host]
+
+    def settings(self, host: str) -> Tuple[int, int]:
+        """(concurrency, chunk_size) to use for the next download from host"""
+        with self._lock:
+            stats = self._stats(host)
+            return min(stats.concurrency, self.max_concurrency), stats.chunk_size
+
+    def record(self, host: str, nbytes: int, seconds: float, concurrency: int) -> None:
+        """Record a finished download made with the given concurrency"""
+        if seconds <= 0:
+            return
+        with self._lock:
+            stats = self._stats(host)
+            stats.downloads += 1
+            stats.total_bytes += nbytes
+            stats.total_seconds += seconds
+            if nbytes < MIN_SAMPLE_BYTES:
+                return
+
+            rate = nbytes / seconds
+            previous = stats.rate(concurrency)
+            stats.rates[str(concurrency)] = (
+                rate if previous is None else EWMA_WEIGHT * rate + (1 - EWMA_WEIGHT) * previous
+            )
+            if concurrency != stats.concurrency or time.time() < stats.cooldown_until:
+                return
+
+            lower = stats.rate(concurrency - 1)
+            current = stats.rates[str(concurrency)]
+            if lower is None or current > lower * (1 + GAIN_THRESHOLD):
+                # Hali o'sayapti - yana bitta ulanish qo'shamiz
+                if concurrency < self.max_concurrency:
+                    stats.concurrency = concurrency + 1
+                stats.chunk_size = min(stats.chunk_size * 2, MAX_CHUNK_SIZE)
+            else:
+                # Plateau: keep the best level measured so far
+                stats.concurrency = int(max(stats.rates, key=stats.rates.get))
+
+    def record_throttle(self, host: str) -> None:
+        """Host answered 429/403: back off multiplicatively"""
+        with self._lock:
+            stats = self._stats(host)
+            stats.throttled += 1
+            stats.concurrency = max(1, stats.concurrency // 2)
+            stats.chunk_size = max(MIN_CHUNK_SIZE, stats.chunk_size // 2)
+            stats.cooldown_until = time.time() + THROTTLE_COOLDOWN
+            # Old measurements were made before the host started limiting us
+            stats.rates = {
+                level: rate for level, rate in stats.rates.items()
+                if int(level) <= stats.concurrency
+            }
+        logger.warning(f"Host {host} throttled downloads, concurrency -> {stats.concurrency}")
+
+    def get_statistics(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                host: {
+                    'concurrency': stats.concurrency,
+                    'chunk_size': stats.chunk_size,
+                    'downloads': stats.downloads,
+                    'throttled': stats.throttled,
+                    'avg_rate': stats.total_bytes / stats.total_seconds if stats.total_seconds else 0.0,
+                    'rates': {int(level): rate for level, rate in stats.rates.items()}
+                }
+                for host, stats in self.hosts.items()
+            }
+
+    def save(self) -> None:
+        if not self.persist_path:
+            return
+        with self._lock:
+            data = {host: asdict(stats) for host, stats in self.hosts.items()}
+        try:
+            self.persist_path.write_text(json.dumps(data))
+        except OSError as e:
+            logger.error(f"Error saving host throughput stats: {e}")
+
+    def load(self) -> None:
+        if not self.persist_path or not self.persist_path.exists():
+            return
+        try:
+            data = json.loads(self.persist_path.read_text())
+            self.hosts = {host: HostStats(**stats) for host, stats in data.items()}
+        except (OSError, ValueError, TypeError) as e:
+            logger.error(f"Error loading host throughput stats: {e}")
+
+# Global tuner instance
+host_tuner = HostThroughputTuner(persist_path=str(Path(config.data_dir) / "host_tuner.json"))
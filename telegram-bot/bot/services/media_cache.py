@@ -0,0 +1,310 @@
+import os
+import re
+import json
+import time
+import shutil
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+from ..config.config import config
+from ..services.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+# On-disk variants
+VARIANT_ORIGINAL = "original"
+VARIANT_COMPRESSED = "compressed"
+
+# Order in which a delivered video is looked up
+DELIVERY_VARIANTS = (VARIANT_COMPRESSED, VARIANT_ORIGINAL)
+
+EVICTION_POLICIES = ("lru", "lfu")
+
+class MediaCache:
+    """Byte-budgeted content cache for downloaded media
+
+    Files are stored under downloads_dir/cache and indexed in SQLite by
+    media key (extractor:id) and variant. When the cache grows past the
+    high watermark, entries are evicted by access (LRU, or LFU with LRU as
+    a tie breaker) until it drops below the low watermark.
+
+    An entry can be leased while its file is in use (e.g. until the upload
+    finishes); eviction skips leased entries until every lease is released.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = None,
+        index_path: str = None,
+        max_size_mb: int = None,
+        high_watermark: int = None,
+        low_watermark: int = None,
+        policy: str = None
+    ):
+        self.cache_dir = Path(cache_dir or Path(config.downloads_dir) / "cache")
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = Path(index_path or Path(config.data_dir) / "media_cache.sqlite3")
+        self.max_bytes = (max_size_mb or config.media_cache_max_mb) * 1024 * 1024
+        self.high_watermark = (high_watermark or config.media_cache_high_watermark) / 100
+        self.low_watermark = (low_watermark or config.media_cache_low_watermark) / 100
+        self.policy = policy or config.media_cache_policy
+        if self.policy not in EVICTION_POLICIES:
+            raise ValueError(f"Unknown cache eviction policy: {self.policy}")
+
+        self._lock = threading.Lock()
+        self._leases: Dict[Tuple[str, str], int] = {}
+        self._conn = sqlite3.connect(str(self.index_path), check_same_thread=False)
+        self._init_schema()
+        self.sync()
+
+    def _init_schema(self):
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    media_key TEXT NOT NULL,
+                    variant TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    meta TEXT,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (media_key, variant)
+                )
+            """)
+
+    def _entry_path(self, media_key: str, variant: str, suffix: str) -> Path:
+        safe_key = re.sub(r'[^A-Za-z0-9_.-]', '_', media_key)
+        return self.cache_dir / f"{safe_key}.{variant}{suffix}"
+
+    def get(self, media_key: str, variant: str, lease: bool = False) -> Optional[Dict[str, Any]]:
+        """Return cached entry and record the access
+
+        With lease=True the entry is leased as well: entry['lease'] must be
+        passed to release() once the file is no longer needed.
+        """
+        if not media_key:
+            return None
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT path, size, meta FROM entries WHERE media_key = ? AND variant = ?",
+                (media_key, variant)
+            ).fetchone()
+            if not row:
+                return None
+            if not os.path.exists(row[0]):
+                self._conn.execute(
+                    "DELETE FROM entries WHERE media_key = ? AND variant = ?",
+                    (media_key, variant)
+                )
+                return None
+            self._conn.execute(
+                "UPDATE entries SET hits = hits + 1, last_access = ? "
+                "WHERE media_key = ? AND variant = ?",
+                (time.time(), media_key, variant)
+            )
+            if lease:
+                self._leases[(media_key, variant)] = self._leases.get((media_key, variant), 0) + 1
+
+        return {
+            'media_key': media_key,
+            'variant': variant,
+            'path': row[0],
+            'size': row[1],
+            'meta': json.loads(row[2]) if row[2] else {},
+            'lease': (media_key, variant) if lease else None
+        }
+
+    def lookup(
+        self,
+        media_key: Optional[str],
+        variants: Iterable[str] = DELIVERY_VARIANTS,
+        lease: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """Find first cached variant and count hit/miss"""
+        for variant in variants:
+            entry = self.get(media_key, variant, lease=lease)
+            if entry:
+                metrics.track_cache_hit(entry['size'])
+                return entry
+        metrics.track_cache_miss()
+        return None
+
+    def put(
+        self,
+        media_key: str,
+        variant: str,
+        source_path: str,
+        meta: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Move a file into the cache and return its new path"""
+        if not media_key or not source_path or not os.path.exists(source_path):
+            return source_path
+
+        target = self._entry_path(media_key, variant, Path(source_path).suffix)
+        try:
+            if Path(source_path).resolve() != target.resolve():
+                shutil.move(source_path, target)
+            size = target.stat().st_size
+            now = time.time()
+            with self._lock, self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries "
+                    "(media_key, variant, path, size, meta, created_at, last_access, hits) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                    (media_key, variant, str(target), size, json.dumps(meta or {}), now, now)
+                )
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Error caching {source_path}: {e}")
+            metrics.track_error(type(e).__name__)
+            return source_path if os.path.exists(source_path) else str(target)
+
+        if self.total_bytes() > self.max_bytes * self.high_watermark:
+            self.evict(protect=(media_key, variant))
+        return str(target)
+
+    def acquire(self, media_key: str, variant: str) -> Optional[Tuple[str, str]]:
+        """Lease an entry so eviction keeps it; None if it is not cached"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM entries WHERE media_key = ? AND variant = ?",
+                (media_key, variant)
+            ).fetchone()
+            if not row:
+                return None
+            self._leases[(media_key, variant)] = self._leases.get((media_key, variant), 0) + 1
+        return media_key, variant
+
+    def release(self, lease: Optional[Tuple[str, str]]) -> None:
+        """Give back a lease from get()/lookup()/acquire(); None is ignored"""
+        if not lease:
+            return
+        with self._lock:
+            count = self._leases.get(lease, 0) - 1
+            if count > 0:
+                self._leases[lease] = count
+            else:
+                self._leases.pop(lease, None)
+
+    def remove(self, media_key: str, variant: str, skip_leased: bool = False) -> bool:
+        """Drop a single entry
+
+        With skip_leased=True a leased entry is kept and False is returned.
+        """
+        with self._lock, self._conn:
+            if skip_leased and self._leases.get((media_key, variant)):
+                return False
+            row = self._conn.execute(
+                "SELECT path FROM entries WHERE media_key = ? AND variant = ?",
+                (media_key, variant)
+            ).fetchone()
+            self._conn.execute(
+                "DELETE FROM entries WHERE media_key = ? AND variant = ?",
+                (media_key, variant)
+            )
+        if row and os.path.exists(row[0]):
+            os.remove(row[0])
+        return True
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def evict(
+        self,
+        target_bytes: Optional[int] = None,
+        protect: Optional[Tuple[str, str]] = None
+    ) -> Tuple[int, int]:
+        """Evict entries until cache size is at or below target_bytes
+
+        Defaults to the low watermark. Leased entries and the protected
+        (media_key, variant) entry - usually the one just added - are
+        never evicted.
+        Returns (evicted_count, evicted_bytes).
+        """
+        if target_bytes is None:
+            target_bytes = int(self.max_bytes * self.low_watermark)
+
+        order = "last_access ASC" if self.policy == "lru" else "hits ASC, last_access ASC"
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT media_key, variant, path, size FROM entries ORDER BY {order}"
+            ).fetchall()
+
+        total = sum(row[3] for row in rows)
+        evicted_count = 0
+        evicted_bytes = 0
+        for media_key, variant, path, size in rows:
+            if total <= target_bytes:
+                break
+            if (media_key, variant) == protect:
+                continue
+            try:
+                if not self.remove(media_key, variant, skip_leased=True):
+                    continue
+            except OSError as e:
+                logger.error(f"Error evicting {path}: {e}")
+                continue
+            total -= size
+            evicted_count += 1
+            evicted_bytes += size
+
+        if evicted_count:
+            metrics.track_cache_eviction(evicted_count)
+            logger.info(
+                f"Media cache evicted {evicted_count} files "
+                f"({evicted_bytes/1024/1024:.1f}MB)"
+            )
+        return evicted_count, evicted_bytes
+
+    def enforce_budget(self) -> Tuple[int, int]:
+        """Evict down to the low watermark if above the high watermark"""
+        if self.total_bytes() > self.max_bytes * self.high_watermark:
+            return self.evict()
+        return 0, 0
+
+    def sync(self) -> None:
+        """Reconcile index with files on disk"""
+        try:
+            with self._lock, self._conn:
+                rows = self._conn.execute("SELECT media_key, variant, path FROM entries").fetchall()
+                known = set()
+                for media_key, variant, path in rows:
+                    if os.path.exists(path):
+                        known.add(Path(path).name)
+                    else:
+                        self._conn.execute(
+                            "DELETE FROM entries WHERE media_key = ? AND variant = ?",
+                            (media_key, variant)
+                        )
+
+            # Indeksda yo'q fayllar - ularni hech kim qayta ishlata olmaydi
+            for file in self.cache_dir.iterdir():
+                if file.is_file() and file.name not in known:
+                    file.unlink()
+        except (OSError, sqlite3.Error) as e:
+            logger.error(f"Error syncing media cache: {e}")
+            metrics.track_error(type(e).__name__)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Cache occupancy"""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            leased = len(self._leases)
+        return {
+            'entries': entries,
+            'leased': leased,
+            'size_bytes': size,
+            'max_bytes': self.max_bytes
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# Global cache instance
+media_cache = MediaCache()
@@ -0,0 +1,141 @@
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from ..config.config import config
+from ..services.monitoring import metrics
+from ..utils import canonicalize_url
+
+logger = logging.getLogger(__name__)
+
+# Fields kept from a yt-dlp info dict. Stream URLs are dropped on purpose:
+# they expire quickly and are useless after a restart.
+INFO_FIELDS = (
+    'id', 'extractor', 'extractor_key', 'title', 'uploader', 'duration',
+    'webpage_url', 'width', 'height', 'fps', 'ext', 'vcodec', 'acodec',
+    'filesize', 'filesize_approx', 'tbr', 'format_id', 'is_live',
+)
+FORMAT_FIELDS = (
+    'format_id', 'ext', 'vcodec', 'acodec', 'width', 'height', 'fps',
+    'tbr', 'vbr', 'abr', 'filesize', 'filesize_approx', 'protocol', 'container',
+    'has_drm',
+)
+
+ENTRY_INFO = "info"
+ENTRY_ERROR = "error"
+
+def slim_info(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce yt-dlp info dict to what admission and format choice need"""
+    slim = {key: info[key] for key in INFO_FIELDS if info.get(key) is not None}
+    for list_key in ('formats', 'requested_formats'):
+        if info.get(list_key):
+            slim[list_key] = [
+                {key: fmt[key] for key in FORMAT_FIELDS if fmt.get(key) is not None}
+                for fmt in info[list_key]
+            ]
+    slim['_slim'] = True
+    return slim
+
+class MetadataCache:
+    """In-memory TTL cache of extraction results keyed by canonical URL
+
+    Successful extractions are stored as slimmed info dicts. Permanent-looking
+    failures (private, age-restricted, unavailable) are cached for a shorter
+    time so that repeated retries fail fast without hitting the platform.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = None,
+        positive_ttl: int = None,
+        negative_ttl: int = None,
+        persist_path: Optional[str] = None
+    ):
+        self.max_entries = max_entries or config.metadata_cache_max_entries
+        self.positive_ttl = positive_ttl or config.metadata_cache_ttl
+        self.negative_ttl = negative_ttl or config.metadata_cache_negative_ttl
+        self.persist_path = Path(persist_path) if persist_path else None
+        self._entries: "OrderedDict[str, Tuple[float, str, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        if self.persist_path:
+            self.load()
+
+    def get(self, url: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Return (kind, payload) for a fresh entry, or None"""
+        key = canonicalize_url(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] < time.time():
+                del self._entries[key]
+                entry = None
+            if not entry:
+                metrics.track_metadata_cache_miss()
+                return None
+            self._entries.move_to_end(key)
+
+        metrics.track_metadata_cache_hit(negative=entry[1] == ENTRY_ERROR)
+        return entry[1], entry[2]
+
+    def put_info(self, url: str, info: Dict[str, Any]) -> None:
+        """Cache a successful extraction"""
+        self._put(url, ENTRY_INFO, slim_info(info), self.positive_ttl)
+
+    def put_error(self, url: str, category: str, message: str) -> None:
+        """Cache a categorized extraction failure"""
+        self._put(url, ENTRY_ERROR, {'category': category, 'message': message}, self.negative_ttl)
+
+    def _put(self, url: str, kind: str, payload: Dict[str, Any], ttl: int) -> None:
+        key = canonicalize_url(url)
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, kind, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, url: str) -> None:
+        with self._lock:
+            self._entries.pop(canonicalize_url(url), None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def save(self) -> None:
+        """Write unexpired entries to persist_path"""
+        if not self.persist_path:
+            return
+        now = time.time()
+        with self._lock:
+            data = [[key, *entry] for key, entry in self._entries.items() if entry[0] > now]
+        try:
+            tmp_path = self.persist_path.with_suffix('.tmp')
+            tmp_path.write_text(json.dumps(data))
+            tmp_path.replace(self.persist_path)
+        except OSError as e:
+            logger.error(f"Error saving metadata cache: {e}")
+
+    def load(self) -> None:
+        """Read entries saved by a previous process"""
+        if not self.persist_path or not self.persist_path.exists():
+            return
+        try:
+            data = json.loads(self.persist_path.read_text())
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading metadata cache: {e}")
+            return
+        now = time.time()
+        with self._lock:
+            for key, expires_at, kind, payload in data[-self.max_entries:]:
+                if expires_at > now:
+                    self._entries[key] = (expires_at, kind, payload)
+        logger.info(f"Loaded {len(self._entries)} metadata cache entries")
+
+# Global metadata cache instance
+metadata_cache = MetadataCache(
+    persist_path=(
+        str(Path(config.data_dir) / "metadata_cache.json")
+        if config.metadata_cache_persist else None
+    )
+)
@@ -24,6 +24,37 @@ class MetricsCollector:
     recent_downloads: list = field(default_factory=list)
     audio_extractions: int = 0
     music_recognitions: int = 0
+    file_id_hits: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    cache_bytes_saved: int = 0
+    cache_evictions: int = 0
+    coalesced_requests: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    stage_timings: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    metadata_cache_hits: int = 0
+    metadata_cache_negative_hits: int = 0
+    metadata_cache_misses: int = 0
+    ydl_warm_checkouts: int = 0
+    format_fit_selections: int = 0
+    transcode_modes: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    download_modes: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    breaker_trips: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    status_edits: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    metadata_prefetches: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    media_probes: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    size_encodes: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    size_predictions: int = 0
+    size_prediction_error_total: float = 0.0
+    size_prediction_error_max: float = 0.0
+    size_corrective_passes: int = 0
+    size_target_misses: int = 0
+    segment_resumes: int = 0
+    segments_reused: int = 0
+    format_fallback_selections: int = 0
+    ydl_cold_checkouts: int = 0
+    processes: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    transcode_presets: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    transcode_aborts: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
 
     def track_download(self, url: str, duration: float) -> None:
         """Video yuklab olish vaqtini kuzatish"""
@@ -35,6 +66,11 @@ class MetricsCollector:
         self.recent_downloads = [t for t in self.recent_downloads 
                                if current_time - t < 24 * 3600]
 
+    def track_download_attempt(self, url: str) -> None:
+        """Yuklab olish urinishini qayd qilish"""
+        self.total_downloads += 1
+        self.recent_downloads.append(time.time())
+
     def track_successful_download(self, url: str) -> None:
         """Muvaffaqiyatli yuklab olishni qayd qilish"""
         self.successful_downloads += 1
@@ -56,6 +92,138 @@ class MetricsCollector:
         """Musiqa aniqlash muvaffaqiyatini kuzatish"""
         self.music_recognitions += 1
 
+    def track_file_id_hit(self) -> None:
+        """Saqlangan file_id orqali qayta yuborishni kuzatish"""
+        self.file_id_hits += 1
+
+    def track_cache_hit(self, size: int) -> None:
+        """Keshdan foydalanishni kuzatish (tejalgan baytlar bilan)"""
+        self.cache_hits += 1
+        self.cache_bytes_saved += size
+
+    def track_cache_miss(self) -> None:
+        """Keshda topilmagan so'rovni kuzatish"""
+        self.cache_misses += 1
+
+    def track_cache_eviction(self, count: int = 1) -> None:
+        """Keshdan chiqarilgan fayllarni kuzatish"""
+        self.cache_evictions += count
+
+    def track_coalesced_request(self, flight: str) -> None:
+        """Boshqa so'rov natijasini kutib olgan so'rovlarni kuzatish"""
+        self.coalesced_requests[flight] += 1
+
+    def track_stage_time(self, stage: str, duration: float) -> None:
+        """Pipeline bosqichi bajarilish vaqtini kuzatish"""
+        timing = self.stage_timings.setdefault(
+            stage, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+        )
+        timing['count'] += 1
+        timing['total_seconds'] += duration
+        timing['max_seconds'] = max(timing['max_seconds'], duration)
+
+    def track_metadata_cache_hit(self, negative: bool = False) -> None:
+        """Metadata keshidan foydalanishni kuzatish"""
+        if negative:
+            self.metadata_cache_negative_hits += 1
+        else:
+            self.metadata_cache_hits += 1
+
+    def track_metadata_cache_miss(self) -> None:
+        """Metadata keshida topilmagan so'rovni kuzatish"""
+        self.metadata_cache_misses += 1
+
+    def track_ydl_checkout(self, warm: bool) -> None:
+        """YoutubeDL nusxasi tayyor (warm) yoki yangi (cold) olinganini kuzatish"""
+        if warm:
+            self.ydl_warm_checkouts += 1
+        else:
+            self.ydl_cold_checkouts += 1
+
+    def track_format_selection(self, fitted: bool) -> None:
+        """Yuklashdan oldin limitga sig'adigan format topilganini kuzatish"""
+        if fitted:
+            self.format_fit_selections += 1
+        else:
+            self.format_fallback_selections += 1
+
+    def track_transcode_mode(self, mode: str) -> None:
+        """Siqish usulini kuzatish (streamed, stream_fallback, file)"""
+        self.transcode_modes[mode] += 1
+
+    def track_download_mode(self, mode: str) -> None:
+        """Yuklab olish usulini kuzatish (range, fragments, sequential)"""
+        self.download_modes[mode] += 1
+
+    def track_breaker_trip(self, domain: str) -> None:
+        """Domen uchun circuit breaker ochilganini kuzatish"""
+        self.breaker_trips[domain] += 1
+
+    def track_status_edit(self, result: str) -> None:
+        """Holat xabari tahririni kuzatish (sent, coalesced, skipped, retry_after)"""
+        self.status_edits[result] += 1
+
+    def track_metadata_prefetch(self, result: str) -> None:
+        """Oldindan boshlangan metadata olishni kuzatish (started, used)"""
+        self.metadata_prefetches[result] += 1
+
+    def track_size_prediction(self, predicted: int, actual: int) -> None:
+        """Namuna asosidagi hajm bashoratining nisbiy xatosini kuzatish"""
+        error = abs(predicted - actual) / actual if actual else 0.0
+        self.size_predictions += 1
+        self.size_prediction_error_total += error
+        self.size_prediction_error_max = max(self.size_prediction_error_max, error)
+
+    def track_size_encode(self, mode: str, corrected: bool, fits: bool) -> None:
+        """Hajmga mo'ljallangan siqishni kuzatish (crf, two_pass; tuzatish o'tishi)"""
+        self.size_encodes[mode] += 1
+        if corrected:
+            self.size_corrective_passes += 1
+        if not fits:
+            self.size_target_misses += 1
+
+    def track_segment_resume(self, segments: int) -> None:
+        """Uzilib qolgan segmentli siqish tayyor segmentlardan davom etganini kuzatish"""
+        self.segment_resumes += 1
+        self.segments_reused += segments
+
+    def track_media_probe(self, source: str) -> None:
+        """Fayl ma'lumoti qayerdan olinganini kuzatish (cache, ytdlp, mp4, ffprobe)"""
+        self.media_probes[source] += 1
+
+    def track_process(self, program: str, status: str, cpu_seconds: float, peak_rss: int) -> None:
+        """ffmpeg/ffprobe jarayoni natijasi va resurs sarfini kuzatish (ok, failed, timeout, cancelled)"""
+        stats = self.processes.setdefault(
+            program, {'runs': defaultdict(int), 'cpu_seconds': 0.0, 'peak_rss_bytes': 0}
+        )
+        stats['runs'][status] += 1
+        stats['cpu_seconds'] += cpu_seconds
+        stats['peak_rss_bytes'] = max(stats['peak_rss_bytes'], peak_rss)
+
+    def track_transcode_preset(
+        self,
+        preset: str,
+        threads: int,
+        media_seconds: float,
+        wall_seconds: float,
+        wait_seconds: float
+    ) -> None:
+        """x264 preseti bo'yicha tezlik va kechikishni kuzatish (siyosatni sozlash uchun)"""
+        stats = self.transcode_presets.setdefault(preset, {
+            'encodes': 0, 'thread_seconds': 0.0, 'media_seconds': 0.0,
+            'wall_seconds': 0.0, 'wait_seconds': 0.0, 'max_wall_seconds': 0.0
+        })
+        stats['encodes'] += 1
+        stats['thread_seconds'] += threads * wall_seconds
+        stats['media_seconds'] += media_seconds
+        stats['wall_seconds'] += wall_seconds
+        stats['wait_seconds'] += wait_seconds
+        stats['max_wall_seconds'] = max(stats['max_wall_seconds'], wall_seconds)
+
+    def track_transcode_abort(self, kind: str) -> None:
+        """Hajmga sig'masligi oldindan ko'ringan va to'xtatilgan siqishni kuzatish"""
+        self.transcode_aborts[kind] += 1
+
     def get_statistics(self) -> Dict[str, Any]:
         """Bot ishlashi haqida statistika"""
         uptime = (datetime.now() - self.start_time).total_seconds()
@@ -96,9 +264,66 @@ class MetricsCollector:
             "average_download_time": avg_download_time,
             "error_distribution": dict(self.error_counts),
             "commands": dict(self.commands),
+            "coalesced_requests": dict(self.coalesced_requests),
+            "metadata_cache": {
+                "hits": self.metadata_cache_hits,
+                "negative_hits": self.metadata_cache_negative_hits,
+                "misses": self.metadata_cache_misses
+            },
+            "format_selection": {
+                "fit": self.format_fit_selections,
+                "fallback": self.format_fallback_selections
+            },
+            "transcode_modes": dict(self.transcode_modes),
+            "size_encoding": {
+                "modes": dict(self.size_encodes),
+                "predictions": self.size_predictions,
+                "prediction_error_avg": (
+                    self.size_prediction_error_total / self.size_predictions
+                    if self.size_predictions else 0.0
+                ),
+                "prediction_error_max": self.size_prediction_error_max,
+                "corrective_passes": self.size_corrective_passes,
+                "target_misses": self.size_target_misses,
+                "segment_resumes": self.segment_resumes,
+                "segments_reused": self.segments_reused
+            },
+            "download_modes": dict(self.download_modes),
+            "breaker_trips": dict(self.breaker_trips),
+            "status_edits": dict(self.status_edits),
+            "metadata_prefetches": dict(self.metadata_prefetches),
+            "media_probes": dict(self.media_probes),
+            "transcode_presets": {
+                preset: dict(
+                    stats,
+                    speed=stats['media_seconds'] / stats['wall_seconds'] if stats['wall_seconds'] else 0.0
+                )
+                for preset, stats in self.transcode_presets.items()
+            },
+            "transcode_aborts": dict(self.transcode_aborts),
+            "processes": {
+                program: {
+                    "runs": dict(stats['runs']),
+                    "cpu_seconds": stats['cpu_seconds'],
+                    "peak_rss_bytes": stats['peak_rss_bytes']
+                }
+                for program, stats in self.processes.items()
+            },
+            "ydl_checkouts": {
+                "warm": self.ydl_warm_checkouts,
+                "cold": self.ydl_cold_checkouts
+            },
+            "stage_timings": {k: dict(v) for k, v in self.stage_timings.items()},
             "last_24h": last_24h,
             "audio_extractions": self.audio_extractions,
             "music_recognitions": self.music_recognitions,
+            "file_id_hits": self.file_id_hits,
+            "cache": {
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "bytes_saved": self.cache_bytes_saved,
+                "evictions": self.cache_evictions
+            },
             "system": system_stats
         }
 
@@ -0,0 +1,130 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+from ..config.config import config
+from ..services.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+# Job stages in execution order
+STAGE_METADATA = "metadata"
+STAGE_DOWNLOAD = "download"
+STAGE_PROBE = "probe"
+STAGE_UPLOAD = "upload"
+
+# Encodes are admitted by the transcode scheduler's CPU budget, not a stage pool
+STAGES = (STAGE_METADATA, STAGE_DOWNLOAD, STAGE_PROBE, STAGE_UPLOAD)
+
+class StagePool:
+    """Bounded worker slots for one pipeline stage
+
+    Works like a FIFO semaphore whose limit can be changed at runtime.
+    Occupancy (active/waiting) and totals are kept for /metrics.
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was handed over right as we got cancelled
+                self.release()
+            else:
+                self._waiters.remove(future)
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        self._wake()
+
+    def set_limit(self, limit: int) -> None:
+        """Change concurrency limit; running work is never interrupted"""
+        self.limit = max(1, limit)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.active < self.limit:
+            future = self._waiters.popleft()
+            if not future.done():
+                self.active += 1
+                future.set_result(True)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one slot of this stage for the duration of the block"""
+        await self.acquire()
+        start_time = time.monotonic()
+        try:
+            yield self
+        except BaseException:
+            self.failed += 1
+            raise
+        else:
+            self.completed += 1
+        finally:
+            duration = time.monotonic() - start_time
+            self.busy_seconds += duration
+            metrics.track_stage_time(self.name, duration)
+            self.release()
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            'limit': self.limit,
+            'active': self.active,
+            'waiting': self.waiting,
+            'completed': self.completed,
+            'failed': self.failed,
+            'busy_seconds': self.busy_seconds
+        }
+
+class Pipeline:
+    """Per-stage worker pools shared by all video jobs
+
+    Network-bound stages (metadata, download, upload) and probing have
+    separate limits, and encodes wait only for CPU budget (see
+    TranscodeScheduler), so a long transcode no longer blocks short clips
+    from being downloaded and delivered.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, int]] = None):
+        limits = limits or {
+            STAGE_METADATA: config.pipeline_metadata_workers,
+            STAGE_DOWNLOAD: config.pipeline_download_workers,
+            STAGE_PROBE: config.pipeline_probe_workers,
+            STAGE_UPLOAD: config.pipeline_upload_workers,
+        }
+        self.pools: Dict[str, StagePool] = {
+            stage: StagePool(stage, limits.get(stage, 1)) for stage in STAGES
+        }
+
+    def stage(self, name: str):
+        """Async context manager holding a slot in the given stage"""
+        return self.pools[name].slot()
+
+    def get_statistics(self) -> Dict[str, Dict[str, Any]]:
+        return {name: pool.get_statistics() for name, pool in self.pools.items()}
+
+# Global pipeline instance
+pipeline = Pipeline()
@@ -5,6 +5,8 @@ import psutil
 from pathlib import Path
 from typing import Optional
 from ..services.monitoring import metrics
+from ..services.media_cache import media_cache
+from ..services.download_journal import download_journal
 from ..config.config import config
 
 logger = logging.getLogger(__name__)
@@ -72,10 +74,16 @@ class RailwayService:
             if not self.downloads_dir.exists():
                 return
 
+            # Kesh hajmini pastki chegaragacha kamaytirish
+            media_cache.evict()
+            if psutil.disk_usage(self.downloads_dir).percent < self.max_disk_percent:
+                return
+
             # Get list of files sorted by modification time
             files = []
             for file_path in self.downloads_dir.iterdir():
-                if file_path.is_file():
+                # Hozir ishlanayotgan yuklash fayllari o'chirilmaydi
+                if file_path.is_file() and not download_journal.is_active(file_path):
                     files.append((file_path, os.path.getmtime(file_path)))
             
             # Sort files by modification time (oldest first)
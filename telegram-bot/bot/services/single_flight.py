@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from ..services.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+class _Call:
+    """One in-flight execution and the callers waiting for it"""
+
+    def __init__(self, task: asyncio.Future, release: Optional[Callable[[Any], None]] = None):
+        self.task = task
+        self.waiters = 0
+        self.release = release
+
+    def settle(self) -> None:
+        """Hand the work's own hold on the result back once nobody waits"""
+        if self.waiters or not self.release or not self.task.done():
+            return
+        release, self.release = self.release, None
+        if not self.task.cancelled() and self.task.exception() is None:
+            release(self.task.result())
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one execution
+
+    The first caller for a key (the leader) starts the work; everyone who
+    asks for the same key while it is in flight awaits the same result.
+    Exceptions are delivered to every waiter as well. The work runs in its
+    own task, so a cancelled caller - leader or not - only stops waiting;
+    the work itself is cancelled when the last waiter gives up.
+
+    Results that hold a resource (e.g. a leased cache entry) pass claim and
+    release: claim runs for every caller as it receives the result, release
+    runs once for the work's own hold after the last caller has claimed.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, _Call] = {}
+
+    def _finish(self, key: str, call: _Call) -> None:
+        if self._inflight.get(key) is call:
+            del self._inflight[key]
+        # Avoid "exception was never retrieved" when every waiter left
+        call.task.cancelled() or call.task.exception()
+        call.settle()
+
+    async def do(
+        self,
+        key: str,
+        func: Callable[[], Awaitable[Any]],
+        claim: Optional[Callable[[Any], None]] = None,
+        release: Optional[Callable[[Any], None]] = None
+    ) -> Tuple[Any, bool]:
+        """Run func once per key
+
+        Returns:
+            (result, shared) - shared is True for callers that reused
+            another caller's in-flight result
+        """
+        call = self._inflight.get(key)
+        shared = call is not None
+        if shared:
+            metrics.track_coalesced_request(self.name)
+            logger.info(f"Joining in-flight {self.name} for {key}")
+        else:
+            call = _Call(asyncio.ensure_future(func()), release)
+            self._inflight[key] = call
+            call.task.add_done_callback(lambda task: self._finish(key, call))
+
+        call.waiters += 1
+        try:
+            # Shield: a cancelled caller must not cancel work others wait for
+            result = await asyncio.shield(call.task)
+            if claim:
+                claim(result)
+            return result, shared
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                logger.info(f"Last waiter for {self.name} {key} cancelled, stopping it")
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+            call.settle()
+
+    def in_flight(self) -> int:
+        """Number of keys currently being processed"""
+        return len(self._inflight)
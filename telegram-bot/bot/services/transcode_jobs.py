@@ -0,0 +1,166 @@
+import time
+import logging
+import itertools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+from ..config.config import config
+from ..ffmpeg_progress import FFmpegProgress
+from ..services.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+# Size projections before this share of the encode are too noisy to act on
+ABORT_MIN_PROGRESS = 0.2
+
+# Status callback of the request being served (set by the handler, seen by its encodes)
+_listener: ContextVar[Optional[Callable[['TranscodeJob'], None]]] = ContextVar(
+    'transcode_listener', default=None
+)
+
+@dataclass
+class TranscodeJob:
+    """One running ffmpeg encode and its latest progress"""
+    id: int
+    kind: str  # crf, abr, segment, stream
+    label: str
+    step: str
+    duration: float  # Seconds of media this run encodes
+    target_bytes: Optional[int] = None  # Abort when the output is projected above this
+    abort_ratio: Optional[float] = None  # Tolerance over target, None = TRANSCODE_ABORT_RATIO
+    started: float = field(default_factory=time.monotonic)
+    progress: FFmpegProgress = field(default_factory=FFmpegProgress)
+    aborted: bool = False
+    listener: Optional[Callable[['TranscodeJob'], None]] = None
+
+    @property
+    def fraction(self) -> float:
+        if not self.duration:
+            return 0.0
+        return min(1.0, self.progress.out_time / self.duration)
+
+    @property
+    def percent(self) -> float:
+        return self.fraction * 100
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Seconds left, from ffmpeg's speed (or the average rate so far)"""
+        remaining = max(0.0, self.duration - self.progress.out_time)
+        if self.progress.speed > 0:
+            return remaining / self.progress.speed
+        if self.progress.out_time > 0:
+            return remaining * self.elapsed / self.progress.out_time
+        return None
+
+    @property
+    def projected_size(self) -> Optional[int]:
+        """Output size if the rest encodes at the rate seen so far"""
+        if self.progress.out_time <= 0 or not self.progress.total_size:
+            return None
+        return int(self.progress.total_size * max(self.duration, self.progress.out_time) / self.progress.out_time)
+
+    def overshoots(self) -> bool:
+        ratio = config.transcode_abort_ratio
+        if ratio and self.abort_ratio is not None:
+            ratio = self.abort_ratio
+        if not self.target_bytes or not ratio or self.fraction < ABORT_MIN_PROGRESS:
+            return False
+        projected = self.projected_size
+        return projected is not None and projected > self.target_bytes * ratio
+
+    def update(self, progress: FFmpegProgress) -> bool:
+        """Progress callback for the process runner; False stops the encode"""
+        self.progress = progress
+        if not progress.done and self.overshoots():
+            self.aborted = True
+            logger.info(
+                f"Stopping {self.kind} encode of {self.label}: {self.percent:.0f}% done, "
+                f"projected {self.projected_size / (1024 * 1024):.1f}MB over "
+                f"{self.target_bytes / (1024 * 1024):.1f}MB target"
+            )
+            metrics.track_transcode_abort(self.kind)
+        if self.listener:
+            try:
+                self.listener(self)
+            except Exception as e:
+                logger.error(f"Transcode progress listener failed: {e}")
+        return not self.aborted
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'label': self.label,
+            'step': self.step,
+            'percent': self.percent,
+            'eta': self.eta,
+            'elapsed': self.elapsed,
+            'speed': self.progress.speed,
+            'bitrate': self.progress.bitrate,
+            'frame': self.progress.frame,
+            'projected_size': self.projected_size,
+            'target_bytes': self.target_bytes
+        }
+
+class TranscodeJobTable:
+    """Running encodes with their progress, for status messages and /admin jobs
+
+    A handler registers a status callback with listen(); every encode
+    started while serving that request reports its progress to it.
+    """
+
+    def __init__(self):
+        self.jobs: Dict[int, TranscodeJob] = {}
+        self._ids = itertools.count(1)
+
+    def create(
+        self,
+        kind: str,
+        label: str,
+        duration: float,
+        target_bytes: Optional[int] = None,
+        step: Optional[str] = None,
+        abort_ratio: Optional[float] = None
+    ) -> TranscodeJob:
+        job = TranscodeJob(
+            id=next(self._ids),
+            kind=kind,
+            label=label,
+            step=step or kind,
+            duration=duration or 0.0,
+            target_bytes=target_bytes,
+            abort_ratio=abort_ratio,
+            listener=_listener.get()
+        )
+        self.jobs[job.id] = job
+        return job
+
+    def finish(self, job: TranscodeJob) -> None:
+        self.jobs.pop(job.id, None)
+
+    @contextmanager
+    def listen(self, callback: Callable[[TranscodeJob], None]):
+        """Send progress of encodes started inside the block to callback"""
+        token = _listener.set(callback)
+        try:
+            yield
+        finally:
+            _listener.reset(token)
+
+    def list(self) -> List[TranscodeJob]:
+        return sorted(self.jobs.values(), key=lambda job: job.started)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            'active': len(self.jobs),
+            'jobs': [job.to_dict() for job in self.list()]
+        }
+
+# Global transcode job table
+transcode_jobs = TranscodeJobTable()
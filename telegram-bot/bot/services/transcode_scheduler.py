@@ -0,0 +1,222 @@
+import os
+import time
+import asyncio
+import logging
+from pathlib import Path
+from collections import deque
+from dataclasses import dataclass
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+from ..config.config import config
+from ..services.monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+# Presets the policy picks from, fastest first
+PRESETS = ('veryfast', 'faster', 'fast', 'medium', 'slow')
+LOADED_PRESET = 'veryfast'
+DEFAULT_PRESET = 'medium'
+# Media seconds encoded per wall second per thread (<=720p), until measured
+DEFAULT_SPEEDS = {'veryfast': 3.0, 'faster': 2.2, 'fast': 1.6, 'medium': 1.2, 'slow': 0.6}
+# Weight of the newest measurement in the per-preset speed
+EWMA_WEIGHT = 0.3
+
+def cgroup_cpu_limit(root: str = CGROUP_ROOT) -> Optional[float]:
+    """CPU quota of this container in cores, None if it has none"""
+    try:
+        quota, period = Path(root, 'cpu.max').read_text().split()[:2]
+        return None if quota == 'max' else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+
+    # cgroup v1
+    for controller in ('cpu', 'cpu,cpuacct'):
+        try:
+            quota = int(Path(root, controller, 'cpu.cfs_quota_us').read_text())
+            period = int(Path(root, controller, 'cpu.cfs_period_us').read_text())
+        except (OSError, ValueError):
+            continue
+        return quota / period if quota > 0 and period > 0 else None
+    return None
+
+def available_cpus(root: str = CGROUP_ROOT) -> float:
+    """Cores this process may really use: CPU affinity capped by the cgroup quota"""
+    try:
+        cpus = float(len(os.sched_getaffinity(0)))
+    except AttributeError:
+        cpus = float(os.cpu_count() or 1)
+    quota = cgroup_cpu_limit(root)
+    return min(cpus, quota) if quota else cpus
+
+@dataclass
+class EncoderSlot:
+    """Threads and preset granted to one encoder"""
+    threads: int
+    preset: str
+    waited: float = 0.0
+    # Callers add the media seconds they encoded; used to measure preset speed
+    media_seconds: float = 0.0
+
+class TranscodeScheduler:
+    """CPU budget shared by every ffmpeg encoder
+
+    The budget is the container's real CPU quota, in x264 threads. Each
+    encoder is granted a share of it for its lifetime, so concurrent
+    encoders never add up to more threads than there are cores, and at
+    most max_encoders run at once (FIFO beyond that). This is the only
+    admission gate for encodes - no stage pool caps them on top of it.
+    The preset follows the load: veryfast while jobs queue up, otherwise
+    the slowest preset whose measured speed still finishes within the
+    latency budget.
+    """
+
+    def __init__(
+        self,
+        cpus: float = None,
+        max_encoders: int = None,
+        max_preset: str = None,
+        latency_budget: float = None
+    ):
+        self.cpus = cpus or config.transcode_cpus or available_cpus()
+        self.budget = max(1, int(self.cpus + 0.5))
+        self.max_encoders = max(1, max_encoders or config.transcode_max_encoders or self.budget // 2)
+        self.max_preset = max_preset or config.transcode_max_preset
+        if self.max_preset not in PRESETS:
+            logger.warning(f"Unknown x264 preset {self.max_preset!r}, using {DEFAULT_PRESET}")
+            self.max_preset = DEFAULT_PRESET
+        self.latency_budget = latency_budget or config.transcode_latency_budget
+        # Yolg'iz kodlovchi hammasini olmaydi: keyingi ish darhol boshlana oladi
+        self.reserve = self.budget // (2 * self.max_encoders) if self.max_encoders > 1 else 0
+        self.active = 0
+        self.threads_in_use = 0
+        self.speeds: Dict[str, float] = dict(DEFAULT_SPEEDS)
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def queue_depth(self) -> int:
+        """Encoders waiting for their turn"""
+        return self.waiting
+
+    def _grant_threads(self, queued: int) -> int:
+        """Threads for the next encoder, 0 if it has to wait"""
+        free = self.budget - self.threads_in_use
+        if self.active >= self.max_encoders or free < 1:
+            return 0
+        demand = min(self.max_encoders, self.active + queued)
+        share = self.budget // demand - (self.reserve if demand == 1 else 0)
+        return min(free, max(1, share))
+
+    def estimate_seconds(self, preset: str, duration: float, threads: int, passes: float = 1.0) -> float:
+        speed = self.speeds.get(preset) or DEFAULT_SPEEDS.get(preset, 1.0)
+        return duration * passes / (speed * max(1, threads))
+
+    def choose_preset(
+        self,
+        duration: float,
+        threads: int,
+        passes: float = 1.0,
+        latency_budget: float = None
+    ) -> str:
+        """Fastest preset under load, else the slowest that fits the latency budget"""
+        allowed = PRESETS[:PRESETS.index(self.max_preset) + 1]
+        if self.queue_depth():
+            return allowed[0]
+        if not duration:
+            return self.max_preset
+        budget = latency_budget or self.latency_budget
+        for preset in reversed(allowed):
+            if self.estimate_seconds(preset, duration, threads, passes) <= budget:
+                return preset
+        return allowed[0]
+
+    async def acquire(self) -> int:
+        """Wait for an encoder slot; returns the threads granted"""
+        if not self._waiters:
+            threads = self._grant_threads(1)
+            if threads:
+                self.active += 1
+                self.threads_in_use += threads
+                return threads
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was handed over right as we got cancelled
+                self.release(future.result())
+            else:
+                self._waiters.remove(future)
+            raise
+
+    def release(self, threads: int) -> None:
+        self.active -= 1
+        self.threads_in_use -= threads
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters:
+            threads = self._grant_threads(len(self._waiters))
+            if not threads:
+                return
+            future = self._waiters.popleft()
+            if not future.done():
+                self.active += 1
+                self.threads_in_use += threads
+                future.set_result(threads)
+
+    def _record(self, slot: EncoderSlot, wall_seconds: float) -> None:
+        if slot.media_seconds <= 0 or wall_seconds <= 0:
+            return
+        speed = slot.media_seconds / wall_seconds / slot.threads
+        previous = self.speeds.get(slot.preset)
+        self.speeds[slot.preset] = speed if previous is None else (
+            EWMA_WEIGHT * speed + (1 - EWMA_WEIGHT) * previous
+        )
+        metrics.track_transcode_preset(slot.preset, slot.threads, slot.media_seconds, wall_seconds, slot.waited)
+
+    @asynccontextmanager
+    async def encoder(
+        self,
+        duration: float,
+        passes: float = 1.0,
+        latency_budget: float = None,
+        preset: str = None
+    ):
+        """Hold an encoder slot (threads + preset) for the duration of the block
+
+        preset forces one, e.g. so every segment of a job matches.
+        """
+        queued_at = time.monotonic()
+        threads = await self.acquire()
+        start_time = time.monotonic()
+        slot = EncoderSlot(
+            threads=threads,
+            preset=preset or self.choose_preset(duration, threads, passes, latency_budget),
+            waited=start_time - queued_at
+        )
+        try:
+            yield slot
+        finally:
+            self.release(threads)
+            self._record(slot, time.monotonic() - start_time)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        return {
+            'cpus': self.cpus,
+            'budget': self.budget,
+            'max_encoders': self.max_encoders,
+            'active': self.active,
+            'waiting': self.waiting,
+            'threads_in_use': self.threads_in_use,
+            'speeds': dict(self.speeds)
+        }
+
+# Global transcode scheduler instance
+transcode_scheduler = TranscodeScheduler()
@@ -7,57 +7,202 @@ from typing import Dict, Any, Optional
 from pathlib import Path
 from telegram import Bot, InlineKeyboardMarkup
 
-from ..downloader import download_video_with_info, DownloadError
+from ..downloader import download_video_with_info, get_metadata, check_size_limit, DownloadError
 from ..video_compress import compress_video
+from ..media_probe import media_probe
+from ..stream_transcode import should_stream, stream_compress
 from ..services.monitoring import metrics
+from ..services.file_id_registry import (
+    file_id_registry, file_id_from_message, VARIANT_VIDEO
+)
+from ..services.media_cache import media_cache, VARIANT_ORIGINAL, VARIANT_COMPRESSED
+from ..services.single_flight import SingleFlight
+from ..services.download_journal import download_journal
+from ..services.fair_scheduler import fair_scheduler, estimate_job_cost
+from ..services.pipeline import (
+    pipeline, STAGE_METADATA, STAGE_DOWNLOAD, STAGE_UPLOAD
+)
 from ..config.config import config
-from ..utils import ensure_downloads_dir, cleanup_file
+from ..utils import ensure_downloads_dir, cleanup_file, media_key_from_info, canonicalize_url
 from ..path_utils import generate_temp_filename
 
 logger = logging.getLogger(__name__)
 
+# Ishlatilmagan oldindan olingan metadata shuncha vaqt saqlanadi
+PREFETCH_TTL = 60
+
 class VideoService:
     def __init__(self, downloads_dir: str = None):
         self.downloads_dir = Path(downloads_dir or config.downloads_dir)
         self.processing_tasks: Dict[str, asyncio.Task] = {}
-        self.lock = asyncio.Lock()
+        self.lock = asyncio.Lock()  # Faqat cleanup() uchun; ishlar pipeline orqali boradi
+        self.flight = SingleFlight("download")
+        self._prefetched: Dict[str, asyncio.Task] = {}
         ensure_downloads_dir()
 
-    async def download_and_process_video(self, url: str) -> Dict[str, Any]:
-        """Video yuklab olish va qayta ishlash"""
-        async with self.lock:  # Bir vaqtda faqat bitta yuklab olish
+    def prefetch(self, url: str) -> None:
+        """Havola ko'rinishi bilan metadata olishni fonda boshlash
+
+        Javob yuborish, navbatga qo'yish va boshqa tekshiruvlar shu bilan
+        parallel bajariladi; ish metadata bosqichiga yetganda tayyor natijani
+        oladi. Avval yuborilgan videolar uchun hech narsa qilinmaydi.
+        """
+        key = canonicalize_url(url)
+        if key in self._prefetched or file_id_registry.resolve_alias(url):
+            return
+
+        async def fetch() -> Dict[str, Any]:
+            async with pipeline.stage(STAGE_METADATA):
+                return await get_metadata(url)
+
+        task = asyncio.create_task(fetch())
+        self._prefetched[key] = task
+        metrics.track_metadata_prefetch("started")
+
+        def expire(task: asyncio.Task) -> None:
+            if not task.cancelled():
+                # Xatolik ish tomonidan olinmasa ham log'ga "never retrieved" tushmasin
+                task.exception()
+            asyncio.get_running_loop().call_later(
+                PREFETCH_TTL, lambda: self._prefetched.get(key) is task and self._prefetched.pop(key)
+            )
+
+        task.add_done_callback(expire)
+
+    async def _get_metadata(self, url: str) -> Dict[str, Any]:
+        """Oldindan boshlangan metadata natijasi yoki yangi so'rov"""
+        task = self._prefetched.pop(canonicalize_url(url), None)
+        if task and not task.cancelled():
+            metrics.track_metadata_prefetch("used")
+            return await task
+
+        async with pipeline.stage(STAGE_METADATA):
+            return await get_metadata(url)
+
+    async def download_and_process_video(
+        self,
+        url: str,
+        chat_id: Optional[int] = None,
+        user_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Video yuklab olish va qayta ishlash
+
+        chat_id jurnalga yoziladi: bot qayta ishga tushsa, tugallanmagan
+        yuklash davom ettiriladi va natija shu chatga yuboriladi.
+        user_id bo'yicha navbat foydalanuvchilar o'rtasida adolatli bo'linadi.
+
+        Muvaffaqiyatli natijadagi kesh fayli ijaraga olinadi (result['lease']):
+        yuborib bo'lingach media_cache.release(result.get('lease')) chaqiriladi.
+        """
+        # Keshda bo'lsa, yt-dlp ni umuman chaqirmaymiz
+        known_key = file_id_registry.resolve_alias(url)
+        cached = self._get_cached_video(known_key) if known_key else None
+        if cached:
+            return cached
+
+        # Bir xil video uchun parallel so'rovlar bitta yuklab olishni kutadi
+        flight_key = known_key or canonicalize_url(url)
+        result, shared = await self.flight.do(
+            flight_key,
+            lambda: self._download_and_process(
+                url, check_cache=not known_key, chat_id=chat_id, user_id=user_id
+            ),
+            # Har bir kutuvchi fayldan o'z ijarasi bilan foydalanadi
+            claim=lambda result: media_cache.acquire(*result['lease']) if result.get('lease') else None,
+            release=lambda result: media_cache.release(result.get('lease'))
+        )
+        return {**result, 'shared': shared}
+
+    async def _download_and_process(
+        self,
+        url: str,
+        check_cache: bool = True,
+        chat_id: Optional[int] = None,
+        user_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Videoni yuklab olish, kerak bo'lsa siqish va keshga joylash
+
+        check_cache: metadata olingandan keyin media kalit bo'yicha keshni
+        tekshirish (havola hali ma'lum bo'lmagan holatlar uchun)
+        """
+        journal_key = None
+        lease = None
+        try:
+            # Xotira tekshiruvi
+            if not await self._check_memory():
+                return {
+                    'success': False,
+                    'error': "❌ Serverda xotira yetarli emas. Iltimos, keyinroq urinib ko'ring."
+                }
+
+            # Disk joy tekshiruvi
+            if not await self._check_disk_space():
+                return {
+                    'success': False,
+                    'error': "❌ Serverda bo'sh joy yetarli emas. Iltimos, keyinroq urinib ko'ring."
+                }
+
+            # Unique ID yaratish
+            task_id = uuid.uuid4().hex
+            
             try:
-                # Xotira tekshiruvi
-                if not await self._check_memory():
-                    return {
-                        'success': False,
-                        'error': "❌ Serverda xotira yetarli emas. Iltimos, keyinroq urinib ko'ring."
-                    }
+                # Metadata bir marta olinadi va yuklab olishga uzatiladi
+                info = await self._get_metadata(url)
 
-                # Disk joy tekshiruvi
-                if not await self._check_disk_space():
-                    return {
-                        'success': False,
-                        'error': "❌ Serverda bo'sh joy yetarli emas. Iltimos, keyinroq urinib ko'ring."
-                    }
+                media_key = media_key_from_info(info, url)
+                file_id_registry.add_alias(url, media_key)
+                if info.get('webpage_url'):
+                    file_id_registry.add_alias(info['webpage_url'], media_key)
 
-                # Unique ID yaratish
-                task_id = uuid.uuid4().hex
-                
-                try:
-                    # Video yuklab olish
-                    video_path, info = await download_video_with_info(url, str(self.downloads_dir))
-                    if not video_path or not os.path.exists(video_path):
-                        return {
-                            'success': False,
-                            'error': "❌ Video yuklab olinmadi"
-                        }
+                # Boshqa havola orqali yuklangan bo'lishi mumkin
+                cached = self._get_cached_video(media_key) if check_cache else None
+                if cached:
+                    return cached
+
+                # Hajm cheklovi - yuklab olish navbatini band qilmasdan
+                check_size_limit(info)
+
+                # Og'ir ish navbati foydalanuvchilar o'rtasida adolatli taqsimlanadi
+                async with fair_scheduler.slot(user_id or chat_id or 0, estimate_job_cost(info)):
+                    # Qisman yuklangan fayllar shu ish nomi bilan saqlanadi
+                    download_journal.begin(media_key, url, chat_id)
+                    journal_key = media_key
+
+                    # Siqish baribir kerak bo'lsa, ffmpeg oqimni yuklab olish bilan birga siqadi
+                    video_path = None
+                    variant = VARIANT_ORIGINAL
+                    if should_stream(info):
+                        compressed_path = download_journal.track(
+                            media_key, generate_temp_filename(prefix="compressed_", suffix=".mp4")
+                        )
+                        # Tarmoq kutilayotgan vaqt ko'p: yuklab olish navbatida turadi
+                        async with pipeline.stage(STAGE_DOWNLOAD):
+                            video_path = await stream_compress(info, compressed_path)
+                        if video_path:
+                            variant = VARIANT_COMPRESSED
+
+                    if not video_path:
+                        # Video yuklab olish
+                        async with pipeline.stage(STAGE_DOWNLOAD):
+                            video_path, info = await download_video_with_info(
+                                url,
+                                str(self.downloads_dir),
+                                info=info,
+                                output_template=download_journal.output_template(media_key)
+                            )
+                        if not video_path or not os.path.exists(video_path):
+                            download_journal.fail(media_key)
+                            return {
+                                'success': False,
+                                'error': "❌ Video yuklab olinmadi"
+                            }
 
                     file_size = os.path.getsize(video_path)
-                    
+                
                     # Railway xotira cheklovini tekshirish
                     if file_size > config.max_video_size_mb * 1024 * 1024:
                         cleanup_file(video_path)
+                        download_journal.discard(media_key)
                         return {
                             'success': False,
                             'error': f"❌ Video hajmi juda katta ({config.max_video_size_mb}MB dan oshmasligi kerak)"
@@ -68,50 +213,119 @@ class VideoService:
                     uploader = info.get('uploader', 'Unknown')
                     duration = info.get('duration', 0)
 
-                    # Video siqish kerak bo'lsa
-                    if file_size > config.target_video_size_mb * 1024 * 1024:
-                        compressed_path = generate_temp_filename(prefix="compressed_", suffix=".mp4")
+                    # Kodeklar mos bo'lsa faqat konteyner almashadi, katta bo'lsa siqiladi
+                    if variant == VARIANT_ORIGINAL:
+                        oversized = file_size > config.target_video_size_mb * 1024 * 1024
+                        if oversized:
+                            metrics.track_transcode_mode("file")
+                        compressed_path = download_journal.track(
+                            media_key, generate_temp_filename(prefix="compressed_", suffix=".mp4")
+                        )
                         compressed_result = await compress_video(
                             video_path,
                             compressed_path,
-                            target_size_mb=config.target_video_size_mb
+                            target_size_mb=config.target_video_size_mb,
+                            info=info
                         )
-                        
-                        if compressed_result:
+                    
+                        if compressed_result and compressed_result != video_path:
                             cleanup_file(video_path)
                             video_path = compressed_result
                             file_size = os.path.getsize(video_path)
+                            if oversized:
+                                variant = VARIANT_COMPRESSED
 
-                    metrics.track_successful_download(url)
-
-                    # Natijani qaytarish
-                    return {
-                        'success': True,
-                        'video_path': video_path,
-                        'file_size': file_size,
+                    # Yuboriladigan faylning haqiqiy o'lchamlari (Telegram qayta ishlamasligi uchun)
+                    media = await media_probe.probe(video_path)
+                    meta = {
                         'title': title,
                         'uploader': uploader,
-                        'duration': duration,
-                        'task_id': task_id,
-                        'info': info
+                        'duration': duration or (media.duration if media else 0),
+                        'width': media.width if media else info.get('width'),
+                        'height': media.height if media else info.get('height'),
+                        'has_audio': media.has_audio if media else True
                     }
 
-                except DownloadError as e:
-                    logger.error(f"Video yuklab olishda xatolik: {e}")
-                    metrics.track_error("DownloadError")
-                    return {
-                        'success': False,
-                        'error': str(e)
-                    }
+                    # Yuborilgan variantni keshga joylash va yuborilguncha ushlab turish
+                    video_path = media_cache.put(media_key, variant, video_path, meta=meta)
+                    lease = media_cache.acquire(media_key, variant)
 
-            except Exception as e:
-                logger.error(f"Video qayta ishlashda xatolik: {e}")
-                metrics.track_error(type(e).__name__)
+                download_journal.finish(media_key, keep=video_path)
+                metrics.track_successful_download(url)
+
+                # Natijani qaytarish
+                return {
+                    'success': True,
+                    'video_path': video_path,
+                    'file_size': file_size,
+                    'title': title,
+                    'uploader': uploader,
+                    'duration': meta['duration'],
+                    'width': meta['width'],
+                    'height': meta['height'],
+                    'has_audio': meta['has_audio'],
+                    'task_id': task_id,
+                    'media_key': media_key,
+                    'info': info,
+                    'lease': lease
+                }
+
+            except DownloadError as e:
+                logger.error(f"Video yuklab olishda xatolik: {e}")
+                metrics.track_error("DownloadError")
+                if journal_key:
+                    # Doimiy xatoliklarda qisman fayllar kerak emas
+                    if e.category:
+                        download_journal.discard(journal_key)
+                    else:
+                        download_journal.fail(journal_key)
                 return {
                     'success': False,
-                    'error': f"❌ Xatolik yuz berdi: {str(e)}"
+                    'error': str(e)
                 }
 
+        except asyncio.CancelledError:
+            media_cache.release(lease)
+            if journal_key:
+                download_journal.fail(journal_key)
+            raise
+
+        except Exception as e:
+            media_cache.release(lease)
+            if journal_key:
+                download_journal.fail(journal_key)
+            logger.error(f"Video qayta ishlashda xatolik: {e}")
+            metrics.track_error(type(e).__name__)
+            return {
+                'success': False,
+                'error': f"❌ Xatolik yuz berdi: {str(e)}"
+            }
+
+    def _get_cached_video(self, media_key: str) -> Optional[Dict[str, Any]]:
+        """Keshdagi videoni yuklab olish natijasi ko'rinishida qaytarish"""
+        entry = media_cache.lookup(media_key, lease=True)
+        if not entry:
+            return None
+
+        meta = entry['meta']
+        logger.info(f"Serving {media_key} ({entry['variant']}) from media cache")
+        return {
+            'success': True,
+            'video_path': entry['path'],
+            'file_size': entry['size'],
+            'title': meta.get('title') or 'Video',
+            'uploader': meta.get('uploader') or 'Unknown',
+            'duration': meta.get('duration') or 0,
+            'width': meta.get('width'),
+            'height': meta.get('height'),
+            'has_audio': meta.get('has_audio', True),
+            'task_id': uuid.uuid4().hex,
+            'media_key': media_key,
+            'info': meta,
+            'cached': True,
+            'lease': entry['lease']
+        }
+
     async def _check_memory(self) -> bool:
         """Xotira yetarliligini tekshirish"""
         try:
@@ -161,7 +375,10 @@ class VideoService:
         chat_id: int,
         bot: Bot,
         caption: str,
-        reply_markup: Optional[InlineKeyboardMarkup] = None
+        reply_markup: Optional[InlineKeyboardMarkup] = None,
+        media_key: Optional[str] = None,
+        parse_mode: Optional[str] = None,
+        meta: Optional[Dict[str, Any]] = None
     ) -> bool:
         """Compress video and send it to chat"""
         try:
@@ -180,15 +397,43 @@ class VideoService:
                 logger.error("Video compression failed")
                 return False
 
+            if compressed_result == video_path:
+                # Fayl allaqachon chegarada - qayta siqishdan foyda yo'q
+                logger.error("Video is within target size but was rejected by Telegram")
+                return False
+
             # Send compressed video
+            media = await media_probe.probe(compressed_result)
             try:
-                with open(compressed_result, 'rb') as video_file:
-                    await bot.send_video(
-                        chat_id=chat_id,
-                        video=video_file,
-                        caption=caption,
-                        reply_markup=reply_markup,
-                        supports_streaming=True
+                async with pipeline.stage(STAGE_UPLOAD):
+                    with open(compressed_result, 'rb') as video_file:
+                        message = await bot.send_video(
+                            chat_id=chat_id,
+                            video=video_file,
+                            caption=caption,
+                            reply_markup=reply_markup,
+                            supports_streaming=True,
+                            width=media.width if media else None,
+                            height=media.height if media else None,
+                            duration=int(media.duration) if media and media.duration else None,
+                            parse_mode=parse_mode
+                        )
+
+                # Siqilgan variantni keshda saqlab qolish
+                local_path = video_path
+                if media_key:
+                    local_path = media_cache.put(
+                        media_key, VARIANT_COMPRESSED, compressed_result, meta=meta
+                    )
+
+                uploaded = file_id_from_message(message)
+                if media_key and uploaded:
+                    file_id_registry.put(
+                        media_key,
+                        VARIANT_VIDEO,
+                        local_path=local_path,
+                        meta=meta,
+                        **uploaded
                     )
                 return True
                 
@@ -197,7 +442,7 @@ class VideoService:
                 return False
                 
             finally:
-                # Clean up compressed video
+                # Clean up compressed video (no-op once moved into the cache)
                 cleanup_file(compressed_result)
                 
         except Exception as e:
@@ -0,0 +1,166 @@
+import os
+import logging
+from typing import Any, Dict, List, Optional
+from .services.monitoring import metrics
+from .services.transcode_scheduler import transcode_scheduler, DEFAULT_PRESET
+from .services.transcode_jobs import transcode_jobs
+from .config.config import config
+from .downloader import estimate_filesize
+from .format_selector import select_format
+from .ffmpeg_encode import calculate_target_bitrate, scaled_dimensions, build_encode_args
+from .ffmpeg_progress import with_progress
+from .utils import run_command
+
+logger = logging.getLogger(__name__)
+
+# Protocols ffmpeg can read itself while the transfer is in progress
+STREAMABLE_PROTOCOLS = ('http', 'https', 'm3u8', 'm3u8_native')
+HTTP_PROTOCOLS = ('http', 'https')
+# The download paces a streaming encode, so it needs only a couple of threads
+# and runs in the download stage instead of holding a CPU budget slot
+STREAM_THREADS = 2
+
+def stream_inputs(info: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Stream URL(s) of the selected format(s), or None if they can't be streamed
+
+    Separate DASH video and audio are two plain HTTP inputs for ffmpeg.
+    Segmented protocols (DASH manifests, f4m, ism), cookie-bound formats and
+    slim (cached) info without URLs fall back to download-then-compress.
+    """
+    if info.get('_slim') or info.get('is_live'):
+        return None
+
+    formats = info.get('requested_formats') or [info]
+    if len(formats) > 2:
+        return None
+
+    inputs = []
+    for fmt in formats:
+        protocol = fmt.get('protocol') or 'https'
+        if not fmt.get('url') or protocol not in STREAMABLE_PROTOCOLS:
+            return None
+        if fmt.get('fragments') or fmt.get('cookies'):
+            return None
+        inputs.append({
+            'url': fmt['url'],
+            'protocol': protocol,
+            'headers': fmt.get('http_headers') or info.get('http_headers') or {}
+        })
+    return inputs
+
+def should_stream(info: Dict[str, Any]) -> bool:
+    """Video will need transcoding anyway and its source can be streamed"""
+    if not config.stream_transcode:
+        return False
+    if config.fit_format_selection and select_format(info):
+        return False
+    filesize = estimate_filesize(info)
+    if not filesize or filesize <= config.target_video_size_mb * 1024 * 1024:
+        return False
+    return stream_inputs(info) is not None
+
+def _input_args(source: Dict[str, Any]) -> List[str]:
+    args = []
+    if source['protocol'] in HTTP_PROTOCOLS:
+        args += ['-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '10']
+    if source['headers']:
+        args += ['-headers', ''.join(f"{key}: {value}\r\n" for key, value in source['headers'].items())]
+    return args + ['-i', source['url']]
+
+def build_stream_command(
+    info: Dict[str, Any],
+    output_path: str,
+    target_size_mb: int,
+    max_height: int,
+    preset: str = DEFAULT_PRESET,
+    threads: Optional[int] = None
+) -> Optional[List[str]]:
+    """ffmpeg command reading straight from the stream URL(s)"""
+    inputs = stream_inputs(info)
+    duration = info.get('duration')
+    if not inputs or not duration:
+        return None
+
+    video_format = (info.get('requested_formats') or [info])[0]
+    width = video_format.get('width') or info.get('width')
+    height = video_format.get('height') or info.get('height')
+    if not width or not height:
+        return None
+    width, height = scaled_dimensions(int(width), int(height), max_height)
+
+    cmd = ['ffmpeg', '-hide_banner', '-nostdin']
+    for source in inputs:
+        cmd += _input_args(source)
+    if len(inputs) == 2:
+        cmd += ['-map', '0:v:0', '-map', '1:a:0']
+    else:
+        cmd += ['-map', '0:v:0', '-map', '0:a:0?']
+
+    target_bitrate = calculate_target_bitrate(duration=float(duration), target_size_mb=target_size_mb)
+    return cmd + build_encode_args(target_bitrate, width, height, output_path, preset=preset, threads=threads)
+
+async def stream_compress(
+    info: Dict[str, Any],
+    output_path: str,
+    target_size_mb: int = None,
+    max_height: int = None
+) -> Optional[str]:
+    """Transcode while downloading; the original never lands on disk
+
+    Returns output_path, or None when the source can't be streamed or
+    ffmpeg failed - the caller then downloads the file and compresses it.
+    An encode whose progress shows it will not fit is stopped early and
+    handled like an oversized result.
+    """
+    target_size_mb = target_size_mb or config.target_video_size_mb
+    max_height = max_height or config.max_video_height
+    if not build_stream_command(info, output_path, target_size_mb, max_height):
+        return None
+
+    duration = float(info.get('duration') or 0)
+    job = transcode_jobs.create(
+        'stream', info.get('title') or info.get('id') or 'video', duration,
+        target_bytes=target_size_mb * 1024 * 1024
+    )
+    try:
+        cmd = build_stream_command(
+            info,
+            output_path,
+            target_size_mb,
+            max_height,
+            preset=transcode_scheduler.choose_preset(duration, STREAM_THREADS),
+            threads=STREAM_THREADS
+        )
+        returncode, stdout, stderr = await run_command(with_progress(cmd), on_progress=job.update)
+    except Exception as e:
+        logger.error(f"Error streaming video to ffmpeg: {e}")
+        metrics.track_error(type(e).__name__)
+        returncode, stderr = -1, b''
+    finally:
+        transcode_jobs.finish(job)
+
+    if job.aborted:
+        logger.warning(f"Streaming transcode of {info.get('id')} heading for "
+                       f"{job.projected_size / (1024 * 1024):.1f}MB, stopped at {job.percent:.0f}%")
+        metrics.track_transcode_mode("stream_oversize")
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return None
+
+    if returncode == 0 and os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+        if os.path.getsize(output_path) <= target_size_mb * 1024 * 1024:
+            metrics.track_transcode_mode("streamed")
+            return output_path
+        # Bir o'tishli oqim siqishi limitdan oshdi: fayl orqali aniq siqiladi
+        logger.warning(f"Streaming transcode of {info.get('id')} overshot "
+                       f"{target_size_mb}MB, falling back to size-accurate encode")
+        metrics.track_transcode_mode("stream_oversize")
+        os.remove(output_path)
+        return None
+
+    logger.warning(f"Streaming transcode failed for {info.get('id')}, falling back: "
+                   f"{stderr.decode(errors='replace')[-500:]}")
+    metrics.track_transcode_mode("stream_fallback")
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    return None
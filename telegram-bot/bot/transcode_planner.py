@@ -0,0 +1,134 @@
+import os
+import struct
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+# Cheapest first: leave as is, move moov, rewrap, touch one stream, re-encode everything
+PLAN_KEEP = "keep"
+PLAN_FASTSTART = "faststart"
+PLAN_COPY = "copy"
+PLAN_AUDIO_ENCODE = "audio_encode"
+PLAN_VIDEO_ENCODE = "video_encode"
+PLAN_TRANSCODE = "transcode"
+
+AUDIO_PLAN_COPY = "copy"
+AUDIO_PLAN_ENCODE = "encode"
+
+# Codecs Telegram plays inline from an mp4
+VIDEO_CODECS = ('h264',)
+VIDEO_PIXEL_FORMATS = ('yuv420p', 'yuvj420p')
+AUDIO_CODECS = ('aac',)
+# Audio copied through a size-targeted encode must not eat the video budget
+MAX_COPY_AUDIO_BITRATE = 256000
+# Audio codecs copied as they are, with the container they belong in
+AUDIO_COPY_EXTENSIONS = {'aac': '.m4a', 'mp3': '.mp3'}
+
+MP4_FORMATS = ('mov', 'mp4', 'm4a')
+
+@dataclass
+class VideoPlan:
+    """What compress_video has to do with one file"""
+    mode: str
+    reason: str
+    audio_bitrate: Optional[int] = None
+
+    @property
+    def encodes_video(self) -> bool:
+        return self.mode in (PLAN_VIDEO_ENCODE, PLAN_TRANSCODE)
+
+    @property
+    def copies_audio(self) -> bool:
+        return self.mode == PLAN_VIDEO_ENCODE
+
+def _stream(probe: Dict[str, Any], codec_type: str) -> Optional[Dict[str, Any]]:
+    for stream in probe.get('streams') or []:
+        if stream.get('codec_type') == codec_type:
+            return stream
+    return None
+
+def _bitrate(stream: Optional[Dict[str, Any]]) -> Optional[int]:
+    try:
+        return int(stream.get('bit_rate')) if stream else None
+    except (TypeError, ValueError):
+        return None
+
+def video_compatible(stream: Optional[Dict[str, Any]]) -> bool:
+    if not stream or stream.get('codec_name') not in VIDEO_CODECS:
+        return False
+    pix_fmt = stream.get('pix_fmt')
+    return not pix_fmt or pix_fmt in VIDEO_PIXEL_FORMATS
+
+def audio_compatible(stream: Optional[Dict[str, Any]]) -> bool:
+    # Ovozsiz video ham mos hisoblanadi
+    return stream is None or stream.get('codec_name') in AUDIO_CODECS
+
+def is_mp4(probe: Dict[str, Any]) -> bool:
+    format_names = (probe.get('format') or {}).get('format_name') or ''
+    return any(name in MP4_FORMATS for name in format_names.split(','))
+
+def moov_before_mdat(path: str) -> bool:
+    """True if the mp4 index comes before the media data (plays while loading)
+
+    Only the top-level box headers are read, so this is cheap for any size.
+    """
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    return False
+                size, box_type = struct.unpack('>I4s', header)
+                if box_type == b'moov':
+                    return True
+                if box_type == b'mdat':
+                    return False
+                if size == 1:
+                    size = struct.unpack('>Q', f.read(8))[0]
+                    f.seek(size - 16, os.SEEK_CUR)
+                elif size == 0:
+                    return False
+                else:
+                    f.seek(size - 8, os.SEEK_CUR)
+    except (OSError, struct.error):
+        return False
+
+def plan_video(
+    probe: Dict[str, Any],
+    file_size: int,
+    target_bytes: int,
+    faststart: bool = False
+) -> Optional[VideoPlan]:
+    """Cheapest operation giving a Telegram-playable mp4 under target_bytes
+
+    Returns None when the file has no video stream.
+    """
+    video = _stream(probe, 'video')
+    if not video:
+        return None
+    audio = _stream(probe, 'audio')
+    video_ok = video_compatible(video)
+    audio_ok = audio_compatible(audio)
+
+    if file_size <= target_bytes and video_ok:
+        if audio_ok:
+            if is_mp4(probe):
+                if faststart:
+                    return VideoPlan(PLAN_KEEP, "compatible mp4")
+                return VideoPlan(PLAN_FASTSTART, "moov after media data")
+            return VideoPlan(PLAN_COPY, "rewrap with faststart")
+        # Faqat ovoz qayta kodlanadi, video o'zgarmaydi
+        return VideoPlan(PLAN_AUDIO_ENCODE, f"audio codec {audio.get('codec_name')}")
+
+    audio_bitrate = _bitrate(audio)
+    if audio is not None and audio_ok and audio_bitrate and audio_bitrate <= MAX_COPY_AUDIO_BITRATE:
+        reason = "too large" if video_ok else f"video codec {video.get('codec_name')}"
+        return VideoPlan(PLAN_VIDEO_ENCODE, reason, audio_bitrate=audio_bitrate)
+    return VideoPlan(PLAN_TRANSCODE, "too large" if video_ok else f"video codec {video.get('codec_name')}")
+
+def plan_audio(probe: Optional[Dict[str, Any]]) -> tuple:
+    """(plan, file extension) for extracting the audio track"""
+    audio = _stream(probe or {}, 'audio')
+    codec = audio.get('codec_name') if audio else None
+    if codec in AUDIO_COPY_EXTENSIONS:
+        return AUDIO_PLAN_COPY, AUDIO_COPY_EXTENSIONS[codec]
+    return AUDIO_PLAN_ENCODE, '.mp3'
@@ -1,22 +1,94 @@
 import re
 import os
+import hashlib
 import logging
 import asyncio
-from typing import Optional, Any, Dict, Tuple
+from typing import Optional, Any, Callable, Dict, List, Tuple
 from pathlib import Path
 from functools import wraps
 from datetime import datetime
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
 
 from .config.config import config
+from .process_runner import process_runner
 
 logger = logging.getLogger(__name__)
 
+URL_PATTERN = re.compile(r'https?://[^\s<>"\']+')
+
 def extract_url(text: str) -> Optional[str]:
     """Extract URL from text message"""
-    url_pattern = r'https?://[^\s<>"\']+'
-    match = re.search(url_pattern, text)
+    match = URL_PATTERN.search(text)
     return match.group(0) if match else None
 
+def extract_urls(text: str, limit: Optional[int] = None) -> List[str]:
+    """Every distinct URL in text, in order (same video via different links counted once)"""
+    urls = []
+    seen = set()
+    for match in URL_PATTERN.finditer(text):
+        url = match.group(0).rstrip('.,;')
+        key = canonicalize_url(url)
+        if key in seen:
+            continue
+        seen.add(key)
+        urls.append(url)
+        if limit and len(urls) >= limit:
+            break
+    return urls
+
+# Query parameters that only track the sharer and never change the video
+TRACKING_PARAMS = {
+    'si', 'feature', 'igshid', 'igsh', 'fbclid', 'gclid', 'ref_src',
+    'is_from_webapp', 'sender_device', 'web_id', 'pp',
+}
+
+# Keys end up in callback_data, which Telegram limits to 64 bytes
+MAX_MEDIA_KEY_LENGTH = 40
+
+def canonicalize_url(url: str) -> str:
+    """Normalize URL so that links to the same video compare equal"""
+    try:
+        parsed = urlparse(url.strip())
+    except ValueError:
+        return url.strip()
+
+    host = (parsed.hostname or '').lower()
+    for prefix in ('www.', 'm.', 'mobile.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    path = parsed.path.rstrip('/') or '/'
+
+    query = [
+        (key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=False)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith('utm_')
+    ]
+
+    # YouTube havolalarini yagona ko'rinishga keltirish
+    if host == 'youtu.be' and path != '/':
+        query = [('v', path.lstrip('/'))] + [(k, v) for k, v in query if k == 'list']
+        host, path = 'youtube.com', '/watch'
+    elif host in ('youtube.com', 'music.youtube.com') and path.startswith('/shorts/'):
+        query = [('v', path.split('/')[2])]
+        host, path = 'youtube.com', '/watch'
+    elif host == 'youtube.com' and path == '/watch':
+        query = [(k, v) for k, v in query if k in ('v', 'list')]
+
+    return urlunparse(('https', host, path, '', urlencode(sorted(query)), ''))
+
+def media_key_from_info(info: Dict[str, Any], url: Optional[str] = None) -> str:
+    """Build a stable key (extractor:id) identifying a video"""
+    extractor = str(info.get('extractor_key') or info.get('extractor') or 'generic').lower()
+    video_id = info.get('id')
+    if not video_id:
+        source = url or info.get('webpage_url') or info.get('original_url') or ''
+        video_id = hashlib.sha1(canonicalize_url(source).encode()).hexdigest()[:16]
+
+    key = f"{extractor}:{video_id}"
+    if len(key) > MAX_MEDIA_KEY_LENGTH:
+        digest = hashlib.sha1(str(video_id).encode()).hexdigest()[:16]
+        key = f"{extractor[:MAX_MEDIA_KEY_LENGTH - 17]}:{digest}"
+    return key
+
 def ensure_downloads_dir() -> None:
     """Ensure downloads directory exists"""
     os.makedirs(config.downloads_dir, exist_ok=True)
@@ -49,15 +121,19 @@ def format_duration(seconds: float) -> str:
         return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
     return f"{minutes:02d}:{seconds:02d}"
 
-async def run_command(cmd: list) -> Tuple[int, bytes, bytes]:
-    """Run a command asynchronously and return returncode, stdout, stderr"""
-    process = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
-    )
-    stdout, stderr = await process.communicate()
-    return process.returncode, stdout, stderr
+async def run_command(
+    cmd: list,
+    timeout: Optional[float] = None,
+    on_progress: Optional[Callable] = None
+) -> Tuple[int, bytes, bytes]:
+    """Run a command asynchronously and return returncode, stdout, stderr
+
+    Goes through process_runner: stderr is only the tail, a run past its
+    deadline is killed (negative returncode) and cancellation kills it.
+    on_progress gets parsed ffmpeg -progress blocks; False stops the run.
+    """
+    result = await process_runner.run(cmd, timeout, on_progress)
+    return result.returncode, result.stdout, result.stderr
 
 def async_error_handler(func):
     """Asinxron funksiyalar uchun xatoliklarni qayta ishlash dekorator"""
@@ -1,61 +1,308 @@
 import os
-import json
+import time
 import logging
 import asyncio
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any
 from pathlib import Path
 
 from .services.monitoring import metrics
+from .services.transcode_scheduler import transcode_scheduler, EncoderSlot, DEFAULT_PRESET
+from .services.transcode_jobs import transcode_jobs, TranscodeJob
 from .config.config import config
 from .utils import run_command
 from .path_utils import generate_temp_filename
+from .media_probe import media_probe
+from .faststart import relocate_moov
+from .transcode_planner import plan_video, PLAN_KEEP, PLAN_FASTSTART, PLAN_AUDIO_ENCODE
+from .ffmpeg_encode import (
+    calculate_target_bitrate, scaled_dimensions, build_encode_args, run_ffmpeg, EncodeOvershoot,
+    AUDIO_BITRATE, MIN_VIDEO_BITRATE, SIZE_SAFETY
+)
+from .segment_encoder import encode_segmented, segment_workers
 
 logger = logging.getLogger(__name__)
 
-async def get_video_info(video_path: str) -> Optional[Dict[str, Any]]:
-    """Get video information using ffprobe"""
-    try:
-        cmd = [
-            'ffprobe',
-            '-v', 'quiet',
-            '-print_format', 'json',
-            '-show_format',
-            '-show_streams',
-            video_path
-        ]
-        
-        returncode, stdout, stderr = await run_command(cmd)
-        
-        if returncode != 0:
-            logger.error(f"FFprobe error: {stderr.decode()}")
-            return None
-            
-        return json.loads(stdout.decode())
-        
-    except Exception as e:
-        logger.error(f"Error getting video info: {e}")
-        metrics.track_error(type(e).__name__)
-        return None
+# mp4 headers and interleaving on top of the raw stream sizes
+CONTAINER_OVERHEAD = 0.01
+# Two-pass output smaller than this share of the target wasted quality
+UNDERSHOOT_RATIO = 0.8
+# Sample encodes used to predict the output size
+SAMPLE_COUNT = 3
+SAMPLE_SECONDS = 4
+# Sampling only pays off when the video is much longer than the samples
+MIN_DURATION_SAMPLES_RATIO = 3
+# Full passes a size-targeted encode is expected to take (two-pass ABR)
+ENCODE_PASSES = 2
+
+async def get_video_info(video_path: str, info: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """ffprobe-shaped stream information, from the shared media probe"""
+    media = await media_probe.probe(video_path, info)
+    return media.to_probe() if media else None
+
+def predict_size(video_bytes_per_second: float, duration: float, audio_bitrate: int = None) -> int:
+    """Output size from the video rate measured on samples plus AAC audio"""
+    audio_bitrate = audio_bitrate or AUDIO_BITRATE
+    payload = (video_bytes_per_second + audio_bitrate / 8) * duration
+    return int(payload * (1 + CONTAINER_OVERHEAD))
 
-def calculate_target_bitrate(
+def corrected_bitrate(
+    bitrate: int,
+    actual_size: int,
+    target_bytes: int,
     duration: float,
-    target_size_mb: int,
-    audio_bitrate: int = 128000
+    audio_bitrate: int = None
 ) -> int:
-    """Calculate target video bitrate based on desired file size"""
-    target_size_bits = target_size_mb * 8 * 1024 * 1024
-    audio_size = (audio_bitrate * duration) / 8
-    video_size = target_size_bits - audio_size
-    video_bitrate = int(video_size / duration)
-    return max(video_bitrate, 100000)  # Minimum 100Kbps
+    """Video bitrate for the corrective pass, scaled by how far the output missed"""
+    audio_bytes = (audio_bitrate or AUDIO_BITRATE) / 8 * duration
+    actual_video = max(1.0, actual_size - audio_bytes)
+    wanted_video = max(1.0, target_bytes * SIZE_SAFETY - audio_bytes)
+    return max(MIN_VIDEO_BITRATE, int(bitrate * wanted_video / actual_video))
+
+def sample_offsets(duration: float, count: int = None, length: float = None) -> list:
+    """Evenly spread sample start times, skipping the first and last stretch"""
+    count = count or SAMPLE_COUNT
+    length = length or SAMPLE_SECONDS
+    if duration < count * length * MIN_DURATION_SAMPLES_RATIO:
+        return []
+    step = duration / (count + 1)
+    return [max(0.0, step * (index + 1) - length / 2) for index in range(count)]
+
+async def measure_sample_rate(
+    input_path: str,
+    duration: float,
+    width: int,
+    height: int,
+    crf: int,
+    max_bitrate: int,
+    preset: str = DEFAULT_PRESET,
+    threads: Optional[int] = None
+) -> Optional[float]:
+    """Video bytes per second of a capped-CRF encode, measured on short samples"""
+    offsets = sample_offsets(duration)
+    if not offsets:
+        return None
+
+    total_bytes = 0
+    total_seconds = 0.0
+    for offset in offsets:
+        sample_path = generate_temp_filename(prefix="sample_", suffix=".mp4")
+        try:
+            cmd = [
+                'ffmpeg', '-ss', f'{offset:.2f}', '-t', f'{SAMPLE_SECONDS}', '-i', input_path,
+                '-c:v', 'libx264', '-preset', preset
+            ] + (['-threads', f'{threads}'] if threads else []) + [
+                '-crf', f'{crf}', '-maxrate', f'{max_bitrate}', '-bufsize', f'{max_bitrate * 2}',
+                '-vf', f'scale={width}:{height}', '-an', '-y', sample_path
+            ]
+            if not await run_ffmpeg(cmd) or not os.path.exists(sample_path):
+                return None
+            total_bytes += os.path.getsize(sample_path)
+            total_seconds += min(SAMPLE_SECONDS, duration - offset)
+        finally:
+            if os.path.exists(sample_path):
+                os.remove(sample_path)
+    return total_bytes / total_seconds if total_seconds else None
+
+async def encode_abr(
+    input_path: str,
+    output_path: str,
+    bitrate: int,
+    width: int,
+    height: int,
+    two_pass: bool = True,
+    audio_copy: bool = False,
+    preset: str = DEFAULT_PRESET,
+    threads: Optional[int] = None,
+    label: Optional[str] = None,
+    duration: float = 0.0,
+    target_bytes: Optional[int] = None
+) -> bool:
+    """ABR encode at bitrate; two passes put the bits where the video needs them
+
+    With a label each pass shows up in the transcode job table; the final
+    pass is stopped early (EncodeOvershoot) if it heads above target_bytes.
+    """
+    def job(step: str, target: Optional[int] = None) -> Optional[TranscodeJob]:
+        if label is None:
+            return None
+        return transcode_jobs.create('abr', label, duration, target_bytes=target, step=step)
+
+    if not two_pass:
+        return await run_ffmpeg(['ffmpeg', '-i', input_path] + build_encode_args(
+            bitrate, width, height, output_path, audio_copy=audio_copy, preset=preset, threads=threads
+        ), job('abr', target_bytes))
+
+    passlogfile = generate_temp_filename(prefix="x264pass_", suffix="")
+    try:
+        for pass_number in (1, 2):
+            cmd = ['ffmpeg', '-i', input_path] + build_encode_args(
+                bitrate, width, height, output_path,
+                pass_number=pass_number, passlogfile=passlogfile, audio_copy=audio_copy,
+                preset=preset, threads=threads
+            )
+            step = f'pass {pass_number}/2'
+            if not await run_ffmpeg(cmd, job(step, target_bytes if pass_number == 2 else None)):
+                return False
+        return True
+    finally:
+        for leftover in Path(passlogfile).parent.glob(f"{Path(passlogfile).name}*"):
+            try:
+                leftover.unlink()
+            except OSError:
+                pass
+
+async def encode_to_size(
+    input_path: str,
+    output_path: str,
+    duration: float,
+    width: int,
+    height: int,
+    target_bytes: int,
+    audio_bitrate: int = None,
+    audio_copy: bool = False
+) -> Optional[str]:
+    """Encode so the output lands just under target_bytes
+
+    A few short capped-CRF sample encodes predict the full output size.
+    If the prediction fits, the whole video is encoded with capped CRF
+    (good quality, no wasted bits); otherwise two-pass ABR at the budget
+    bitrate is used. The final size is checked and, if it still misses,
+    one corrective two-pass encode with a rescaled bitrate is made.
+    Encodes report -progress to the job table and are stopped as soon as
+    their projected size clearly overshoots: a CRF run then falls back to
+    two-pass, a two-pass run goes straight to the corrective encode.
+    audio_bitrate is the copied track's bitrate when audio_copy is set.
+    Samples and passes all run in one transcode scheduler slot, so they
+    share its threads and preset.
+    """
+    async with transcode_scheduler.encoder(duration, passes=ENCODE_PASSES) as slot:
+        return await _encode_to_size(
+            input_path, output_path, duration, width, height, target_bytes,
+            audio_bitrate or AUDIO_BITRATE, audio_copy, slot
+        )
+
+async def _encode_to_size(
+    input_path: str,
+    output_path: str,
+    duration: float,
+    width: int,
+    height: int,
+    target_bytes: int,
+    audio_bitrate: int,
+    audio_copy: bool,
+    slot: EncoderSlot
+) -> Optional[str]:
+    budget_bitrate = calculate_target_bitrate(
+        duration=duration,
+        target_size_mb=target_bytes * SIZE_SAFETY / (1024 * 1024),
+        audio_bitrate=audio_bitrate
+    )
+
+    predicted = None
+    sample_rate = await measure_sample_rate(
+        input_path, duration, width, height, config.encode_crf, budget_bitrate,
+        preset=slot.preset, threads=slot.threads
+    )
+    if sample_rate:
+        predicted = predict_size(sample_rate, duration, audio_bitrate)
+        slot.media_seconds += SAMPLE_COUNT * SAMPLE_SECONDS
+
+    label = os.path.basename(input_path)
+    projected = None
+    mode = None
+    if predicted and predicted <= target_bytes * SIZE_SAFETY:
+        mode = "crf"
+        job = transcode_jobs.create('crf', label, duration, target_bytes=target_bytes)
+        try:
+            encoded = await run_ffmpeg(['ffmpeg', '-i', input_path] + build_encode_args(
+                budget_bitrate, width, height, output_path, crf=config.encode_crf, audio_copy=audio_copy,
+                preset=slot.preset, threads=slot.threads
+            ), job)
+            slot.media_seconds += duration
+        except EncodeOvershoot as e:
+            # Namunalar adashgan: qolgan vaqtni ABR'ga sarflash foydaliroq
+            logger.info(
+                f"CRF encode heading for {e.projected_size / (1024 * 1024):.1f}MB, switching to two-pass"
+            )
+            slot.media_seconds += duration * job.fraction
+            metrics.track_size_prediction(predicted, e.projected_size)
+            predicted = None
+            mode = None
+    if mode is None:
+        mode = "two_pass"
+        try:
+            encoded = await encode_abr(
+                input_path, output_path, budget_bitrate, width, height, audio_copy=audio_copy,
+                preset=slot.preset, threads=slot.threads,
+                label=label, duration=duration, target_bytes=target_bytes
+            )
+        except EncodeOvershoot as e:
+            # To'xtatilgan o'tishning taxminiy hajmi tuzatish uchun yetarli
+            projected = e.projected_size
+            encoded = True
+        slot.media_seconds += duration * 2
+    if not encoded or (projected is None and not os.path.exists(output_path)):
+        return None
+
+    actual = projected or os.path.getsize(output_path)
+    if predicted:
+        metrics.track_size_prediction(predicted, actual)
+
+    # ABR natijasi juda kichik bo'lsa ham sifat behuda yo'qotilgan
+    missed = projected is not None or actual > target_bytes or (
+        mode == "two_pass" and actual < target_bytes * UNDERSHOOT_RATIO
+    )
+    corrected = False
+    if missed:
+        bitrate = corrected_bitrate(budget_bitrate, actual, target_bytes, duration, audio_bitrate)
+        logger.info(
+            f"Encode missed target ({actual / (1024 * 1024):.1f}MB vs "
+            f"{target_bytes / (1024 * 1024):.1f}MB), correcting to {bitrate // 1000}kbps"
+        )
+        corrected = True
+        if not await encode_abr(
+            input_path, output_path, bitrate, width, height, audio_copy=audio_copy,
+            preset=slot.preset, threads=slot.threads, label=label, duration=duration
+        ):
+            return None
+        slot.media_seconds += duration * 2
+        actual = os.path.getsize(output_path)
+
+    metrics.track_size_encode(mode, corrected, actual <= target_bytes)
+    if actual > target_bytes:
+        logger.warning(f"Encoded video still above target: {actual / (1024 * 1024):.1f}MB")
+    return output_path
+
+async def remux_video(input_path: str, output_path: str, encode_audio: bool = False) -> Optional[str]:
+    """Copy the video stream into a faststart mp4, re-encoding only the audio if asked"""
+    if encode_audio:
+        audio_args = ['-c:a', 'aac', '-b:a', f'{AUDIO_BITRATE // 1000}k', '-ar', '44100']
+    else:
+        audio_args = ['-c:a', 'copy']
+    cmd = [
+        'ffmpeg', '-i', input_path,
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-c:v', 'copy'
+    ] + audio_args + ['-movflags', '+faststart', '-y', output_path]
+    if not await run_ffmpeg(cmd) or not os.path.exists(output_path):
+        return None
+    return output_path
 
 async def compress_video(
     input_path: str,
     output_path: str,
     target_size_mb: int = None,
-    max_height: int = 720
+    max_height: int = 720,
+    info: Optional[Dict[str, Any]] = None
 ) -> Optional[str]:
-    """Compress video to target size while maintaining quality"""
+    """Make a Telegram-ready mp4 under target size as cheaply as possible
+
+    The probe result decides: keep the file, rewrap it (stream copy with
+    faststart), re-encode only the audio, re-encode only the video while
+    copying AAC audio, or fully transcode. Returns input_path when the
+    file can be sent as it is. info is the yt-dlp info of input_path, if
+    known; it spares probing the file.
+    """
     try:
         if not os.path.exists(input_path):
             logger.error(f"Input video not found: {input_path}")
@@ -63,81 +310,81 @@ async def compress_video(
 
         # Use config target size if not specified
         target_size_mb = target_size_mb or config.target_video_size_mb
+        target_bytes = target_size_mb * 1024 * 1024
             
         # Get video information
-        video_info = await get_video_info(input_path)
-        if not video_info:
+        media = await media_probe.probe(input_path, info)
+        if not media:
             return None
             
         # Get video duration and original size
-        duration = float(video_info['format']['duration'])
-        original_size = os.path.getsize(input_path)
-        
-        # If already smaller than target, return original
-        if original_size <= target_size_mb * 1024 * 1024:
-            logger.info("Video already within size limit")
-            return input_path
-            
-        # Find video stream
-        video_stream = None
-        for stream in video_info['streams']:
-            if stream['codec_type'] == 'video':
-                video_stream = stream
-                break
-                
-        if not video_stream:
+        duration = media.duration
+        original_size = media.size
+
+        plan = plan_video(media.to_probe(), original_size, target_bytes, media.faststart)
+        if not plan:
             logger.error("No video stream found")
             return None
-            
-        # Calculate target bitrate
-        target_bitrate = calculate_target_bitrate(
-            duration=duration,
-            target_size_mb=target_size_mb
-        )
-        
-        # Calculate scaling
-        width = int(video_stream.get('width', 1920))
-        height = int(video_stream.get('height', 1080))
-        
-        if height > max_height:
-            scale_factor = max_height / height
-            width = int(width * scale_factor)
-            height = max_height
-            
-        # Ensure even dimensions
-        width = width - (width % 2)
-        height = height - (height % 2)
-        
-        # Construct ffmpeg command
-        cmd = [
-            'ffmpeg',
-            '-i', input_path,
-            '-c:v', 'libx264',
-            '-preset', 'medium',  # Balance between speed and compression
-            '-b:v', f'{target_bitrate}',
-            '-maxrate', f'{int(target_bitrate * 1.5)}',
-            '-bufsize', f'{int(target_bitrate * 2)}',
-            '-vf', f'scale={width}:{height}',
-            '-c:a', 'aac',
-            '-b:a', '128k',
-            '-ar', '44100',
-            '-movflags', '+faststart',
-            '-y',
-            output_path
-        ]
-        
-        # Run compression
-        returncode, stdout, stderr = await run_command(cmd)
-        
-        if returncode != 0:
-            logger.error(f"FFmpeg error: {stderr.decode()}")
-            metrics.track_error("FFmpegError")
+        logger.info(f"Transcode plan for {input_path}: {plan.mode} ({plan.reason})")
+
+        start_time = time.monotonic()
+        if plan.mode == PLAN_KEEP:
+            result = input_path
+        elif plan.mode == PLAN_FASTSTART:
+            # moov oldinga ko'chiriladi (ffmpeg'siz); bo'lmasa ffmpeg bilan qayta o'raladi
+            result = await asyncio.get_running_loop().run_in_executor(
+                None, relocate_moov, input_path, output_path
+            ) or await remux_video(input_path, output_path)
+        elif not plan.encodes_video:
+            # Nusxalash tez: transcode navbatini band qilmaydi
+            result = await remux_video(input_path, output_path, encode_audio=plan.mode == PLAN_AUDIO_ENCODE)
+        else:
+            # Calculate scaling
+            width, height = scaled_dimensions(
+                int(media.width or 1920),
+                int(media.height or 1080),
+                max_height
+            )
+
+            # CPU navbati transcode_scheduler'da: har bir kodlovchi o'z ulushini oladi
+            if (config.segment_encoding and duration >= config.segment_min_duration
+                    and segment_workers() > 1):
+                # Uzun video segmentlarga bo'linib barcha yadrolarda siqiladi
+                result = await encode_segmented(
+                    input_path,
+                    output_path,
+                    duration,
+                    width,
+                    height,
+                    target_bytes,
+                    has_audio=media.has_audio,
+                    audio_bitrate=plan.audio_bitrate,
+                    audio_copy=plan.copies_audio
+                )
+            else:
+                # Hajmni oldindan bashorat qilib, kerak bo'lsa bir marta tuzatib siqish
+                result = await encode_to_size(
+                    input_path,
+                    output_path,
+                    duration,
+                    width,
+                    height,
+                    target_bytes,
+                    audio_bitrate=plan.audio_bitrate,
+                    audio_copy=plan.copies_audio
+                )
+        metrics.track_stage_time(f"transcode_{plan.mode}", time.monotonic() - start_time)
+
+        if not result:
             return None
+        if result == input_path:
+            logger.info("Video already within size limit")
+            return input_path
             
         if os.path.exists(output_path):
             new_size = os.path.getsize(output_path)
             compression_ratio = (original_size - new_size) / original_size * 100
-            logger.info(f"Video compressed: {compression_ratio:.1f}% size reduction")
+            logger.info(f"Video {plan.mode}: {compression_ratio:.1f}% size reduction")
             return output_path
             
     except Exception as e:
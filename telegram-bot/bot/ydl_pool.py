@@ -0,0 +1,145 @@
+import asyncio
+import logging
+from pathlib import Path
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional
+import yt_dlp
+from .services.monitoring import metrics
+from .config.config import config
+
+logger = logging.getLogger(__name__)
+
+# Option profiles
+PROFILE_METADATA = "metadata"
+PROFILE_DOWNLOAD = "download"
+
+class YDLPool:
+    """Long-lived YoutubeDL instances, checked out one job at a time
+
+    Building a YoutubeDL per request throws away extractor instances, open
+    HTTP connections, cookies and yt-dlp's in-memory caches. Pooled
+    instances keep all of that between jobs; on-disk extractor artifacts
+    (e.g. YouTube signature functions) go to a persistent cachedir.
+    A YoutubeDL is not thread-safe, so an instance is only ever used by the
+    job that checked it out.
+    """
+
+    def __init__(
+        self,
+        opts_factory: Callable[[str], Dict[str, Any]],
+        sizes: Optional[Dict[str, int]] = None,
+        cachedir: Optional[str] = None,
+        max_jobs_per_instance: int = 200
+    ):
+        self.opts_factory = opts_factory
+        self.sizes = sizes or {
+            PROFILE_METADATA: config.pipeline_metadata_workers,
+            PROFILE_DOWNLOAD: config.pipeline_download_workers,
+        }
+        self.cachedir = cachedir or str(Path(config.data_dir) / "yt-dlp-cache")
+        self.max_jobs_per_instance = max_jobs_per_instance
+        self._idle: Dict[str, List[yt_dlp.YoutubeDL]] = {}
+        self._created: Dict[str, int] = {}
+        self._jobs: Dict[int, int] = {}
+        self._available: Dict[str, asyncio.Condition] = {}
+
+    def _condition(self, profile: str) -> asyncio.Condition:
+        if profile not in self._available:
+            self._available[profile] = asyncio.Condition()
+        return self._available[profile]
+
+    def options(self, profile: str) -> Dict[str, Any]:
+        """YoutubeDL options of a profile, including the shared cachedir"""
+        opts = self.opts_factory(profile)
+        opts['cachedir'] = self.cachedir
+        return opts
+
+    def _create(self, profile: str) -> yt_dlp.YoutubeDL:
+        ydl = yt_dlp.YoutubeDL(self.options(profile))
+        logger.info(f"Created YoutubeDL instance for profile '{profile}'")
+        return ydl
+
+    async def _acquire(self, profile: str) -> yt_dlp.YoutubeDL:
+        condition = self._condition(profile)
+        async with condition:
+            while True:
+                idle = self._idle.setdefault(profile, [])
+                if idle:
+                    metrics.track_ydl_checkout(warm=True)
+                    return idle.pop()
+                if self._created.get(profile, 0) < self.sizes.get(profile, 1):
+                    self._created[profile] = self._created.get(profile, 0) + 1
+                    break
+                await condition.wait()
+
+        try:
+            ydl = await asyncio.get_event_loop().run_in_executor(None, self._create, profile)
+        except BaseException:
+            self._created[profile] -= 1
+            raise
+        metrics.track_ydl_checkout(warm=False)
+        return ydl
+
+    async def _release(self, profile: str, ydl: yt_dlp.YoutubeDL, discard: bool) -> None:
+        jobs = self._jobs.get(id(ydl), 0) + 1
+        if discard or jobs >= self.max_jobs_per_instance:
+            self._jobs.pop(id(ydl), None)
+            self._close(ydl)
+            self._created[profile] -= 1
+        else:
+            self._jobs[id(ydl)] = jobs
+            self._idle.setdefault(profile, []).append(ydl)
+
+        condition = self._condition(profile)
+        async with condition:
+            condition.notify()
+
+    @asynccontextmanager
+    async def checkout(self, profile: str):
+        """Borrow a warm YoutubeDL for one job"""
+        ydl = await self._acquire(profile)
+        discard = False
+        try:
+            yield ydl
+        except yt_dlp.utils.DownloadError:
+            # Oddiy yuklab olish xatoligi - nusxa sog'lom
+            raise
+        except BaseException:
+            # Noma'lum holat (bekor qilish, ichki xato) - nusxani qayta ishlatmaymiz
+            discard = True
+            raise
+        finally:
+            await self._release(profile, ydl, discard)
+
+    @staticmethod
+    def _close(ydl: yt_dlp.YoutubeDL) -> None:
+        try:
+            # __exit__ saves cookies and closes network handlers
+            ydl.__exit__(None, None, None)
+        except Exception as e:
+            logger.error(f"Error closing YoutubeDL instance: {e}")
+
+    async def warm_up(self, profiles=(PROFILE_METADATA, PROFILE_DOWNLOAD)) -> None:
+        """Create one instance per profile ahead of the first request"""
+        for profile in profiles:
+            async with self.checkout(profile):
+                pass
+
+    def clear(self) -> None:
+        """Close all idle instances"""
+        for profile, idle in self._idle.items():
+            for ydl in idle:
+                self._jobs.pop(id(ydl), None)
+                self._close(ydl)
+            self._created[profile] = self._created.get(profile, 0) - len(idle)
+            idle.clear()
+
+    def get_statistics(self) -> Dict[str, Dict[str, int]]:
+        return {
+            profile: {
+                'created': self._created.get(profile, 0),
+                'idle': len(self._idle.get(profile, [])),
+                'size': self.sizes.get(profile, 1)
+            }
+            for profile in set(self.sizes) | set(self._created)
+        }
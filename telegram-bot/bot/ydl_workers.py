@@ -0,0 +1,359 @@
+import os
+import signal
+import asyncio
+import logging
+import itertools
+import multiprocessing
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from .config.config import config
+
+logger = logging.getLogger(__name__)
+
+# Worker operations
+OP_PING = "ping"
+OP_EXTRACT = "extract"
+OP_DOWNLOAD = "download"
+
+# Full info dicts kept inside a worker so a later download can skip extraction
+WORKER_INFO_CACHE_SIZE = 32
+
+class _WorkerState:
+    """Per-process state of a yt-dlp worker"""
+
+    def __init__(self, ydl_opts: Dict[str, Any]):
+        self.pid = os.getpid()
+        self.ydl_opts = ydl_opts
+        self._ydl = None
+        self._infos: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._refs = itertools.count(1)
+
+    def ydl(self):
+        if self._ydl is None:
+            import yt_dlp
+            # Parent's options: same cachedir (signature/player cache) as YDLPool
+            self._ydl = yt_dlp.YoutubeDL(dict(self.ydl_opts))
+        return self._ydl
+
+    def reset(self) -> None:
+        """Drop the YoutubeDL instance after an unexpected error"""
+        if self._ydl is not None:
+            try:
+                self._ydl.__exit__(None, None, None)
+            except Exception:
+                pass
+            self._ydl = None
+
+    def remember(self, info: Dict[str, Any]) -> str:
+        ref = f"{self.pid}:{next(self._refs)}"
+        self._infos[ref] = info
+        while len(self._infos) > WORKER_INFO_CACHE_SIZE:
+            self._infos.popitem(last=False)
+        return ref
+
+    def recall(self, ref: Optional[str]) -> Optional[Dict[str, Any]]:
+        return self._infos.pop(ref, None) if ref else None
+
+def _extract(state: _WorkerState, url: str) -> Dict[str, Any]:
+    from .services.metadata_cache import slim_info
+    from .downloader import DownloadError
+
+    info = state.ydl().extract_info(url, download=False)
+    if not info:
+        raise DownloadError("Could not extract video info")
+    slim = slim_info(info)
+    slim['_ref'] = state.remember(info)
+    return slim
+
+def _download(
+    state: _WorkerState,
+    url: str,
+    output_path: str,
+    info: Optional[Dict[str, Any]],
+    tuning: Optional[Dict[str, Tuple[int, int]]] = None
+) -> Dict[str, Any]:
+    import time
+    from .config.config import config
+    from .services.metadata_cache import slim_info
+    from .downloader import check_size_limit, prepare_job, stream_host, throughput_sample, DownloadError
+
+    ydl = state.ydl()
+    full_info = state.recall((info or {}).get('_ref'))
+    if full_info is None:
+        full_info = ydl.extract_info(url, download=False)
+        if not full_info:
+            raise DownloadError("Could not extract video info")
+    check_size_limit(full_info)
+
+    prepare_job(ydl, output_path, full_info, tuning)
+    host = stream_host(full_info) if config.parallel_downloads else None
+    start_time = time.monotonic()
+    result = ydl.process_ie_result(full_info, download=True)
+
+    slim = slim_info(result)
+    slim['requested_downloads'] = [
+        {'filepath': download.get('filepath')}
+        for download in result.get('requested_downloads') or []
+    ]
+    # Throughput is recorded by the parent's host tuner
+    slim['_throughput'] = throughput_sample(
+        host, result, time.monotonic() - start_time,
+        ydl.params.get('concurrent_fragment_downloads', 1)
+    )
+    return slim
+
+_OPS = {
+    OP_PING: lambda state: state.pid,
+    OP_EXTRACT: _extract,
+    OP_DOWNLOAD: _download,
+}
+
+def _worker_main(conn, ydl_opts: Dict[str, Any]) -> None:
+    """Entry point of a worker process: run jobs sent over the pipe"""
+    # Ctrl+C is handled by the bot process, which shuts workers down itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    import yt_dlp
+    from .downloader import DownloadError, map_download_error
+
+    state = _WorkerState(ydl_opts)
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+
+        op, args = message
+        try:
+            conn.send(('ok', _OPS[op](state, *args)))
+        except DownloadError as e:
+            conn.send(('error', (str(e), e.category, None, e.http_status)))
+        except yt_dlp.utils.DownloadError as e:
+            error = map_download_error(e)
+            conn.send(('error', (str(error), error.category, None, error.http_status)))
+        except Exception as e:
+            state.reset()
+            conn.send(('error', (str(e), None, type(e).__name__, None)))
+
+    state.reset()
+
+class _Worker:
+    """Handle of one worker process"""
+
+    def __init__(self, ctx, ydl_opts: Dict[str, Any]):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, ydl_opts), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    @property
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self) -> None:
+        try:
+            self.process.kill()
+            self.process.join(timeout=1)
+        except Exception as e:
+            logger.error(f"Error killing yt-dlp worker {self.pid}: {e}")
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+            self.process.join(timeout=5)
+        except (OSError, ValueError):
+            pass
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+class YDLProcessPool:
+    """yt-dlp extraction and download in separate worker processes
+
+    Extractors do a lot of regex and JSON work; in the bot process that
+    competes for the GIL with the PTB event loop. Workers run jobs one at a
+    time and send back only slimmed info dicts. A worker that crashes is
+    replaced, and cancelling a job kills the worker running it.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.size = config.ydl_process_workers if workers is None else workers
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: List[_Worker] = []
+        self._started = 0
+        self._available: Optional[asyncio.Condition] = None
+        self.completed = 0
+        self.crashes = 0
+        self.cancelled = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    @staticmethod
+    def ydl_options() -> Dict[str, Any]:
+        """The download pool's YoutubeDL options, so workers share its cachedir"""
+        from .downloader import ydl_pool
+        from .ydl_pool import PROFILE_DOWNLOAD
+        return ydl_pool.options(PROFILE_DOWNLOAD)
+
+    @property
+    def available(self) -> asyncio.Condition:
+        if self._available is None:
+            self._available = asyncio.Condition()
+        return self._available
+
+    async def _acquire(self, prefer_pid: Optional[int] = None) -> _Worker:
+        async with self.available:
+            while True:
+                # Workers that died while idle are replaced
+                for worker in [w for w in self._idle if not w.alive]:
+                    logger.warning(f"yt-dlp worker {worker.pid} died while idle")
+                    self._idle.remove(worker)
+                    worker.kill()
+                    self._started -= 1
+                    self.crashes += 1
+
+                if self._idle:
+                    for worker in self._idle:
+                        if worker.pid == prefer_pid:
+                            self._idle.remove(worker)
+                            return worker
+                    return self._idle.pop()
+                if self._started < self.size:
+                    self._started += 1
+                    break
+                await self.available.wait()
+
+        spawn = asyncio.get_running_loop().run_in_executor(None, _Worker, self._ctx, self.ydl_options())
+        try:
+            worker = await asyncio.shield(spawn)
+        except asyncio.CancelledError:
+            # The process still starts in the executor thread; stop it when it does
+            spawn.add_done_callback(lambda f: f.exception() or f.result().kill())
+            self._started -= 1
+            raise
+        except BaseException:
+            self._started -= 1
+            raise
+        logger.info(f"Started yt-dlp worker process {worker.pid}")
+        return worker
+
+    async def _release(self, worker: _Worker, broken: bool) -> None:
+        if broken:
+            worker.kill()
+            self._started -= 1
+        else:
+            self._idle.append(worker)
+        async with self.available:
+            self.available.notify()
+
+    async def _receive(self, worker: _Worker) -> Tuple[str, Any]:
+        """Wait for the worker's reply without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        fd = worker.conn.fileno()
+
+        def on_readable():
+            loop.remove_reader(fd)
+            if future.done():
+                return
+            try:
+                future.set_result(worker.conn.recv())
+            except (EOFError, OSError) as e:
+                future.set_exception(e)
+
+        loop.add_reader(fd, on_readable)
+        try:
+            return await future
+        finally:
+            loop.remove_reader(fd)
+
+    async def _run(self, op: str, *args, prefer_pid: Optional[int] = None) -> Any:
+        from .downloader import DownloadError
+
+        worker = await self._acquire(prefer_pid)
+        broken = True
+        try:
+            worker.conn.send((op, args))
+            status, result = await self._receive(worker)
+            broken = False
+        except asyncio.CancelledError:
+            # Job bekor qilindi - ishchi jarayonni to'xtatamiz
+            self.cancelled += 1
+            logger.info(f"Cancelled {op} job, killing yt-dlp worker {worker.pid}")
+            raise
+        except (EOFError, OSError) as e:
+            self.crashes += 1
+            logger.error(f"yt-dlp worker {worker.pid} crashed during {op}: {e}")
+            raise DownloadError("Download worker crashed")
+        finally:
+            await self._release(worker, broken)
+
+        if status == 'error':
+            message, category, exc_name, status = result
+            if exc_name:
+                from .services.monitoring import metrics
+                metrics.track_error(exc_name)
+            raise DownloadError(message, category, status)
+
+        self.completed += 1
+        return result
+
+    async def extract(self, url: str) -> Dict[str, Any]:
+        """Slim info for url; '_ref' lets the same worker reuse the full info"""
+        return await self._run(OP_EXTRACT, url)
+
+    async def download(
+        self,
+        url: str,
+        output_path: str,
+        info: Optional[Dict[str, Any]] = None,
+        tuning: Optional[Dict[str, Tuple[int, int]]] = None
+    ) -> Dict[str, Any]:
+        """Download url to output_path and return slim info with requested_downloads
+
+        tuning carries the parent's host tuner settings; the result's
+        '_throughput' is the sample for the parent to record.
+        """
+        ref = (info or {}).get('_ref')
+        prefer_pid = int(ref.split(':')[0]) if ref else None
+        return await self._run(OP_DOWNLOAD, url, output_path, info, tuning, prefer_pid=prefer_pid)
+
+    async def ping(self) -> int:
+        """Round trip to a worker; returns its pid"""
+        return await self._run(OP_PING)
+
+    async def start(self) -> None:
+        """Spawn all workers ahead of the first request"""
+        if self.enabled:
+            await asyncio.gather(*(self.ping() for _ in range(self.size)))
+
+    def close(self) -> None:
+        """Stop idle workers"""
+        for worker in self._idle:
+            worker.stop()
+        self._started -= len(self._idle)
+        self._idle.clear()
+
+    def get_statistics(self) -> Dict[str, int]:
+        return {
+            'size': self.size,
+            'started': self._started,
+            'idle': len(self._idle),
+            'busy': self._started - len(self._idle),
+            'completed': self.completed,
+            'crashes': self.crashes,
+            'cancelled': self.cancelled
+        }
+
+# Global worker pool (disabled unless YDL_PROCESS_WORKERS > 0)
+ydl_workers = YDLProcessPool()
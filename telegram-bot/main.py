@@ -8,7 +8,9 @@ from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQu
 
 # Import handlers
 from bot.handlers.base_handlers import start_command, help_command, stats_command, admin_command
-from bot.handlers.media_handlers import handle_media_message
+from bot.handlers.media_handlers import (
+    handle_media_message, handle_url_list_document, resume_interrupted_downloads
+)
 from bot.handlers.audio_handlers import extract_audio, find_original
 
 # Import services
@@ -16,6 +18,10 @@ from bot.services.monitoring import metrics
 from bot.services.cleanup_service import CleanupService
 from bot.services.health_service import HealthService
 from bot.services.railway_service import RailwayService
+from bot.services.metadata_cache import metadata_cache
+from bot.downloader import ydl_pool
+from bot.ydl_workers import ydl_workers
+from bot.services.host_tuner import host_tuner
 from bot.config.config import config
 
 # Load environment variables
@@ -33,8 +39,18 @@ else:
 
 logger = logging.getLogger(__name__)
 
+def log_task_failure(task: asyncio.Task) -> None:
+    """Done-callback: background task xatoligini yo'qotmasdan log qilish"""
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error:
+        logger.error(f"Background task {task.get_name()} failed: {error!r}")
+        metrics.track_error(type(error).__name__)
+
 async def main():
     """Start the bot"""
+    resume_task = None
     try:
         # Initialize Railway service
         railway_service = RailwayService(str(config.downloads_dir))
@@ -51,6 +67,12 @@ async def main():
         health_service = HealthService(port=config.port)
         await health_service.start()
 
+        # Pre-create YoutubeDL instances so the first link doesn't pay setup cost
+        if ydl_workers.enabled:
+            await ydl_workers.start()
+        else:
+            await ydl_pool.warm_up()
+
         # Configure bot with higher timeouts for Railway
         from telegram.request import HTTPXRequest
         request = HTTPXRequest(
@@ -74,6 +96,7 @@ async def main():
         application.add_handler(CommandHandler("stats", stats_command))
         application.add_handler(CommandHandler("admin", admin_command))
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_media_message))
+        application.add_handler(MessageHandler(filters.Document.TXT, handle_url_list_document))
         application.add_handler(CallbackQueryHandler(extract_audio, pattern=r"^get_audio:"))
         application.add_handler(CallbackQueryHandler(find_original, pattern=r"^find_original:"))
 
@@ -105,11 +128,17 @@ async def main():
         logger.info("Starting bot...")
         await application.initialize()
         await application.start()
+
+        # Restart paytida to'xtagan yuklashlarni qisman fayllardan davom ettirish
+        resume_task = asyncio.create_task(
+            resume_interrupted_downloads(application.bot), name="resume_interrupted_downloads"
+        )
+        resume_task.add_done_callback(log_task_failure)
         
         # Run bot until stopped
         logger.info("Bot is running...")
         await application.run_polling(
-            drop_pending_updates=True,
+            drop_pending_updates=False,
             allowed_updates=[
                 "message",
                 "callback_query",
@@ -125,9 +154,15 @@ async def main():
     finally:
         # Cleanup on shutdown
         logger.info("Shutting down...")
+        if resume_task:
+            resume_task.cancel()
         await cleanup_service.stop()
         await health_service.stop()
         await railway_service.stop()
+        metadata_cache.save()
+        host_tuner.save()
+        ydl_pool.clear()
+        ydl_workers.close()
         try:
             await application.stop()
         except:
@@ -0,0 +1,157 @@
+import os
+import asyncio
+import shutil
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from bot.utils import extract_urls
+from telegram.error import NetworkError
+from bot.handlers import media_handlers
+
+class TestExtractUrls(unittest.TestCase):
+    def test_all_urls_in_order_without_duplicates(self):
+        text = (
+            "1. https://youtu.be/abc?si=share,\n"
+            "2) https://www.youtube.com/watch?v=xyz\n"
+            "takror: https://youtu.be/abc\n"
+            "https://www.instagram.com/reel/C1/."
+        )
+        self.assertEqual(extract_urls(text), [
+            "https://youtu.be/abc?si=share",
+            "https://www.youtube.com/watch?v=xyz",
+            "https://www.instagram.com/reel/C1/"
+        ])
+
+    def test_limit(self):
+        text = " ".join(f"https://example.com/v/{i}" for i in range(30))
+        self.assertEqual(len(extract_urls(text, limit=20)), 20)
+
+class TestBatchDelivery(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        registry = MagicMock()
+        registry.resolve_alias.return_value = None
+        registry.get.return_value = None
+        self.patches = [
+            patch.object(media_handlers, 'file_id_registry', registry),
+            patch.object(media_handlers.video_service, 'download_and_process_video',
+                         AsyncMock(side_effect=self._fake_download)),
+            patch.object(media_handlers.video_service, 'prefetch')
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+        shutil.rmtree(self.test_dir)
+
+    async def _fake_download(self, url, chat_id=None, user_id=None):
+        if url.endswith("/bad"):
+            return {'success': False, 'error': "Video mavjud emas"}
+        name = url.rsplit('/', 1)[-1]
+        path = os.path.join(self.test_dir, f"{name}.mp4")
+        with open(path, 'wb') as f:
+            f.write(b"\0" * 10)
+        return {
+            'success': True, 'video_path': path, 'file_size': 10, 'title': name,
+            'duration': 5, 'media_key': f"test:{name}"
+        }
+
+    def _make_update(self):
+        update = MagicMock()
+        update.effective_chat.id = 42
+        update.effective_user.id = 7
+        self.status_message = MagicMock(spec=['edit_text', 'delete', 'chat_id', 'message_id'])
+        self.status_message.chat_id = 42
+        self.status_message.message_id = 1
+        self.status_message.edit_text = AsyncMock()
+        self.status_message.delete = AsyncMock()
+        update.effective_message.reply_text = AsyncMock(return_value=self.status_message)
+        context = MagicMock()
+        context.bot.send_media_group = AsyncMock(
+            side_effect=lambda chat_id, media: tuple(MagicMock() for _ in media)
+        )
+        context.bot.send_video = AsyncMock()
+        return update, context
+
+    async def test_urls_delivered_as_albums_of_ten(self):
+        update, context = self._make_update()
+        urls = [f"https://example.com/v/{i}" for i in range(12)]
+
+        await media_handlers.handle_url_batch(update, context, urls)
+
+        albums = [call.kwargs['media'] for call in context.bot.send_media_group.call_args_list]
+        self.assertEqual([len(album) for album in albums], [10, 2])
+        context.bot.send_video.assert_not_called()
+        # Bitta holat xabari, oxirida o'chiriladi
+        update.effective_message.reply_text.assert_called_once()
+        self.status_message.delete.assert_called_once()
+
+    async def test_failed_items_reported_in_status(self):
+        update, context = self._make_update()
+        urls = ["https://example.com/v/1", "https://example.com/v/bad", "https://example.com/v/2"]
+
+        await media_handlers.handle_url_batch(update, context, urls)
+
+        album = context.bot.send_media_group.call_args.kwargs['media']
+        self.assertEqual(len(album), 2)
+        report = self.status_message.edit_text.call_args_list[-1].args[0]
+        self.assertIn("https://example.com/v/bad", report)
+        self.assertIn("2/3", report)
+
+    async def test_registered_item_survives_forgotten_record(self):
+        update, context = self._make_update()
+        record = {'file_id': 'FILE_ID', 'file_size': 10, 'meta': {'title': 'cached', 'duration': 5}}
+        registry = media_handlers.file_id_registry
+        registry.resolve_alias.side_effect = lambda url: "test:cached" if url.endswith("/cached") else None
+        # registered_result yozuvni ko'radi, albom yuborilguncha u o'chiriladi
+        lookups = iter([record])
+        registry.get.side_effect = lambda *args, **kwargs: next(lookups, None)
+        urls = ["https://example.com/v/cached", "https://example.com/v/1"]
+
+        await media_handlers.handle_url_batch(update, context, urls)
+
+        album = context.bot.send_media_group.call_args.kwargs['media']
+        self.assertEqual(album[0].media, 'FILE_ID')
+        self.assertEqual(len(album), 2)
+
+    async def test_cancelled_item_releases_cache_lease(self):
+        update, context = self._make_update()
+        reached = asyncio.Event()
+
+        async def stuck_progress(message, text):
+            reached.set()
+            await asyncio.sleep(10)
+
+        async def leased_download(url, chat_id=None, user_id=None):
+            return {**await self._fake_download(url), 'lease': ('test:1', 'original')}
+
+        with patch.object(media_handlers, 'update_progress_message', stuck_progress), \
+                patch.object(media_handlers.video_service, 'download_and_process_video', leased_download), \
+                patch.object(media_handlers.media_cache, 'release') as release:
+            batch = asyncio.create_task(
+                media_handlers.handle_url_batch(update, context, ["https://example.com/v/1"])
+            )
+            await reached.wait()
+            batch.cancel()
+            await asyncio.gather(batch, return_exceptions=True)
+
+        release.assert_called_once_with(('test:1', 'original'))
+
+class TestMediaMessage(unittest.IsolatedAsyncioTestCase):
+    async def test_cached_send_failure_is_reported(self):
+        update = MagicMock()
+        update.effective_message.text = "https://example.com/v/1"
+        update.effective_message.reply_text = AsyncMock()
+
+        with patch.object(media_handlers, 'send_cached_video', AsyncMock(side_effect=NetworkError("boom"))), \
+                patch.object(media_handlers.video_service, 'prefetch'):
+            await media_handlers.handle_media_message(update, MagicMock())
+
+        # Holat xabari yo'q: xatolik yangi javob sifatida yuboriladi
+        report = update.effective_message.reply_text.call_args.args[0]
+        self.assertIn("Xatolik yuz berdi", report)
+
+if __name__ == '__main__':
+    unittest.main()
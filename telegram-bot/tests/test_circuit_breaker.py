@@ -0,0 +1,174 @@
+import unittest
+import asyncio
+import tempfile
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+import yt_dlp
+from bot.downloader import (
+    get_metadata, download_video_with_info, classify_result, DownloadError, ERROR_PRIVATE
+)
+from bot.services.circuit_breaker import (
+    CircuitBreakers, CircuitOpenError, STATE_CLOSED, STATE_OPEN,
+    RESULT_OK, RESULT_FAILURE, RESULT_THROTTLED
+)
+from bot.services.metadata_cache import MetadataCache
+
+URL = "https://www.instagram.com/reel/abc/"
+DOMAIN = "instagram.com"
+
+def classify(e):
+    if e is None:
+        return RESULT_OK
+    return RESULT_THROTTLED if "429" in str(e) else RESULT_FAILURE
+
+class TestCircuitBreakers(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.breakers = CircuitBreakers(
+            window=10, min_calls=4, failure_ratio=0.5, throttle_limit=3,
+            open_seconds=30, max_wait=0, max_concurrency=4
+        )
+        self.now = 1000.0
+        self.clock = patch('bot.services.circuit_breaker.time.monotonic', lambda: self.now)
+        self.clock.start()
+
+    def tearDown(self):
+        self.clock.stop()
+
+    async def _call(self, error=None):
+        async with self.breakers.guard(URL, classify):
+            if error:
+                raise error
+
+    async def _fail(self, message="timed out"):
+        with self.assertRaises(RuntimeError):
+            await self._call(RuntimeError(message))
+
+    async def test_opens_after_failures_and_fails_fast(self):
+        for _ in range(4):
+            await self._fail()
+
+        stats = self.breakers.get_statistics()[DOMAIN]
+        self.assertEqual(stats['state'], STATE_OPEN)
+        with self.assertRaises(CircuitOpenError) as ctx:
+            await self._call()
+        self.assertAlmostEqual(ctx.exception.retry_after, 30)
+        self.assertEqual(self.breakers.get_statistics()[DOMAIN]['rejected'], 1)
+
+    async def test_half_open_probe_closes_circuit(self):
+        for _ in range(4):
+            await self._fail()
+        self.now += 31
+
+        await self._call()
+        self.assertEqual(self.breakers.get_statistics()[DOMAIN]['state'], STATE_CLOSED)
+
+    async def test_failed_probe_reopens_for_longer(self):
+        for _ in range(4):
+            await self._fail()
+        self.now += 31
+
+        await self._fail()
+        with self.assertRaises(CircuitOpenError) as ctx:
+            await self._call()
+        self.assertAlmostEqual(ctx.exception.retry_after, 60)
+
+    async def test_only_one_probe_while_half_open(self):
+        for _ in range(4):
+            await self._fail()
+        self.now += 31
+        probing = asyncio.Event()
+        release = asyncio.Event()
+
+        async def probe():
+            async with self.breakers.guard(URL, classify):
+                probing.set()
+                await release.wait()
+
+        task = asyncio.create_task(probe())
+        await probing.wait()
+        with self.assertRaises(CircuitOpenError):
+            await self._call()
+        release.set()
+        await task
+        self.assertEqual(self.breakers.get_statistics()[DOMAIN]['state'], STATE_CLOSED)
+
+    async def test_throttling_halves_limit_and_trips(self):
+        for _ in range(8):
+            await self._call()
+        self.assertEqual(self.breakers.get_statistics()[DOMAIN]['limit'], 4)
+
+        await self._fail("HTTP Error 429")
+        self.assertEqual(self.breakers.get_statistics()[DOMAIN]['limit'], 2)
+
+        await self._fail("HTTP Error 429")
+        await self._fail("HTTP Error 429")
+        self.assertEqual(self.breakers.get_statistics()[DOMAIN]['state'], STATE_OPEN)
+
+    async def test_short_open_period_is_waited_out(self):
+        breakers = CircuitBreakers(min_calls=2, failure_ratio=0.5, open_seconds=0.05, max_wait=1)
+        self.clock.stop()
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                async with breakers.guard(URL, classify):
+                    raise RuntimeError("timed out")
+
+        async with breakers.guard(URL, classify):
+            pass
+        self.assertEqual(breakers.get_statistics()[DOMAIN]['state'], STATE_CLOSED)
+        self.clock.start()
+
+class FakeYDLPool:
+    """YDL pool whose instances fail every extraction with a raw yt-dlp error"""
+
+    def __init__(self, message: str):
+        self.message = message
+
+    def extract_info(self, url, download=False):
+        raise yt_dlp.utils.DownloadError(self.message)
+
+    @asynccontextmanager
+    async def checkout(self, profile):
+        yield self
+
+class TestDownloaderThrottling(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.breakers = CircuitBreakers(window=10, min_calls=4, throttle_limit=3, max_wait=0, max_concurrency=4)
+        self.patches = [
+            patch('bot.downloader.circuit_breakers', self.breakers),
+            patch('bot.downloader.metadata_cache', MetadataCache(max_entries=10, positive_ttl=60, negative_ttl=60)),
+            patch('bot.downloader.ydl_pool', FakeYDLPool(
+                "ERROR: [Instagram] abc: Unable to download webpage: HTTP Error 403: Forbidden"
+            )),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    def _stats(self):
+        return self.breakers.get_statistics()[DOMAIN]
+
+    async def test_metadata_403_counts_as_throttling(self):
+        with self.assertRaises(DownloadError) as ctx:
+            await get_metadata(URL)
+
+        # Foydalanuvchiga "xususiy" deyiladi, lekin breaker 403 ni ko'radi
+        self.assertEqual(ctx.exception.category, ERROR_PRIVATE)
+        self.assertEqual(ctx.exception.http_status, 403)
+        self.assertEqual(self._stats()['throttled'], 1)
+        self.assertEqual(self._stats()['successes'], 0)
+
+    async def test_download_403_counts_as_throttling(self):
+        with self.assertRaises(DownloadError):
+            await download_video_with_info(URL, output_dir=tempfile.mkdtemp())
+
+        self.assertEqual(self._stats()['throttled'], 1)
+        self.assertEqual(self._stats()['successes'], 0)
+
+    def test_explicit_private_video_is_not_the_sites_fault(self):
+        self.assertEqual(classify_result(DownloadError("Private video", ERROR_PRIVATE)), RESULT_OK)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import os
+import time
+import shutil
+import tempfile
+from bot.services.download_journal import DownloadJournal
+
+class TestDownloadJournal(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.journal = DownloadJournal(partial_dir=self.test_dir, max_age_hours=1, max_attempts=2)
+
+    def tearDown(self):
+        # Test fayllarini tozalash
+        shutil.rmtree(self.test_dir)
+
+    def _make_partial(self, media_key: str, suffix: str = ".mp4.part", size: int = 100) -> str:
+        path = os.path.join(self.test_dir, self.journal.job_name(media_key) + suffix)
+        with open(path, "wb") as f:
+            f.write(b"\0" * size)
+        return path
+
+    def test_output_template_is_deterministic(self):
+        template = self.journal.output_template("youtube:abc")
+        self.assertEqual(template, self.journal.output_template("youtube:abc"))
+        self.assertNotEqual(template, self.journal.output_template("youtube:xyz"))
+        self.assertTrue(template.endswith(".%(ext)s"))
+
+    def test_failed_job_keeps_partials_and_is_pending(self):
+        self.journal.begin("youtube:abc", "https://youtu.be/abc", chat_id=1)
+        partial = self._make_partial("youtube:abc")
+
+        # Ishlayotgan ish qayta boshlanmaydi
+        self.assertEqual(self.journal.pending(), [])
+
+        self.journal.fail("youtube:abc")
+        self.assertTrue(os.path.exists(partial))
+        pending = self.journal.pending()
+        self.assertEqual(len(pending), 1)
+        self.assertEqual(pending[0]['url'], "https://youtu.be/abc")
+        self.assertEqual(pending[0]['chat_ids'], [1])
+
+    def test_attempt_limit_discards_partials(self):
+        for _ in range(2):
+            self.journal.begin("youtube:abc", "https://youtu.be/abc", chat_id=1)
+            partial = self._make_partial("youtube:abc")
+            self.journal.fail("youtube:abc")
+
+        self.assertFalse(os.path.exists(partial))
+        self.assertEqual(self.journal.pending(), [])
+
+    def test_finish_keeps_result_file(self):
+        self.journal.begin("youtube:abc", "https://youtu.be/abc")
+        partial = self._make_partial("youtube:abc")
+        result = self._make_partial("youtube:abc", suffix=".mp4")
+
+        self.journal.finish("youtube:abc", keep=result)
+        self.assertFalse(os.path.exists(partial))
+        self.assertTrue(os.path.exists(result))
+        self.assertIsNone(self.journal.get("youtube:abc"))
+
+    def test_cleanup_stale_removes_old_inactive_jobs(self):
+        self.journal.begin("youtube:old", "https://youtu.be/old")
+        self.journal.fail("youtube:old")
+        old_partial = self._make_partial("youtube:old")
+        old_time = time.time() - 2 * 3600
+        for name in os.listdir(self.test_dir):
+            os.utime(os.path.join(self.test_dir, name), (old_time, old_time))
+
+        self.journal.begin("youtube:new", "https://youtu.be/new")
+        new_partial = self._make_partial("youtube:new")
+
+        freed = self.journal.cleanup_stale()
+        self.assertGreaterEqual(freed, 100)
+        self.assertFalse(os.path.exists(old_partial))
+        self.assertTrue(os.path.exists(new_partial))
+        self.assertEqual(self.journal.get_statistics()['active'], 1)
+
+    def test_active_job_files_are_reported(self):
+        self.journal.begin("youtube:abc", "https://youtu.be/abc")
+        partial = self._make_partial("youtube:abc")
+        working = os.path.join(self.test_dir, "..", os.path.basename(self.test_dir) + "_compressed.mp4")
+        self.journal.track("youtube:abc", working)
+        # Faol bo'lmagan ish fayli kuzatilmaydi
+        self.journal.track("youtube:xyz", "/tmp/other.mp4")
+
+        self.assertTrue(self.journal.is_active(partial))
+        self.assertTrue(self.journal.is_active(working))
+        self.assertFalse(self.journal.is_active("/tmp/other.mp4"))
+
+        self.journal.finish("youtube:abc")
+        self.assertFalse(self.journal.is_active(working))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,7 @@
 import unittest
 import os
 from unittest.mock import patch
-from bot.downloader import download_video_with_info, DownloadError
+from bot.downloader import download_video_with_info, DownloadError, estimate_filesize, ydl_pool
 
 class TestDownloader(unittest.TestCase):
     def setUp(self):
@@ -44,5 +44,75 @@ class TestDownloader(unittest.TestCase):
         with self.assertRaises(DownloadError):
             download_video_with_info(self.test_url, self.test_dir)
 
+class TestSingleExtraction(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        ydl_pool.clear()
+        self.test_url = "https://www.youtube.com/watch?v=test"
+        self.test_dir = "test_downloads"
+        os.makedirs(self.test_dir, exist_ok=True)
+        self.video_path = os.path.join(self.test_dir, 'test_video.mp4')
+        with open(self.video_path, "wb") as f:
+            f.write(b"dummy video content")
+
+    def tearDown(self):
+        # Test fayllarini tozalash
+        ydl_pool.clear()
+        for file in os.listdir(self.test_dir):
+            os.remove(os.path.join(self.test_dir, file))
+        os.rmdir(self.test_dir)
+
+    @patch('yt_dlp.YoutubeDL')
+    async def test_info_extracted_once(self, mock_ytdl):
+        mock_instance = mock_ytdl.return_value
+        mock_instance.extract_info.return_value = {'id': 'test', 'title': 'Test Video'}
+        mock_instance.process_ie_result.return_value = {
+            'id': 'test',
+            'title': 'Test Video',
+            'requested_downloads': [{'filepath': self.video_path}]
+        }
+
+        video_path, info = await download_video_with_info(self.test_url, self.test_dir)
+
+        self.assertEqual(video_path, self.video_path)
+        mock_instance.extract_info.assert_called_once_with(self.test_url, download=False)
+        mock_instance.process_ie_result.assert_called_once()
+
+    @patch('yt_dlp.YoutubeDL')
+    async def test_prefetched_info_skips_extraction(self, mock_ytdl):
+        mock_instance = mock_ytdl.return_value
+        mock_instance.process_ie_result.return_value = {
+            'requested_downloads': [{'filepath': self.video_path}]
+        }
+
+        await download_video_with_info(self.test_url, self.test_dir, info={'id': 'test'})
+
+        mock_instance.extract_info.assert_not_called()
+
+    async def test_oversized_video_rejected_before_download(self):
+        info = {'id': 'test', 'filesize': 10 * 1024 * 1024 * 1024}
+        with patch('yt_dlp.YoutubeDL') as mock_ytdl:
+            with self.assertRaises(DownloadError):
+                await download_video_with_info(self.test_url, self.test_dir, info=info)
+            mock_ytdl.assert_not_called()
+
+    def test_estimate_filesize_sums_merged_formats(self):
+        info = {'requested_formats': [{'filesize': 100}, {'filesize_approx': 50}]}
+        self.assertEqual(estimate_filesize(info), 150)
+        self.assertIsNone(estimate_filesize({'requested_formats': [{'filesize': 100}, {}]}))
+
+    @patch('yt_dlp.YoutubeDL')
+    async def test_instances_are_reused(self, mock_ytdl):
+        mock_instance = mock_ytdl.return_value
+        mock_instance.params = {'outtmpl': {'default': 'x'}}
+        mock_instance.process_ie_result.return_value = {
+            'requested_downloads': [{'filepath': self.video_path}]
+        }
+
+        for _ in range(3):
+            await download_video_with_info(self.test_url, self.test_dir, info={'id': 'test'})
+
+        mock_ytdl.assert_called_once()
+        self.assertEqual(mock_instance.process_ie_result.call_count, 3)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,98 @@
+import time
+import asyncio
+import unittest
+from telegram.error import RetryAfter
+from bot.services.edit_scheduler import EditScheduler
+
+class FakeMessage:
+    def __init__(self, chat_id: int, message_id: int, log: list, fail_with=None):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.log = log
+        self.fail_with = list(fail_with or [])
+
+    async def edit_text(self, text, **kwargs):
+        if self.fail_with:
+            raise self.fail_with.pop(0)
+        self.log.append((time.monotonic(), self.message_id, text))
+
+class TestEditScheduler(unittest.IsolatedAsyncioTestCase):
+    async def _drain(self, scheduler: EditScheduler, timeout: float = 3):
+        deadline = time.monotonic() + timeout
+        while scheduler.get_statistics()['pending'] and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+
+    async def test_only_latest_text_is_sent(self):
+        scheduler = EditScheduler(global_rate=100, chat_rate=5)
+        log = []
+        message = FakeMessage(1, 1, log)
+
+        for percent in range(0, 101, 10):
+            scheduler.edit(message, f"{percent}%")
+        await self._drain(scheduler)
+
+        self.assertEqual(len(log), 1)
+        self.assertEqual(log[-1][2], "100%")
+
+    async def test_unchanged_text_is_skipped(self):
+        scheduler = EditScheduler(global_rate=100, chat_rate=100)
+        log = []
+        message = FakeMessage(1, 1, log)
+
+        scheduler.edit(message, "📤 Video yuklanmoqda...")
+        await self._drain(scheduler)
+        scheduler.edit(message, "📤 Video yuklanmoqda...")
+        self.assertEqual(scheduler.get_statistics()['pending'], 0)
+        self.assertEqual(len(log), 1)
+
+    async def test_chat_rate_is_respected(self):
+        scheduler = EditScheduler(global_rate=100, chat_rate=10)
+        log = []
+        messages = [FakeMessage(1, message_id, log) for message_id in range(6)]
+
+        for message in messages:
+            scheduler.edit(message, "⏳")
+        await self._drain(scheduler)
+
+        self.assertEqual(len(log), 6)
+        # Bir yuborish uchun zaxira qoldiriladi, keyin 10/s
+        span = log[-1][0] - log[0][0]
+        self.assertGreaterEqual(span, 0.35)
+
+    async def test_sends_go_before_progress_edits(self):
+        scheduler = EditScheduler(global_rate=100, chat_rate=5)
+        events = []
+        messages = [FakeMessage(1, message_id, events) for message_id in range(4)]
+        for message in messages:
+            scheduler.edit(message, "⏳")
+        await asyncio.sleep(0)
+
+        start = time.monotonic()
+        await scheduler.reserve(1)
+        waited = time.monotonic() - start
+        events.append((time.monotonic(), "send", None))
+        await self._drain(scheduler)
+
+        kinds = [event[1] for event in events]
+        # Tahrirlar bitta tokenni yuborish uchun qoldiradi: yuborish kutmaydi
+        self.assertLess(waited, 0.05)
+        self.assertEqual(kinds.index("send"), 2)
+        self.assertEqual(len(kinds), 5)
+
+    async def test_retry_after_delays_and_keeps_latest_text(self):
+        scheduler = EditScheduler(global_rate=100, chat_rate=100)
+        log = []
+        message = FakeMessage(1, 1, log, fail_with=[RetryAfter(1)])
+
+        scheduler.edit(message, "10%")
+        await asyncio.sleep(0.05)
+        scheduler.edit(message, "50%")
+        start = time.monotonic()
+        await self._drain(scheduler)
+
+        self.assertEqual([entry[2] for entry in log], ["50%"])
+        self.assertGreaterEqual(log[0][0] - start, 0.8)
+
+if __name__ == '__main__':
+    unittest.main()
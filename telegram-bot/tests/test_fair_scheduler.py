@@ -0,0 +1,121 @@
+import unittest
+import asyncio
+from bot.services.fair_scheduler import FairScheduler, estimate_job_cost
+from bot.services.pipeline import StagePool
+
+LONG = 300
+SHORT = 10
+
+class TestFairScheduler(unittest.IsolatedAsyncioTestCase):
+    async def _simulate(self, acquire, release, jobs):
+        """Jobs run one at a time; returns finish time of each job in virtual seconds
+
+        jobs: (user_id, cost) in submission order
+        """
+        clock = 0.0
+        finished = {}
+        submitted = asyncio.Event()
+
+        async def run(index, user_id, cost):
+            nonlocal clock
+            await acquire(user_id, cost)
+            try:
+                # Hamma ishlar navbatga qo'yilgandan keyin bajariladi
+                await submitted.wait()
+                clock += cost
+                finished[index] = clock
+            finally:
+                release()
+
+        tasks = []
+        for index, (user_id, cost) in enumerate(jobs):
+            tasks.append(asyncio.create_task(run(index, user_id, cost)))
+            await asyncio.sleep(0)
+        submitted.set()
+        await asyncio.gather(*tasks)
+        return [finished[index] for index in range(len(jobs))]
+
+    def _mixed_load(self):
+        # Bitta foydalanuvchi 10 ta uzun video, qolganlar qisqa kliplar yuboradi
+        jobs = [(1, LONG) for _ in range(10)]
+        jobs += [(user_id, SHORT) for user_id in (2, 3, 4) for _ in range(3)]
+        return jobs
+
+    async def test_short_clips_are_not_starved(self):
+        jobs = self._mixed_load()
+        scheduler = FairScheduler(limit=1, quantum=60, global_sjf=False)
+        fair = await self._simulate(scheduler.acquire, lambda: scheduler.release(), jobs)
+
+        fifo_pool = StagePool("fifo", 1)
+        fifo = await self._simulate(lambda user_id, cost: fifo_pool.acquire(), fifo_pool.release, jobs)
+
+        short = [index for index, (_, cost) in enumerate(jobs) if cost == SHORT]
+        fair_short = sorted(fair[index] for index in short)
+        fifo_short = sorted(fifo[index] for index in short)
+
+        # Qisqa kliplar faqat allaqachon boshlangan bitta uzun ishni kutadi
+        self.assertLessEqual(max(fair_short), LONG + len(short) * SHORT)
+        self.assertLess(sum(fair_short) / len(short), sum(fifo_short) / len(short) / 5)
+        # p95
+        self.assertLess(fair_short[int(len(short) * 0.95)], fifo_short[int(len(short) * 0.95)] / 5)
+        # Uzun ishlar ham oxir-oqibat bajariladi
+        self.assertEqual(max(fair), sum(cost for _, cost in jobs))
+
+    def test_non_finite_weight_rejected(self):
+        scheduler = FairScheduler(limit=1)
+        for weight in (float('nan'), float('inf'), 0.0, -1.0):
+            with self.assertRaises(ValueError):
+                scheduler.set_weight(2, weight)
+        self.assertEqual(scheduler.weight(2), 1.0)
+
+    async def test_users_share_by_weight(self):
+        scheduler = FairScheduler(limit=1, quantum=60, global_sjf=False)
+        scheduler.set_weight(2, 2.0)
+        jobs = [(user_id, 60) for _ in range(12) for user_id in (1, 2)]
+        finished = await self._simulate(scheduler.acquire, lambda: scheduler.release(), jobs)
+
+        # Birinchi yarmida 2-foydalanuvchi ikki baravar ko'p ish bajaradi
+        order = sorted(range(len(jobs)), key=lambda index: finished[index])[:12]
+        served = [jobs[index][0] for index in order]
+        self.assertGreaterEqual(served.count(2), 2 * served.count(1) - 2)
+        self.assertGreater(served.count(1), 0)
+
+    async def test_shortest_job_first_within_user(self):
+        scheduler = FairScheduler(limit=1, quantum=1000, global_sjf=False)
+        jobs = [(1, 50), (1, 200), (1, 100), (1, 10)]
+        finished = await self._simulate(scheduler.acquire, lambda: scheduler.release(), jobs)
+
+        # Birinchisi darhol boshlanadi, qolganlari arzonidan boshlab
+        order = sorted(range(len(jobs)), key=lambda index: finished[index])
+        self.assertEqual(order, [0, 3, 2, 1])
+
+    async def test_global_sjf_orders_across_users(self):
+        scheduler = FairScheduler(limit=1, global_sjf=True)
+        jobs = [(1, 100), (1, 90), (2, 80), (3, 5)]
+        finished = await self._simulate(scheduler.acquire, lambda: scheduler.release(), jobs)
+
+        order = sorted(range(len(jobs)), key=lambda index: finished[index])
+        self.assertEqual(order, [0, 3, 2, 1])
+
+    async def test_cancelled_waiter_leaves_queue(self):
+        scheduler = FairScheduler(limit=1, global_sjf=False)
+        await scheduler.acquire(1, 10)
+        waiter = asyncio.create_task(scheduler.acquire(2, 10))
+        await asyncio.sleep(0)
+        self.assertEqual(scheduler.waiting, 1)
+
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+
+        scheduler.release()
+        self.assertEqual(scheduler.waiting, 0)
+        self.assertEqual(scheduler.active, 0)
+
+    def test_cost_grows_with_duration(self):
+        short = estimate_job_cost({'duration': 30})
+        long = estimate_job_cost({'duration': 3600})
+        self.assertGreater(long, short * 10)
+
+if __name__ == '__main__':
+    unittest.main()
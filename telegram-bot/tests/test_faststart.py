@@ -0,0 +1,138 @@
+import os
+import json
+import shutil
+import struct
+import tempfile
+import unittest
+from unittest.mock import patch
+from bot.faststart import relocate_moov, _patch_table, _OffsetMap
+from bot.transcode_planner import moov_before_mdat, PLAN_FASTSTART
+from bot.video_compress import compress_video
+from bot.services.monitoring import metrics
+
+CHUNKS = [b'chunk-one', b'chunk-two', b'chunk-three']
+
+def box(box_type: bytes, payload: bytes = b'') -> bytes:
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+def full_box(box_type: bytes, payload: bytes) -> bytes:
+    return box(box_type, bytes(4) + payload)
+
+def offset_table(box_type: bytes, offsets) -> bytes:
+    code = 'Q' if box_type == b'co64' else 'I'
+    return full_box(box_type, struct.pack(f'>I{len(offsets)}{code}', len(offsets), *offsets))
+
+def moov_with(table_type: bytes, offsets, extra: bytes = b'') -> bytes:
+    stbl = box(b'stbl', full_box(b'stsz', struct.pack('>II', 0, 0)) + offset_table(table_type, offsets))
+    trak = box(b'trak', box(b'mdia', box(b'minf', stbl)))
+    return box(b'moov', full_box(b'mvhd', bytes(96)) + trak + extra)
+
+def make_mp4(path: str, table_type: bytes = b'stco', extra: bytes = b'') -> None:
+    """ftyp + mdat + moov (moov oxirida), stco/co64 har bir chunk'ga ishora qiladi"""
+    ftyp = box(b'ftyp', b'isom' + bytes(4))
+    offsets = []
+    position = len(ftyp) + 8
+    for chunk in CHUNKS:
+        offsets.append(position)
+        position += len(chunk)
+    with open(path, 'wb') as f:
+        f.write(ftyp + box(b'mdat', b''.join(CHUNKS)) + moov_with(table_type, offsets, extra))
+
+def read_offsets(data: bytes):
+    """Chunk offsets from the first stco/co64 table in data"""
+    for box_type, code in ((b'stco', 'I'), (b'co64', 'Q')):
+        index = data.find(box_type)
+        if index != -1:
+            count = struct.unpack_from('>I', data, index + 8)[0]
+            return box_type, struct.unpack_from(f'>{count}{code}', data, index + 12)
+    return None, ()
+
+class TestRelocateMoov(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.input = os.path.join(self.tmp, 'in.mp4')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _assert_chunks_readable(self, path: str, table_type: bytes):
+        with open(path, 'rb') as f:
+            data = f.read()
+        found_type, offsets = read_offsets(data)
+        self.assertEqual(found_type, table_type)
+        for offset, chunk in zip(offsets, CHUNKS):
+            self.assertEqual(data[offset:offset + len(chunk)], chunk)
+
+    def test_moov_is_moved_and_offsets_patched(self):
+        make_mp4(self.input)
+        output = os.path.join(self.tmp, 'out.mp4')
+
+        self.assertEqual(relocate_moov(self.input, output), output)
+
+        self.assertTrue(moov_before_mdat(output))
+        self.assertEqual(os.path.getsize(output), os.path.getsize(self.input))
+        self._assert_chunks_readable(output, b'stco')
+        self.assertFalse(os.path.exists(f"{output}.faststart.tmp"))
+
+    def test_co64_and_in_place(self):
+        make_mp4(self.input, table_type=b'co64')
+
+        self.assertEqual(relocate_moov(self.input), self.input)
+
+        self.assertTrue(moov_before_mdat(self.input))
+        self._assert_chunks_readable(self.input, b'co64')
+
+    def test_already_faststart_is_untouched(self):
+        make_mp4(self.input)
+        output = os.path.join(self.tmp, 'out.mp4')
+        relocate_moov(self.input, output)
+
+        self.assertEqual(relocate_moov(output, os.path.join(self.tmp, 'again.mp4')), output)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, 'again.mp4')))
+
+    def test_unsupported_layout_returns_none(self):
+        make_mp4(self.input, extra=box(b'cmov', bytes(8)))
+        self.assertIsNone(relocate_moov(self.input, os.path.join(self.tmp, 'out.mp4')))
+
+        with open(self.input, 'wb') as f:
+            f.write(box(b'ftyp', b'isom') + box(b'mdat', b'x' * 32) + b'\x00\x00')
+        self.assertIsNone(relocate_moov(self.input))
+
+    def test_stco_is_widened_past_4gb(self):
+        buf = offset_table(b'stco', [4_000_000_000])
+        mdat = (b'mdat', 0, 16, 5 * 2 ** 32)
+        offsets = _OffsetMap([mdat], [2 ** 31])
+
+        patched = _patch_table(buf, b'stco', 8, len(buf), offsets)
+
+        self.assertEqual(read_offsets(patched), (b'co64', (4_000_000_000 + 2 ** 31,)))
+
+class TestFaststartPlan(unittest.IsolatedAsyncioTestCase):
+    async def test_compatible_mp4_is_relocated_without_ffmpeg(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            input_path = os.path.join(tmp, 'in.mp4')
+            output = os.path.join(tmp, 'out.mp4')
+            make_mp4(input_path)
+            probe = {
+                'streams': [{'codec_type': 'video', 'codec_name': 'h264', 'pix_fmt': 'yuv420p'}],
+                'format': {'format_name': 'mov,mp4,m4a,3gp,3g2,mj2', 'duration': '10'}
+            }
+            commands = []
+
+            async def run(cmd):
+                commands.append(cmd)
+                return 0, json.dumps(probe).encode(), b''
+
+            with patch('bot.ffmpeg_encode.run_command', run), patch('bot.media_probe.run_command', run):
+                result = await compress_video(input_path, output, target_size_mb=45)
+
+            self.assertEqual(result, output)
+            self.assertTrue(moov_before_mdat(output))
+            self.assertFalse(any(cmd[0] == 'ffmpeg' for cmd in commands))
+            self.assertIn(f"transcode_{PLAN_FASTSTART}", metrics.stage_timings)
+        finally:
+            shutil.rmtree(tmp)
+
+if __name__ == '__main__':
+    unittest.main()
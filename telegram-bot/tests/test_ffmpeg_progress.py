@@ -0,0 +1,96 @@
+import sys
+import unittest
+from bot.ffmpeg_progress import FFmpegProgress, ProgressParser, with_progress, PROGRESS_ARGS
+from bot.process_runner import ProcessRunner, STATUS_ABORTED
+from bot.services.transcode_jobs import TranscodeJobTable
+
+PROGRESS_OUTPUT = (
+    b"frame=120\nfps=48.0\nbitrate=1200.5kbits/s\ntotal_size=750000\n"
+    b"out_time_us=5000000\nout_time_ms=5000000\nout_time=00:00:05.000000\n"
+    b"dup_frames=0\nspeed=2.5x\nprogress=continue\n"
+    b"frame=240\nfps=N/A\nbitrate=N/A\ntotal_size=N/A\n"
+    b"out_time_us=N/A\nout_time=00:01:10.500000\nspeed=N/A\nprogress=end\n"
+)
+
+# Har 0.1 soniyada o'sib boruvchi hajm bilan -progress bloklarini chiqaradi
+FAKE_ENCODER = (
+    "import sys, time\n"
+    "for second in range(1, 100):\n"
+    "    sys.stdout.write(f'out_time_us={second * 1000000}\\ntotal_size={second * 1000000}\\n"
+    "speed=1.0x\\nprogress=continue\\n')\n"
+    "    sys.stdout.flush()\n"
+    "    time.sleep(0.1)\n"
+)
+
+class TestProgressParser(unittest.TestCase):
+    def test_blocks_survive_arbitrary_chunking(self):
+        parser = ProgressParser()
+        blocks = []
+        for start in range(0, len(PROGRESS_OUTPUT), 7):
+            blocks += parser.feed(PROGRESS_OUTPUT[start:start + 7])
+
+        self.assertEqual(len(blocks), 2)
+        first, last = blocks
+        self.assertEqual((first.frame, first.fps, first.out_time), (120, 48.0, 5.0))
+        self.assertEqual((first.speed, first.bitrate, first.total_size), (2.5, 1200500.0, 750000))
+        self.assertFalse(first.done)
+        # N/A qiymatlar nolga, out_time soat formatidan olinadi
+        self.assertEqual((last.frame, last.speed, last.total_size, last.out_time), (240, 0.0, 0, 70.5))
+        self.assertTrue(last.done)
+
+    def test_progress_args_follow_program(self):
+        self.assertEqual(with_progress(['ffmpeg', '-i', 'in.mp4', 'out.mp4']),
+                         ['ffmpeg'] + PROGRESS_ARGS + ['-i', 'in.mp4', 'out.mp4'])
+
+class TestTranscodeJobs(unittest.TestCase):
+    def test_percent_eta_and_projection(self):
+        table = TranscodeJobTable()
+        job = table.create('crf', 'video.mp4', 100, step='crf')
+
+        self.assertIsNone(job.eta)
+        self.assertTrue(job.update(FFmpegProgress(out_time=25, speed=5.0, total_size=10 * 1024 * 1024)))
+
+        self.assertEqual(job.percent, 25)
+        self.assertEqual(job.eta, 15)
+        self.assertEqual(job.projected_size, 40 * 1024 * 1024)
+        self.assertEqual([item.id for item in table.list()], [job.id])
+        table.finish(job)
+        self.assertEqual(table.get_statistics(), {'active': 0, 'jobs': []})
+
+    def test_overshoot_stops_only_after_enough_progress(self):
+        table = TranscodeJobTable()
+        job = table.create('abr', 'video.mp4', 100, target_bytes=30 * 1024 * 1024)
+
+        # Boshlanishda hajm bashorati ishonchsiz
+        self.assertTrue(job.update(FFmpegProgress(out_time=10, total_size=5 * 1024 * 1024)))
+        self.assertTrue(job.update(FFmpegProgress(out_time=30, total_size=9 * 1024 * 1024)))
+        self.assertFalse(job.update(FFmpegProgress(out_time=40, total_size=16 * 1024 * 1024)))
+        self.assertTrue(job.aborted)
+
+    def test_listener_sees_jobs_created_inside_block(self):
+        table = TranscodeJobTable()
+        seen = []
+        with table.listen(lambda job: seen.append(job.percent)):
+            inside = table.create('segment', 'video.mp4', 10)
+        outside = table.create('segment', 'video.mp4', 10)
+
+        inside.update(FFmpegProgress(out_time=5))
+        outside.update(FFmpegProgress(out_time=5))
+        self.assertEqual(seen, [50])
+
+class TestProgressAbort(unittest.IsolatedAsyncioTestCase):
+    async def test_callback_stops_process(self):
+        seen = []
+
+        def on_progress(progress):
+            seen.append(progress.out_time)
+            return progress.out_time < 3
+
+        result = await ProcessRunner(timeout=30).run([sys.executable, '-c', FAKE_ENCODER], on_progress=on_progress)
+
+        self.assertEqual(result.status, STATUS_ABORTED)
+        self.assertEqual(seen, [1.0, 2.0, 3.0])
+        self.assertLess(result.duration, 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import os
+import tempfile
+from bot.services.file_id_registry import FileIdRegistry, VARIANT_VIDEO, VARIANT_AUDIO
+from bot.utils import canonicalize_url, media_key_from_info
+
+class TestFileIdRegistry(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.test_dir, "file_ids.sqlite3")
+        self.registry = FileIdRegistry(self.db_path)
+
+    def tearDown(self):
+        # Test fayllarini tozalash
+        self.registry.close()
+        os.remove(self.db_path)
+        os.rmdir(self.test_dir)
+
+    def test_lookup_by_alias(self):
+        self.registry.add_alias("https://youtu.be/abc123?si=share", "youtube:abc123")
+        self.registry.put("youtube:abc123", VARIANT_VIDEO, "FILE_ID", file_size=1024,
+                          meta={'title': 'Test Video'})
+
+        record = self.registry.lookup_url("https://www.youtube.com/watch?v=abc123")
+
+        self.assertIsNotNone(record)
+        self.assertEqual(record['file_id'], "FILE_ID")
+        self.assertEqual(record['meta']['title'], 'Test Video')
+        self.assertIsNone(self.registry.get("youtube:abc123", VARIANT_AUDIO))
+
+    def test_persists_across_instances(self):
+        self.registry.put("tiktok:1", VARIANT_AUDIO, "AUDIO_ID")
+        self.registry.close()
+
+        self.registry = FileIdRegistry(self.db_path)
+        self.assertEqual(self.registry.get("tiktok:1", VARIANT_AUDIO)['file_id'], "AUDIO_ID")
+
+    def test_forget(self):
+        self.registry.put("tiktok:1", VARIANT_VIDEO, "OLD_ID")
+        self.registry.forget("tiktok:1", VARIANT_VIDEO)
+        self.assertIsNone(self.registry.get("tiktok:1", VARIANT_VIDEO))
+
+    def test_hits_counted(self):
+        self.registry.put("tiktok:1", VARIANT_VIDEO, "FILE_ID")
+        self.registry.get("tiktok:1")
+        self.registry.get("tiktok:1")
+        self.registry.get("tiktok:1", touch=False)
+        self.assertEqual(self.registry.get_statistics()['hits'], 2)
+
+    def test_canonicalize_url(self):
+        expected = "https://youtube.com/watch?v=abc123"
+        self.assertEqual(canonicalize_url("https://youtu.be/abc123?si=x"), expected)
+        self.assertEqual(canonicalize_url("https://m.youtube.com/shorts/abc123"), expected)
+        self.assertEqual(
+            canonicalize_url("https://www.tiktok.com/@user/video/42?is_from_webapp=1&utm_source=tg"),
+            "https://tiktok.com/@user/video/42"
+        )
+
+    def test_media_key_fits_callback_data(self):
+        key = media_key_from_info({'extractor_key': 'Generic', 'id': 'x' * 200})
+        self.assertLessEqual(len(f"find_original:{key}".encode()), 64)
+        self.assertEqual(media_key_from_info({'extractor_key': 'Youtube', 'id': 'abc'}), "youtube:abc")
+
+if __name__ == '__main__':
+    unittest.main()
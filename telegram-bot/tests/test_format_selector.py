@@ -0,0 +1,69 @@
+import unittest
+from bot.format_selector import select_format, estimate_format_size
+
+MB = 1024 * 1024
+
+YOUTUBE_FORMATS = [
+    {'format_id': 'sb0', 'ext': 'mhtml', 'vcodec': 'none', 'acodec': 'none', 'protocol': 'mhtml'},
+    {'format_id': '140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a.40.2', 'filesize': 4 * MB},
+    {'format_id': '251', 'ext': 'webm', 'vcodec': 'none', 'acodec': 'opus', 'filesize': 4 * MB},
+    {'format_id': '18', 'ext': 'mp4', 'vcodec': 'avc1.42001E', 'acodec': 'mp4a.40.2', 'height': 360, 'filesize': 12 * MB},
+    {'format_id': '136', 'ext': 'mp4', 'vcodec': 'avc1.4d401f', 'acodec': 'none', 'height': 720, 'filesize': 30 * MB},
+    {'format_id': '247', 'ext': 'webm', 'vcodec': 'vp9', 'acodec': 'none', 'height': 720, 'filesize': 25 * MB},
+    {'format_id': '137', 'ext': 'mp4', 'vcodec': 'avc1.640028', 'acodec': 'none', 'height': 1080, 'filesize': 80 * MB},
+    {'format_id': '248', 'ext': 'webm', 'vcodec': 'vp9', 'acodec': 'none', 'height': 1080, 'filesize': 40 * MB},
+]
+
+class TestFormatSelector(unittest.TestCase):
+    def test_prefers_h264_aac_at_same_height(self):
+        spec, size = select_format({'duration': 300, 'formats': YOUTUBE_FORMATS}, 40 * MB)
+
+        # 720p vp9 is smaller, but h264+aac merges into mp4 without remux
+        self.assertEqual(spec, '136+140')
+        self.assertEqual(size, 34 * MB)
+
+    def test_compatibility_beats_higher_resolution(self):
+        spec, _ = select_format({'duration': 300, 'formats': YOUTUBE_FORMATS}, 45 * MB)
+
+        # 1080p vp9 ham sig'adi, lekin u baribir h264 ga qayta siqilishi kerak
+        self.assertEqual(spec, '136+140')
+
+    def test_other_codecs_used_when_no_h264_fits(self):
+        formats = [fmt for fmt in YOUTUBE_FORMATS if fmt['format_id'] not in ('18', '136')]
+
+        spec, _ = select_format({'duration': 300, 'formats': formats}, 45 * MB)
+
+        self.assertEqual(spec, '248+140')
+
+    def test_nothing_fits(self):
+        self.assertIsNone(select_format({'duration': 300, 'formats': YOUTUBE_FORMATS}, 10 * MB))
+
+    def test_size_from_bitrate(self):
+        # Ko'pchilik saytlar faqat tbr beradi, kodeklar noma'lum
+        formats = [
+            {'format_id': 'hd', 'ext': 'mp4', 'height': 1080, 'tbr': 4000},
+            {'format_id': 'sd', 'ext': 'mp4', 'height': 540, 'tbr': 1000},
+        ]
+        self.assertAlmostEqual(estimate_format_size(formats[1], 60), 1000 * 1000 / 8 * 60 * 1.1)
+
+        spec, _ = select_format({'duration': 60, 'formats': formats}, 45 * MB)
+        self.assertEqual(spec, 'hd')
+
+        spec, _ = select_format({'duration': 300, 'formats': formats}, 45 * MB)
+        self.assertEqual(spec, 'sd')
+
+    def test_unknown_codec_without_picture_size_is_not_video(self):
+        # Kodek ham, o'lcham ham noma'lum format video deb tanlanmaydi
+        formats = [{'format_id': 'meta', 'ext': 'mp4', 'filesize': 1 * MB}]
+        self.assertIsNone(select_format({'duration': 60, 'formats': formats}, 45 * MB))
+
+        formats.append({'format_id': 'sd', 'ext': 'mp4', 'height': 480, 'filesize': 10 * MB})
+        spec, _ = select_format({'duration': 60, 'formats': formats}, 45 * MB)
+        self.assertEqual(spec, 'sd')
+
+    def test_unknown_sizes_and_live_streams(self):
+        self.assertIsNone(select_format({'formats': [{'format_id': 'x', 'ext': 'mp4'}]}, 45 * MB))
+        self.assertIsNone(select_format({'is_live': True, 'formats': YOUTUBE_FORMATS}, 45 * MB))
+
+if __name__ == '__main__':
+    unittest.main()
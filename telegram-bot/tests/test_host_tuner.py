@@ -0,0 +1,50 @@
+import unittest
+from bot.services.host_tuner import HostThroughputTuner, host_key, INITIAL_CHUNK_SIZE
+
+MB = 1024 * 1024
+
+class TestHostThroughputTuner(unittest.TestCase):
+    def setUp(self):
+        self.tuner = HostThroughputTuner(max_concurrency=6)
+
+    def test_host_key_groups_cdn_nodes(self):
+        self.assertEqual(host_key("https://rr3---sn-abc.googlevideo.com/videoplayback?x=1"), "googlevideo.com")
+        self.assertEqual(host_key("http://127.0.0.1:8080/file.mp4"), "127.0.0.1")
+
+    def test_concurrency_grows_while_throughput_grows(self):
+        host = "cdn.example.com"
+        # Har bir ulanish taxminan 2MB/s qo'shadi, 4 tadan keyin o'sish to'xtaydi
+        for _ in range(6):
+            concurrency, _ = self.tuner.settings(host)
+            rate = min(concurrency, 4) * 2 * MB
+            self.tuner.record(host, 40 * MB, 40 * MB / rate, concurrency)
+
+        concurrency, chunk_size = self.tuner.settings(host)
+        self.assertIn(concurrency, (4, 5))
+        self.assertGreater(chunk_size, INITIAL_CHUNK_SIZE)
+        self.assertEqual(self.tuner.get_statistics()[host]['downloads'], 6)
+
+    def test_throttle_backs_off_and_blocks_increase(self):
+        host = "vk.example.com"
+        for _ in range(3):
+            concurrency, _ = self.tuner.settings(host)
+            self.tuner.record(host, 40 * MB, 40 / concurrency, concurrency)
+        before, chunk_before = self.tuner.settings(host)
+
+        self.tuner.record_throttle(host)
+        after, chunk_after = self.tuner.settings(host)
+        self.assertEqual(after, max(1, before // 2))
+        self.assertEqual(chunk_after, chunk_before // 2)
+
+        # Cooldown davomida oshirilmaydi
+        self.tuner.record(host, 40 * MB, 1, after)
+        self.assertEqual(self.tuner.settings(host)[0], after)
+
+    def test_small_samples_do_not_change_settings(self):
+        host = "img.example.com"
+        before = self.tuner.settings(host)
+        self.tuner.record(host, 100 * 1024, 0.1, before[0])
+        self.assertEqual(self.tuner.settings(host), before)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import os
+import time
+import shutil
+import tempfile
+from bot.services.media_cache import MediaCache, VARIANT_ORIGINAL, VARIANT_COMPRESSED
+from bot.services.monitoring import metrics
+
+class TestMediaCache(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cache = self._make_cache()
+
+    def tearDown(self):
+        # Test fayllarini tozalash
+        self.cache.close()
+        shutil.rmtree(self.test_dir)
+
+    def _make_cache(self, policy="lru"):
+        return MediaCache(
+            cache_dir=os.path.join(self.test_dir, "cache"),
+            index_path=os.path.join(self.test_dir, "index.sqlite3"),
+            max_size_mb=1,
+            high_watermark=90,
+            low_watermark=50,
+            policy=policy
+        )
+
+    def _make_file(self, name: str, size: int) -> str:
+        path = os.path.join(self.test_dir, name)
+        with open(path, "wb") as f:
+            f.write(b"\0" * size)
+        return path
+
+    def test_put_and_lookup(self):
+        source = self._make_file("video.mp4", 1000)
+        cached_path = self.cache.put("youtube:abc", VARIANT_COMPRESSED, source, meta={'title': 'Test'})
+
+        self.assertFalse(os.path.exists(source))
+        self.assertTrue(os.path.exists(cached_path))
+
+        hits_before = metrics.cache_hits
+        entry = self.cache.lookup("youtube:abc")
+        self.assertEqual(entry['path'], cached_path)
+        self.assertEqual(entry['meta']['title'], 'Test')
+        self.assertEqual(metrics.cache_hits, hits_before + 1)
+
+    def test_lookup_miss(self):
+        misses_before = metrics.cache_misses
+        self.assertIsNone(self.cache.lookup("youtube:missing"))
+        self.assertIsNone(self.cache.lookup(None))
+        self.assertEqual(metrics.cache_misses, misses_before + 2)
+
+    def test_lru_eviction_keeps_recently_used(self):
+        size = 350 * 1024
+        self.cache.put("a:1", VARIANT_ORIGINAL, self._make_file("1.mp4", size))
+        time.sleep(0.01)
+        self.cache.put("a:2", VARIANT_ORIGINAL, self._make_file("2.mp4", size))
+        time.sleep(0.01)
+        self.cache.get("a:1", VARIANT_ORIGINAL)
+        time.sleep(0.01)
+        # 1050KB > 90% of 1MB budget -> evict down to 50%
+        self.cache.put("a:3", VARIANT_ORIGINAL, self._make_file("3.mp4", size))
+
+        self.assertIsNone(self.cache.get("a:2", VARIANT_ORIGINAL))
+        self.assertIsNotNone(self.cache.get("a:3", VARIANT_ORIGINAL))
+        self.assertLessEqual(self.cache.total_bytes(), 512 * 1024)
+
+    def test_lfu_eviction_keeps_popular(self):
+        self.cache.close()
+        self.cache = self._make_cache(policy="lfu")
+        self.cache.put("a:1", VARIANT_ORIGINAL, self._make_file("1.mp4", 50 * 1024))
+        for _ in range(3):
+            self.cache.get("a:1", VARIANT_ORIGINAL)
+        self.cache.put("a:2", VARIANT_ORIGINAL, self._make_file("2.mp4", 450 * 1024))
+        self.cache.put("a:3", VARIANT_ORIGINAL, self._make_file("3.mp4", 450 * 1024))
+
+        self.assertIsNotNone(self.cache.get("a:1", VARIANT_ORIGINAL))
+        self.assertIsNone(self.cache.get("a:2", VARIANT_ORIGINAL))
+
+    def test_sync_drops_missing_and_orphans(self):
+        cached_path = self.cache.put("a:1", VARIANT_ORIGINAL, self._make_file("1.mp4", 10))
+        os.remove(cached_path)
+        orphan = os.path.join(self.test_dir, "cache", "orphan.mp4")
+        with open(orphan, "wb") as f:
+            f.write(b"x")
+
+        self.cache.sync()
+
+        self.assertEqual(self.cache.get_statistics()['entries'], 0)
+        self.assertFalse(os.path.exists(orphan))
+
+    def test_leased_entries_survive_eviction(self):
+        size = 350 * 1024
+        self.cache.put("a:1", VARIANT_ORIGINAL, self._make_file("1.mp4", size))
+        time.sleep(0.01)
+        self.cache.put("a:2", VARIANT_ORIGINAL, self._make_file("2.mp4", size))
+        # a:1 yuborilayotgan bo'lsa ham eng eski - ijara uni saqlab qoladi
+        entry = self.cache.lookup("a:1", variants=(VARIANT_ORIGINAL,), lease=True)
+        self.cache.put("a:3", VARIANT_ORIGINAL, self._make_file("3.mp4", size))
+
+        self.assertTrue(os.path.exists(entry['path']))
+        self.assertIsNone(self.cache.get("a:2", VARIANT_ORIGINAL))
+        self.assertEqual(self.cache.get_statistics()['leased'], 1)
+
+        self.cache.release(entry['lease'])
+        self.cache.evict(target_bytes=0)
+        self.assertFalse(os.path.exists(entry['path']))
+        self.assertEqual(self.cache.get_statistics()['leased'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
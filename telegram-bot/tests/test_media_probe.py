@@ -0,0 +1,162 @@
+import os
+import json
+import shutil
+import struct
+import tempfile
+import unittest
+from unittest.mock import patch
+from bot.media_probe import MediaProbe, parse_mp4, SOURCE_YTDLP, SOURCE_MP4, SOURCE_FFPROBE
+
+def box(box_type: bytes, payload: bytes = b'') -> bytes:
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+def full_box(box_type: bytes, payload: bytes, version: int = 0) -> bytes:
+    return box(box_type, bytes([version, 0, 0, 0]) + payload)
+
+def stbl(entry: bytes, sample_sizes) -> bytes:
+    return box(b'stbl',
+               full_box(b'stsd', struct.pack('>I', 1) + entry) +
+               full_box(b'stsz', struct.pack('>II', 0, len(sample_sizes)) +
+                        struct.pack(f'>{len(sample_sizes)}I', *sample_sizes)))
+
+def trak(handler: bytes, entry: bytes, seconds: int, sample_sizes, width: int = 0, height: int = 0) -> bytes:
+    tkhd = full_box(b'tkhd', bytes(20 + 8 + 8 + 36) + struct.pack('>II', width << 16, height << 16))
+    mdhd = full_box(b'mdhd', struct.pack('>IIII', 0, 0, 1000, seconds * 1000) + bytes(4))
+    hdlr = full_box(b'hdlr', bytes(4) + handler + bytes(13))
+    minf = box(b'minf', stbl(entry, sample_sizes))
+    return box(b'trak', tkhd + box(b'mdia', mdhd + hdlr + minf))
+
+def avc1(width: int, height: int) -> bytes:
+    return box(b'avc1', bytes(24) + struct.pack('>HH', width, height) + bytes(46))
+
+def mp4a(avg_bitrate: int, object_type: int = 0x40) -> bytes:
+    decoder_config = bytes([0x04, 13, object_type, 0x15]) + bytes(3) + struct.pack('>II', avg_bitrate, avg_bitrate)
+    es_descriptor = bytes([0x03, 3 + len(decoder_config), 0, 1, 0]) + decoder_config
+    return box(b'mp4a', bytes(24) + struct.pack('>I', 44100 << 16) + full_box(b'esds', es_descriptor))
+
+def make_mp4(path: str, faststart: bool = True, audio: bool = True, seconds: int = 10) -> None:
+    tracks = trak(b'vide', avc1(1280, 720), seconds, [1000] * 30, 1280, 720)
+    if audio:
+        tracks += trak(b'soun', mp4a(128000), seconds, [300] * 43)
+    mvhd = full_box(b'mvhd', struct.pack('>IIII', 0, 0, 1000, seconds * 1000) + bytes(80))
+    moov = box(b'moov', mvhd + tracks)
+    mdat = box(b'mdat', bytes(1024))
+    ftyp = box(b'ftyp', b'isom' + bytes(4))
+    with open(path, 'wb') as f:
+        f.write(ftyp + (moov + mdat if faststart else mdat + moov))
+
+FFPROBE_RESULT = {
+    'streams': [{'codec_type': 'video', 'codec_name': 'vp9', 'width': 640, 'height': 360}],
+    'format': {'format_name': 'matroska,webm', 'duration': '12.5'}
+}
+
+class TestMediaProbe(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.ffprobe_calls = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    async def _fake_ffprobe(self, cmd):
+        self.ffprobe_calls += 1
+        return 0, json.dumps(FFPROBE_RESULT).encode(), b''
+
+    def test_mp4_header_is_parsed_without_subprocess(self):
+        path = os.path.join(self.tmp, 'video.mp4')
+        make_mp4(path)
+
+        media = parse_mp4(path)
+
+        self.assertEqual(media.source, SOURCE_MP4)
+        self.assertEqual((media.width, media.height), (1280, 720))
+        self.assertAlmostEqual(media.duration, 10)
+        self.assertTrue(media.faststart)
+        self.assertEqual(media.video['codec_name'], 'h264')
+        self.assertEqual(media.audio['codec_name'], 'aac')
+        self.assertEqual(media.audio['bit_rate'], '128000')
+        self.assertEqual(media.audio['sample_rate'], '44100')
+        # Video bitreyti namunalar hajmidan hisoblanadi
+        self.assertEqual(media.video['bit_rate'], str(30 * 1000 * 8 // 10))
+
+    def test_moov_at_end_and_silent_video(self):
+        path = os.path.join(self.tmp, 'video.mp4')
+        make_mp4(path, faststart=False, audio=False)
+
+        media = parse_mp4(path)
+
+        self.assertFalse(media.faststart)
+        self.assertFalse(media.has_audio)
+
+    def test_non_mp4_is_not_parsed(self):
+        path = os.path.join(self.tmp, 'video.webm')
+        with open(path, 'wb') as f:
+            f.write(b'\x1a\x45\xdf\xa3' + bytes(100))
+        self.assertIsNone(parse_mp4(path))
+
+    async def test_ytdlp_info_is_used_first(self):
+        path = os.path.join(self.tmp, 'video.mp4')
+        make_mp4(path)
+        info = {
+            'ext': 'mp4', 'duration': 10, 'width': 1920, 'height': 1080,
+            'requested_formats': [
+                {'vcodec': 'avc1.640028', 'acodec': 'none', 'width': 1920, 'height': 1080, 'vbr': 2500},
+                {'vcodec': 'none', 'acodec': 'mp4a.40.2', 'abr': 129.5},
+            ]
+        }
+
+        media = await MediaProbe().probe(path, info)
+
+        self.assertEqual(media.source, SOURCE_YTDLP)
+        self.assertEqual(media.video['codec_name'], 'h264')
+        self.assertEqual(media.audio['codec_name'], 'aac')
+        self.assertEqual(media.audio['bit_rate'], '129500')
+        self.assertTrue(media.faststart)
+
+    async def test_ytdlp_info_for_other_container_is_ignored(self):
+        path = os.path.join(self.tmp, 'video.mp4')
+        make_mp4(path)
+
+        media = await MediaProbe().probe(path, {'ext': 'webm', 'duration': 10, 'vcodec': 'vp9'})
+
+        self.assertEqual(media.source, SOURCE_MP4)
+
+    async def test_unknown_ytdlp_acodec_falls_through_to_file(self):
+        path = os.path.join(self.tmp, 'video.mp4')
+        make_mp4(path)
+        # Ko'p saytlar acodec bermaydi: bu "audio yo'q" degani emas
+        info = {'ext': 'mp4', 'duration': 10, 'vcodec': 'avc1.64001f', 'acodec': None,
+                'width': 1280, 'height': 720}
+
+        media = await MediaProbe().probe(path, info)
+
+        self.assertEqual(media.source, SOURCE_MP4)
+        self.assertTrue(media.has_audio)
+
+    async def test_ffprobe_is_last_resort_and_cached(self):
+        path = os.path.join(self.tmp, 'video.webm')
+        with open(path, 'wb') as f:
+            f.write(bytes(100))
+        probe = MediaProbe()
+
+        with patch('bot.media_probe.run_command', self._fake_ffprobe):
+            first = await probe.probe(path)
+            second = await probe.probe(path)
+
+        self.assertEqual(first.source, SOURCE_FFPROBE)
+        self.assertIs(first, second)
+        self.assertEqual(self.ffprobe_calls, 1)
+        self.assertEqual((first.width, first.height), (640, 360))
+
+    async def test_changed_file_is_probed_again(self):
+        path = os.path.join(self.tmp, 'video.mp4')
+        make_mp4(path, seconds=10)
+        probe = MediaProbe()
+        self.assertAlmostEqual((await probe.probe(path)).duration, 10)
+
+        make_mp4(path, seconds=20)
+        os.utime(path, ns=(0, 10 ** 9))
+        self.assertAlmostEqual((await probe.probe(path)).duration, 20)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+import os
+import time
+import tempfile
+from unittest.mock import patch, AsyncMock
+from bot.services.metadata_cache import MetadataCache, slim_info, ENTRY_INFO, ENTRY_ERROR
+from bot.downloader import get_metadata, DownloadError, ERROR_PRIVATE, ERROR_CIRCUIT_OPEN
+
+class TestMetadataCache(unittest.TestCase):
+    def test_slim_info_drops_stream_urls(self):
+        info = {
+            'id': 'abc',
+            'title': 'Test',
+            'url': 'https://cdn.example.com/signed',
+            'http_headers': {'User-Agent': 'x'},
+            'formats': [{'format_id': '18', 'url': 'https://cdn.example.com/18', 'filesize': 100}]
+        }
+        slim = slim_info(info)
+
+        self.assertNotIn('url', slim)
+        self.assertNotIn('http_headers', slim)
+        self.assertEqual(slim['formats'], [{'format_id': '18', 'filesize': 100}])
+        self.assertTrue(slim['_slim'])
+
+    def test_positive_entry_expires(self):
+        cache = MetadataCache(max_entries=10, positive_ttl=1, negative_ttl=1)
+        cache.put_info("https://youtu.be/abc", {'id': 'abc'})
+
+        kind, payload = cache.get("https://www.youtube.com/watch?v=abc")
+        self.assertEqual(kind, ENTRY_INFO)
+        self.assertEqual(payload['id'], 'abc')
+
+        with patch('time.time', return_value=time.time() + 5):
+            self.assertIsNone(cache.get("https://youtu.be/abc"))
+
+    def test_bounded_size_evicts_oldest(self):
+        cache = MetadataCache(max_entries=2, positive_ttl=60, negative_ttl=60)
+        cache.put_info("https://example.com/1", {'id': '1'})
+        cache.put_info("https://example.com/2", {'id': '2'})
+        cache.get("https://example.com/1")
+        cache.put_info("https://example.com/3", {'id': '3'})
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("https://example.com/2"))
+        self.assertIsNotNone(cache.get("https://example.com/1"))
+
+    def test_persistence_round_trip(self):
+        path = os.path.join(tempfile.mkdtemp(), "metadata.json")
+        cache = MetadataCache(max_entries=10, positive_ttl=60, negative_ttl=60, persist_path=path)
+        cache.put_error("https://example.com/private", ERROR_PRIVATE, "Video is private")
+        cache.save()
+
+        restored = MetadataCache(max_entries=10, positive_ttl=60, negative_ttl=60, persist_path=path)
+        kind, payload = restored.get("https://example.com/private")
+
+        self.assertEqual(kind, ENTRY_ERROR)
+        self.assertEqual(payload['category'], ERROR_PRIVATE)
+        os.remove(path)
+        os.rmdir(os.path.dirname(path))
+
+class TestNegativeCaching(unittest.IsolatedAsyncioTestCase):
+    async def test_private_video_not_extracted_twice(self):
+        url = "https://www.instagram.com/p/private123/"
+        error = DownloadError("Video is private or requires authentication", ERROR_PRIVATE)
+        with patch('bot.downloader.extract_metadata', AsyncMock(side_effect=error)) as mock_extract:
+            for _ in range(3):
+                with self.assertRaises(DownloadError) as ctx:
+                    await get_metadata(url)
+                self.assertEqual(ctx.exception.category, ERROR_PRIVATE)
+
+        mock_extract.assert_awaited_once()
+
+    async def test_uncategorized_errors_not_cached(self):
+        url = "https://www.tiktok.com/@user/video/flaky"
+        error = DownloadError("Download error: timed out")
+        with patch('bot.downloader.extract_metadata', AsyncMock(side_effect=error)) as mock_extract:
+            for _ in range(2):
+                with self.assertRaises(DownloadError):
+                    await get_metadata(url)
+
+        self.assertEqual(mock_extract.await_count, 2)
+
+    async def test_transient_failures_not_cached(self):
+        url = "https://www.instagram.com/p/throttled/"
+        errors = [
+            # 403 cheklov, geo-blok yoki eskirgan imzo ham bo'lishi mumkin
+            DownloadError("Video is private or requires authentication", ERROR_PRIVATE, 403),
+            DownloadError("instagram.com hozircha so'rovlarni cheklamoqda", ERROR_CIRCUIT_OPEN),
+        ]
+        with patch('bot.downloader.extract_metadata', AsyncMock(side_effect=errors)) as mock_extract:
+            for _ in errors:
+                with self.assertRaises(DownloadError):
+                    await get_metadata(url)
+
+        self.assertEqual(mock_extract.await_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import asyncio
+from bot.services.pipeline import Pipeline, StagePool, STAGE_DOWNLOAD, STAGE_PROBE
+
+class TestStagePool(unittest.IsolatedAsyncioTestCase):
+    async def test_limit_is_respected(self):
+        pool = StagePool("download", 2)
+        peak = 0
+
+        async def job():
+            nonlocal peak
+            async with pool.slot():
+                peak = max(peak, pool.active)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(job() for _ in range(6)))
+
+        self.assertEqual(peak, 2)
+        self.assertEqual(pool.completed, 6)
+        self.assertEqual(pool.active, 0)
+
+    async def test_raising_limit_wakes_waiters(self):
+        pool = StagePool("transcode", 1)
+        await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+        self.assertEqual(pool.waiting, 1)
+
+        pool.set_limit(2)
+        await asyncio.wait_for(waiter, 1)
+
+        self.assertEqual(pool.active, 2)
+
+    async def test_cancelled_waiter_releases_queue_position(self):
+        pool = StagePool("upload", 1)
+        await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+
+        pool.release()
+        self.assertEqual(pool.waiting, 0)
+        self.assertEqual(pool.active, 0)
+
+    async def test_stages_do_not_block_each_other(self):
+        pipeline = Pipeline({STAGE_DOWNLOAD: 1, STAGE_PROBE: 1})
+        probe_started = asyncio.Event()
+        release_probe = asyncio.Event()
+
+        async def long_probe():
+            async with pipeline.stage(STAGE_PROBE):
+                probe_started.set()
+                await release_probe.wait()
+
+        task = asyncio.create_task(long_probe())
+        await probe_started.wait()
+
+        # Yuklab olish bosqichi tekshiruv tugashini kutmasligi kerak
+        async with pipeline.stage(STAGE_DOWNLOAD):
+            stats = pipeline.get_statistics()
+            self.assertEqual(stats[STAGE_DOWNLOAD]['active'], 1)
+            self.assertEqual(stats[STAGE_PROBE]['active'], 1)
+
+        release_probe.set()
+        await task
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+from bot.services.video_service import VideoService
+from bot.downloader import DownloadError
+
+URL = "https://www.youtube.com/watch?v=abc&si=share"
+
+class TestMetadataPrefetch(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.service = VideoService()
+        self.get_metadata = AsyncMock(return_value={'id': 'abc', 'extractor_key': 'Youtube'})
+        self.patches = [
+            patch('bot.services.video_service.get_metadata', self.get_metadata),
+            patch('bot.services.video_service.file_id_registry.resolve_alias', return_value=None)
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self.patches:
+            p.stop()
+
+    async def test_job_uses_prefetched_metadata(self):
+        self.service.prefetch(URL)
+        # Bir xil video uchun ikkinchi havola yangi so'rov boshlamaydi
+        self.service.prefetch("https://youtube.com/watch?v=abc")
+        await asyncio.sleep(0)
+
+        info = await self.service._get_metadata(URL)
+
+        self.assertEqual(info['id'], 'abc')
+        self.get_metadata.assert_awaited_once_with(URL)
+
+    async def test_without_prefetch_metadata_is_fetched(self):
+        info = await self.service._get_metadata(URL)
+
+        self.assertEqual(info['id'], 'abc')
+        self.get_metadata.assert_awaited_once()
+
+    async def test_prefetch_error_reaches_job(self):
+        self.get_metadata.side_effect = DownloadError("Video is not available", "unavailable")
+        self.service.prefetch(URL)
+        await asyncio.sleep(0)
+
+        with self.assertRaises(DownloadError):
+            await self.service._get_metadata(URL)
+
+    async def test_known_video_is_not_prefetched(self):
+        with patch('bot.services.video_service.file_id_registry.resolve_alias', return_value="youtube:abc"):
+            self.service.prefetch(URL)
+
+        self.assertEqual(self.service._prefetched, {})
+        self.get_metadata.assert_not_awaited()
+
+if __name__ == '__main__':
+    unittest.main()
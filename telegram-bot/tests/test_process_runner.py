@@ -0,0 +1,103 @@
+import sys
+import time
+import asyncio
+import unittest
+import psutil
+from bot.process_runner import ProcessRunner, RingBuffer, STATUS_OK, STATUS_FAILED, STATUS_TIMEOUT, STATUS_CANCELLED
+from bot.services.monitoring import metrics
+from bot.utils import run_command
+
+# Nevarani ishga tushirib, uning pid'ini chiqaradi va kutadi
+SPAWN_GRANDCHILD = (
+    "import subprocess, sys; "
+    "p = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(30)']); "
+    "print(p.pid, flush=True); p.wait()"
+)
+
+def gone(pid: int) -> bool:
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        try:
+            if psutil.Process(pid).status() == psutil.STATUS_ZOMBIE:
+                return True
+        except psutil.NoSuchProcess:
+            return True
+        time.sleep(0.05)
+    return False
+
+class TestRingBuffer(unittest.TestCase):
+    def test_keeps_only_the_tail(self):
+        buffer = RingBuffer(10)
+        for chunk in (b'abcdef', b'ghij', b'klmno'):
+            buffer.write(chunk)
+        self.assertEqual(buffer.getvalue(), b'fghijklmno')
+        self.assertEqual(buffer.dropped, 5)
+
+class TestProcessRunner(unittest.IsolatedAsyncioTestCase):
+    def _runs(self, program: str, status: str) -> int:
+        return metrics.processes.get(program, {}).get('runs', {}).get(status, 0)
+
+    async def test_output_and_status(self):
+        program = sys.executable.rsplit('/', 1)[-1]
+        before = self._runs(program, STATUS_OK)
+        result = await ProcessRunner().run([sys.executable, '-c', 'print("hello")'])
+
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout.strip(), b'hello')
+        self.assertEqual(result.status, STATUS_OK)
+        self.assertEqual(self._runs(program, STATUS_OK), before + 1)
+
+        failed = await ProcessRunner().run([sys.executable, '-c', 'import sys; sys.exit(3)'])
+        self.assertEqual((failed.returncode, failed.status), (3, STATUS_FAILED))
+
+    async def test_stderr_is_capped(self):
+        runner = ProcessRunner(output_limit_kb=1)
+        script = "import sys; sys.stderr.write('x' * 100000 + 'END')"
+
+        result = await runner.run([sys.executable, '-c', script])
+
+        self.assertEqual(len(result.stderr), 1024)
+        self.assertTrue(result.stderr.endswith(b'END'))
+        self.assertEqual(result.stderr_dropped, 100003 - 1024)
+
+    async def test_timeout_kills_process_group(self):
+        runner = ProcessRunner()
+        start = time.monotonic()
+
+        result = await runner.run([sys.executable, '-c', SPAWN_GRANDCHILD], timeout=1)
+
+        self.assertLess(time.monotonic() - start, 10)
+        self.assertEqual(result.status, STATUS_TIMEOUT)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn(b'timeout', result.stderr)
+        self.assertTrue(gone(int(result.stdout.split()[0])))
+
+    async def test_cancel_kills_process_group(self):
+        runner = ProcessRunner()
+        program = sys.executable.rsplit('/', 1)[-1]
+        before = self._runs(program, STATUS_CANCELLED)
+        task = asyncio.create_task(runner.run([sys.executable, '-c', SPAWN_GRANDCHILD], timeout=0))
+        await asyncio.sleep(1)
+        children = [p for p in psutil.Process().children(recursive=True) if p.status() != psutil.STATUS_ZOMBIE]
+        self.assertTrue(children)
+
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+
+        self.assertTrue(all(gone(child.pid) for child in children))
+        self.assertEqual(self._runs(program, STATUS_CANCELLED), before + 1)
+
+    async def test_usage_is_sampled(self):
+        script = "import time; data = bytearray(50 * 1024 * 1024); end = time.time() + 1\nwhile time.time() < end: pass"
+        result = await ProcessRunner().run([sys.executable, '-c', script])
+
+        self.assertGreater(result.cpu_seconds, 0.3)
+        self.assertGreater(result.peak_rss, 50 * 1024 * 1024)
+
+    async def test_run_command_keeps_its_tuple(self):
+        returncode, stdout, stderr = await run_command([sys.executable, '-c', 'print(1)'])
+        self.assertEqual((returncode, stdout.strip(), stderr), (0, b'1', b''))
+
+if __name__ == '__main__':
+    unittest.main()
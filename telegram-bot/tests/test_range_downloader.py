@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import unittest
+from aiohttp import web
+from bot.range_downloader import download_ranges, RangeDownloadError
+
+PAYLOAD = os.urandom(3 * 1024 * 1024 + 123)
+
+class TestRangeDownloader(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.status = None
+        self.range_requests = 0
+        self.fail_after = None
+
+        async def handler(request):
+            if self.status:
+                return web.Response(status=self.status)
+            header = request.headers.get('Range')
+            if not header:
+                return web.Response(body=PAYLOAD)
+            self.range_requests += 1
+            if self.fail_after is not None and self.range_requests > self.fail_after:
+                return web.Response(status=500)
+            start, end = header.replace('bytes=', '').split('-')
+            start, end = int(start), min(int(end), len(PAYLOAD) - 1)
+            return web.Response(
+                status=206,
+                body=PAYLOAD[start:end + 1],
+                headers={'Content-Range': f'bytes {start}-{end}/{len(PAYLOAD)}'}
+            )
+
+        app = web.Application()
+        app.router.add_get('/video.mp4', handler)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/video.mp4"
+        self.output_path = os.path.join(tempfile.mkdtemp(), 'video.mp4')
+
+    async def asyncTearDown(self):
+        await self.runner.cleanup()
+        shutil.rmtree(os.path.dirname(self.output_path))
+
+    async def test_parallel_ranges_reassemble_file(self):
+        nbytes, seconds = await download_ranges(self.url, self.output_path, connections=4, chunk_size=512 * 1024)
+
+        self.assertEqual(nbytes, len(PAYLOAD))
+        with open(self.output_path, 'rb') as f:
+            self.assertEqual(f.read(), PAYLOAD)
+        # 1 ta o'lcham so'rovi + 7 ta bo'lak
+        self.assertEqual(self.range_requests, 8)
+
+    async def test_throttled_host_raises(self):
+        self.status = 429
+        with self.assertRaises(RangeDownloadError) as ctx:
+            await download_ranges(self.url, self.output_path, connections=2)
+
+        self.assertTrue(ctx.exception.throttled)
+        self.assertFalse(os.path.exists(self.output_path))
+
+    async def test_interrupted_download_resumes(self):
+        # O'lcham so'rovi + 3 ta bo'lakdan keyin server xato qaytaradi
+        self.fail_after = 4
+        with self.assertRaises(RangeDownloadError):
+            await download_ranges(self.url, self.output_path, connections=1, chunk_size=512 * 1024)
+        self.assertFalse(os.path.exists(self.output_path))
+        self.assertTrue(os.path.exists(f"{self.output_path}.ranges.json"))
+
+        self.fail_after = None
+        self.range_requests = 0
+        nbytes, _ = await download_ranges(self.url, self.output_path, connections=1, chunk_size=512 * 1024)
+
+        with open(self.output_path, 'rb') as f:
+            self.assertEqual(f.read(), PAYLOAD)
+        # Faqat qolgan 4 ta bo'lak qayta so'raladi
+        self.assertEqual(self.range_requests, 1 + 4)
+        self.assertEqual(nbytes, len(PAYLOAD) - 3 * 512 * 1024)
+        self.assertFalse(os.path.exists(f"{self.output_path}.ranges.json"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+import os
+import shutil
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+from bot.ffmpeg_progress import FFmpegProgress
+from bot.services.monitoring import metrics
+from bot.services.transcode_scheduler import TranscodeScheduler
+from bot.segment_encoder import (
+    encode_segmented, split_points, plan_segments, cleanup_stale, MIN_SEGMENT_SECONDS
+)
+
+MB = 1024 * 1024
+TARGET = 45 * MB
+DURATION = 1200
+
+class FakeFFmpeg:
+    """Segment encodes write bitrate-sized files; concat sums its inputs
+
+    fail_segments: segment start times whose encode fails once.
+    overshoot: per-start-time size factor of the first encode.
+    Segment encodes report progress halfway and stop there if told to.
+    """
+
+    def __init__(self, fail_segments=(), overshoot=None):
+        self.fail_segments = set(fail_segments)
+        self.overshoot = dict(overshoot or {})
+        self.encoded = []
+        self.aborted = []
+        self.running = 0
+        self.max_running = 0
+
+    def _arg(self, cmd, name):
+        return cmd[cmd.index(name) + 1]
+
+    async def __call__(self, cmd, on_progress=None):
+        if cmd[0] == 'ffprobe':
+            lines = "".join(f"{t}.000000,{'K_' if t % 2 == 0 else '__'}\n" for t in range(DURATION))
+            return 0, lines.encode(), b''
+
+        output = cmd[-1]
+        if '-f' in cmd and self._arg(cmd, '-f') == 'concat':
+            size = 0
+            list_path = Path(self._arg(cmd, '-i'))
+            for line in list_path.read_text().splitlines():
+                size += os.path.getsize(list_path.parent / line.split("'")[1])
+            if '-map' in cmd:
+                size += os.path.getsize(cmd[cmd.index('-i', cmd.index('-i') + 1) + 1])
+            with open(output, 'wb') as f:
+                f.truncate(size)
+            return 0, b'', b''
+
+        if '-ss' not in cmd:
+            # Audio trek: 128kbps
+            with open(output, 'wb') as f:
+                f.truncate(int(128000 / 8 * DURATION))
+            return 0, b'', b''
+
+        start = float(self._arg(cmd, '-ss'))
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        if start in self.fail_segments:
+            self.fail_segments.discard(start)
+            return 1, b'', b'encoder crashed'
+        self.encoded.append(start)
+        factor = self.overshoot.pop(start, 1.0)
+        seconds = float(self._arg(cmd, '-t'))
+        size = int(self._arg(cmd, '-b:v')) / 8 * seconds * factor
+        if on_progress and on_progress(FFmpegProgress(out_time=seconds / 2, total_size=int(size / 2))) is False:
+            self.aborted.append(start)
+            return -9, b'', b''
+        with open(output, 'wb') as f:
+            f.truncate(int(size))
+        return 0, b'', b''
+
+class TestSegmentEncoder(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.input = os.path.join(self.tmp, 'source.mp4')
+        with open(self.input, 'wb') as f:
+            f.truncate(300 * MB)
+        self.output = os.path.join(self.tmp, 'out.mp4')
+        self.segments_dir = Path(self.tmp) / 'segments'
+        self.dir_patch = patch('bot.segment_encoder.segments_dir', lambda: self.segments_dir)
+        self.workers_patch = patch('bot.segment_encoder.segment_workers', lambda: 4)
+        self.scheduler_patch = patch(
+            'bot.segment_encoder.transcode_scheduler', TranscodeScheduler(cpus=8, max_encoders=4)
+        )
+        self.dir_patch.start()
+        self.workers_patch.start()
+        self.scheduler_patch.start()
+
+    def tearDown(self):
+        self.dir_patch.stop()
+        self.workers_patch.stop()
+        self.scheduler_patch.stop()
+        shutil.rmtree(self.tmp)
+
+    async def _encode(self, ffmpeg):
+        with patch('bot.ffmpeg_encode.run_command', ffmpeg), patch('bot.segment_encoder.run_command', ffmpeg):
+            return await encode_segmented(self.input, self.output, DURATION, 1280, 720, TARGET)
+
+    async def test_segments_encode_in_parallel_and_fit_target(self):
+        ffmpeg = FakeFFmpeg()
+
+        self.assertEqual(await self._encode(ffmpeg), self.output)
+
+        self.assertEqual(len(ffmpeg.encoded), 8)
+        self.assertEqual(ffmpeg.max_running, 4)
+        self.assertLessEqual(os.path.getsize(self.output), TARGET)
+        self.assertGreater(os.path.getsize(self.output), TARGET * 0.9)
+        # Muvaffaqiyatdan keyin segmentlar o'chiriladi
+        self.assertEqual(list(self.segments_dir.iterdir()), [])
+
+    async def test_crash_resumes_from_checkpoint(self):
+        first = FakeFFmpeg(fail_segments={600.0})
+        self.assertIsNone(await self._encode(first))
+        self.assertEqual(len(first.encoded), 7)
+
+        resumes = metrics.segment_resumes
+        second = FakeFFmpeg()
+        self.assertEqual(await self._encode(second), self.output)
+
+        # Faqat yiqilgan segment qayta kodlanadi
+        self.assertEqual(second.encoded, [600.0])
+        self.assertEqual(metrics.segment_resumes, resumes + 1)
+
+    async def test_overshooting_segment_gets_one_correction(self):
+        ffmpeg = FakeFFmpeg(overshoot={300.0: 1.3})
+        corrective = metrics.size_corrective_passes
+
+        await self._encode(ffmpeg)
+
+        self.assertEqual(ffmpeg.encoded.count(300.0), 2)
+        self.assertEqual(ffmpeg.aborted, [300.0])
+        self.assertEqual(len(ffmpeg.encoded), 9)
+        self.assertLessEqual(os.path.getsize(self.output), TARGET)
+        self.assertEqual(metrics.size_corrective_passes, corrective + 1)
+
+    async def test_early_stop_and_correction_share_threshold(self):
+        # Qat'iy TRANSCODE_ABORT_RATIO segmentni tuzatilmaydigan holda to'xtatmasligi kerak
+        ffmpeg = FakeFFmpeg(overshoot={300.0: 1.03})
+        with patch('bot.services.transcode_jobs.config.transcode_abort_ratio', 1.0):
+            self.assertEqual(await self._encode(ffmpeg), self.output)
+
+        self.assertEqual(ffmpeg.aborted, [])
+        self.assertEqual(len(ffmpeg.encoded), 8)
+
+    def test_split_points_snap_to_keyframes(self):
+        keyframes = [float(t) for t in range(0, 600, 7)]
+        points = split_points(keyframes, 600, 4)
+
+        self.assertEqual(points[0], 0.0)
+        self.assertEqual(points[-1], 600)
+        self.assertEqual(len(points), 5)
+        for point in points[1:-1]:
+            self.assertIn(point, keyframes)
+            self.assertLessEqual(min(abs(point - ideal) for ideal in (150, 300, 450)), 3.5)
+
+    def test_budgets_add_up_to_total(self):
+        segments = plan_segments([float(t) for t in range(0, 1000, 3)], 1000, 500000, workers=3)
+        self.assertEqual(len(segments), 6)
+        self.assertAlmostEqual(sum(segment.budget_bytes for segment in segments), 500000 / 8 * 1000)
+        # Qisqa videoda segmentlar juda kichik bo'lmaydi
+        short = plan_segments([], MIN_SEGMENT_SECONDS * 2.5, 500000, workers=8)
+        self.assertEqual(len(short), 2)
+
+    def test_stale_jobs_are_removed(self):
+        job_dir = self.segments_dir / 'seg_old'
+        job_dir.mkdir(parents=True)
+        (job_dir / 'seg_000.mp4').write_bytes(b'x' * 100)
+        os.utime(job_dir / 'seg_000.mp4', (0, 0))
+        os.utime(job_dir, (0, 0))
+
+        self.assertEqual(cleanup_stale(max_age_hours=1), 100)
+        self.assertFalse(job_dir.exists())
+
+if __name__ == '__main__':
+    unittest.main()
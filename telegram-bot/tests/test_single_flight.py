@@ -0,0 +1,156 @@
+import unittest
+import asyncio
+from bot.services.single_flight import SingleFlight
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight("test")
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return "artifact"
+
+        results = await asyncio.gather(*(flight.do("video:1", work) for _ in range(10)))
+
+        self.assertEqual(calls, 1)
+        self.assertTrue(all(result == "artifact" for result, _ in results))
+        self.assertEqual(sum(1 for _, shared in results if not shared), 1)
+        self.assertEqual(flight.in_flight(), 0)
+
+    async def test_failure_fans_out(self):
+        flight = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.05)
+            raise ValueError("private video")
+
+        results = await asyncio.gather(
+            *(flight.do("video:1", work) for _ in range(3)),
+            return_exceptions=True
+        )
+
+        self.assertEqual(len(results), 3)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+    async def test_sequential_calls_run_again(self):
+        flight = SingleFlight("test")
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            return calls
+
+        await flight.do("video:1", work)
+        result, shared = await flight.do("video:1", work)
+
+        self.assertEqual(result, 2)
+        self.assertFalse(shared)
+
+    async def test_follower_cancel_keeps_leader_running(self):
+        flight = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        leader = asyncio.create_task(flight.do("video:1", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("video:1", work))
+        await asyncio.sleep(0)
+        follower.cancel()
+
+        self.assertEqual(await leader, ("done", False))
+
+    async def test_leader_cancel_keeps_followers_result(self):
+        flight = SingleFlight("test")
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        leader = asyncio.create_task(flight.do("video:1", work))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(flight.do("video:1", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertEqual(await follower, ("done", True))
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+        self.assertEqual(flight.in_flight(), 0)
+
+    async def test_work_cancelled_when_every_caller_leaves(self):
+        flight = SingleFlight("test")
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def work():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        callers = [asyncio.create_task(flight.do("video:1", work)) for _ in range(2)]
+        await started.wait()
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await asyncio.sleep(0)
+        self.assertEqual(flight.in_flight(), 0)
+
+    async def test_every_caller_claims_before_work_releases(self):
+        flight = SingleFlight("test")
+        holds = []
+
+        async def work():
+            holds.append("work")
+            await asyncio.sleep(0.05)
+            return "lease"
+
+        def claim(result):
+            holds.append("caller")
+
+        def release(result):
+            # Ish o'z ushlagichini oxirgi chaqiruvchi olgandan keyingina qaytaradi
+            self.assertEqual(holds.count("caller"), 3)
+            holds.remove("work")
+
+        results = await asyncio.gather(
+            *(flight.do("video:1", work, claim=claim, release=release) for _ in range(3))
+        )
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual(holds, ["caller"] * 3)
+
+    async def test_release_runs_when_every_caller_left(self):
+        flight = SingleFlight("test")
+        released = []
+        done = asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.sleep(0.05)
+            finally:
+                done.set()
+            return "lease"
+
+        caller = asyncio.create_task(flight.do("video:1", work, release=released.append))
+        await asyncio.sleep(0)
+        # Natija tayyor bo'lgan paytda chaqiruvchi bekor qilinadi
+        await done.wait()
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        await asyncio.sleep(0)
+
+        self.assertEqual(released, ["lease"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from bot.ffmpeg_progress import FFmpegProgress
+from bot.services.monitoring import metrics
+from bot.video_compress import (
+    encode_to_size, predict_size, corrected_bitrate, sample_offsets,
+    AUDIO_BITRATE, SAMPLE_COUNT, SAMPLE_SECONDS
+)
+
+MB = 1024 * 1024
+TARGET = 45 * MB
+
+class FakeEncoder:
+    """Writes outputs as big as x264 would for content needing crf_rate bytes/s
+
+    abr_error scales ABR output per encode, e.g. [1.1, 1.0] overshoots once;
+    crf_error scales full-length CRF output (content the samples missed).
+    Encodes report progress halfway and stop there if told to.
+    """
+
+    def __init__(self, crf_rate: float, duration: float, abr_error=None, crf_error: float = 1.0):
+        self.crf_rate = crf_rate
+        self.duration = duration
+        self.abr_error = list(abr_error or [])
+        self.crf_error = crf_error
+        self.calls = []
+        self.aborted = []
+
+    def _arg(self, cmd, name):
+        return cmd[cmd.index(name) + 1] if name in cmd else None
+
+    async def __call__(self, cmd, on_progress=None):
+        self.calls.append(cmd)
+        output = cmd[-1]
+        if '-pass' in cmd and self._arg(cmd, '-pass') == '1':
+            with open(self._arg(cmd, '-passlogfile') + '-0.log', 'w') as f:
+                f.write('stats')
+            return 0, b'', b''
+
+        if '-crf' in cmd:
+            rate = min(self.crf_rate, int(self._arg(cmd, '-maxrate')) / 8)
+        else:
+            error = self.abr_error.pop(0) if self.abr_error else 1.0
+            rate = int(self._arg(cmd, '-b:v')) / 8 * error
+        if '-crf' in cmd and '-t' not in cmd:
+            rate *= self.crf_error
+        seconds = float(self._arg(cmd, '-t') or self.duration)
+        size = rate * seconds
+        if '-an' not in cmd:
+            size += AUDIO_BITRATE / 8 * seconds
+        if on_progress and on_progress(FFmpegProgress(out_time=seconds / 2, total_size=int(size / 2))) is False:
+            self.aborted.append(cmd)
+            with open(output, 'wb') as f:
+                f.truncate(int(size / 2))
+            return -9, b'', b''
+        with open(output, 'wb') as f:
+            f.truncate(int(size))
+        return 0, b'', b''
+
+    def encodes(self, kind):
+        full = [cmd for cmd in self.calls if '-t' not in cmd]
+        if kind == 'sample':
+            return [cmd for cmd in self.calls if '-t' in cmd]
+        if kind == 'crf':
+            return [cmd for cmd in full if '-crf' in cmd]
+        return [cmd for cmd in full if self._arg(cmd, '-pass') == '2']
+
+class TestSizeEncoding(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.output = os.path.join(self.tmp, 'out.mp4')
+        counter = iter(range(1000))
+        self.names = patch(
+            'bot.video_compress.generate_temp_filename',
+            lambda prefix='', suffix='': os.path.join(self.tmp, f"{prefix}{next(counter)}{suffix}")
+        )
+        self.names.start()
+
+    def tearDown(self):
+        self.names.stop()
+        shutil.rmtree(self.tmp)
+
+    async def _encode(self, encoder):
+        with patch('bot.ffmpeg_encode.run_command', encoder):
+            return await encode_to_size('in.mp4', self.output, encoder.duration, 1280, 720, TARGET)
+
+    async def test_simple_content_uses_capped_crf(self):
+        encoder = FakeEncoder(crf_rate=20000, duration=600)
+        predictions = metrics.size_predictions
+        error_total = metrics.size_prediction_error_total
+
+        self.assertEqual(await self._encode(encoder), self.output)
+
+        self.assertEqual(len(encoder.encodes('sample')), SAMPLE_COUNT)
+        self.assertEqual(len(encoder.encodes('crf')), 1)
+        self.assertEqual(encoder.encodes('two_pass'), [])
+        # Namunalar bir xil murakkablikda: bashorat deyarli aniq
+        self.assertEqual(metrics.size_predictions, predictions + 1)
+        self.assertLess(metrics.size_prediction_error_total - error_total, 0.02)
+        self.assertLess(os.path.getsize(self.output), TARGET)
+
+    async def test_complex_content_uses_two_pass(self):
+        encoder = FakeEncoder(crf_rate=500000, duration=600)
+
+        await self._encode(encoder)
+
+        self.assertEqual(encoder.encodes('crf'), [])
+        self.assertEqual(len(encoder.encodes('two_pass')), 1)
+        self.assertLessEqual(os.path.getsize(self.output), TARGET)
+        # Ikki o'tish statistikasi tozalanadi
+        self.assertEqual([name for name in os.listdir(self.tmp) if 'x264pass' in name], [])
+
+    async def test_overshoot_gets_one_corrective_pass(self):
+        encoder = FakeEncoder(crf_rate=500000, duration=600, abr_error=[1.1, 1.0])
+        corrective = metrics.size_corrective_passes
+
+        await self._encode(encoder)
+
+        passes = encoder.encodes('two_pass')
+        self.assertEqual(len(passes), 2)
+        first, second = (int(cmd[cmd.index('-b:v') + 1]) for cmd in passes)
+        self.assertLess(second, first / 1.05)
+        self.assertLessEqual(os.path.getsize(self.output), TARGET)
+        self.assertEqual(metrics.size_corrective_passes, corrective + 1)
+
+    async def test_correction_is_bounded_to_one_pass(self):
+        encoder = FakeEncoder(crf_rate=500000, duration=600, abr_error=[1.2, 1.5])
+        misses = metrics.size_target_misses
+
+        self.assertEqual(await self._encode(encoder), self.output)
+
+        self.assertEqual(len(encoder.encodes('two_pass')), 2)
+        self.assertEqual(metrics.size_target_misses, misses + 1)
+
+    async def test_crf_overshoot_stops_early_and_switches_to_two_pass(self):
+        encoder = FakeEncoder(crf_rate=20000, duration=600, crf_error=5.0)
+
+        self.assertEqual(await self._encode(encoder), self.output)
+
+        self.assertEqual(encoder.aborted, encoder.encodes('crf'))
+        self.assertEqual(len(encoder.encodes('two_pass')), 1)
+        self.assertLessEqual(os.path.getsize(self.output), TARGET)
+
+    async def test_two_pass_overshoot_goes_straight_to_correction(self):
+        encoder = FakeEncoder(crf_rate=500000, duration=600, abr_error=[1.5, 1.0])
+        aborts = metrics.transcode_aborts['abr']
+
+        await self._encode(encoder)
+
+        passes = encoder.encodes('two_pass')
+        self.assertEqual(encoder.aborted, passes[:1])
+        self.assertEqual(len(passes), 2)
+        self.assertLessEqual(os.path.getsize(self.output), TARGET)
+        self.assertEqual(metrics.transcode_aborts['abr'], aborts + 1)
+
+    async def test_short_video_skips_sampling(self):
+        encoder = FakeEncoder(crf_rate=20000, duration=20)
+
+        await self._encode(encoder)
+
+        self.assertEqual(encoder.encodes('sample'), [])
+        self.assertEqual(len(encoder.encodes('two_pass')), 1)
+
+    def test_prediction_and_correction_math(self):
+        # 100KB/s video + 16KB/s audio, 1% konteyner
+        self.assertEqual(predict_size(100000, 100), int(116000 * 100 * 1.01))
+        self.assertLess(corrected_bitrate(1000000, 50 * MB, TARGET, 300), 1000000 * 45 / 50)
+        self.assertGreater(corrected_bitrate(1000000, 30 * MB, TARGET, 300), 1000000)
+
+    def test_samples_spread_over_video(self):
+        offsets = sample_offsets(600)
+        self.assertEqual(len(offsets), SAMPLE_COUNT)
+        self.assertGreater(offsets[0], 0)
+        self.assertLess(offsets[-1] + SAMPLE_SECONDS, 600)
+
+if __name__ == '__main__':
+    unittest.main()
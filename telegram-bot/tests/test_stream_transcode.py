@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, AsyncMock
+from bot.stream_transcode import stream_inputs, should_stream, build_stream_command, stream_compress
+
+MB = 1024 * 1024
+
+DASH_INFO = {
+    'id': 'dash',
+    'duration': 600,
+    'filesize_approx': 300 * MB,
+    'requested_formats': [
+        {'format_id': '137', 'url': 'https://cdn.example.com/v', 'protocol': 'https',
+         'width': 1920, 'height': 1080, 'http_headers': {'User-Agent': 'ua'}},
+        {'format_id': '140', 'url': 'https://cdn.example.com/a', 'protocol': 'https'},
+    ],
+}
+
+class TestStreamTranscode(unittest.IsolatedAsyncioTestCase):
+    def test_separate_video_and_audio_are_two_inputs(self):
+        cmd = build_stream_command(DASH_INFO, 'out.mp4', target_size_mb=45, max_height=720)
+
+        self.assertEqual(cmd.count('-i'), 2)
+        self.assertIn('https://cdn.example.com/a', cmd)
+        self.assertEqual(cmd[cmd.index('-headers') + 1], 'User-Agent: ua\r\n')
+        self.assertIn('1:a:0', cmd)
+        self.assertIn('scale=1280:720', cmd)
+        self.assertEqual(cmd[-1], 'out.mp4')
+
+    def test_segmented_and_slim_sources_fall_back(self):
+        segmented = {
+            'url': 'https://cdn.example.com/manifest.mpd',
+            'protocol': 'http_dash_segments',
+            'fragments': [{'path': 'seg1'}]
+        }
+        self.assertIsNone(stream_inputs(segmented))
+        self.assertIsNone(stream_inputs({**DASH_INFO, '_slim': True}))
+        self.assertIsNone(stream_inputs({'url': 'https://x', 'cookies': 'a=b'}))
+        self.assertEqual(len(stream_inputs({'url': 'https://x/master.m3u8', 'protocol': 'm3u8_native'})), 1)
+
+    def test_only_oversized_videos_are_streamed(self):
+        self.assertTrue(should_stream(DASH_INFO))
+        self.assertFalse(should_stream({**DASH_INFO, 'filesize_approx': 20 * MB}))
+        # O'lchami noma'lum bo'lsa, oddiy yuklab olish
+        self.assertFalse(should_stream({**DASH_INFO, 'filesize_approx': None}))
+
+    async def test_ffmpeg_failure_falls_back(self):
+        output_path = os.path.join(tempfile.mkdtemp(), 'out.mp4')
+        with open(output_path, 'wb') as f:
+            f.write(b'partial')
+
+        with patch('bot.stream_transcode.run_command', AsyncMock(return_value=(1, b'', b'403 Forbidden'))):
+            result = await stream_compress(DASH_INFO, output_path)
+
+        self.assertIsNone(result)
+        self.assertFalse(os.path.exists(output_path))
+        os.rmdir(os.path.dirname(output_path))
+
+    async def test_oversized_output_falls_back(self):
+        output_path = os.path.join(tempfile.mkdtemp(), 'out.mp4')
+
+        async def overshoot(cmd, on_progress=None):
+            with open(output_path, 'wb') as f:
+                f.truncate(46 * MB)
+            return 0, b'', b''
+
+        with patch('bot.stream_transcode.run_command', overshoot):
+            result = await stream_compress(DASH_INFO, output_path, target_size_mb=45)
+
+        self.assertIsNone(result)
+        self.assertFalse(os.path.exists(output_path))
+        os.rmdir(os.path.dirname(output_path))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,146 @@
+import os
+import json
+import shutil
+import struct
+import tempfile
+import unittest
+from unittest.mock import patch
+from bot.services.monitoring import metrics
+from bot.transcode_planner import (
+    plan_video, plan_audio, moov_before_mdat,
+    PLAN_KEEP, PLAN_FASTSTART, PLAN_COPY, PLAN_AUDIO_ENCODE, PLAN_VIDEO_ENCODE, PLAN_TRANSCODE,
+    AUDIO_PLAN_COPY, AUDIO_PLAN_ENCODE
+)
+from bot.video_compress import compress_video
+from bot.acrcloud_recognizer import extract_audio_from_video
+
+MB = 1024 * 1024
+TARGET = 45 * MB
+
+def probe(video='h264', audio='aac', audio_bitrate='128000', format_name='mov,mp4,m4a,3gp,3g2,mj2'):
+    streams = []
+    if video:
+        streams.append({'codec_type': 'video', 'codec_name': video, 'pix_fmt': 'yuv420p',
+                        'width': 1920, 'height': 1080})
+    if audio:
+        streams.append({'codec_type': 'audio', 'codec_name': audio, 'bit_rate': audio_bitrate})
+    return {'streams': streams, 'format': {'format_name': format_name, 'duration': '300'}}
+
+def box(box_type: bytes, payload: bytes = b'') -> bytes:
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+class TestTranscodePlanner(unittest.TestCase):
+    def test_compatible_file_is_kept_or_rewrapped(self):
+        self.assertEqual(plan_video(probe(), 10 * MB, TARGET, faststart=True).mode, PLAN_KEEP)
+        self.assertEqual(plan_video(probe(), 10 * MB, TARGET, faststart=False).mode, PLAN_FASTSTART)
+        self.assertEqual(plan_video(probe(format_name='matroska,webm'), 10 * MB, TARGET, True).mode, PLAN_COPY)
+        self.assertEqual(plan_video(probe(audio=None), 10 * MB, TARGET, True).mode, PLAN_KEEP)
+
+    def test_only_incompatible_audio_is_encoded(self):
+        plan = plan_video(probe(audio='opus'), 10 * MB, TARGET, faststart=True)
+        self.assertEqual(plan.mode, PLAN_AUDIO_ENCODE)
+        self.assertFalse(plan.encodes_video)
+
+    def test_large_file_keeps_aac_audio(self):
+        plan = plan_video(probe(), 200 * MB, TARGET)
+        self.assertEqual(plan.mode, PLAN_VIDEO_ENCODE)
+        self.assertTrue(plan.copies_audio)
+        self.assertEqual(plan.audio_bitrate, 128000)
+
+    def test_full_transcode_only_when_needed(self):
+        # Ovoz kodeki mos emas yoki bitreyti noma'lum/juda katta
+        self.assertEqual(plan_video(probe(audio='opus'), 200 * MB, TARGET).mode, PLAN_TRANSCODE)
+        self.assertEqual(plan_video(probe(audio_bitrate=None), 200 * MB, TARGET).mode, PLAN_TRANSCODE)
+        self.assertEqual(plan_video(probe(audio_bitrate='320000'), 200 * MB, TARGET).mode, PLAN_TRANSCODE)
+        self.assertEqual(plan_video(probe(video='vp9', audio='opus'), 10 * MB, TARGET).mode, PLAN_TRANSCODE)
+        self.assertEqual(plan_video(probe(video='vp9'), 10 * MB, TARGET).mode, PLAN_VIDEO_ENCODE)
+        self.assertIsNone(plan_video(probe(video=None), 10 * MB, TARGET))
+
+    def test_audio_plan(self):
+        self.assertEqual(plan_audio(probe()), (AUDIO_PLAN_COPY, '.m4a'))
+        self.assertEqual(plan_audio(probe(audio='mp3')), (AUDIO_PLAN_COPY, '.mp3'))
+        self.assertEqual(plan_audio(probe(audio='opus')), (AUDIO_PLAN_ENCODE, '.mp3'))
+        self.assertEqual(plan_audio(None), (AUDIO_PLAN_ENCODE, '.mp3'))
+
+    def test_moov_position(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            front = os.path.join(tmp, 'front.mp4')
+            back = os.path.join(tmp, 'back.mp4')
+            with open(front, 'wb') as f:
+                f.write(box(b'ftyp', b'isom') + box(b'moov', b'x' * 16) + box(b'mdat', b'y' * 64))
+            with open(back, 'wb') as f:
+                f.write(box(b'ftyp', b'isom') + box(b'mdat', b'y' * 64) + box(b'moov', b'x' * 16))
+            self.assertTrue(moov_before_mdat(front))
+            self.assertFalse(moov_before_mdat(back))
+            self.assertFalse(moov_before_mdat(os.path.join(tmp, 'missing.mp4')))
+        finally:
+            shutil.rmtree(tmp)
+
+class TestCodecAwarePaths(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.input = os.path.join(self.tmp, 'in.webm')
+        with open(self.input, 'wb') as f:
+            f.truncate(10 * MB)
+        self.commands = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _fake_ffmpeg(self, probe_result):
+        async def run(cmd):
+            self.commands.append(cmd)
+            if cmd[0] == 'ffprobe':
+                return 0, json.dumps(probe_result).encode(), b''
+            with open(cmd[-1], 'wb') as f:
+                f.write(b'out')
+            return 0, b'', b''
+        return run
+
+    async def test_compatible_codecs_are_stream_copied(self):
+        output = os.path.join(self.tmp, 'out.mp4')
+        run = self._fake_ffmpeg(probe(format_name='matroska,webm'))
+        with patch('bot.ffmpeg_encode.run_command', run), patch('bot.media_probe.run_command', run):
+            result = await compress_video(self.input, output, target_size_mb=45)
+
+        self.assertEqual(result, output)
+        ffmpeg = self.commands[-1]
+        self.assertEqual(ffmpeg[ffmpeg.index('-c:v') + 1], 'copy')
+        self.assertEqual(ffmpeg[ffmpeg.index('-c:a') + 1], 'copy')
+        self.assertIn('+faststart', ffmpeg)
+        self.assertNotIn('libx264', ffmpeg)
+        self.assertIn(f"transcode_{PLAN_COPY}", metrics.stage_timings)
+
+    async def test_aac_audio_is_copied_not_encoded(self):
+        run = self._fake_ffmpeg(probe())
+        with patch('bot.media_probe.run_command', run), \
+                patch('bot.acrcloud_recognizer.run_command', run), \
+                patch('bot.acrcloud_recognizer.generate_temp_filename',
+                      lambda prefix, suffix: os.path.join(self.tmp, prefix + 'x' + suffix)):
+            result = await extract_audio_from_video(self.input)
+
+        self.assertEqual(result, os.path.join(self.tmp, 'audio_x.m4a'))
+        ffmpeg = self.commands[-1]
+        self.assertEqual(ffmpeg[ffmpeg.index('-acodec') + 1], 'copy')
+        self.assertIn(f"audio_{AUDIO_PLAN_COPY}", metrics.stage_timings)
+
+    async def test_explicit_output_path_is_kept(self):
+        run = self._fake_ffmpeg(probe())
+        with patch('bot.media_probe.run_command', run), \
+                patch('bot.acrcloud_recognizer.run_command', run):
+            copied = await extract_audio_from_video(self.input, os.path.join(self.tmp, 'audio.m4a'))
+            copy_cmd = self.commands[-1]
+            encoded = await extract_audio_from_video(self.input, os.path.join(self.tmp, 'audio.mp3'))
+            encode_cmd = self.commands[-1]
+            rejected = await extract_audio_from_video(self.input, os.path.join(self.tmp, 'audio.wav'))
+
+        # Yo'l o'zgarmaydi, kodek kengaytmaga mos tanlanadi
+        self.assertEqual(copied, os.path.join(self.tmp, 'audio.m4a'))
+        self.assertEqual(copy_cmd[copy_cmd.index('-acodec') + 1], 'copy')
+        self.assertEqual(encoded, os.path.join(self.tmp, 'audio.mp3'))
+        self.assertEqual(encode_cmd[encode_cmd.index('-acodec') + 1], 'libmp3lame')
+        self.assertIsNone(rejected)
+
+if __name__ == '__main__':
+    unittest.main()
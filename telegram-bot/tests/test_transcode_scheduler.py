@@ -0,0 +1,115 @@
+import os
+import shutil
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch
+from bot.services.monitoring import metrics
+from bot.services.transcode_scheduler import TranscodeScheduler, cgroup_cpu_limit, available_cpus
+from bot.video_compress import build_encode_args
+
+class TestCpuQuota(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _write(self, name: str, text: str) -> None:
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def test_cgroup_v2(self):
+        self._write('cpu.max', '150000 100000\n')
+        self.assertEqual(cgroup_cpu_limit(self.root), 1.5)
+        self._write('cpu.max', 'max 100000\n')
+        self.assertIsNone(cgroup_cpu_limit(self.root))
+
+    def test_cgroup_v1(self):
+        self._write('cpu,cpuacct/cpu.cfs_quota_us', '200000')
+        self._write('cpu,cpuacct/cpu.cfs_period_us', '100000')
+        self.assertEqual(cgroup_cpu_limit(self.root), 2.0)
+        self._write('cpu,cpuacct/cpu.cfs_quota_us', '-1')
+        self.assertIsNone(cgroup_cpu_limit(self.root))
+
+    def test_quota_caps_host_cores(self):
+        self._write('cpu.max', '100000 100000')
+        with patch('os.sched_getaffinity', lambda pid: set(range(64))):
+            self.assertEqual(available_cpus(self.root), 1.0)
+        self.assertEqual(available_cpus(os.path.join(self.root, 'missing')), len(os.sched_getaffinity(0)))
+
+class TestTranscodeScheduler(unittest.IsolatedAsyncioTestCase):
+    async def test_threads_never_exceed_budget(self):
+        scheduler = TranscodeScheduler(cpus=8, max_encoders=3)
+        peak = {'threads': 0, 'encoders': 0}
+
+        async def job():
+            async with scheduler.encoder(60) as slot:
+                peak['threads'] = max(peak['threads'], scheduler.threads_in_use)
+                peak['encoders'] = max(peak['encoders'], scheduler.active)
+                self.assertGreaterEqual(slot.threads, 1)
+                await asyncio.sleep(0.02)
+
+        await asyncio.gather(*(job() for _ in range(10)))
+
+        self.assertLessEqual(peak['threads'], 8)
+        self.assertEqual(peak['encoders'], 3)
+        self.assertEqual((scheduler.active, scheduler.threads_in_use, scheduler.waiting), (0, 0, 0))
+
+    async def test_lone_encoder_leaves_room_for_the_next(self):
+        scheduler = TranscodeScheduler(cpus=8, max_encoders=4)
+
+        async with scheduler.encoder(60) as first:
+            self.assertEqual(first.threads, 7)
+            async with scheduler.encoder(60) as second:
+                self.assertEqual(second.threads, 1)
+
+    async def test_cancelled_waiter_does_not_leak(self):
+        scheduler = TranscodeScheduler(cpus=2, max_encoders=1)
+        async with scheduler.encoder(60):
+            waiter = asyncio.create_task(scheduler.acquire())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+        self.assertEqual((scheduler.active, scheduler.threads_in_use, scheduler.waiting), (0, 0, 0))
+
+    async def test_preset_follows_load_and_latency_budget(self):
+        scheduler = TranscodeScheduler(cpus=4, max_encoders=1, max_preset='medium', latency_budget=100)
+
+        # Bo'sh: sekinroq preset vaqt byudjetiga sig'sa tanlanadi
+        self.assertEqual(scheduler.choose_preset(60, threads=4), 'medium')
+        self.assertEqual(scheduler.choose_preset(3600, threads=4), 'veryfast')
+        self.assertEqual(scheduler.choose_preset(500, threads=4), 'fast')
+
+        # Navbat bor: eng tez preset
+        async with scheduler.encoder(60):
+            waiter = asyncio.create_task(scheduler.acquire())
+            await asyncio.sleep(0)
+            self.assertEqual(scheduler.choose_preset(60, threads=4), 'veryfast')
+            waiter.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+
+    async def test_measured_speed_updates_policy_and_metrics(self):
+        scheduler = TranscodeScheduler(cpus=1, max_encoders=1)
+        before = metrics.transcode_presets.get('slow', {}).get('encodes', 0)
+
+        async with scheduler.encoder(60, preset='slow') as slot:
+            await asyncio.sleep(0.05)
+            slot.media_seconds = 60
+
+        self.assertGreater(scheduler.speeds['slow'], 0.6)
+        self.assertEqual(metrics.transcode_presets['slow']['encodes'], before + 1)
+        self.assertGreater(metrics.get_statistics()['transcode_presets']['slow']['speed'], 0)
+
+    def test_encode_args_carry_preset_and_threads(self):
+        args = build_encode_args(1_000_000, 1280, 720, 'out.mp4', preset='veryfast', threads=3)
+        self.assertEqual(args[args.index('-preset') + 1], 'veryfast')
+        self.assertEqual(args[args.index('-threads') + 1], '3')
+        self.assertNotIn('-threads', build_encode_args(1_000_000, 1280, 720, 'out.mp4'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+import asyncio
+from unittest.mock import patch, MagicMock
+from bot.ydl_pool import YDLPool, PROFILE_METADATA
+
+class TestYDLPool(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.patcher = patch('yt_dlp.YoutubeDL', side_effect=lambda opts: MagicMock())
+        self.mock_ytdl = self.patcher.start()
+        self.pool = YDLPool(lambda profile: {}, sizes={PROFILE_METADATA: 2}, cachedir="/tmp/ydl-cache")
+
+    def tearDown(self):
+        self.pool.clear()
+        self.patcher.stop()
+
+    async def test_instance_is_reused(self):
+        async with self.pool.checkout(PROFILE_METADATA) as first:
+            pass
+        async with self.pool.checkout(PROFILE_METADATA) as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertEqual(self.mock_ytdl.call_count, 1)
+
+    async def test_pool_size_is_bounded(self):
+        peak = 0
+        held = set()
+
+        async def job():
+            nonlocal peak
+            async with self.pool.checkout(PROFILE_METADATA) as ydl:
+                self.assertNotIn(ydl, held)
+                held.add(ydl)
+                peak = max(peak, len(held))
+                await asyncio.sleep(0.01)
+                held.discard(ydl)
+
+        await asyncio.gather(*(job() for _ in range(5)))
+
+        self.assertEqual(peak, 2)
+        self.assertEqual(self.mock_ytdl.call_count, 2)
+
+    async def test_instance_discarded_after_unexpected_error(self):
+        with self.assertRaises(RuntimeError):
+            async with self.pool.checkout(PROFILE_METADATA) as broken:
+                raise RuntimeError("extractor crashed")
+
+        async with self.pool.checkout(PROFILE_METADATA) as fresh:
+            pass
+
+        self.assertIsNot(broken, fresh)
+        broken.__exit__.assert_called_once()
+
+if __name__ == '__main__':
+    unittest.main()
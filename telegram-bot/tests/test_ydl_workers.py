@@ -0,0 +1,97 @@
+import os
+import signal
+import socket
+import asyncio
+import unittest
+from unittest.mock import patch
+from bot.downloader import _download_once, ydl_pool
+from bot.services.host_tuner import HostThroughputTuner
+from bot.ydl_workers import YDLProcessPool, _WorkerState
+
+class TestYDLProcessPool(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.pool = YDLProcessPool(workers=2)
+
+    async def asyncTearDown(self):
+        self.pool.close()
+
+    async def test_jobs_run_in_separate_processes(self):
+        pids = await asyncio.gather(self.pool.ping(), self.pool.ping())
+
+        self.assertEqual(len(set(pids)), 2)
+        self.assertNotIn(os.getpid(), pids)
+        self.assertEqual(self.pool.get_statistics()['idle'], 2)
+
+    async def test_dead_worker_is_replaced(self):
+        pid = await self.pool.ping()
+        self.pool.close()
+        self.pool.size = 1
+
+        pid = await self.pool.ping()
+        os.kill(pid, signal.SIGKILL)
+        await asyncio.sleep(0.2)
+
+        new_pid = await self.pool.ping()
+        self.assertNotEqual(pid, new_pid)
+        self.assertEqual(self.pool.crashes, 1)
+
+    async def test_cancel_kills_running_job(self):
+        # Server that accepts connections and never answers
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen()
+        port = server.getsockname()[1]
+        self.pool.size = 1
+        await self.pool.ping()
+        try:
+            task = asyncio.create_task(self.pool.extract(f"http://127.0.0.1:{port}/video.mp4"))
+            await asyncio.sleep(1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+        finally:
+            server.close()
+
+        stats = self.pool.get_statistics()
+        self.assertEqual(stats['cancelled'], 1)
+        self.assertEqual(stats['started'], 0)
+
+        # Pool keeps working after the worker was killed
+        self.assertIsInstance(await self.pool.ping(), int)
+
+class FakeWorkers:
+    """Worker pool that reports a finished fragment download"""
+    enabled = True
+
+    def __init__(self):
+        self.tuning = None
+
+    async def download(self, url, output_path, info=None, tuning=None):
+        self.tuning = tuning
+        return {
+            'id': 'abc',
+            'requested_downloads': [{'filepath': output_path}],
+            '_throughput': {'host': 'cdn.example.com', 'nbytes': 8 * 1024 * 1024, 'seconds': 2.0, 'concurrency': 2}
+        }
+
+class TestWorkerIntegration(unittest.IsolatedAsyncioTestCase):
+    def test_worker_ydl_uses_pool_options(self):
+        options = YDLProcessPool.ydl_options()
+        self.assertEqual(options['cachedir'], ydl_pool.cachedir)
+
+        ydl = _WorkerState(options).ydl()
+        self.assertEqual(ydl.params['cachedir'], ydl_pool.cachedir)
+
+    async def test_worker_throughput_recorded_in_parent(self):
+        tuner = HostThroughputTuner(max_concurrency=4)
+        tuner.settings('cdn.example.com')
+        workers = FakeWorkers()
+        with patch('bot.downloader.ydl_workers', workers), patch('bot.downloader.host_tuner', tuner):
+            result = await _download_once('https://example.com/v', '/tmp/out.mp4', {'id': 'abc'})
+
+        self.assertNotIn('_throughput', result)
+        self.assertIn('cdn.example.com', workers.tuning)
+        self.assertEqual(tuner.get_statistics()['cdn.example.com']['downloads'], 1)
+
+if __name__ == '__main__':
+    unittest.main()